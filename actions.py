@@ -37,6 +37,8 @@ LOGIKA OHŘEVU AKUMULACE:
 from datetime import datetime
 from typing import Any, Dict
 
+from solution import Solution, to_plain
+
 # ---------------------------------------------------------------------------
 # Parametry systému
 # ---------------------------------------------------------------------------
@@ -76,8 +78,9 @@ def powerplan_to_actions(sol: Dict[str, Any], slot_index: int = 0) -> Dict[str,
         sol: Slovník s výstupy Powerplan optimizátoru
         slot_index: Index slotu (0 = aktuální/první slot)
     """
-    out = sol["outputs"]  # outputs now use lower_snake_case keys
-    inp = sol.get("inputs", {})  # inputs contain predictions
+    sol = Solution.from_dict(sol)
+    out = sol.outputs  # outputs now use lower_snake_case keys
+    inp = sol.inputs  # inputs contain predictions
     Hin_upper = out["h_in_upper"][slot_index]
     Hin_lower = out["h_in_lower"][slot_index]
     Hin_total = Hin_upper + Hin_lower
@@ -97,8 +100,7 @@ def powerplan_to_actions(sol: Dict[str, Any], slot_index: int = 0) -> Dict[str,
     fve_surplus = max(0, fve_output - load_demand)
 
     # Zjednodušená logika ohřevu pro aktuální slot
-    from datetime import datetime
-    slot_time = datetime.fromisoformat(sol["times"][slot_index])
+    slot_time = sol.datetimes[slot_index]
     heating = simplified_heating_logic(
         fve_surplus, B_SOC, Hin_upper, Hin_lower, Gbuy,
         temp_upper_current, temp_lower_current, slot_time
@@ -154,7 +156,15 @@ def powerplan_to_actions(sol: Dict[str, Any], slot_index: int = 0) -> Dict[str,
     # Minimální SOC podle situace
     minimum_battery_soc = MIN_SOC_RESERVE if max_heat_on else max(MIN_SOC_RESERVE - 10, 20)
 
-    return {
+    # Mezní hodnoty z duálních cen LP (rozhodovací pravidlo pro automatizace mezi přepočty)
+    marginal = {}
+    if "b_value" in out and "bus_price" in out:
+        marginal = {
+            "battery_kwh_value":     round(float(out["b_value"][slot_index]), 3),
+            "energy_marginal_price": round(float(out["bus_price"][slot_index]), 3),
+        }
+
+    return to_plain({
         "charger_use_mode":        charger_use_mode,
         "upper_accumulation_on":   upper_accumulation_on,
         "lower_accumulation_on":   lower_accumulation_on,
@@ -165,7 +175,8 @@ def powerplan_to_actions(sol: Dict[str, Any], slot_index: int = 0) -> Dict[str,
         "battery_target_soc":      round(B_SOC, 1),
         "reserve_power_charging":  reserve_power_charging,
         "minimum_battery_soc":     minimum_battery_soc,
-    }
+        **marginal,
+    })
 
 ACTION_ATTRIBUTES: dict[str, dict[str, str]] = {
     "charger_use_mode": {
@@ -225,6 +236,18 @@ ACTION_ATTRIBUTES: dict[str, dict[str, str]] = {
         "state_class": "measurement",
         "icon": "mdi:battery-low",
     },
+    "battery_kwh_value": {
+        "friendly_name": "Hodnota 1 kWh v baterii",
+        "unit_of_measurement": "Kč/kWh",
+        "state_class": "measurement",
+        "icon": "mdi:battery-heart-variant",
+    },
+    "energy_marginal_price": {
+        "friendly_name": "Mezní cena energie v aktuálním slotu",
+        "unit_of_measurement": "Kč/kWh",
+        "state_class": "measurement",
+        "icon": "mdi:cash-clock",
+    },
 }
 
 # ---------------------------------------------------------------------------
@@ -303,14 +326,29 @@ def simplified_heating_logic(fve_surplus: float, B_SOC: float, Hin_upper: float,
         "comfort_heating_grid": comfort_heating_grid
     }
 
+# Akce v `powerplan_to_actions_timeline` (bez pomocných řad pro grafy)
+TIMELINE_ACTIONS = [
+    "charger_mode",
+    "upper_accumulation",
+    "lower_accumulation",
+    "max_heat",
+    "heating_blocked",
+    "comfort_heating_grid",
+    "battery_target_soc",
+    "reserve_power",
+    "minimum_soc",
+]
+
 # ---------------------------------------------------------------------------
 def powerplan_to_actions_timeline(sol: Dict[str, Any]) -> Dict[str, Any]:
     """
     Generuje plán akcí pro všechny časové sloty podle výstupů MPC optimizátoru.
     Výsledek obsahuje časové řady pro vizualizaci v grafech.
     """
-    out = sol["outputs"]
-    inp = sol.get("inputs", {})  # inputs contain predictions
+    sol = Solution.from_dict(sol)
+    out = sol.outputs
+    inp = sol.inputs  # inputs contain predictions
+    slot_times = sol.datetimes
     num_slots = len(out["h_in_upper"])
     
     # Příprava výstupních časových řad
@@ -350,8 +388,7 @@ def powerplan_to_actions_timeline(sol: Dict[str, Any]) -> Dict[str, Any]:
         fve_surplus = max(0, fve_output - load_demand)
         
         # Zjednodušená logika ohřevu
-        from datetime import datetime
-        slot_time = datetime.fromisoformat(sol["times"][slot])
+        slot_time = slot_times[slot]
         heating = simplified_heating_logic(
             fve_surplus, B_SOC, Hin_upper, Hin_lower, Gbuy,
             temp_upper, temp_lower, slot_time
@@ -408,4 +445,4 @@ def powerplan_to_actions_timeline(sol: Dict[str, Any]) -> Dict[str, Any]:
             "charger_feedin": charger_mode == "Feedin Priority",
         })
     
-    return timeline
+    return to_plain(timeline)
@@ -1,7 +1,6 @@
-from typing import Any, Dict
+from typing import Any, Dict, Optional, Tuple
 import yaml
 import json
-import requests
 import os
 from models import (
     get_electricity_price,
@@ -12,51 +11,95 @@ from models import (
     get_temperature_forecast,
 )
 
-from powerplan_environment import CREDENTIALS_FILE, OPTIONS_FILE
+from powerplan_environment import CREDENTIALS_FILE, OPTIONS_FILE, ensure_dirs
+from modbus_telemetry import read_telemetry
 
-TOKEN = ""
+# --- Připojení k Home Assistantu -----------------------------------------
+#
+# Přihlašovací údaje se načítají až při prvním použití (ne při importu), aby
+# šel modul importovat bez HA (nástroje, testy) a start workeru byl rychlý.
+
+class HAClient:
+    """Líně vytvořený klient pro REST API Home Assistantu (sdílená HTTP session)."""
+
+    def __init__(self, url: str, token: str):
+        import requests
 
-try:
-    with open(OPTIONS_FILE, "r") as f:
-        print(f"Using credentials from {OPTIONS_FILE}")
-        opts = json.load(f)
-        TOKEN = opts.get("token", "")
-        HA_URL = opts.get("ha_url", "")
-except:
-    pass
+        self.url = url
+        self.token = token
+        self.headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+        }
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
 
 
-if not TOKEN:
-    HA_URL = os.environ.get("HA_URL", "http://homeassistant.local:8123")
-    TOKEN = os.environ.get("HASSIO_TOKEN", None)
+_client: Optional[HAClient] = None
 
 
-if not TOKEN:
+def load_credentials() -> Tuple[str, str]:
+    """Vrátí (url, token) z options.json, proměnných prostředí nebo credentials.yaml."""
+    url, token = "", ""
     try:
-        print(f"Using credentials from {CREDENTIALS_FILE}")
-        with open(CREDENTIALS_FILE, "r") as f:
-            credentials = yaml.safe_load(f)
-            HA_URL = credentials["url"]
-            TOKEN = credentials["token"]
-    except (FileNotFoundError, yaml.YAMLError, ValueError, KeyError) as e:
-        print(f"Error reading {CREDENTIALS_FILE}:", e)
-        with open(CREDENTIALS_FILE, "w") as f:
-            yaml.dump({"url": HA_URL, "token": "your_token"}, f)
-            print(f"Created {CREDENTIALS_FILE} with default values. Please update it.")
-            exit(1)
-
-
-HEADERS = {
-    "Authorization": f"Bearer {TOKEN}",
-    "Content-Type": "application/json",
-}
+        with open(OPTIONS_FILE, "r") as f:
+            print(f"Using credentials from {OPTIONS_FILE}")
+            opts = json.load(f)
+            token = opts.get("token", "")
+            url = opts.get("ha_url", "")
+    except (FileNotFoundError, json.JSONDecodeError, ValueError):
+        pass
+
+    if not token:
+        url = os.environ.get("HA_URL", "http://homeassistant.local:8123")
+        token = os.environ.get("HASSIO_TOKEN", None)
+
+    if not token:
+        try:
+            print(f"Using credentials from {CREDENTIALS_FILE}")
+            with open(CREDENTIALS_FILE, "r") as f:
+                credentials = yaml.safe_load(f)
+                url = credentials["url"]
+                token = credentials["token"]
+        except (FileNotFoundError, yaml.YAMLError, ValueError, KeyError, TypeError) as e:
+            print(f"Error reading {CREDENTIALS_FILE}:", e)
+            ensure_dirs()
+            with open(CREDENTIALS_FILE, "w") as f:
+                yaml.dump({"url": url, "token": "your_token"}, f)
+                print(f"Created {CREDENTIALS_FILE} with default values. Please update it.")
+            raise RuntimeError(f"Home Assistant credentials missing, update {CREDENTIALS_FILE}") from e
+
+    return url, token
+
+
+def get_client() -> HAClient:
+    """Vrátí sdíleného HA klienta, při prvním volání ho vytvoří."""
+    global _client
+    if _client is None:
+        _client = HAClient(*load_credentials())
+    return _client
+
 
 # --- Pomocné funkce -------------------------------------------------------
 
-def get_ha_states():
-    response = requests.get(f"{HA_URL}/api/states", headers=HEADERS, timeout=10)
-    response.raise_for_status()
-    return response.json()
+def get_ha_states(entity_ids=None):
+    """
+    Stavy entit z HA. Bez `entity_ids` celé `/api/states`, jinak jen zadané
+    entity po jedné (`/api/states/<entity_id>`, neexistující se vynechají).
+    """
+    client = get_client()
+    if entity_ids is None:
+        response = client.session.get(f"{client.url}/api/states", timeout=10)
+        response.raise_for_status()
+        return response.json()
+    states = []
+    for entity_id in entity_ids:
+        response = client.session.get(f"{client.url}/api/states/{entity_id}", timeout=10)
+        if response.status_code == 404:
+            continue
+        response.raise_for_status()
+        states.append(response.json())
+    return states
 
 def get_entity(state_list, entity_id, default=0.0):
     for e in state_list:
@@ -67,8 +110,55 @@ def get_entity(state_list, entity_id, default=0.0):
                 return default
     return default
 
-def prepare_data():
-    states = get_ha_states()
+FORECAST_ENTITIES = (
+    "sensor.solcast_pv_forecast_forecast_today",
+    "sensor.solcast_pv_forecast_forecast_tomorrow",
+    "sensor.current_buy_electricity_price",
+    "sensor.current_sell_electricity_price",
+    "sensor.tepelnaakumulace_energie_n_dr_e",
+)
+
+# Počáteční stavy: klíč → (entita v HA, výchozí hodnota)
+INITIAL_ENTITIES = {
+    "bat_soc": ("sensor.solax_battery_capacity", 50),
+    "boiler_top": ("sensor.tepelnaakumulace_horn_senzor", 45.0),
+    "boiler_middle": ("sensor.tepelnaakumulace_st_edn_senzor", 45.0),
+    "boiler_bottom": ("sensor.tepelnaakumulace_spodn_senzor", 30.0),
+}
+
+
+def prepare_data(pushed: Optional[Dict[str, float]] = None,
+                 device_entities: Optional[Dict[str, str]] = None):
+    """
+    Stáhne vstupy z HA. Počáteční stavy mají přednost z Modbus telemetrie,
+    pak z `pushed` (čerstvé hodnoty přijaté push stylem přes MQTT) a teprve
+    pak ze stavů HA – z HA se stahují jen entity, které jinak chybí.
+
+    `device_entities` (klíč → entita, viz `devices.device_entities`) jsou
+    počáteční stavy dalších zařízení; nedostupná entita ve výsledku chybí
+    a zařízení začne z hodnoty v nastavení.
+    """
+    # Čerstvější počáteční stavy přímo z Modbus serveru akumulace (volitelné)
+    try:
+        telemetry = read_telemetry() or {}
+    except (OSError, ValueError) as e:
+        print(f"[WARN] Modbus telemetry unavailable, using HA states: {e}")
+        telemetry = {}
+    initials = {**(pushed or {}), **telemetry}
+
+    missing = [entity for key, (entity, _) in INITIAL_ENTITIES.items() if key not in initials]
+    device_entities = device_entities or {}
+    states = get_ha_states(list(FORECAST_ENTITIES) + missing + list(device_entities.values()))
+    for key, (entity, default) in INITIAL_ENTITIES.items():
+        if key not in initials:
+            initials[key] = get_entity(states, entity, default)
+    device_initials = {}
+    for key, entity in device_entities.items():
+        value = get_entity(states, entity, None)
+        if value is None:
+            print(f"[WARN] {entity} nedostupná, {key} z nastavení")
+        else:
+            device_initials[key] = value
 
     # --- předpovědi a ceny -------------------------------------------------
     fve_raw = get_fve_forecast(states, "sensor.solcast_pv_forecast_forecast_today")
@@ -88,12 +178,12 @@ def prepare_data():
     outdoor_forecast = get_temperature_forecast(hours)
     outdoor_temps = [temp for _, temp in outdoor_forecast]
 
-    bat_soc = get_entity(states, "sensor.solax_battery_capacity", 50)
     boiler_E = get_entity(states, "sensor.tepelnaakumulace_energie_n_dr_e", 25.0)
 
-    boiler_top = get_entity(states, "sensor.tepelnaakumulace_horn_senzor", 45.0)
-    boiler_middle = get_entity(states, "sensor.tepelnaakumulace_st_edn_senzor", 45.0)
-    boiler_bottom = get_entity(states, "sensor.tepelnaakumulace_spodn_senzor", 30.0)
+    bat_soc = initials["bat_soc"]
+    boiler_top = initials["boiler_top"]
+    boiler_middle = initials["boiler_middle"]
+    boiler_bottom = initials["boiler_bottom"]
 
     temp_upper = boiler_top * 0.5 + boiler_middle * 0.5
     temp_lower = boiler_middle * 0.25 + boiler_bottom * 0.75
@@ -115,6 +205,7 @@ def prepare_data():
         "outdoor_temps": outdoor_temps,
         "temp_upper": temp_upper,
         "temp_lower": temp_lower,
+        **device_initials,
     }
 
 def publish_to_ha(payload: Dict[str, Any], prefix: str = "powerplan_", attributes = None, extra = None) -> None:
@@ -134,18 +225,21 @@ def publish_to_ha(payload: Dict[str, Any], prefix: str = "powerplan_", attribute
     requests.HTTPError
         Když HA vrátí stavový kód >= 400.
     """
+    import requests
+
+    client = get_client()
     for key, value in payload.items():
         entity_id = f"sensor.{prefix}{key}"
-        attr = attributes.get(key, {}) if attributes else {}
+        attr = dict(attributes.get(key, {})) if attributes else {}
         if extra:
             attr.update(extra)
-        resp = requests.post(
-            f"{HA_URL}/api/states/{entity_id}",
-            headers=HEADERS,
+        resp = client.session.post(
+            f"{client.url}/api/states/{entity_id}",
             data=json.dumps({
                 "state": str(value),
                 "attributes": attr
-            })
+            }),
+            timeout=10,
         )
         try:
             resp.raise_for_status()
@@ -155,6 +249,57 @@ def publish_to_ha(payload: Dict[str, Any], prefix: str = "powerplan_", attribute
         else:
             print(f"[OK ] {entity_id} = {value}")
 
+
+# Naposledy publikované stavy (entity_id → (stav, otisk atributů, čas publikace)) pro publish_changed
+_published_states: Dict[str, Tuple[str, str, float]] = {}
+# Atributy, které se mění s každým přepočtem – změna jen jich publikaci nevyvolá
+VOLATILE_ATTRIBUTES = ("generated_at", "current_slot")
+# Nezměněný stav se jednou za čas publikuje znovu – entity vytvořené přes
+# REST API HA po restartu neobnovuje
+REPUBLISH_INTERVAL = 3600.0  # s
+
+
+def _attributes_digest(key: str, attributes, extra) -> str:
+    """Otisk atributů entity bez VOLATILE_ATTRIBUTES."""
+    import hashlib
+
+    attr = dict(attributes.get(key, {})) if attributes else {}
+    if extra:
+        attr.update(extra)
+    for name in VOLATILE_ATTRIBUTES:
+        attr.pop(name, None)
+    return hashlib.sha1(json.dumps(attr, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def publish_changed(payload: Dict[str, Any], prefix: str = "powerplan_", attributes = None, extra = None,
+                    compare_attributes: bool = True) -> Dict[str, Any]:
+    """
+    Jako publish_to_ha, ale publikuje jen klíče, jejichž stav nebo atributy
+    (kromě VOLATILE_ATTRIBUTES) se od minulé publikace změnily, případně je
+    publikace starší než REPUBLISH_INTERVAL. Každý zápis stavu ukládá
+    recorder HA jako řádek historie, takže se akce zapisují jen při
+    přepnutí, ne každých 5 minut. S `compare_attributes=False` rozhoduje
+    jen stav (atributy, které se mění s každým přepočtem).
+
+    Vrací skutečně publikovanou část payloadu.
+    """
+    import time
+
+    now = time.time()
+    changed = {}
+    digests = {}
+    for key, value in payload.items():
+        digests[key] = _attributes_digest(key, attributes, extra) if compare_attributes else ""
+        last = _published_states.get(f"sensor.{prefix}{key}")
+        if (last is None or last[0] != str(value) or last[1] != digests[key]
+                or now - last[2] > REPUBLISH_INTERVAL):
+            changed[key] = value
+    if changed:
+        publish_to_ha(changed, prefix, attributes, extra)
+        for key, value in changed.items():
+            _published_states[f"sensor.{prefix}{key}"] = (str(value), digests[key], now)
+    return changed
+
 # ---------------------------------------------------------------------------
 # Příklad použití:
 #
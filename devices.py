@@ -0,0 +1,581 @@
+"""
+devices.py
+----------
+Zařízení modelu MPC jako bloky proměnných a omezení.
+
+Každé zařízení přispívá do sdíleného modelu vlastním blokem – proměnnými
+(pojmenovanými podle `name`), omezeními dynamiky a mezí, členy účelové
+funkce a podílem na společných vazbách:
+
+• `bus(t)`       – odběr ze sběrnice v energetické bilanci [kW] (záporný = dodávka)
+• `grid_load(t)` – podíl na limitu hlavního jističe
+• `inverter_load(t)` – podíl na limitu měniče
+• `duals()`      – pojmenovaná omezení, jejichž duální ceny jsou výstupem
+                   (marginální hodnota energie v zásobníku po slotech)
+
+Sběrnici (nákup, prodej, nevyužitá FVE) a vazby mezi zařízeními sestavuje
+`run_mpc_optimizer`. Blok popisuje každou rodinu omezení najednou pro celý
+horizont – proměnné po slotech s koeficienty jako pole NumPy (`add_rows`);
+výrazy se skládají z dvojic (proměnná, koeficient) bez přetěžování
+operátorů PuLP, stejně jako v `presolve`.
+
+Výchozí baterie (`name="b"`) a nádrž (`name="h"`) mají stejné názvy
+proměnných i výstupů jako dřív. Další zařízení se zadávají v nastavení
+(`devices`, seznam objektů s `type` battery / tank / deferrable, viz
+`build_devices`), jejich výstupy mají prefix `name_`. Nádrž je dvouzónová
+(`TankPhysics`), více nádrží = více zařízení `TwoZoneTank`.
+"""
+
+import json
+import re
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from models.tank_losses import TankPhysics, compile_tank
+
+# Smysl omezení jako v PuLP (LpConstraintLE / EQ / GE)
+LE, EQ, GE = -1, 0, 1
+
+
+@dataclass
+class ModelContext:
+    """Sdílený model: problém PuLP, sloty a binární proměnné (MILP)."""
+
+    prob: Any
+    indexes: range
+    dt: Sequence[float]
+    milp: bool = False
+    binaries: List[Any] = field(default_factory=list)
+
+
+def shifted(variables: Mapping[int, Any]) -> Dict[int, Any]:
+    """Proměnné minulého slotu: t → variables[t - 1] (slot 0 nemá předchůdce)."""
+    return {t + 1: var for t, var in variables.items()}
+
+
+def add_rows(model: ModelContext, name: Optional[str],
+             terms: Sequence[Tuple[Mapping[int, Any], Any]], sense: int, rhs: Any = 0.0) -> None:
+    """
+    Přidá jedno omezení na slot pro celý horizont:
+    Σ koeficient[t] · proměnná[t]  (sense)  rhs[t].
+
+    `terms` jsou dvojice (proměnné po slotech, koeficient – skalár nebo pole
+    po slotech); chybějící proměnná (např. `shifted` ve slotu 0) se vynechá.
+    Omezení se jmenují `name_t`, bez jména je pojmenuje PuLP.
+    """
+    from pulp import LpAffineExpression, LpConstraint
+
+    n = len(model.indexes)
+    coefs = [np.broadcast_to(np.asarray(c, dtype=float), n) for _, c in terms]
+    rhs = np.broadcast_to(np.asarray(rhs, dtype=float), n)
+    for t in model.indexes:
+        expr = LpAffineExpression([
+            (variables[t], c[t]) for (variables, _), c in zip(terms, coefs) if t in variables and c[t] != 0
+        ])
+        model.prob.addConstraint(
+            LpConstraint(expr, sense=sense, rhs=float(rhs[t])), name=f"{name}_{t}" if name else None,
+        )
+
+
+def initial_rhs(n: int, value: float, rhs: Any = 0.0) -> np.ndarray:
+    """Pravá strana dynamiky: stav před slotem 0 se přesune na pravou stranu prvního řádku."""
+    out = np.array(np.broadcast_to(np.asarray(rhs, dtype=float), n))
+    out[0] += value
+    return out
+
+
+class Device(ABC):
+    """Zařízení modelu – blok proměnných a omezení (viz modul)."""
+
+    name: str
+
+    @abstractmethod
+    def build(self, model: ModelContext) -> None:
+        """Vytvoří proměnné a omezení bloku v `model.prob`."""
+
+    def bus(self, t: int):
+        return 0
+
+    def grid_load(self, t: int):
+        return 0
+
+    def inverter_load(self, t: int):
+        return 0
+
+    def objective(self, model: ModelContext):
+        return 0
+
+    def variables(self) -> Dict[str, Dict[int, Any]]:
+        """Výstupní klíč → proměnné po slotech (pro hromadné vytažení hodnot)."""
+        return {}
+
+    def duals(self) -> Dict[str, Dict[int, str]]:
+        """
+        Výstupní klíč → názvy omezení po slotech. Výstupem je záporná duální
+        cena omezení, tj. hodnota 1 kWh navíc v zásobníku na začátku slotu [Kč].
+        """
+        return {}
+
+    def key(self, suffix: str) -> str:
+        return f"{self.name}_{suffix}"
+
+
+@dataclass
+class Battery(Device):
+    """Baterie s účinností nabíjení/vybíjení, penalizací pod prahem a koncovým oceněním SOC."""
+
+    cap: float
+    soc_min: float
+    soc_max: float
+    power: float
+    eff_in: float
+    eff_out: float
+    soc_init: float
+    soc_limit: Optional[Sequence[float]] = None  # horní mez SOC po slotech (default soc_max)
+    discharge_penalty: float = 0.0
+    under_penalty: float = 0.0
+    threshold: float = 0.0
+    price_above: float = 0.0
+    price_below: float = 0.0
+    name: str = "b"
+
+    def build(self, model: ModelContext) -> None:
+        from pulp import LpVariable
+
+        indexes, dt = model.indexes, np.asarray(model.dt, dtype=float)
+        self.power_var = LpVariable.dicts(self.key("power"), indexes, -self.power, self.power)
+        # Meze SOC (včetně horní meze po slotech) jsou meze proměnných, ne řádky modelu
+        self.soc = {
+            t: LpVariable(f"{self.key('soc')}_{t}", self.soc_min,
+                          self.soc_limit[t] if self.soc_limit is not None else self.soc_max)
+            for t in indexes
+        }
+        self.charge = LpVariable.dicts(self.key("charge"), indexes, 0, self.power)
+        self.discharge = LpVariable.dicts(self.key("discharge"), indexes, 0, self.power)
+
+        # Penalizace za SOC pod prahem v každém kroku: soc_under ≥ threshold − soc
+        self.soc_under = LpVariable.dicts(self.key("soc_under"), indexes, 0)
+        add_rows(model, self.key("under"), [(self.soc_under, 1), (self.soc, 1)], GE, self.threshold)
+
+        # Koncové SOC rozdělené na pásma pod / nad prahem
+        self.short = LpVariable(self.key("short"), 0, self.threshold)
+        self.surplus = LpVariable(self.key("surplus"), 0, self.cap - self.threshold)
+        model.prob += self.short + self.surplus == self.soc[indexes[-1]]
+
+        add_rows(model, self.key("split"),
+                 [(self.power_var, 1), (self.charge, -1), (self.discharge, 1)], EQ)
+        # soc[t] = soc[t-1] + (charge · eff_in − discharge / eff_out) · dt
+        add_rows(model, self.key("dynamics"), [
+            (self.soc, 1), (shifted(self.soc), -1),
+            (self.charge, -self.eff_in * dt), (self.discharge, dt / self.eff_out),
+        ], EQ, initial_rhs(len(indexes), self.soc_init))
+
+    def bus(self, t: int):
+        return self.charge[t] / self.eff_in - self.discharge[t] * self.eff_out
+
+    def grid_load(self, t: int):
+        return self.charge[t]
+
+    def inverter_load(self, t: int):
+        return self.discharge[t]
+
+    def objective(self, model: ModelContext):
+        from pulp import lpSum
+
+        return (
+            lpSum((self.discharge_penalty * self.discharge[t] + self.under_penalty * self.soc_under[t]) * model.dt[t]
+                  for t in model.indexes)
+            - self.price_above * self.surplus
+            + self.price_below * (self.threshold - self.short)
+        )
+
+    def variables(self) -> Dict[str, Dict[int, Any]]:
+        return {
+            self.key("power"): self.power_var, self.key("charge"): self.charge,
+            self.key("discharge"): self.discharge, self.key("soc"): self.soc,
+            self.key("soc_under"): self.soc_under,
+        }
+
+    def duals(self) -> Dict[str, Dict[int, str]]:
+        return {self.key("value"): {t: self.key(f"dynamics_{t}") for t in self.soc}}
+
+
+@dataclass
+class TwoZoneTank(Device):
+    """
+    Dvouzónová akumulační nádrž s patronou v každé zóně. Fyzika (ztráty,
+    přenos mezi zónami) je afinní v SOC minulého slotu, viz `TankPhysics`.
+    """
+
+    tank: TankPhysics
+    lower_power: float
+    upper_power: float
+    out_lower: Sequence[float]
+    out_upper: Sequence[float]
+    soc_lower_init: float
+    soc_upper_init: float
+    parasitic: float = 0.0
+    heating_bonus: float = 0.0
+    upper_bonus: float = 0.0
+    final_price: float = 0.0
+    value_bonus: float = 0.0
+    value_indexes: Sequence[int] = ()
+    name: str = "h"
+
+    def build(self, model: ModelContext) -> None:
+        from pulp import LpBinary, LpVariable
+
+        indexes, tank = model.indexes, self.tank
+        n, dt = len(indexes), np.asarray(model.dt, dtype=float)
+        self.in_lower = LpVariable.dicts(self.key("in_lower"), indexes, 0, self.lower_power)
+        self.in_upper = LpVariable.dicts(self.key("in_upper"), indexes, 0, self.upper_power)
+        self.soc_lower = LpVariable.dicts(self.key("soc_lower"), indexes, 0, tank.lower_cap)
+        self.soc_upper = LpVariable.dicts(self.key("soc_upper"), indexes, 0, tank.upper_cap)
+        self.h_out_lower = LpVariable.dicts(self.key("out_lower"), indexes, 0)
+        self.h_out_upper = LpVariable.dicts(self.key("out_upper"), indexes, 0)
+        # Přenos tepla dolní → horní (záporný = opačný směr)
+        self.to_upper = LpVariable.dicts(self.key("to_upper"), indexes)
+
+        # MILP: patrony jsou relé – buď vypnuto, nebo plný výkon po celý slot
+        if model.milp:
+            on_lower = LpVariable.dicts(self.key("on_lower"), indexes, cat=LpBinary)
+            on_upper = LpVariable.dicts(self.key("on_upper"), indexes, cat=LpBinary)
+            model.binaries += list(on_lower.values()) + list(on_upper.values())
+            add_rows(model, self.key("relay_lower"), [(self.in_lower, 1), (on_lower, -self.lower_power)], EQ)
+            add_rows(model, self.key("relay_upper"), [(self.in_upper, 1), (on_upper, -self.upper_power)], EQ)
+
+        add_rows(model, self.key("demand_upper"), [(self.h_out_upper, 1)], EQ, self.out_upper)
+        add_rows(model, self.key("demand_lower"), [(self.h_out_lower, 1)], EQ, self.out_lower)
+
+        prev_lower, prev_upper = shifted(self.soc_lower), shifted(self.soc_upper)
+        # to_upper[t] = transfer(soc[t-1]); slot 0 z počátečního stavu
+        add_rows(model, self.key("transfer"), [
+            (self.to_upper, 1), (prev_lower, -tank.transfer_lower), (prev_upper, tank.transfer_upper),
+        ], EQ, initial_rhs(n, tank.transfer(self.soc_lower_init, self.soc_upper_init)))
+        # Přenos nemůže převýšit energii zdrojové zóny
+        add_rows(model, self.key("transfer_max"), [(self.to_upper, 1), (prev_lower, -1)], LE,
+                 initial_rhs(n, self.soc_lower_init))
+        add_rows(model, self.key("transfer_min"), [(self.to_upper, 1), (prev_upper, 1)], GE,
+                 initial_rhs(n, -self.soc_upper_init))
+
+        # Ztráty jsou složené do koeficientu zachování SOC
+        keep_lower, keep_upper = tank.retention(dt)
+        loss = -tank.loss_offset * dt
+        add_rows(model, self.key("dynamics_lower"), [
+            (self.soc_lower, 1), (prev_lower, -keep_lower),
+            (self.in_lower, -dt), (self.to_upper, dt), (self.h_out_lower, dt),
+        ], EQ, initial_rhs(n, keep_lower[0] * self.soc_lower_init, loss))
+        add_rows(model, self.key("dynamics_upper"), [
+            (self.soc_upper, 1), (prev_upper, -keep_upper),
+            (self.in_upper, -dt), (self.to_upper, -dt), (self.h_out_upper, dt),
+        ], EQ, initial_rhs(n, keep_upper[0] * self.soc_upper_init, loss))
+
+    def heat(self, t: int):
+        return self.in_lower[t] + self.in_upper[t]
+
+    def bus(self, t: int):
+        # Parazitní ztráty z obou patron
+        return self.heat(t) + self.parasitic * self.heat(t)
+
+    def grid_load(self, t: int):
+        return self.heat(t)
+
+    def inverter_load(self, t: int):
+        return self.heat(t)
+
+    def objective(self, model: ModelContext):
+        from pulp import lpSum
+
+        t_end = model.indexes[-1]
+        return (
+            lpSum(-(self.heating_bonus * self.heat(t) + self.upper_bonus * self.in_upper[t]) * model.dt[t]
+                  for t in model.indexes)
+            - self.final_price * (self.soc_lower[t_end] + self.soc_upper[t_end])
+            - self.upper_bonus * self.soc_upper[t_end]
+            - self.value_bonus * lpSum(self.soc_upper[t] for t in self.value_indexes)
+        )
+
+    def variables(self) -> Dict[str, Dict[int, Any]]:
+        return {
+            self.key("in_lower"): self.in_lower, self.key("in_upper"): self.in_upper,
+            self.key("out_lower"): self.h_out_lower, self.key("out_upper"): self.h_out_upper,
+            self.key("soc_lower"): self.soc_lower, self.key("soc_upper"): self.soc_upper,
+            self.key("to_upper"): self.to_upper,
+        }
+
+    def duals(self) -> Dict[str, Dict[int, str]]:
+        return {
+            self.key("value_lower"): {t: self.key(f"dynamics_lower_{t}") for t in self.soc_lower},
+            self.key("value_upper"): {t: self.key(f"dynamics_upper_{t}") for t in self.soc_upper},
+        }
+
+
+@dataclass
+class DeferrableLoad(Device):
+    """
+    Odložitelná spotřeba (EV, myčka, pračka): v povolených slotech odebere
+    `energy` kWh s výkonem do `power` kW (v limitu jističe i měniče jako
+    patrony nádrže). Nedodaná energie se penalizuje
+    `shortfall_penalty` Kč/kWh, takže příliš krátké okno model neudělá
+    nepřípustným.
+
+    `windows` rozdělí horizont na okna dostupnosti s vlastní požadovanou
+    energií – (sloty okna, kWh), viz `deferrable_windows`. Bez nich platí
+    jediný cíl `energy` pro celý horizont.
+    """
+
+    name: str
+    power: float
+    energy: float
+    available: Sequence[bool]
+    shortfall_penalty: float = 10.0
+    windows: Optional[Sequence[Tuple[Sequence[int], float]]] = None
+
+    def build(self, model: ModelContext) -> None:
+        from pulp import LpAffineExpression, LpVariable
+
+        indexes, dt = model.indexes, model.dt
+        self.load = {
+            t: LpVariable(f"{self.key('power')}_{t}", 0, self.power if self.available[t] else 0)
+            for t in indexes
+        }
+        windows = self.windows if self.windows is not None else [(list(indexes), self.energy)]
+        self.shortfall = {}
+        for w, (slots, target) in enumerate(windows):
+            self.shortfall[w] = LpVariable(f"{self.key('shortfall')}_{w}", 0, target)
+            energy = LpAffineExpression([(self.load[t], dt[t]) for t in slots] + [(self.shortfall[w], 1)])
+            model.prob += energy >= target, f"{self.key('energy')}_{w}"
+
+    def bus(self, t: int):
+        return self.load[t]
+
+    def grid_load(self, t: int):
+        return self.load[t]
+
+    def inverter_load(self, t: int):
+        # Spotřebič na výstupu měniče jako patrony nádrže
+        return self.load[t]
+
+    def objective(self, model: ModelContext):
+        from pulp import LpAffineExpression
+
+        return LpAffineExpression([(v, self.shortfall_penalty) for v in self.shortfall.values()])
+
+    def variables(self) -> Dict[str, Dict[int, Any]]:
+        return {self.key("power"): self.load}
+
+
+# --- Zařízení z nastavení ----------------------------------------------------
+
+# Povinné a volitelné parametry položek nastavení `devices` podle typu.
+# `entities`: parametr s entitou HA → počáteční stav `<název>_<stav>`
+# v initials (čte `data_connector.prepare_data`, viz `device_entities`).
+DEVICE_FIELDS = {
+    "battery": {
+        "required": ("cap", "power"),
+        "optional": ("eff_in", "eff_out", "soc_min_pct", "soc_max_pct", "soc"),
+        "entities": {"soc_entity": "soc"},
+    },
+    "tank": {
+        "required": ("lower_vol", "upper_vol", "lower_power", "upper_power"),
+        "optional": ("lower_min_t", "lower_max_t", "upper_min_t", "upper_max_t", "alpha",
+                     "tuv_share", "heating_share", "temp_lower", "temp_upper"),
+        "entities": {"temp_lower_entity": "temp_lower", "temp_upper_entity": "temp_upper"},
+    },
+    "deferrable": {
+        "required": ("power", "energy", "energy_entity"),
+        "optional": ("start_hour", "end_hour", "shortfall_penalty"),
+        "entities": {"energy_entity": "delivered"},
+    },
+}
+_NAME = re.compile(r"^[a-z][a-z0-9]*$")
+_ENTITY = re.compile(r"^[a-z_]+\.[a-z0-9_]+$")
+# Názvy výchozí baterie a nádrže
+_RESERVED = ("b", "h", "g")
+
+
+def parse_device_specs(raw: Any) -> List[Dict[str, Any]]:
+    """
+    Ověří nastavení `devices` (seznam nebo jeho JSON) a vrátí seznam položek.
+
+    Raises
+    ------
+    ValueError
+        Neplatný JSON, neznámý typ, chybějící nebo neznámý parametr, neplatný
+        či opakovaný název.
+    """
+    if raw in (None, ""):
+        return []
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except ValueError as e:
+            raise ValueError(f"devices: neplatný JSON ({e})")
+    if not isinstance(raw, list):
+        raise ValueError("devices: očekáván seznam zařízení")
+
+    specs, names = [], set()
+    for i, item in enumerate(raw):
+        if not isinstance(item, dict):
+            raise ValueError(f"devices[{i}]: očekáván objekt")
+        kind, name = item.get("type"), item.get("name")
+        fields = DEVICE_FIELDS.get(kind)
+        if fields is None:
+            raise ValueError(f"devices[{i}]: neznámý typ {kind!r} (známé: {', '.join(DEVICE_FIELDS)})")
+        if not isinstance(name, str) or not _NAME.match(name) or name in _RESERVED or name in names:
+            raise ValueError(f"devices[{i}]: neplatný nebo opakovaný název {name!r}")
+        names.add(name)
+        missing = [k for k in fields["required"] if k not in item]
+        entities = fields["entities"]
+        unknown = [k for k in item if k not in ("type", "name", *fields["required"], *fields["optional"], *entities)]
+        if missing or unknown:
+            raise ValueError(f"devices[{i}] ({name}): chybí {missing}, neznámé {unknown}")
+        try:
+            values = {k: float(v) for k, v in item.items() if k not in ("type", "name", *entities)}
+        except (TypeError, ValueError):
+            raise ValueError(f"devices[{i}] ({name}): parametry musí být čísla")
+        if not all(np.isfinite(v) for v in values.values()):
+            raise ValueError(f"devices[{i}] ({name}): parametry musí být konečná čísla")
+        for k in entities:
+            if k in item and not (isinstance(item[k], str) and _ENTITY.match(item[k])):
+                raise ValueError(f"devices[{i}] ({name}): {k} není entita HA ({item[k]!r})")
+        specs.append({"type": kind, "name": name, **values, **{k: item[k] for k in entities if k in item}})
+    return specs
+
+
+def device_entities(options: Mapping[str, Any]) -> Dict[str, str]:
+    """Počáteční stavy dalších zařízení z HA: klíč v initials → entita."""
+    from options import get_option
+
+    try:
+        specs = parse_device_specs(get_option(options, "devices"))
+    except ValueError:
+        return {}
+    return {
+        f"{spec['name']}_{state}": spec[field]
+        for spec in specs
+        for field, state in DEVICE_FIELDS[spec["type"]]["entities"].items()
+        if field in spec
+    }
+
+
+def _in_window(hour: int, start: float, end: float) -> bool:
+    """Hodina v okně [start, end); okno může přecházet přes půlnoc."""
+    return start <= hour < end if start <= end else hour >= start or hour < end
+
+
+def deferrable_windows(hours: Sequence[datetime], dt: Sequence[float], start: float, end: float,
+                       energy: float, delivered: float = 0.0) -> List[Tuple[List[int], float]]:
+    """
+    Denní okna dostupnosti [start, end) v horizontu a energie požadovaná v každém.
+
+    Každé okno má vlastní cíl `energy`. Okno otevřené v prvním slotu už
+    dostalo `delivered` kWh (čítač energie spotřebiče), chce se jen zbytek.
+    Okno uříznuté koncem horizontu chce poměrnou část podle hodin, které
+    z něj v horizontu zbývají – zbytek dořeší další přepočty.
+    """
+    length = (end - start) % 24 or 24.0
+    windows: List[List[int]] = []
+    previous = None
+    for t, h in enumerate(hours):
+        if not _in_window(h.hour, start, end):
+            previous = None
+            continue
+        position = (h.hour - start) % 24
+        if previous is None or position < previous:
+            windows.append([])
+        windows[-1].append(t)
+        previous = position
+
+    result = []
+    for slots in windows:
+        first = slots[0]
+        target = max(0.0, energy - delivered) if first == 0 else energy
+        # Hodiny do konce okna od začátku prvního slotu okna v horizontu
+        left = length - (hours[first].hour - start) % 24 - 1 + dt[first]
+        inside = sum(dt[t] for t in slots)
+        result.append((slots, target * min(1.0, inside / left) if left > 0 else target))
+    return result
+
+
+def build_devices(options: Mapping[str, Any], series: Mapping[str, Sequence[float]],
+                  initials: Mapping[str, float], hours: Sequence[datetime],
+                  dt: Sequence[float]) -> List[Device]:
+    """
+    Další zařízení z nastavení `devices` pro `run_mpc_optimizer(devices=...)`.
+
+    Ekonomika (penalizace, bonusy, koncové ceny) je stejná jako u výchozí
+    baterie a nádrže. Počáteční stav se bere z `initials` (`<název>_soc` [%],
+    `<název>_temp_lower` / `<název>_temp_upper` [°C] z entit `*_entity`,
+    viz `device_entities`), jinak z položky (`soc`, `temp_lower`,
+    `temp_upper`). Nádrž odebírá podíl `tuv_share` z `tuv_demand`
+    a `heating_share` z `heating_demand` (při heating_enabled). Odložitelná
+    spotřeba chce `energy` v každém denním okně, v otevřeném okně bez
+    energie už dodané podle čítače (`<název>_delivered` [kWh]).
+    """
+    from options import get_option
+    from powerplan_optimizer import clamp, temp_to_energy
+
+    specs = parse_device_specs(get_option(options, "devices"))
+    if not specs:
+        return []
+
+    context = {"buy_price": series["buy_price"]}
+    devices: List[Device] = []
+    for spec in specs:
+        name = spec["name"]
+        if spec["type"] == "battery":
+            cap = spec["cap"]
+            soc_min = spec.get("soc_min_pct", 0.15) * cap
+            soc_max = spec.get("soc_max_pct", 1.0) * cap
+            soc = initials.get(f"{name}_soc", spec.get("soc", 50.0))
+            devices.append(Battery(
+                cap=cap, soc_min=soc_min, soc_max=soc_max, power=spec["power"],
+                eff_in=spec.get("eff_in", get_option(options, "b_eff_in")),
+                eff_out=spec.get("eff_out", get_option(options, "b_eff_out")),
+                soc_init=clamp(soc / 100 * cap, soc_min, soc_max),
+                discharge_penalty=get_option(options, "battery_penalty"),
+                under_penalty=get_option(options, "bat_under_penalty"),
+                threshold=get_option(options, "bat_threshold_pct") * cap,
+                price_above=get_option(options, "bat_price_above", context=context),
+                price_below=get_option(options, "bat_price_below", context=context),
+                name=name,
+            ))
+        elif spec["type"] == "tank":
+            lower_min_t = spec.get("lower_min_t", get_option(options, "h_lower_min_t"))
+            lower_max_t = spec.get("lower_max_t", get_option(options, "h_lower_max_t"))
+            upper_min_t = spec.get("upper_min_t", get_option(options, "h_upper_min_t"))
+            upper_max_t = spec.get("upper_max_t", get_option(options, "h_upper_max_t"))
+            lower_cap = temp_to_energy(lower_max_t, spec["lower_vol"], lower_min_t)
+            upper_cap = temp_to_energy(upper_max_t, spec["upper_vol"], upper_min_t)
+            temp_lower = initials.get(f"{name}_temp_lower", spec.get("temp_lower", lower_min_t))
+            temp_upper = initials.get(f"{name}_temp_upper", spec.get("temp_upper", upper_min_t))
+            heating_share = spec.get("heating_share", 0.0) if get_option(options, "heating_enabled") else 0.0
+            devices.append(TwoZoneTank(
+                tank=compile_tank(lower_cap, upper_cap, spec["lower_vol"], spec["upper_vol"],
+                                  spec.get("alpha", get_option(options, "alpha"))),
+                lower_power=spec["lower_power"], upper_power=spec["upper_power"],
+                out_lower=list(heating_share * np.asarray(series["heating_demand"], dtype=float)),
+                out_upper=list(spec.get("tuv_share", 0.0) * np.asarray(series["tuv_demand"], dtype=float)),
+                soc_lower_init=clamp(temp_to_energy(temp_lower, spec["lower_vol"], lower_min_t), 0, lower_cap),
+                soc_upper_init=clamp(temp_to_energy(temp_upper, spec["upper_vol"], upper_min_t), 0, upper_cap),
+                parasitic=get_option(options, "parasitic_water_heating"),
+                heating_bonus=get_option(options, "water_priority_bonus"),
+                upper_bonus=get_option(options, "upper_zone_priority"),
+                final_price=get_option(options, "final_boiler_price", context=context),
+                name=name,
+            ))
+        else:
+            start, end = spec.get("start_hour", 0.0), spec.get("end_hour", 24.0)
+            devices.append(DeferrableLoad(
+                name, power=spec["power"], energy=spec["energy"],
+                available=[_in_window(h.hour, start, end) for h in hours],
+                shortfall_penalty=spec.get("shortfall_penalty", 10.0),
+                windows=deferrable_windows(hours, dt, start, end, spec["energy"],
+                                           initials.get(f"{name}_delivered", 0.0)),
+            ))
+    return devices
@@ -0,0 +1,258 @@
+"""
+dp_engine.py
+------------
+Dynamické programování jako alternativní engine bez PuLP/CBC.
+
+Model `run_mpc_optimizer` má jen tři zásobníky (SOC baterie, dolní a horní
+zóna nádrže) a omezení po slotech, takže ho lze řešit zpětnou rekurzí
+přes diskretizované mřížky stavů:
+
+• baterie  – přechody mezi body mřížky SOC (krok `battery_step` kWh),
+             nabíjení/vybíjení z rozdílu SOC a účinností, limit výkonu
+• nádrž    – stav (dolní, horní) na mřížce s krokem `tank_step` kWh,
+             hodnotová funkce se mezi body interpoluje bilineárně; patrony
+             mají úrovně `heater_levels` (podíl výkonu), při plné zóně se
+             ohřev omezí na doplnění do kapacity
+• síť      – nákup / prodej / nevyužitá FVE dopočítané z bilance sběrnice
+
+Zpětný průchod počítá hodnotovou funkci nad celou mřížkou (NumPy přes
+stavy × akce), dopředný průchod pak vybírá akce z přesného stavu nádrže
+i baterie s výhledem hodnotové funkce. Výsledek má stejné hodnoty
+proměnných jako LP, takže výstupy i KPI skládá tentýž kód optimalizátoru.
+
+Přesnost vs. rychlost řídí kroky mřížek. Engine je určen pro hostitele
+bez binárky CBC nebo s pomalým CBC (ARM); výchozí engine zůstává LP.
+"""
+
+from typing import Dict, Tuple
+
+import numpy as np
+
+from fast_path import PlanValues, terminal_bands
+from models.tank_losses import TankPhysics
+
+BATTERY_STEP = 0.5          # kWh
+TANK_STEP = 3.0             # kWh
+HEATER_LEVELS = (0.0, 0.5, 1.0)
+BIG = 1e9                   # cena nepřípustného stavu (inf by v interpolaci dal NaN)
+EPS = 1e-9
+
+
+def _grid(low: float, high: float, step: float) -> np.ndarray:
+    return np.linspace(low, high, max(2, int(round((high - low) / step)) + 1))
+
+
+def _battery_grid(low: float, high: float, step: float, anchor: float) -> np.ndarray:
+    """Mřížka SOC s krokem `step` procházející počátečním SOC (plus meze)."""
+    points = anchor + step * np.arange(-np.floor((anchor - low) / step), np.floor((high - anchor) / step) + 1)
+    grid = np.unique(np.round(np.concatenate(([low], points, [high])), 9))
+    # Body těsně u mezí by jen zvětšovaly počet změn SOC
+    keep = (np.diff(grid, prepend=-np.inf) > step * 0.25) | np.isclose(grid, high) | np.isclose(grid, anchor)
+    return grid[keep]
+
+
+def _interpolate(values: np.ndarray, lower_grid: np.ndarray, upper_grid: np.ndarray,
+                 lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+    """Bilineární interpolace V[s, L, U] v bodech (lower, upper); výsledek [..., s]."""
+    def axis(grid, x):
+        step = grid[1] - grid[0]
+        i = np.clip(((x - grid[0]) / step).astype(int), 0, len(grid) - 2)
+        w = np.clip((x - grid[i]) / step, 0.0, 1.0)
+        return i, w
+
+    il, wl = axis(lower_grid, lower)
+    iu, wu = axis(upper_grid, upper)
+    wl, wu = wl[..., None], wu[..., None]
+    v = np.moveaxis(values, 0, -1)  # [L, U, s]
+    return ((1 - wl) * (1 - wu) * v[il, iu] + wl * (1 - wu) * v[il + 1, iu]
+            + (1 - wl) * wu * v[il, iu + 1] + wl * wu * v[il + 1, iu + 1])
+
+
+class _Model:
+    """Parametry a přechody jednoho běhu (sdílené zpětným i dopředným průchodem)."""
+
+    def __init__(self, p: Dict):
+        self.p = p
+        self.tank: TankPhysics = p["tank"]
+        n = len(p["dt"])
+        self.n = n
+        self.dt = np.asarray(p["dt"], dtype=float)
+        self.buy = np.asarray(p["buy_price"], dtype=float)
+        self.sell = np.asarray(p["sell_price"], dtype=float)
+        self.net = np.asarray(p["load_pred"], dtype=float) - np.asarray(p["fve_pred"], dtype=float)
+        self.tuv = np.asarray(p["tuv_demand"], dtype=float)
+        heat = np.asarray(p["heating_demand"], dtype=float)
+        self.h_out_lower = heat if p["heating_enabled"] else np.zeros(n)
+        demand = (heat > 0) | (self.tuv > 0)
+        self.soc_limit = np.where(demand, p["b_cap"] * 0.9, p["b_cap"])
+        self.tank_slot = np.zeros(n, dtype=bool)
+        self.tank_slot[list(p["tank_value_indexes"])] = True
+
+        levels = np.asarray(p["heater_levels"], dtype=float)
+        self.h_lower = np.repeat(levels, len(levels)) * p["h_lower_power"]
+        self.h_upper = np.tile(levels, len(levels)) * p["h_upper_power"]
+
+    def terminal_battery(self, soc: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Koncové ocenění SOC (short/surplus naplněné jako v LP)."""
+        p = self.p
+        short, surplus = terminal_bands(soc, p["b_cap"], p["bat_threshold"], p["bat_price_above"], p["bat_price_below"])
+        return -p["bat_price_above"] * surplus + p["bat_price_below"] * (p["bat_threshold"] - short), short, surplus
+
+    def stage(self, t: int, soc: np.ndarray, lower: np.ndarray, upper: np.ndarray,
+              targets: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Složky nákladu slotu t pro stavy baterie `soc` (ns), nádrže (lower,
+        upper) (nT) a akce (úroveň patron nh × cílové SOC nb).
+
+        Bilance sběrnice závisí na baterii jen přes změnu SOC, proto se nákup
+        a prodej počítají nad různými změnami (nk, typicky 2·nb − 1) a do
+        tvaru (nT, nh, ns, nb) se rozloží až v `total`. Nepřípustné
+        kombinace mají náklad ≥ BIG.
+        """
+        p, tank, dt = self.p, self.tank, self.dt[t]
+
+        # Nádrž (nT, nh)
+        L, U = lower[:, None], upper[:, None]
+        flow = np.clip(tank.transfer(L, U), -U, L)
+        loss_lower, loss_upper = tank.losses(L, U)
+        rest_lower = L + (-flow - self.h_out_lower[t] - loss_lower) * dt
+        rest_upper = U + (flow - self.tuv[t] - loss_upper) * dt
+        # Patrona při plné zóně jen doplní do kapacity
+        h_lower = np.clip(np.minimum(self.h_lower, (tank.lower_cap - rest_lower) / dt), 0.0, None)
+        h_upper = np.clip(np.minimum(self.h_upper, (tank.upper_cap - rest_upper) / dt), 0.0, None)
+        next_lower = np.minimum(rest_lower + h_lower * dt, tank.lower_cap)
+        next_upper = np.minimum(rest_upper + h_upper * dt, tank.upper_cap)
+        heat = h_lower + h_upper
+
+        action_cost = -p["upper_zone_priority"] * h_upper * dt
+        if self.tank_slot[t]:
+            action_cost = action_cost - p["tank_value_bonus"] * next_upper
+        action_cost = action_cost + BIG * ((next_lower < -EPS) | (next_upper < -EPS))
+        action_cost = np.broadcast_to(action_cost[:, :, None], heat.shape + targets.shape)
+        if p["charge_bat_min"]:
+            action_cost = action_cost + BIG * ((heat > EPS)[:, :, None] & (targets < p["b_cap"] * 0.6 - EPS))
+
+        # Baterie (ns, nb) a různé změny SOC (nk)
+        delta, inverse = np.unique(np.round(targets[None, :] - soc[:, None], 9), return_inverse=True)
+        inverse = inverse.reshape(len(soc), len(targets))
+        charge = np.maximum(delta, 0.0) / (p["b_eff_in"] * dt)
+        discharge = np.maximum(-delta, 0.0) * p["b_eff_out"] / dt
+        battery_cost = (p["battery_penalty"] * discharge[inverse]
+                        + p["bat_under_penalty"] * np.maximum(0.0, p["bat_threshold"] - targets)) * dt
+        battery_cost = battery_cost + BIG * ((charge > p["b_power_max"] + EPS) | (discharge > p["b_power_max"] + EPS))[inverse]
+        battery_cost = battery_cost + BIG * (targets > self.soc_limit[t] + EPS)
+
+        # Sběrnice (nT, nh, nk)
+        H = heat[:, :, None]
+        C, D = charge[None, None], discharge[None, None]
+        residual = self.net[t] + C / p["b_eff_in"] - D * p["b_eff_out"] + (1 + p["parasitic_water_heating"]) * H
+        g_buy = np.maximum(residual, 0.0)
+        surplus = np.maximum(-residual, 0.0)
+        if self.sell[t] + p["fve_unused_penalty"] >= 0:
+            g_sell = np.minimum(surplus, np.maximum(p["inverter_limit"] - D - H, 0.0))
+        else:
+            g_sell = np.zeros_like(surplus)
+        unused = surplus - g_sell
+        bus_cost = (self.buy[t] * g_buy - self.sell[t] * g_sell + p["fve_unused_penalty"] * unused
+                    - p["water_priority_bonus"] * H) * dt
+        bus_cost = bus_cost + BIG * ((g_buy + C + H > p["grid_limit"] + EPS) | (D + H > p["inverter_limit"] + EPS))
+
+        return {
+            "bus_cost": bus_cost, "battery_cost": battery_cost, "action_cost": action_cost, "inverse": inverse,
+            "next_lower": next_lower, "next_upper": next_upper, "flow": flow, "h_lower": h_lower, "h_upper": h_upper,
+            "charge": charge, "discharge": discharge, "g_buy": g_buy, "g_sell": g_sell, "unused": unused,
+        }
+
+    @staticmethod
+    def total(st: Dict[str, np.ndarray], ahead: np.ndarray) -> np.ndarray:
+        """Náklad slotu + hodnota následujícího stavu (`ahead` tvaru (nT, nh, nb)) jako (nT, nh, ns, nb)."""
+        q = st["bus_cost"][:, :, st["inverse"]]
+        q += st["battery_cost"]
+        q += (st["action_cost"] + ahead)[:, :, None, :]
+        return q
+
+
+def solve_dp(**params) -> PlanValues:
+    """
+    Vyřeší plán dynamickým programováním. Parametry jsou vyhodnocené hodnoty
+    z `run_mpc_optimizer` (viz `fast_path.idle_plan`) plus `inverter_limit`,
+    `b_power_max`, `h_lower_power`, `h_upper_power`, `charge_bat_min`,
+    `fve_unused_penalty` a volitelně `battery_step`, `tank_step`, `heater_levels`.
+
+    Vyhazuje RuntimeError, pokud na mřížce neexistuje přípustný plán.
+    """
+    params.setdefault("battery_step", BATTERY_STEP)
+    params.setdefault("tank_step", TANK_STEP)
+    params.setdefault("heater_levels", HEATER_LEVELS)
+    model = _Model(params)
+    p, tank, n = params, model.tank, model.n
+
+    battery_grid = _battery_grid(p["b_min"], p["b_max"], p["battery_step"], p["soc_bat_init"])
+    lower_grid = _grid(0.0, tank.lower_cap, p["tank_step"])
+    upper_grid = _grid(0.0, tank.upper_cap, p["tank_step"])
+    mesh_lower, mesh_upper = (a.ravel() for a in np.meshgrid(lower_grid, upper_grid, indexing="ij"))
+    shape = (len(battery_grid), len(lower_grid), len(upper_grid))
+
+    # Koncová hodnota V_N[s, L, U]
+    terminal, _, _ = model.terminal_battery(battery_grid)
+    value = (terminal[:, None, None]
+             - p["final_boiler_price"] * (lower_grid[None, :, None] + upper_grid[None, None, :])
+             - p["upper_zone_priority"] * upper_grid[None, None, :])
+    values = [None] * n + [value]
+
+    # Zpětný průchod
+    for t in range(n - 1, 0, -1):
+        st = model.stage(t, battery_grid, mesh_lower, mesh_upper, battery_grid)
+        ahead = _interpolate(values[t + 1], lower_grid, upper_grid, st["next_lower"], st["next_upper"])
+        best = model.total(st, ahead).min(axis=(1, 3))          # (nT, ns)
+        values[t] = np.minimum(best.T.reshape(shape), BIG)
+
+    # Dopředný průchod z přesného stavu
+    soc = float(p["soc_bat_init"])
+    lower, upper = float(p["soc_lower_init"]), float(p["soc_upper_init"])
+    keys = ("b_charge", "b_discharge", "b_soc", "g_buy", "g_sell", "fve_unused",
+            "h_in_lower", "h_in_upper", "h_soc_lower", "h_soc_upper", "h_to_upper")
+    out = {k: np.zeros(n) for k in keys}
+    for t in range(n):
+        st = model.stage(t, np.array([soc]), np.array([lower]), np.array([upper]), battery_grid)
+        ahead = _interpolate(values[t + 1], lower_grid, upper_grid, st["next_lower"], st["next_upper"])
+        q = model.total(st, ahead)[0, :, 0, :]                  # (nh, nb)
+        h, j = np.unravel_index(np.argmin(q), q.shape)
+        if q[h, j] - ahead[0, h, j] >= BIG:
+            raise RuntimeError(f"DP nenašel přípustný plán (slot {t})")
+        k = st["inverse"][0, j]
+        out["b_charge"][t] = st["charge"][k]
+        out["b_discharge"][t] = st["discharge"][k]
+        out["g_buy"][t] = st["g_buy"][0, h, k]
+        out["g_sell"][t] = st["g_sell"][0, h, k]
+        out["fve_unused"][t] = st["unused"][0, h, k]
+        out["h_in_lower"][t] = st["h_lower"][0, h]
+        out["h_in_upper"][t] = st["h_upper"][0, h]
+        out["h_to_upper"][t] = st["flow"][0, 0]
+        soc = float(battery_grid[j])
+        lower, upper = float(st["next_lower"][0, h]), float(st["next_upper"][0, h])
+        out["b_soc"][t], out["h_soc_lower"][t], out["h_soc_upper"][t] = soc, lower, upper
+
+    b_soc_under = np.maximum(0.0, p["bat_threshold"] - out["b_soc"])
+    plan = {
+        **out,
+        "b_power": out["b_charge"] - out["b_discharge"],
+        "h_out_lower": model.h_out_lower,
+        "h_out_upper": model.tuv,
+        "b_soc_under": b_soc_under,
+    }
+
+    terminal, short, surplus = model.terminal_battery(out["b_soc"][-1:])
+    tank_upper = out["h_soc_upper"][model.tank_slot].sum()
+    objective = (
+        float(((model.buy * out["g_buy"] - model.sell * out["g_sell"]
+                + p["battery_penalty"] * out["b_discharge"] + p["fve_unused_penalty"] * out["fve_unused"]
+                - p["water_priority_bonus"] * (out["h_in_lower"] + out["h_in_upper"])
+                - p["upper_zone_priority"] * out["h_in_upper"]
+                + p["bat_under_penalty"] * b_soc_under) * model.dt).sum())
+        + float(terminal[0])
+        - p["final_boiler_price"] * (out["h_soc_lower"][-1] + out["h_soc_upper"][-1])
+        - p["upper_zone_priority"] * out["h_soc_upper"][-1]
+        - p["tank_value_bonus"] * tank_upper
+    )
+    return PlanValues(plan, float(short[0]), float(surplus[0]), objective)
@@ -0,0 +1,110 @@
+"""
+engine_benchmark.py
+-------------------
+Porovnání LP (CBC) a DP enginu nad uloženými plány.
+
+Každý `result_*.json` obsahuje vstupy, počáteční stavy, časy, délky slotů
+i nastavení běhu, takže se dá znovu vyřešit oběma enginy. Výpis ukazuje
+dobu řešení a rozdíl účelové funkce DP oproti LP – podle něj se volí
+kroky mřížek DP (`dp_battery_step`, `dp_tank_step`, `dp_heater_steps`).
+
+    python engine_benchmark.py                      # všechny plány v results/
+    python engine_benchmark.py results/result_*.json --limit 20 --tank-step 1.5
+"""
+
+import argparse
+import glob
+import json
+import os
+import statistics
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from powerplan_environment import RESULTS_DIR
+
+
+def load_case(path: str) -> Optional[Dict[str, Any]]:
+    """Načte uložený plán; None, pokud neobsahuje kompletní vstupy."""
+    with open(path, "r") as f:
+        data = json.load(f)
+    if not all(k in data for k in ("inputs", "initials", "times", "dt")):
+        return None
+    return data
+
+
+def solve(case: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, float]:
+    from powerplan_optimizer import run_mpc_optimizer
+
+    hours = [datetime.fromisoformat(t) for t in case["times"]]
+    start = time.perf_counter()
+    solution = run_mpc_optimizer(case["inputs"], case["initials"], hours, options, case["dt"])
+    return {
+        "time": time.perf_counter() - start,
+        "objective": solution["results"]["objective_value"],
+    }
+
+
+def benchmark(paths: List[str], dp_options: Dict[str, Any]) -> List[Dict[str, Any]]:
+    rows = []
+    for path in paths:
+        case = load_case(path)
+        if case is None:
+            print(f"{os.path.basename(path)}: chybí vstupy, přeskočeno")
+            continue
+        # Rychlá cesta by u klidových plánů obešla oba enginy
+        options = {**(case.get("options") or {}), "fast_path_enabled": False, "fast_path_verify": False}
+        lp = solve(case, {**options, "engine": "lp"})
+        dp = solve(case, {**options, **dp_options, "engine": "dp"})
+        gap = dp["objective"] - lp["objective"]
+        row = {
+            "file": os.path.basename(path),
+            "slots": len(case["times"]),
+            "lp_time": lp["time"],
+            "dp_time": dp["time"],
+            "gap": gap,
+            "gap_pct": 100 * gap / max(1.0, abs(lp["objective"])),
+        }
+        rows.append(row)
+        print(f"{row['file']:<40} {row['slots']:>4} "
+              f"LP {row['lp_time'] * 1000:8.1f} ms  DP {row['dp_time'] * 1000:8.1f} ms  "
+              f"rozdíl {row['gap']:8.3f} Kč ({row['gap_pct']:5.2f} %)")
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Porovnání LP a DP enginu nad uloženými plány")
+    parser.add_argument("paths", nargs="*", help="Soubory result_*.json (výchozí: všechny v results/)")
+    parser.add_argument("--limit", type=int, default=None, help="Jen posledních N plánů")
+    parser.add_argument("--battery-step", type=float, default=None, help="dp_battery_step [kWh]")
+    parser.add_argument("--tank-step", type=float, default=None, help="dp_tank_step [kWh]")
+    parser.add_argument("--heater-steps", type=int, default=None, help="dp_heater_steps")
+    args = parser.parse_args(argv)
+
+    paths = args.paths or sorted(glob.glob(os.path.join(RESULTS_DIR, "result_*.json")))
+    if args.limit:
+        paths = paths[-args.limit:]
+    dp_options = {
+        key: value
+        for key, value in (
+            ("dp_battery_step", args.battery_step),
+            ("dp_tank_step", args.tank_step),
+            ("dp_heater_steps", args.heater_steps),
+        )
+        if value is not None
+    }
+
+    rows = benchmark(paths, dp_options)
+    if not rows:
+        print("Žádné plány k porovnání")
+        return
+    print(
+        f"\n{len(rows)} plánů: medián LP {statistics.median(r['lp_time'] for r in rows) * 1000:.1f} ms, "
+        f"DP {statistics.median(r['dp_time'] for r in rows) * 1000:.1f} ms, "
+        f"rozdíl účelové funkce průměr {statistics.mean(r['gap_pct'] for r in rows):.2f} %, "
+        f"max {max(r['gap_pct'] for r in rows):.2f} %"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+fast_path.py
+------------
+Analytická rychlá cesta pro triviální horizonty.
+
+Část běhů (noční tarif, žádná FVE, teplá nádrž, vybitá baterie) skončí
+plánem, kde baterie stojí a patrony jsou vypnuté – přesto se sestavoval
+celý model PuLP a spouštěl CBC. `idle_plan` takové případy pozná přímo
+ze vstupů a klidový plán dopočítá v uzavřeném tvaru (baterie drží SOC,
+síť kryje čistou spotřebu, nádrž se vyvíjí podle `TankPhysics`).
+
+Klidový plán se použije jen s certifikátem optimality: pro každý slot se
+porovná horní odhad hodnoty každého elementárního kroku (nabít, vybít,
+ohřát) s dolním odhadem jeho nákladů. Hodnota kWh v baterii zahrnuje
+koncové ocenění SOC, penalizaci pod prahem i pozdější využití (vybití
+místo nákupu, ohřev), takže pokryje i arbitráž mezi sloty. Pokud žádný
+krok není výhodný, je klidový bod optimem LP (a protože je celočíselný,
+i MILP). Jinak `idle_plan` vrátí None a řeší se LP.
+
+Režim ověření (`fast_path_verify`) vyřeší i LP a zapíše rozdíl obou řešení.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from models.tank_losses import TankPhysics
+
+EPS = 1e-9
+
+
+@dataclass
+class PlanValues:
+    """Hodnoty proměnných plánu (stejné klíče jako z LP) a koncové SOC/účelová funkce."""
+
+    values: Dict[str, np.ndarray]
+    b_short: float
+    b_surplus: float
+    objective_value: float
+
+
+@dataclass
+class IdleCheck:
+    """Výsledek klasifikace – plán, nebo důvod, proč rychlá cesta nejde použít."""
+
+    plan: Optional[PlanValues] = None
+    reason: str = ""
+    margins: Dict[str, float] = field(default_factory=dict)
+
+
+def _suffix_max(values: np.ndarray, default: float) -> np.ndarray:
+    """out[t] = max(values[t+1:]) (default pro poslední slot)."""
+    out = np.full(len(values), default, dtype=float)
+    if len(values) > 1:
+        out[:-1] = np.maximum.accumulate(values[::-1])[::-1][1:]
+    return out
+
+
+def _suffix_min(values: np.ndarray, default: float) -> np.ndarray:
+    return -_suffix_max(-values, -default)
+
+
+def terminal_bands(soc, b_cap: float, bat_threshold: float, bat_price_above: float, bat_price_below: float):
+    """Rozdělení koncového SOC na pásma (short do prahu, surplus nad prahem) tak, jak ho naplní LP."""
+    if bat_price_above > bat_price_below:
+        surplus = np.minimum(soc, b_cap - bat_threshold)
+        return soc - surplus, surplus
+    short = np.minimum(soc, bat_threshold)
+    return short, soc - short
+
+
+def idle_plan(
+    *,
+    tuv_demand: Sequence[float],
+    heating_demand: Sequence[float],
+    fve_pred: Sequence[float],
+    buy_price: Sequence[float],
+    sell_price: Sequence[float],
+    load_pred: Sequence[float],
+    dt: Sequence[float],
+    heating_enabled: bool,
+    tank: TankPhysics,
+    soc_bat_init: float,
+    soc_lower_init: float,
+    soc_upper_init: float,
+    b_cap: float,
+    b_min: float,
+    b_max: float,
+    b_eff_in: float,
+    b_eff_out: float,
+    grid_limit: float,
+    battery_penalty: float,
+    bat_under_penalty: float,
+    bat_threshold: float,
+    bat_price_above: float,
+    bat_price_below: float,
+    final_boiler_price: float,
+    water_priority_bonus: float,
+    upper_zone_priority: float,
+    tank_value_bonus: float,
+    tank_value_indexes: Sequence[int],
+    parasitic_water_heating: float,
+) -> IdleCheck:
+    """
+    Rozhodne, zda je klidový plán optimální, a případně ho spočítá.
+
+    Parametry jsou už vyhodnocené hodnoty z `run_mpc_optimizer`.
+    """
+    dt = np.asarray(dt, dtype=float)
+    n = len(dt)
+    buy = np.asarray(buy_price, dtype=float)
+    sell = np.asarray(sell_price, dtype=float)
+    net = np.asarray(load_pred, dtype=float) - np.asarray(fve_pred, dtype=float)
+    tuv = np.asarray(tuv_demand, dtype=float)
+    heat = np.asarray(heating_demand, dtype=float)
+    h_out_lower = heat if heating_enabled else np.zeros(n)
+
+    # -- přípustnost klidového plánu -----------------------------------------
+    if n == 0:
+        return IdleCheck(reason="prázdný horizont")
+    if (net < 0).any():
+        return IdleCheck(reason="přebytek FVE")
+    if (net > grid_limit).any():
+        return IdleCheck(reason="čistá spotřeba nad limitem jističe")
+    demand = (heat > 0) | (tuv > 0)
+    soc_limit = np.where(demand, b_cap * 0.9, b_cap)
+    if (soc_bat_init > soc_limit + EPS).any() or not b_min - EPS <= soc_bat_init <= b_max + EPS:
+        return IdleCheck(reason="SOC baterie mimo meze klidového plánu")
+
+    sim = tank.simulate(soc_lower_init, soc_upper_init, np.zeros(n), np.zeros(n), h_out_lower, tuv, dt, clip=False)
+    lower, upper, flow = sim["h_soc_lower"], sim["h_soc_upper"], sim["h_to_upper"]
+    prev_lower = np.concatenate(([soc_lower_init], lower[:-1]))
+    prev_upper = np.concatenate(([soc_upper_init], upper[:-1]))
+    if ((lower < -EPS).any() or (upper < -EPS).any()
+            or (lower > tank.lower_cap + EPS).any() or (upper > tank.upper_cap + EPS).any()
+            or (flow > prev_lower + EPS).any() or (flow < -prev_upper - EPS).any()):
+        return IdleCheck(reason="nádrž bez ohřevu nevystačí")
+
+    # -- certifikát optimality --------------------------------------------------
+    can_discharge = soc_bat_init > b_min + EPS
+    terminal_low = min(bat_price_above, bat_price_below)
+    terminal_high = max(bat_price_above, bat_price_below)
+
+    # Horní odhad hodnoty kWh tepla (na kWh z patrony): bonus za ohřev,
+    # koncové ocenění (ztráty ho jen snižují) a bonus hodnoty tepla ve
+    # zbývajících hodinách tank_value_hour
+    tank_slots = np.zeros(n)
+    for i in tank_value_indexes:
+        tank_slots[: i + 1] += 1
+    heat_value = (
+        water_priority_bonus + upper_zone_priority
+        + max(0.0, final_boiler_price + upper_zone_priority)
+        + max(0.0, tank_value_bonus) * tank_slots
+    ) / (1 + parasitic_water_heating)  # na kWh odebranou ze sběrnice
+
+    # Přínos kWh dodané na sběrnici (ušetřený nákup, export, ohřev)
+    bus_value = np.maximum(np.maximum(buy, sell), heat_value)
+
+    # Dolní odhad hodnoty kWh v baterii: koncové ocenění nebo pozdější dobití ze sítě
+    soc_value_low = np.minimum(terminal_low, _suffix_min(buy / b_eff_in, np.inf))
+    # Horní odhad: koncové ocenění nebo pozdější vybití, plus penalizace pod prahem
+    later_use = _suffix_max(b_eff_out * b_eff_out * (bus_value - battery_penalty / b_eff_out), -np.inf)
+    under = np.where(soc_bat_init < bat_threshold - EPS, dt, 0.0)
+    under_left = np.cumsum(under[::-1])[::-1]
+    soc_value_high = np.maximum(terminal_high, later_use) + bat_under_penalty * under_left
+
+    # Cena kWh na sběrnici – nákup, případně vybití baterie
+    supply_cost = buy
+    if can_discharge:
+        supply_cost = np.minimum(buy, battery_penalty / b_eff_out + soc_value_low / b_eff_out ** 2)
+
+    margins = {
+        # Nabití 1 kWh SOC stojí buy/eff_in
+        "charge": float(np.min(buy / b_eff_in - soc_value_high)),
+        # Ohřev 1 kWh ze sběrnice
+        "heat": float(np.min(supply_cost - heat_value)),
+    }
+    if can_discharge:
+        # Vybití 1 kWh (strana baterie): na sběrnici eff_out, SOC klesne o 1/eff_out
+        margins["discharge"] = float(np.min(
+            battery_penalty + soc_value_low / b_eff_out - b_eff_out * np.maximum(np.maximum(buy, sell), heat_value)
+        ))
+    for move, margin in margins.items():
+        if margin < -EPS:
+            return IdleCheck(reason=f"výhodný krok: {move}", margins=margins)
+
+    # -- klidový plán --------------------------------------------------------
+    zeros = np.zeros(n)
+    b_soc = np.full(n, soc_bat_init)
+    b_soc_under = np.maximum(0.0, bat_threshold - b_soc)
+    values = {
+        "b_power": zeros, "b_charge": zeros, "b_discharge": zeros, "b_soc": b_soc,
+        "g_buy": net, "g_sell": zeros, "fve_unused": zeros,
+        "h_in_lower": zeros, "h_in_upper": zeros, "h_out_lower": h_out_lower, "h_out_upper": tuv,
+        "h_soc_lower": lower, "h_soc_upper": upper, "h_to_upper": flow, "b_soc_under": b_soc_under,
+    }
+
+    # Koncové SOC: LP naplní dražší z pásem short (do prahu) / surplus (nad prahem)
+    b_short, b_surplus = (float(x) for x in terminal_bands(
+        soc_bat_init, b_cap, bat_threshold, bat_price_above, bat_price_below,
+    ))
+
+    objective = (
+        float(((buy * net + bat_under_penalty * b_soc_under) * dt).sum())
+        - bat_price_above * b_surplus
+        + bat_price_below * (bat_threshold - b_short)
+        - final_boiler_price * (lower[-1] + upper[-1])
+        - upper_zone_priority * upper[-1]
+        - tank_value_bonus * float(upper[list(tank_value_indexes)].sum())
+    )
+    return IdleCheck(plan=PlanValues(values, b_short, b_surplus, objective), margins=margins)
@@ -1,20 +1,26 @@
 # Gunicorn configuration file
-from powerplan_environment import PORT
+from powerplan_environment import PORT, REQUEST_TIMEOUT
+from solver_service import SOLVE_WORKERS, SOLVE_QUEUE
 
 # Server socket
 bind = f"0.0.0.0:{PORT}"
 backlog = 2048
 
 # Worker processes
-workers = 1  # Pro scheduler a optimalizaci používáme pouze 1 worker
-worker_class = "sync"
+# Jediný worker vlastní scheduler i všechny přepočty (zámek v powerplan_server
+# je jen mezi vlákny), proto pouze 1 worker
+workers = 1
+# Vlákna: /api/solve a /api/whatif čekají na pracovní procesy a nesmí blokovat UI;
+# nad místa ve frontě řešiče zbydou vlákna pro UI a pro odpověď 503 při plné frontě
+worker_class = "gthread"
+threads = max(1, SOLVE_WORKERS) + max(0, SOLVE_QUEUE) + 2
 worker_connections = 1000
-timeout = 30
+timeout = REQUEST_TIMEOUT
 keepalive = 2
 
-# Restart workers after this many requests, to prevent memory leaks
-max_requests = 1000
-max_requests_jitter = 50
+# Worker se nerecykluje – při restartu by starý a nový worker chvíli
+# přepočítávaly a řídily střídač souběžně
+max_requests = 0
 
 # Logging
 accesslog = "-"
@@ -37,3 +43,10 @@ graceful_timeout = 30
 
 # Capture output from app
 capture_output = True
+
+
+def post_fork(server, worker):
+    # Vlákna scheduleru, streameru, MQTT a regulace patří workeru, který
+    # obsluhuje /regenerate – při startu v masteru by je fork nepřenesl
+    from powerplan_server import start_services
+    start_services()
@@ -0,0 +1,269 @@
+"""
+ha_statistics.py
+----------------
+Hromadný import plánu do dlouhodobých statistik Home Assistantu.
+
+Stavy zapisované přes REST API ukládá recorder HA jako řádky historie při
+každé změně (i atributů). Plánované a naměřené řady se místo toho
+importují jednou zprávou na statistiku přes websocket
+`recorder/import_statistics` – HA z nich jen aktualizuje hodinové
+statistiky a nevznikají žádné řádky historie.
+
+• planned   – hodinové průměry/min/max celé plánované trajektorie
+              (budoucí hodiny se s každým přepočtem přepíšou)
+• measured  – naměřené počáteční stavy (SOC, teploty zón), se kterými se
+              jednotlivé přepočty spouštěly; vzorky se sbírají po hodinách
+              (`MeasuredSamples`), takže řádek hodiny je průměr/min/max
+              všech dosavadních měření, ne jen posledního
+
+Spojení je vyměnitelné: `HAWebSocket` používá balíček websocket-client,
+`StubHAWebSocket` je lokální náhrada serveru HA pro testy.
+"""
+
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from solution import Solution
+
+STATISTICS_SOURCE = "powerplan"
+
+# Klíč výstupu optimalizátoru → (název statistiky, jednotka)
+STATISTICS_SERIES = {
+    "b_soc_percent": ("Baterie SOC", "%"),
+    "b_power": ("Výkon baterie", "kW"),
+    "g_buy": ("Nákup ze sítě", "kW"),
+    "g_sell": ("Prodej do sítě", "kW"),
+    "temp_upper": ("Teplota horní zóny", "°C"),
+    "temp_lower": ("Teplota spodní zóny", "°C"),
+}
+
+# Klíč počátečních stavů (`initials`) → (název statistiky, jednotka)
+MEASURED_SERIES = {
+    "bat_soc": ("Baterie SOC", "%"),
+    "temp_upper": ("Teplota horní zóny", "°C"),
+    "temp_lower": ("Teplota spodní zóny", "°C"),
+}
+MEASURED_HOURS = 3  # kolik posledních hodin vzorků se drží v paměti
+
+
+class HAWebSocketError(RuntimeError):
+    """HA odmítl přihlášení nebo vrátil chybu příkazu."""
+
+
+def websocket_url(url: str) -> str:
+    """Odvodí adresu websocket API z adresy REST API (včetně supervisor proxy)."""
+    ws = "ws" + url[4:] if url.startswith("http") else url
+    ws = ws.rstrip("/")
+    if ws.endswith("/core"):
+        return ws + "/websocket"
+    return ws + "/api/websocket"
+
+
+class HAWebSocket:
+    """
+    Websocket API Home Assistantu (přihlášení + příkazy s ID).
+
+    `connect` vrací objekt s metodami send(str) / recv() -> str / close();
+    standardně `websocket.create_connection` z websocket-client.
+    """
+
+    def __init__(self, url: str, token: str, connect: Optional[Callable[[str], Any]] = None):
+        if connect is None:
+            import websocket
+
+            connect = lambda u: websocket.create_connection(u, timeout=10)
+        self._ws = connect(websocket_url(url))
+        self._id = 0
+        hello = json.loads(self._ws.recv())
+        if hello.get("type") != "auth_required":
+            raise HAWebSocketError(f"Neočekávaná zpráva {hello.get('type')}")
+        self._ws.send(json.dumps({"type": "auth", "access_token": token}))
+        reply = json.loads(self._ws.recv())
+        if reply.get("type") != "auth_ok":
+            raise HAWebSocketError(reply.get("message", "Přihlášení k websocket API selhalo"))
+
+    def call(self, message: Dict[str, Any]) -> Any:
+        """Pošle příkaz a počká na jeho výsledek (události mezi tím přeskočí)."""
+        self._id += 1
+        self._ws.send(json.dumps({"id": self._id, **message}))
+        while True:
+            reply = json.loads(self._ws.recv())
+            if reply.get("id") == self._id and reply.get("type") == "result":
+                break
+        if not reply.get("success"):
+            error = reply.get("error", {})
+            raise HAWebSocketError(f"{message['type']}: {error.get('code')} {error.get('message')}")
+        return reply.get("result")
+
+    def close(self) -> None:
+        self._ws.close()
+
+
+class StubHAWebSocket:
+    """
+    Lokální náhrada websocket serveru HA pro testy – použij jako `connect`
+    (`HAWebSocket(url, token, connect=stub)`).
+
+    Ověřuje token, přijímá `recorder/import_statistics` a ukládá statistiky
+    do `statistics` (statistic_id → {start: řádek}) stejně jako recorder,
+    tj. opakovaný import stejné hodiny ji přepíše.
+    """
+
+    def __init__(self, token: str = "test"):
+        self.token = token
+        self.statistics: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.metadata: Dict[str, Dict[str, Any]] = {}
+        self.messages: List[Dict[str, Any]] = []
+        self._outbox: List[Dict[str, Any]] = []
+
+    def __call__(self, url: str) -> "StubHAWebSocket":
+        self._outbox = [{"type": "auth_required"}]
+        return self
+
+    def recv(self) -> str:
+        return json.dumps(self._outbox.pop(0))
+
+    def send(self, raw: str) -> None:
+        message = json.loads(raw)
+        self.messages.append(message)
+        if message["type"] == "auth":
+            ok = message.get("access_token") == self.token
+            self._outbox.append({"type": "auth_ok"} if ok else {"type": "auth_invalid", "message": "Invalid access token"})
+        elif message["type"] == "recorder/import_statistics":
+            meta = message["metadata"]
+            if not meta["statistic_id"].startswith(meta["source"] + ":"):
+                self._result(message["id"], error={"code": "invalid_format", "message": "Invalid statistic_id"})
+                return
+            self.metadata[meta["statistic_id"]] = meta
+            rows = self.statistics.setdefault(meta["statistic_id"], {})
+            for row in message["stats"]:
+                rows[row["start"]] = row
+            self._result(message["id"])
+        else:
+            self._result(message["id"], error={"code": "unknown_command", "message": "Unknown command."})
+
+    def _result(self, msg_id: int, error: Optional[Dict[str, str]] = None) -> None:
+        reply = {"id": msg_id, "type": "result", "success": error is None, "result": None}
+        if error:
+            reply["error"] = error
+        self._outbox.append(reply)
+
+    def close(self) -> None:
+        pass
+
+
+# --- Sestavení statistik --------------------------------------------------
+
+class MeasuredSamples:
+    """Naměřené počáteční stavy přepočtů seskupené po hodinách (klíč → hodina → hodnoty)."""
+
+    def __init__(self, hours: int = MEASURED_HOURS):
+        self.hours = hours
+        self.samples: Dict[str, Dict[datetime, List[float]]] = {}
+
+    def add(self, at: datetime, initials: Dict[str, Any]) -> None:
+        hour = at.replace(minute=0, second=0, microsecond=0)
+        for key in MEASURED_SERIES:
+            if initials.get(key) is None:
+                continue
+            by_hour = self.samples.setdefault(key, {})
+            by_hour.setdefault(hour, []).append(float(initials[key]))
+            for old in sorted(by_hour)[:-self.hours]:
+                del by_hour[old]
+
+    def rows(self, key: str) -> List[Dict[str, Any]]:
+        return [
+            {"start": hour.isoformat(), "mean": sum(v) / len(v), "min": min(v), "max": max(v)}
+            for hour, v in sorted(self.samples.get(key, {}).items())
+        ]
+
+
+_measured = MeasuredSamples()
+
+
+def hourly_rows(times: List[datetime], dt: List[float], values: List[float]) -> List[Dict[str, Any]]:
+    """
+    Agreguje sloty do hodinových řádků statistiky (vážený průměr, min, max).
+
+    HA přijímá jen řádky začínající na celou hodinu, sloty se proto sdruží
+    podle hodiny začátku.
+    """
+    rows: Dict[datetime, Dict[str, float]] = {}
+    for t, length, value in zip(times, dt, values):
+        hour = t.replace(minute=0, second=0, microsecond=0)
+        row = rows.setdefault(hour, {"weight": 0.0, "total": 0.0, "min": value, "max": value})
+        row["weight"] += length
+        row["total"] += value * length
+        row["min"] = min(row["min"], value)
+        row["max"] = max(row["max"], value)
+    return [
+        {
+            "start": hour.isoformat(),
+            "mean": row["total"] / row["weight"] if row["weight"] else row["min"],
+            "min": row["min"],
+            "max": row["max"],
+        }
+        for hour, row in sorted(rows.items())
+    ]
+
+
+def _message(statistic_id: str, name: str, unit: str, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "type": "recorder/import_statistics",
+        "metadata": {
+            "statistic_id": f"{STATISTICS_SOURCE}:{statistic_id}",
+            "source": STATISTICS_SOURCE,
+            "name": name,
+            "unit_of_measurement": unit,
+            "has_mean": True,
+            "has_sum": False,
+        },
+        "stats": rows,
+    }
+
+
+def statistics_messages(solution: Dict[str, Any], measured: Optional[MeasuredSamples] = None) -> List[Dict[str, Any]]:
+    """Sestaví zprávy `recorder/import_statistics` pro plánované a naměřené řady."""
+    solution = Solution.from_dict(solution)
+    times = solution.datetimes
+    dt = solution.dt.tolist() if solution.dt is not None else [1.0] * len(times)
+    messages = []
+    if times:
+        for key, (name, unit) in STATISTICS_SERIES.items():
+            if key in solution.outputs:
+                rows = hourly_rows(times, dt, solution.outputs[key].tolist())
+                messages.append(_message(f"planned_{key}", f"{name} – plán", unit, rows))
+    if measured is not None:
+        for key, (name, unit) in MEASURED_SERIES.items():
+            rows = measured.rows(key)
+            if rows:
+                messages.append(_message(f"measured_{key}", name, unit, rows))
+    return messages
+
+
+def import_statistics(solution: Dict[str, Any], connection: Optional[HAWebSocket] = None,
+                      measured: Optional[MeasuredSamples] = None) -> int:
+    """
+    Importuje statistiky plánu jedním websocket spojením. Počáteční stavy
+    řešení se nejdřív přidají ke vzorkům `measured` (výchozí sdílené).
+    Vrací počet zpráv.
+    """
+    measured = _measured if measured is None else measured
+    times = Solution.from_dict(solution).datetimes
+    if times:
+        measured.add(times[0], solution.get("initials") or {})
+    own = connection is None
+    if own:
+        from data_connector import get_client
+
+        client = get_client()
+        connection = HAWebSocket(client.url, client.token)
+    try:
+        messages = statistics_messages(solution, measured)
+        for message in messages:
+            connection.call(message)
+        return len(messages)
+    finally:
+        if own:
+            connection.close()
@@ -0,0 +1,298 @@
+"""
+modbus_telemetry.py
+-------------------
+Přímé čtení telemetrie baterie a nádrže přes Modbus TCP.
+
+Řídicí jednotka akumulace (ESPHome, `ha/akumulace.yaml`) vystavuje
+`modbus_server` se zrcadlem registrů střídače Solax. Čtení přímo z ní
+obchází polling HA, takže počáteční stavy pro první slot jsou čerstvější;
+stavy, které Modbus dodá, se z HA vůbec nestahují.
+
+Výchozí mapa obsahuje jen SOC baterie. Další registry (např. teploty
+nádrže, pokud je server vystavuje) se zadávají volbou `modbus_registers`:
+
+    bat_soc=0x001C, boiler_top=0x0100:s:0.1, boiler_middle=257:s:0.1
+
+tj. `název=adresa[:s][:měřítko]`, `s` = registr se znaménkem.
+
+• ModbusTCPClient – minimální klient (funkce 0x03) nad jedním trvalým
+  spojením; spojení se sdílí mezi výpočty (`get_connection`) a při chybě
+  se jednou obnoví
+• plan_reads      – sloučí sousední registry do bloků, jeden dotaz na blok;
+  nenamapované adresy mezi nimi se nečtou (zařízení by vrátilo výjimku
+  0x02 a selhal by celý blok)
+• ModbusSimulator – lokální Modbus TCP server ve vlákně pro testy
+"""
+
+import socket
+import socketserver
+import struct
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from powerplan_environment import addon_option
+
+MODBUS_PORT = 502
+MODBUS_TIMEOUT = 2.0     # s
+MAX_BLOCK = 125          # max. počet registrů v jednom dotazu (FC3)
+MAX_GAP = 0              # nenamapované registry mezi bloky, které se smí přečíst navíc
+
+FC_READ_HOLDING = 0x03
+
+
+@dataclass(frozen=True)
+class Register:
+    address: int
+    signed: bool = False
+    scale: float = 1.0
+
+
+# Hodnoty, které umí nahradit stavy z HA (viz data_connector.prepare_data)
+TELEMETRY_KEYS = ("bat_soc", "boiler_top", "boiler_middle", "boiler_bottom")
+
+# Výchozí mapa registrů modbus_serveru akumulace – baterie zrcadlí adresy Solaxu
+REGISTERS: Dict[str, Register] = {
+    "bat_soc": Register(0x001C),
+}
+
+
+class ModbusError(IOError):
+    """Chyba komunikace nebo výjimka vrácená Modbus serverem."""
+
+
+# --- Klient ---------------------------------------------------------------
+
+class ModbusTCPClient:
+    """Modbus TCP klient s jedním trvalým spojením (thread-safe)."""
+
+    def __init__(self, host: str, port: int = MODBUS_PORT, unit: int = 1, timeout: float = MODBUS_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.unit = unit
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._lock = threading.Lock()
+        self._transaction = 0
+
+    def _connect(self) -> socket.socket:
+        if self._sock is None:
+            self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return self._sock
+
+    def _drop(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._drop()
+
+    def _recv_exact(self, sock: socket.socket, size: int) -> bytes:
+        data = b""
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("Spojení ukončeno serverem")
+            data += chunk
+        return data
+
+    def _request(self, pdu: bytes) -> bytes:
+        self._transaction = (self._transaction + 1) & 0xFFFF
+        sock = self._connect()
+        sock.sendall(struct.pack(">HHHB", self._transaction, 0, len(pdu) + 1, self.unit) + pdu)
+        transaction, _, length, _ = struct.unpack(">HHHB", self._recv_exact(sock, 7))
+        response = self._recv_exact(sock, length - 1)
+        if transaction != self._transaction:
+            self._drop()
+            raise ModbusError("Neočekávané číslo transakce")
+        if response[0] & 0x80:
+            raise ModbusError(f"Modbus výjimka {response[1]} (funkce {response[0] & 0x7F:#x})")
+        return response
+
+    def read_holding_registers(self, address: int, count: int) -> List[int]:
+        """Přečte `count` registrů od `address` (funkce 0x03)."""
+        pdu = struct.pack(">BHH", FC_READ_HOLDING, address, count)
+        with self._lock:
+            try:
+                response = self._request(pdu)
+            except ModbusError:
+                raise
+            except OSError:
+                # Spojení mohl server mezitím zavřít – jednou se připoj znovu
+                self._drop()
+                try:
+                    response = self._request(pdu)
+                except OSError as e:
+                    self._drop()
+                    raise ModbusError(f"Modbus {self.host}:{self.port} nedostupný: {e}") from e
+        byte_count = response[1]
+        return list(struct.unpack(f">{byte_count // 2}H", response[2:2 + byte_count]))
+
+
+_connections: Dict[Tuple[str, int, int], ModbusTCPClient] = {}
+_connections_lock = threading.Lock()
+
+
+def get_connection(host: str, port: int = MODBUS_PORT, unit: int = 1) -> ModbusTCPClient:
+    """Vrátí sdílené spojení pro (host, port, unit), při prvním volání ho vytvoří."""
+    key = (host, port, unit)
+    with _connections_lock:
+        if key not in _connections:
+            _connections[key] = ModbusTCPClient(host, port, unit)
+        return _connections[key]
+
+
+# --- Mapa registrů --------------------------------------------------------
+
+def parse_registers(text: str) -> Dict[str, Register]:
+    """Mapa registrů z volby `modbus_registers` (`název=adresa[:s][:měřítko]`, odděleno čárkou)."""
+    registers: Dict[str, Register] = {}
+    for item in text.replace(";", ",").split(","):
+        if not item.strip():
+            continue
+        name, sep, spec = item.partition("=")
+        name = name.strip()
+        if not sep or name not in TELEMETRY_KEYS:
+            raise ValueError(f"Neplatný registr '{item.strip()}' (známé: {', '.join(TELEMETRY_KEYS)})")
+        address, *flags = [part.strip() for part in spec.split(":")]
+        signed = "s" in flags
+        scales = [f for f in flags if f != "s"]
+        try:
+            registers[name] = Register(int(address, 0), signed, float(scales[0]) if scales else 1.0)
+        except ValueError:
+            raise ValueError(f"Neplatná adresa nebo měřítko registru '{item.strip()}'")
+    return registers
+
+
+def configured_registers() -> Dict[str, Register]:
+    """Mapa registrů z volby `modbus_registers`, jinak výchozí `REGISTERS`."""
+    text = addon_option("modbus_registers", "")
+    return parse_registers(text) if text else REGISTERS
+
+
+# --- Dávkové čtení --------------------------------------------------------
+
+def plan_reads(registers: Dict[str, Register], max_gap: int = MAX_GAP,
+               max_block: int = MAX_BLOCK) -> List[Tuple[int, int]]:
+    """
+    Sloučí adresy registrů do souvislých bloků (začátek, počet).
+
+    Mezery do `max_gap` registrů se přečtou navíc (jeden delší dotaz je
+    levnější než dva krátké) – jen pokud zařízení nenamapované adresy
+    toleruje, výchozí 0 čte pouze sousední registry.
+    """
+    blocks: List[Tuple[int, int]] = []
+    for address in sorted({r.address for r in registers.values()}):
+        if blocks:
+            start, count = blocks[-1]
+            end = start + count
+            if address - end <= max_gap and address - start < max_block:
+                blocks[-1] = (start, address - start + 1)
+                continue
+        blocks.append((address, 1))
+    return blocks
+
+
+def read_registers(client: ModbusTCPClient, registers: Dict[str, Register] = REGISTERS) -> Dict[str, float]:
+    """Přečte všechny registry po blocích a vrátí hodnoty ve fyzikálních jednotkách."""
+    raw: Dict[int, int] = {}
+    for start, count in plan_reads(registers):
+        for offset, value in enumerate(client.read_holding_registers(start, count)):
+            raw[start + offset] = value
+
+    values = {}
+    for name, reg in registers.items():
+        value = raw[reg.address]
+        if reg.signed and value >= 0x8000:
+            value -= 0x10000
+        values[name] = value * reg.scale
+    return values
+
+
+def read_telemetry() -> Optional[Dict[str, float]]:
+    """
+    Přečte telemetrii z Modbus serveru nastaveného volbou `modbus_host`.
+
+    Vrací jen hodnoty z mapy registrů (`configured_registers`), None pokud
+    Modbus není nastaven. Chyby komunikace propagují (ModbusError /
+    OSError), volající použije hodnoty z HA.
+    """
+    host = addon_option("modbus_host", "")
+    if not host:
+        return None
+    client = get_connection(
+        host,
+        int(addon_option("modbus_port", MODBUS_PORT)),
+        int(addon_option("modbus_unit", 1)),
+    )
+    return read_registers(client, configured_registers())
+
+
+# --- Simulátor ------------------------------------------------------------
+
+class _ModbusHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        sim: "ModbusSimulator" = self.server.simulator
+        sock = self.request
+        while True:
+            header = sock.recv(7)
+            if len(header) < 7:
+                return
+            transaction, protocol, length, unit = struct.unpack(">HHHB", header)
+            pdu = sock.recv(length - 1)
+            sim.requests.append(pdu)
+            function = pdu[0]
+            if function != FC_READ_HOLDING:
+                response = struct.pack(">BB", function | 0x80, 0x01)
+            else:
+                address, count = struct.unpack(">HH", pdu[1:5])
+                try:
+                    words = [sim.registers[address + i] & 0xFFFF for i in range(count)]
+                    response = struct.pack(f">BB{count}H", function, count * 2, *words)
+                except KeyError:
+                    response = struct.pack(">BB", function | 0x80, 0x02)
+            sock.sendall(struct.pack(">HHHB", transaction, protocol, len(response) + 1, unit) + response)
+
+
+class _ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class ModbusSimulator:
+    """
+    Lokální Modbus TCP server pro testy (funkce 0x03).
+
+    Registry jsou slovník adresa → hodnota; neexistující adresa vrací
+    výjimku 0x02 jako skutečné zařízení. `requests` zaznamenává přijaté PDU,
+    takže lze ověřit počet dotazů.
+    """
+
+    def __init__(self, registers: Optional[Dict[int, int]] = None, host: str = "127.0.0.1", port: int = 0):
+        self.registers: Dict[int, int] = dict(registers or {})
+        self.requests: List[bytes] = []
+        self._server = _ThreadingTCPServer((host, port), _ModbusHandler)
+        self._server.simulator = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._server.server_address
+
+    def set_values(self, values: Dict[str, float], registers: Dict[str, Register] = REGISTERS) -> None:
+        """Nastaví registry z fyzikálních hodnot podle mapy registrů."""
+        for name, value in values.items():
+            reg = registers[name]
+            self.registers[reg.address] = int(round(value / reg.scale)) & 0xFFFF
+
+    def start(self) -> "ModbusSimulator":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="modbus-sim", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
@@ -1,10 +1,107 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Sequence
+
+import numpy as np
+
+# Parametry tepelných ztrát nádrže
+T_TANK_MIN = 45      # °C při prázdné zóně
+T_TANK_MAX = 80      # °C při plné zóně
+K_TANK = 0.002       # kW/°C
+K_CIRC = 0.006       # kW/°C
+
+
 def estimate_heating_losses(H_SOC_var, H_CAP, T_ambient=20, cirk_time=0.3):
     # Vše jsou LpVariable nebo konstanty!
     # Předpokládejme H_SOC_var [kWh], H_CAP [kWh]
     # Výstupem je LpAffineExpression!
-    T_tank = 45 + (H_SOC_var / H_CAP) * (80 - 45)
-    k_tank = 0.002   # kW/°C
-    k_circ = 0.006   # kW/°C
+    T_tank = T_TANK_MIN + (H_SOC_var / H_CAP) * (T_TANK_MAX - T_TANK_MIN)
+    k_tank = K_TANK   # kW/°C
+    k_circ = K_CIRC   # kW/°C
     loss_tank = k_tank * (T_tank - T_ambient)
     loss_circ = k_circ * (T_tank - T_ambient) * cirk_time
     return loss_tank + loss_circ
+
+
+@dataclass(frozen=True)
+class TankPhysics:
+    """
+    Předkompilovaná fyzika dvouzónové nádrže – afinní funkce SOC v minulém slotu.
+
+    loss_zone(S)   = loss_slope_zone · S + loss_offset_zone          [kW]
+    h_to_upper(S)  = transfer_lower · S_lower − transfer_upper · S_upper  [kW]
+
+    Koeficienty jsou obyčejná čísla, takže stejný model použije LP (násobení
+    proměnných PuLP) i simulátor nad poli NumPy.
+    """
+
+    lower_cap: float
+    upper_cap: float
+    loss_slope_lower: float
+    loss_slope_upper: float
+    loss_offset: float
+    transfer_lower: float
+    transfer_upper: float
+
+    def losses(self, soc_lower, soc_upper):
+        """Ztráty obou zón (float, pole NumPy i výraz PuLP)."""
+        return (
+            self.loss_slope_lower * soc_lower + self.loss_offset,
+            self.loss_slope_upper * soc_upper + self.loss_offset,
+        )
+
+    def transfer(self, soc_lower, soc_upper):
+        """Pasivní přenos tepla dolní → horní zóna (záporný = opačný směr)."""
+        return self.transfer_lower * soc_lower - self.transfer_upper * soc_upper
+
+    def retention(self, dt: float):
+        """Část SOC zón, která po ztrátách zůstane za slot délky `dt` (dolní, horní)."""
+        return 1 - self.loss_slope_lower * dt, 1 - self.loss_slope_upper * dt
+
+    def simulate(self, soc_lower: float, soc_upper: float, h_in_lower: Sequence[float],
+                 h_in_upper: Sequence[float], h_out_lower: Sequence[float],
+                 h_out_upper: Sequence[float], dt: Sequence[float], clip: bool = True) -> Dict[str, np.ndarray]:
+        """
+        Simulace SOC obou zón pro daný průběh ohřevu a odběru (stejné rovnice
+        jako v LP). Přenos je omezen energií zdrojové zóny, SOC kapacitou zón.
+
+        S `clip=False` se meze neuplatní – volající tak pozná, zda by průběh
+        v LP byl přípustný.
+        """
+        n = len(dt)
+        lower = np.empty(n)
+        upper = np.empty(n)
+        to_upper = np.empty(n)
+        for t in range(n):
+            flow = self.transfer(soc_lower, soc_upper)
+            if clip:
+                flow = min(max(flow, -soc_upper), soc_lower)
+            loss_lower, loss_upper = self.losses(soc_lower, soc_upper)
+            soc_lower = soc_lower + (h_in_lower[t] - flow - h_out_lower[t] - loss_lower) * dt[t]
+            soc_upper = soc_upper + (h_in_upper[t] + flow - h_out_upper[t] - loss_upper) * dt[t]
+            if clip:
+                soc_lower = min(max(soc_lower, 0.0), self.lower_cap)
+                soc_upper = min(max(soc_upper, 0.0), self.upper_cap)
+            lower[t], upper[t], to_upper[t] = soc_lower, soc_upper, flow
+        return {"h_soc_lower": lower, "h_soc_upper": upper, "h_to_upper": to_upper}
+
+
+@lru_cache(maxsize=32)
+def compile_tank(lower_cap: float, upper_cap: float, lower_vol: float, upper_vol: float,
+                 alpha: float, T_ambient: float = 20, cirk_time: float = 0.3) -> TankPhysics:
+    """
+    Zkompiluje ztráty (`estimate_heating_losses`) a přenos mezi zónami do
+    koeficientů. Výsledek se cachuje pro opakovaná řešení se stejnými parametry.
+    """
+    k = K_TANK + K_CIRC * cirk_time
+    # alpha je teplotní koeficient, přenos se počítá z rozdílu hustot energie
+    alpha_energy = alpha * 3600 / 4181
+    return TankPhysics(
+        lower_cap=lower_cap,
+        upper_cap=upper_cap,
+        loss_slope_lower=k * (T_TANK_MAX - T_TANK_MIN) / lower_cap,
+        loss_slope_upper=k * (T_TANK_MAX - T_TANK_MIN) / upper_cap,
+        loss_offset=k * (T_TANK_MIN - T_ambient),
+        transfer_lower=alpha_energy / lower_vol if lower_vol > 0 else 0.0,
+        transfer_upper=alpha_energy / upper_vol if upper_vol > 0 else 0.0,
+    )
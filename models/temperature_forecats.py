@@ -1,6 +1,5 @@
 #!/usr/bin/env python3
 
-import requests
 from datetime import datetime
 
 def validator(time, hours=None):
@@ -16,7 +15,9 @@ def validator(time, hours=None):
 def get_temperature_forecast(hours=None):
     lat, lon = 50.76415, 15.16004
     url = f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&hourly=temperature_2m"
-    resp = requests.get(url)
+    import requests
+
+    resp = requests.get(url, timeout=10)
     data = resp.json()
     # Pole teplot na další hodiny:
     temps = data["hourly"]["temperature_2m"]
@@ -0,0 +1,389 @@
+"""
+mqtt_transport.py
+-----------------
+MQTT transport jako alternativa k REST API Home Assistantu.
+
+Jedno trvalé spojení s brokerem (např. mosquitto add-on) místo HTTP
+požadavku na každou entitu:
+
+• akce a plán se publikují jako retained topicy – HA i po restartu hned
+  dostane poslední hodnoty, nic se nemusí publikovat znovu
+• entity se v HA zakládají přes MQTT discovery (`homeassistant/.../config`)
+• SOC baterie a teploty nádrže chodí push stylem na vstupní topicy, jejich
+  poslední hodnoty přebíjí stavy z REST API v `prepare_data`
+• výrazná změna vstupu nebo nové ceny spustí přepočet (s debounce)
+
+paho-mqtt se importuje líně, jen když je transport zapnutý (`mqtt_host`).
+`MQTTBrokerSimulator` je lokální broker (MQTT 3.1.1, QoS 0/1, retained
+zprávy) ve vlákně pro testy.
+"""
+
+import json
+import os
+import socketserver
+import struct
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+MQTT_PORT = 1883
+TOPIC_PREFIX = "powerplan"
+DISCOVERY_PREFIX = "homeassistant"
+AVAILABILITY_TOPIC = f"{TOPIC_PREFIX}/status"
+
+# Vstupní topicy (číselná hodnota v payloadu) → klíč počátečního stavu
+INPUT_TOPICS = {
+    f"{TOPIC_PREFIX}/input/bat_soc": "bat_soc",
+    f"{TOPIC_PREFIX}/input/boiler_top": "boiler_top",
+    f"{TOPIC_PREFIX}/input/boiler_middle": "boiler_middle",
+    f"{TOPIC_PREFIX}/input/boiler_bottom": "boiler_bottom",
+}
+# Libovolná zpráva na tomto topicu znamená nové ceny → přepočet
+PRICE_TOPIC = f"{TOPIC_PREFIX}/input/prices"
+
+INPUT_MAX_AGE = 900.0     # s – starší push hodnoty se ignorují
+RESOLVE_DEBOUNCE = 30.0   # s – sloučení více změn do jednoho přepočtu
+# Změna vstupu, která vyvolá přepočet (jinak se použije při dalším plánovaném)
+RESOLVE_THRESHOLDS = {
+    "bat_soc": 5.0,        # %
+    "boiler_top": 3.0,     # °C
+    "boiler_middle": 3.0,
+    "boiler_bottom": 3.0,
+}
+
+DEVICE = {
+    "identifiers": ["powerplan"],
+    "name": "PowerStreamPlan",
+    "manufacturer": "PowerStreamPlan",
+}
+
+
+def _default_client_factory(client_id: str):
+    import paho.mqtt.client as mqtt
+
+    try:
+        return mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id)
+    except AttributeError:  # paho-mqtt < 2.0
+        return mqtt.Client(client_id=client_id)
+
+
+class MQTTTransport:
+    """Trvalé MQTT spojení pro publikaci plánu a příjem vstupů."""
+
+    def __init__(self, host: str, port: int = MQTT_PORT, username: Optional[str] = None,
+                 password: Optional[str] = None, on_change: Optional[Callable[[], None]] = None,
+                 client_factory: Callable[[str], Any] = _default_client_factory):
+        self.host = host
+        self.port = port
+        self.on_change = on_change
+        self._lock = threading.Lock()
+        self._inputs: Dict[str, tuple] = {}      # klíč → (hodnota, čas přijetí)
+        self._used: Dict[str, float] = {}        # hodnoty použité posledním výpočtem
+        self._discovered: set = set()
+        self._timer: Optional[threading.Timer] = None
+        self._pid: Optional[int] = None          # proces, ve kterém běží síťová smyčka
+
+        self.client = client_factory("powerplan")
+        if username:
+            self.client.username_pw_set(username, password)
+        self.client.will_set(AVAILABILITY_TOPIC, "offline", qos=1, retain=True)
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
+
+    def start(self) -> "MQTTTransport":
+        """
+        Připojí se k brokeru; síťová smyčka běží ve vlákně paho. Publikovat
+        lze jen z tohoto procesu – pod gunicornem se volá až ve workeru.
+        """
+        self._pid = os.getpid()
+        self.client.connect_async(self.host, self.port, keepalive=60)
+        self.client.loop_start()
+        return self
+
+    def stop(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        self.client.publish(AVAILABILITY_TOPIC, "offline", qos=1, retain=True)
+        self.client.loop_stop()
+        self.client.disconnect()
+
+    # -- příjem vstupů --------------------------------------------------------
+
+    def _on_connect(self, client, userdata, flags, *rest):
+        # Po každém (znovu)připojení – discovery i odběry jsou na brokeru jen
+        # po dobu spojení, retained zprávy zůstávají
+        self._discovered.clear()
+        client.publish(AVAILABILITY_TOPIC, "online", qos=1, retain=True)
+        for topic in list(INPUT_TOPICS) + [PRICE_TOPIC]:
+            client.subscribe(topic, qos=1)
+
+    def _on_message(self, client, userdata, msg):
+        if msg.topic == PRICE_TOPIC:
+            self._schedule_resolve()
+            return
+        key = INPUT_TOPICS.get(msg.topic)
+        if key is None:
+            return
+        try:
+            value = float(msg.payload.decode())
+        except (UnicodeDecodeError, ValueError):
+            print(f"[WARN] MQTT {msg.topic}: neplatná hodnota {msg.payload!r}")
+            return
+        with self._lock:
+            self._inputs[key] = (value, time.time())
+            used = self._used.get(key)
+        if used is None or abs(value - used) >= RESOLVE_THRESHOLDS.get(key, float("inf")):
+            self._schedule_resolve()
+
+    def _schedule_resolve(self) -> None:
+        """Spustí přepočet po RESOLVE_DEBOUNCE s (další změny mezitím se sloučí)."""
+        if self.on_change is None:
+            return
+        with self._lock:
+            if self._timer is not None and self._timer.is_alive():
+                return
+            self._timer = threading.Timer(RESOLVE_DEBOUNCE, self._resolve)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _resolve(self) -> None:
+        try:
+            self.on_change()
+        except Exception as e:
+            print(f"[ERR] MQTT přepočet selhal: {e}")
+
+    def latest_inputs(self, max_age: float = INPUT_MAX_AGE) -> Dict[str, float]:
+        """Poslední push hodnoty mladší než `max_age`."""
+        now = time.time()
+        with self._lock:
+            return {k: v for k, (v, t) in self._inputs.items() if now - t <= max_age}
+
+    def mark_used(self, values: Optional[Dict[str, float]]) -> None:
+        """
+        Označí hodnoty jako použité úspěšným výpočtem – další přepočet spustí
+        až změna o RESOLVE_THRESHOLDS oproti nim.
+        """
+        with self._lock:
+            self._used.update(values or {})
+
+    # -- publikace ------------------------------------------------------------
+
+    def _publish(self, topic: str, payload: str) -> None:
+        # Kopie klienta po forku sdílí socket, ale ne síťovou smyčku – retained
+        # zprávy by se ztrácely nebo odcházely dvakrát
+        if self._pid != os.getpid():
+            raise RuntimeError("MQTT transport nebyl spuštěn v tomto procesu (start() až po forku)")
+        self.client.publish(topic, payload, qos=1, retain=True)
+
+    def _discover(self, key: str, config: Dict[str, Any]) -> None:
+        if key in self._discovered:
+            return
+        payload = {
+            "name": config.pop("friendly_name", key),
+            "unique_id": f"powerplan_{key}",
+            "object_id": f"powerplan_{key}",
+            "availability_topic": AVAILABILITY_TOPIC,
+            "device": DEVICE,
+            **config,
+        }
+        self._publish(f"{DISCOVERY_PREFIX}/sensor/powerplan/{key}/config", json.dumps(payload))
+        self._discovered.add(key)
+
+    def publish_actions(self, actions: Dict[str, Any], attributes: Optional[Dict[str, Dict[str, str]]] = None,
+                        extra: Optional[Dict[str, Any]] = None) -> None:
+        """Publikuje akce jako retained stavy `powerplan/<klíč>/state`."""
+        for key, value in actions.items():
+            config = {k: v for k, v in (attributes or {}).get(key, {}).items()
+                      if k in ("friendly_name", "icon", "unit_of_measurement", "device_class", "state_class")}
+            if config.get("device_class") == "switch":
+                config.pop("device_class")  # switch není platná třída senzoru
+            config["state_topic"] = f"{TOPIC_PREFIX}/{key}/state"
+            if extra:
+                config["json_attributes_topic"] = f"{TOPIC_PREFIX}/attributes"
+            self._discover(key, config)
+            self._publish(config["state_topic"], str(value))
+        if extra:
+            self._publish(f"{TOPIC_PREFIX}/attributes", json.dumps(extra))
+
+    def publish_debug(self, state: Any, attributes: Dict[str, Any]) -> None:
+        """Ladicí senzor – stav aktuální slot, atributy souhrn výsledků."""
+        self._discover("debug", {
+            "state_topic": f"{TOPIC_PREFIX}/debug/state",
+            "json_attributes_topic": f"{TOPIC_PREFIX}/debug/attributes",
+        })
+        self._publish(f"{TOPIC_PREFIX}/debug/attributes", json.dumps(attributes, default=str))
+        self._publish(f"{TOPIC_PREFIX}/debug/state", str(state))
+
+    def publish_plan(self, solution: Dict[str, Any]) -> None:
+        """Publikuje celý plán (kódovaný po změnách, viz plan_timeline)."""
+        from plan_timeline import encode_changes, plan_state, PLAN_ATTRIBUTES
+
+        changes = encode_changes(solution["times"], solution["actions_timeline"])
+        self._discover("plan", {
+            "friendly_name": PLAN_ATTRIBUTES["friendly_name"],
+            "icon": PLAN_ATTRIBUTES["icon"],
+            "device_class": PLAN_ATTRIBUTES["device_class"],
+            "state_topic": f"{TOPIC_PREFIX}/plan/state",
+            "json_attributes_topic": f"{TOPIC_PREFIX}/plan/attributes",
+        })
+        self._publish(f"{TOPIC_PREFIX}/plan/attributes", json.dumps({
+            "changes": changes,
+            "horizon_end": solution["times"][-1] if solution["times"] else None,
+        }))
+        self._publish(f"{TOPIC_PREFIX}/plan/state", plan_state(changes) or "None")
+
+
+# --- Simulátor brokeru ----------------------------------------------------
+
+def topic_matches(pattern: str, topic: str) -> bool:
+    """Shoda topicu s filtrem odběru (zástupné znaky `+` a `#`)."""
+    parts, levels = pattern.split("/"), topic.split("/")
+    for i, part in enumerate(parts):
+        if part == "#":
+            return True
+        if i >= len(levels) or (part != "+" and part != levels[i]):
+            return False
+    return len(parts) == len(levels)
+
+
+def _packet(kind: int, body: bytes) -> bytes:
+    length, encoded = len(body), b""
+    while True:
+        byte, length = length % 128, length // 128
+        encoded += bytes([byte | (0x80 if length else 0)])
+        if not length:
+            return bytes([kind]) + encoded + body
+
+
+def _string(data: bytes, pos: int) -> Tuple[str, int]:
+    (size,) = struct.unpack(">H", data[pos:pos + 2])
+    return data[pos + 2:pos + 2 + size].decode(), pos + 2 + size
+
+
+class _MQTTHandler(socketserver.BaseRequestHandler):
+    def _recv_exact(self, size: int) -> bytes:
+        data = b""
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError
+            data += chunk
+        return data
+
+    def _read_packet(self) -> Tuple[int, bytes]:
+        header = self._recv_exact(1)[0]
+        length, shift = 0, 0
+        while True:
+            byte = self._recv_exact(1)[0]
+            length += (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                return header, self._recv_exact(length)
+
+    def send(self, data: bytes) -> None:
+        with self.send_lock:
+            self.request.sendall(data)
+
+    def handle(self):
+        broker: "MQTTBrokerSimulator" = self.server.broker
+        self.send_lock = threading.Lock()
+        self.subscriptions: List[str] = []
+        try:
+            while True:
+                header, body = self._read_packet()
+                kind = header >> 4
+                if kind == 1:      # CONNECT
+                    self.send(_packet(0x20, b"\x00\x00"))
+                    with broker.lock:
+                        broker.clients.append(self)
+                elif kind == 3:    # PUBLISH
+                    qos, retain = (header >> 1) & 0x03, bool(header & 0x01)
+                    topic, pos = _string(body, 0)
+                    if qos:
+                        self.send(_packet(0x40, body[pos:pos + 2]))
+                        pos += 2
+                    broker.publish(topic, body[pos:], retain)
+                elif kind == 8:    # SUBSCRIBE
+                    packet_id, pos, patterns = body[:2], 2, []
+                    while pos < len(body):
+                        pattern, pos = _string(body, pos)
+                        patterns.append(pattern)
+                        pos += 1
+                    self.subscriptions.extend(patterns)
+                    self.send(_packet(0x90, packet_id + b"\x00" * len(patterns)))
+                    for pattern in patterns:
+                        broker.deliver_retained(self, pattern)
+                elif kind == 10:   # UNSUBSCRIBE
+                    self.send(_packet(0xB0, body[:2]))
+                elif kind == 12:   # PINGREQ
+                    self.send(b"\xd0\x00")
+                elif kind == 14:   # DISCONNECT
+                    return
+        except (ConnectionError, OSError):
+            return
+        finally:
+            with broker.lock:
+                if self in broker.clients:
+                    broker.clients.remove(self)
+
+
+class _ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class MQTTBrokerSimulator:
+    """
+    Lokální MQTT broker pro testy.
+
+    Podporuje jen to, co potřebuje transport: přihlášení bez ověření, odběry
+    se zástupnými znaky, retained zprávy (prázdný payload je maže) a QoS 0/1
+    na vstupu; odběratelům doručuje s QoS 0. `retained` obsahuje aktuální
+    retained zprávy, `published` všechny přijaté (topic, payload, retain).
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.lock = threading.Lock()
+        self.clients: List[_MQTTHandler] = []
+        self.retained: Dict[str, bytes] = {}
+        self.published: List[Tuple[str, bytes, bool]] = []
+        self._server = _ThreadingTCPServer((host, port), _MQTTHandler)
+        self._server.broker = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._server.server_address
+
+    def subscribed(self, topic: str) -> bool:
+        """Má některý klient odběr, do kterého `topic` spadá."""
+        with self.lock:
+            return any(topic_matches(p, topic) for c in self.clients for p in c.subscriptions)
+
+    def publish(self, topic: str, payload: bytes, retain: bool = False) -> None:
+        with self.lock:
+            self.published.append((topic, payload, retain))
+            if retain:
+                if payload:
+                    self.retained[topic] = payload
+                else:
+                    self.retained.pop(topic, None)
+            clients = [c for c in self.clients if any(topic_matches(p, topic) for p in c.subscriptions)]
+        message = _packet(0x30, struct.pack(">H", len(topic)) + topic.encode() + payload)
+        for client in clients:
+            client.send(message)
+
+    def deliver_retained(self, client: _MQTTHandler, pattern: str) -> None:
+        with self.lock:
+            messages = [(t, p) for t, p in self.retained.items() if topic_matches(pattern, t)]
+        for topic, payload in messages:
+            client.send(_packet(0x31, struct.pack(">H", len(topic)) + topic.encode() + payload))
+
+    def start(self) -> "MQTTBrokerSimulator":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mqtt-sim", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
@@ -71,6 +71,26 @@ VARIABLES_SPEC = {
         # Časové okno pro koupání
         "bath_time_start": {"type": "int", "unit": "hodina", "default": 18, "desc": "Začátek období pro koupání"},
         "bath_time_end": {"type": "int", "unit": "hodina", "default": 21, "desc": "Konec období pro koupání"},
+
+        # === MILP režim ===
+        # Patrony jsou reálně relé (zapnuto/vypnuto) a charge_bat_min je podmínka na SOC
+        "milp_enabled": {"type": "bool", "default": False, "desc": "Binární model patron (on/off) a skutečná SOC podmínka ohřevu (MILP)"},
+        "milp_time_limit": {"type": "float", "unit": "s", "range": [1, None], "default": 30.0, "desc": "Časový limit MILP řešiče"},
+        "milp_gap": {"type": "float", "unit": "-", "range": [0, 1], "default": 0.01, "desc": "Relativní MIP gap, při kterém se řešení považuje za hotové"},
+        "presolve_enabled": {"type": "bool", "default": True, "desc": "Redukce modelu před řešičem (fixní proměnné, aliasy, duplicitní omezení)"},
+        "fast_path_enabled": {"type": "bool", "default": True, "desc": "Klidový plán bez řešiče, pokud je prokazatelně optimální (noc bez FVE, teplá nádrž)"},
+        "fast_path_verify": {"type": "bool", "default": False, "desc": "Ověřovat rychlou cestu řešením LP (zapíše rozdíl do fast_path_check)"},
+        "engine": {"type": "choice", "choices": ["auto", "lp", "dp"], "default": "auto", "desc": "Řešič plánu: LP (CBC), dynamické programování, nebo auto (DP jen bez CBC)"},
+        "dp_battery_step": {"type": "float", "unit": "kWh", "range": [0.05, None], "default": 0.5, "desc": "Krok mřížky SOC baterie pro DP engine"},
+        "dp_tank_step": {"type": "float", "unit": "kWh", "range": [0.5, None], "default": 3.0, "desc": "Krok mřížky energie zón nádrže pro DP engine"},
+        "dp_heater_steps": {"type": "int", "range": [1, 8], "default": 2, "desc": "Počet stupňů výkonu patron pro DP engine (2 = 0, 50, 100 %)"},
+        "decomposition_enabled": {"type": "bool", "default": False, "desc": "Vícedenní horizont řešit po blocích souběžně v pracovních procesech (heuristika, ne přesné optimum)"},
+        "decomposition_block_hours": {"type": "float", "unit": "h", "range": [6, None], "default": 24.0, "desc": "Délka bloku dekompozice"},
+        "decomposition_overlap_hours": {"type": "float", "unit": "h", "range": [0, None], "default": 24.0, "desc": "Překryv bloku s následujícím (koncové ocenění bloku)"},
+        "decomposition_max_iter": {"type": "int", "range": [1, 20], "default": 4, "desc": "Maximální počet souběžných iterací, pak se bloky dořeší postupně"},
+        "decomposition_tol": {"type": "float", "unit": "kWh", "range": [0, None], "default": 0.05, "desc": "Tolerance stavu zásobníků na hranicích bloků"},
+        # Další zařízení modelu (devices.build_devices): [{"type": "battery" | "tank" | "deferrable", "name": ..., ...}]
+        "devices": {"type": "devices", "default": [], "desc": "Další baterie, nádrže a odložitelné spotřebiče (JSON seznam, viz DOCS)"},
     }
 }
 
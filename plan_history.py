@@ -0,0 +1,267 @@
+"""
+plan_history.py
+---------------
+Historie plánů: kompaktní index uložených řešení a porovnání, jak se plán
+měnil mezi jednotlivými běhy optimalizace.
+
+Každý běh se kromě plného `result_<den>_<čas>.json` zapíše jedním řádkem do
+denního indexu `index_<den>.jsonl` (časy jako epoch sekundy, jen sledované
+řady zaokrouhlené na 3 desetinná místa). Diff i "vějíř" plánů za celý den se
+počítají z indexu vektorově nad společnou časovou osou, bez načítání
+stovek plných JSON souborů.
+
+Endpointy:
+• /api/plan_diff?runs=<den>_<čas>,<den>_<čas>[,...] – rozdíly po slotech mezi po sobě jdoucími běhy
+• /api/plan_fan?day=<den>&key=b_soc                  – všechny běhy daného dne na společné ose
+"""
+
+import os
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from flask import Blueprint, request, jsonify
+
+from actions import TIMELINE_ACTIONS
+from powerplan_environment import RESULTS_DIR
+from solution import Solution
+
+history_bp = Blueprint("history_bp", __name__)
+
+# Řady ukládané do indexu
+INDEX_SERIES = ["b_soc", "b_power", "g_buy", "g_sell", "h_in_lower", "h_in_upper"]
+# Akce ukládané do indexu (z actions_timeline) – režim střídače, patrony i cíle baterie
+INDEX_ACTIONS = TIMELINE_ACTIONS
+
+
+def _index_file(day: str) -> str:
+    return os.path.join(RESULTS_DIR, f"index_{day}.jsonl")
+
+
+def run_id_from_filename(filename: str) -> str:
+    """'result_20250714_120000.json' -> '20250714_120000'"""
+    return os.path.basename(filename)[len("result_"):].split(".")[0]
+
+
+def compact_record(solution: Dict[str, Any], filename: str) -> Dict[str, Any]:
+    """Vytvoří kompaktní záznam řešení pro denní index."""
+    solution = Solution.from_dict(solution)
+    outputs = solution.outputs
+    timeline = solution.get("actions_timeline", {})
+    results = solution.results
+    return {
+        "run": run_id_from_filename(filename),
+        "file": os.path.basename(filename),
+        "generated_at": solution.get("generated_at"),
+        "times": solution.epoch.astype(np.int64).tolist(),
+        "series": {
+            key: np.round(outputs[key].astype(float), 3).tolist()
+            for key in INDEX_SERIES if key in outputs
+        },
+        "actions": {
+            key: list(timeline[key]) for key in INDEX_ACTIONS if key in timeline
+        },
+        "objective": results.get("objective_value"),
+        "net_bilance": results.get("net_bilance"),
+    }
+
+
+def record_solution(solution: Dict[str, Any], filename: str) -> None:
+    """Připíše řešení do denního indexu (volá se po uložení result_*.json)."""
+    record = compact_record(solution, filename)
+    day = record["run"].split("_")[0]
+    if not os.path.exists(_index_file(day)):
+        # První běh dne po aktualizaci – zaindexuj i starší běhy (včetně tohoto)
+        _rebuild_index(day)
+        return
+    with open(_index_file(day), "a") as f:
+        f.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+
+def _rebuild_index(day: str) -> List[Dict[str, Any]]:
+    """Jednorázově vytvoří index dne ze starších plných result_*.json souborů."""
+    records = []
+    files = sorted(
+        f for f in os.listdir(RESULTS_DIR)
+        if f.startswith(f"result_{day}_") and f.endswith(".json")
+    )
+    for fname in files:
+        try:
+            with open(os.path.join(RESULTS_DIR, fname), "r") as f:
+                records.append(compact_record(json.load(f), fname))
+        except (json.JSONDecodeError, KeyError, ValueError) as e:
+            print(f"[WARN] {fname} nelze zaindexovat: {e}")
+    if records:
+        with open(_index_file(day), "w") as f:
+            for record in records:
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+    return records
+
+
+def load_index(day: str) -> List[Dict[str, Any]]:
+    """Načte denní index seřazený podle času běhu (chybějící index dopočítá)."""
+    path = _index_file(day)
+    if not os.path.exists(path):
+        return _rebuild_index(day)
+    records = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return sorted(records, key=lambda r: r["run"])
+
+
+def load_runs(run_ids: List[str]) -> List[Dict[str, Any]]:
+    """Najde záznamy podle id běhů '<den>_<čas>' (pořadí dle vstupu)."""
+    by_day: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    records = []
+    for run in run_ids:
+        day = run.split("_")[0]
+        if day not in by_day:
+            by_day[day] = {r["run"]: r for r in load_index(day)}
+        if run not in by_day[day]:
+            raise KeyError(run)
+        records.append(by_day[day][run])
+    return records
+
+
+def align(records: List[Dict[str, Any]], key: str, source: str = "series"):
+    """
+    Zarovná řadu `key` všech záznamů na společnou časovou osu.
+
+    Vrací (osa v epoch sekundách, matice běhy × sloty). Chybějící sloty jsou
+    NaN (číselné řady) nebo None (akce).
+    """
+    axis = np.unique(np.concatenate([np.asarray(r["times"], dtype=np.int64) for r in records]))
+    numeric = source == "series"
+    matrix = np.full((len(records), len(axis)), np.nan if numeric else None,
+                     dtype=np.float64 if numeric else object)
+    for i, r in enumerate(records):
+        values = r.get(source, {}).get(key)
+        if values is None:
+            continue
+        cols = np.searchsorted(axis, np.asarray(r["times"], dtype=np.int64))
+        matrix[i, cols] = np.asarray(values, dtype=matrix.dtype)
+    return axis, matrix
+
+
+def _iso(axis) -> List[str]:
+    return [datetime.fromtimestamp(int(t)).astimezone().isoformat() for t in axis]
+
+
+def _nan_to_none(values) -> List[Optional[float]]:
+    return [None if np.isnan(v) else float(v) for v in values]
+
+
+def diff_runs(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Rozdíly mezi po sobě jdoucími běhy na společné časové ose.
+
+    Pro každou řadu vrací per-slot rozdíl (novější − starší), pro akce seznam
+    slotů, kde se akce změnila, a rozdíl hodnoty účelové funkce.
+    """
+    if len(records) < 2:
+        raise ValueError("Pro porovnání jsou potřeba alespoň dva běhy")
+
+    axis, _ = align(records, INDEX_SERIES[0])
+    series = {}
+    for key in INDEX_SERIES:
+        _, matrix = align(records, key)
+        series[key] = np.diff(matrix, axis=0)
+
+    actions = {}
+    for key in INDEX_ACTIONS:
+        _, matrix = align(records, key, source="actions")
+        present = (matrix[1:] != None) & (matrix[:-1] != None)  # noqa: E711
+        actions[key] = (matrix, present & (matrix[1:] != matrix[:-1]))
+
+    times = _iso(axis)
+    diffs = []
+    for i in range(len(records) - 1):
+        older, newer = records[i], records[i + 1]
+        changed = {}
+        for key, (matrix, mask) in actions.items():
+            cols = np.nonzero(mask[i])[0]
+            changed[key] = [
+                {"time": times[j], "from": matrix[i, j], "to": matrix[i + 1, j]}
+                for j in cols
+            ]
+        objective_delta = None
+        if older.get("objective") is not None and newer.get("objective") is not None:
+            objective_delta = newer["objective"] - older["objective"]
+        net_delta = None
+        if older.get("net_bilance") is not None and newer.get("net_bilance") is not None:
+            net_delta = newer["net_bilance"] - older["net_bilance"]
+        diffs.append({
+            "from": older["run"],
+            "to": newer["run"],
+            "objective_delta": objective_delta,
+            "net_bilance_delta": net_delta,
+            "series": {key: _nan_to_none(d[i]) for key, d in series.items()},
+            "max_abs": {
+                key: (float(np.nanmax(np.abs(d[i]))) if np.any(~np.isnan(d[i])) else None)
+                for key, d in series.items()
+            },
+            "action_changes": changed,
+        })
+
+    return {"times": times, "runs": [r["run"] for r in records], "diffs": diffs}
+
+
+def plan_fan(day: str, key: str = "b_soc") -> Dict[str, Any]:
+    """Všechny běhy dne pro řadu `key` na společné ose + min/medián/max po slotech."""
+    records = load_index(day)
+    if not records:
+        raise KeyError(day)
+    axis, matrix = align(records, key)
+    # Každý slot společné osy má hodnotu alespoň z jednoho běhu
+    counts = np.sum(~np.isnan(matrix), axis=0)
+    stats = {
+        "min": np.nanmin(matrix, axis=0),
+        "median": np.nanmedian(matrix, axis=0),
+        "max": np.nanmax(matrix, axis=0),
+    }
+    return {
+        "day": day,
+        "key": key,
+        "times": _iso(axis),
+        "runs": [r["run"] for r in records],
+        "generated_at": [r.get("generated_at") for r in records],
+        "objective": [r.get("objective") for r in records],
+        "values": [_nan_to_none(row) for row in matrix],
+        "min": stats["min"].tolist(),
+        "median": stats["median"].tolist(),
+        "max": stats["max"].tolist(),
+        "count": counts.tolist(),
+    }
+
+
+# --- Web routes -----------------------------------------------------------
+
+@history_bp.route("/api/plan_diff")
+def api_plan_diff():
+    runs = [r for r in request.args.get("runs", "").split(",") if r]
+    if not runs:
+        # Bez parametrů porovnej poslední dva běhy dneška
+        day = request.args.get("day") or datetime.now().strftime("%Y%m%d")
+        runs = [r["run"] for r in load_index(day)[-2:]]
+    try:
+        return jsonify(diff_runs(load_runs(runs)))
+    except KeyError as e:
+        return jsonify({"error": f"Běh {e} nenalezen"}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@history_bp.route("/api/plan_fan")
+def api_plan_fan():
+    day = request.args.get("day") or datetime.now().strftime("%Y%m%d")
+    key = request.args.get("key", "b_soc")
+    if key not in INDEX_SERIES:
+        return jsonify({"error": f"Neznámá řada {key}, dostupné: {INDEX_SERIES}"}), 400
+    try:
+        return jsonify(plan_fan(day, key))
+    except KeyError:
+        return jsonify({"error": f"Pro den {day} nejsou uložené žádné běhy"}), 404
@@ -0,0 +1,115 @@
+"""
+plan_timeline.py
+----------------
+Publikace celého plánu akcí jako atributů jedné entity v HA.
+
+`sensor.powerplan_plan` nese kompletní `actions_timeline` zakódovaný po
+změnách: první záznam obsahuje všechny akce, každý další jen čas začátku
+slotu a akce, které se v něm mění. Velikost atributů tak roste s počtem
+přepnutí, ne s délkou horizontu.
+
+Stav entity je čas nejbližší změny (device_class timestamp), takže HA
+automatizace může přepnout režim přesně na hranici slotu triggerem na
+čas entity, bez čekání na další přepočet. Plán se znovu publikuje jen
+tehdy, když se oproti minule publikované verzi něco změnilo, nebo po
+REPUBLISH_INTERVAL (entitu z REST API HA po restartu neobnoví).
+"""
+
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from actions import TIMELINE_ACTIONS
+
+# Akce z actions_timeline, které HA potřebuje k lokálnímu provedení plánu
+TIMELINE_KEYS = TIMELINE_ACTIONS
+
+PLAN_ATTRIBUTES = {
+    "friendly_name": "Plán akcí (čas další změny)",
+    "device_class": "timestamp",
+    "icon": "mdi:calendar-clock",
+}
+
+# Nezměněný plán se jednou za čas publikuje znovu (jako publish_changed v data_connector)
+REPUBLISH_INTERVAL = 3600.0  # s
+
+_last_published: Optional[List[Dict[str, Any]]] = None
+_last_state: Optional[str] = None
+_last_time = 0.0
+
+
+def encode_changes(times: List[str], timeline: Dict[str, List[Any]],
+                   keys: List[str] = TIMELINE_KEYS) -> List[Dict[str, Any]]:
+    """
+    Zakóduje časové řady akcí po změnách.
+
+    Vrací seznam {"start": ISO čas, <akce>: hodnota, ...}; první záznam
+    obsahuje všechny akce, další jen ty, které se oproti předchozímu slotu
+    změnily. Sloty beze změny se vynechají.
+    """
+    keys = [k for k in keys if k in timeline]
+    changes: List[Dict[str, Any]] = []
+    previous: Dict[str, Any] = {}
+    for i, start in enumerate(times):
+        entry = {k: timeline[k][i] for k in keys if i == 0 or timeline[k][i] != previous[k]}
+        if entry:
+            changes.append({"start": start, **entry})
+        previous = {k: timeline[k][i] for k in keys}
+    return changes
+
+
+def decode_changes(changes: List[Dict[str, Any]], at: str) -> Dict[str, Any]:
+    """Vrátí akce platné v čase `at` (ISO) – opak `encode_changes`."""
+    moment = datetime.fromisoformat(at)
+    actions: Dict[str, Any] = {}
+    for entry in changes:
+        if datetime.fromisoformat(entry["start"]) > moment:
+            break
+        actions.update({k: v for k, v in entry.items() if k != "start"})
+    return actions
+
+
+def plan_state(changes: List[Dict[str, Any]], now: Optional[datetime] = None) -> Optional[str]:
+    """Čas nejbližší budoucí změny (ISO), nebo None, když plán už žádnou nemá."""
+    now = now or datetime.now().astimezone()
+    for entry in changes[1:]:
+        if datetime.fromisoformat(entry["start"]) > now:
+            return entry["start"]
+    return None
+
+
+def publish_plan(solution: Dict[str, Any], force: bool = False) -> bool:
+    """
+    Publikuje `sensor.powerplan_plan`, pokud se plán od minulé publikace
+    změnil nebo je publikace starší než REPUBLISH_INTERVAL.
+
+    Vrací True, když došlo k publikaci.
+    """
+    from data_connector import publish_to_ha
+
+    global _last_published, _last_state, _last_time
+    now = time.time()
+    changes = encode_changes(solution["times"], solution["actions_timeline"])
+    state = plan_state(changes) or "unknown"
+
+    # Porovnává se jen budoucnost – předchozí plán oříznutý o uplynulé sloty
+    # se shoduje, pokud se nic nezměnilo. Po uplynutí změny se ale musí
+    # posunout stav na další změnu, jinak by trigger v HA už nevystřelil.
+    if (not force and _last_published is not None and changes and state == _last_state
+            and now - _last_time <= REPUBLISH_INTERVAL):
+        start = changes[0]["start"]
+        current = decode_changes(_last_published, start)
+        tail = [e for e in _last_published if datetime.fromisoformat(e["start"]) > datetime.fromisoformat(start)]
+        if [{"start": start, **current}] + tail == changes:
+            return False
+
+    attributes = {
+        **PLAN_ATTRIBUTES,
+        "changes": changes,
+        "horizon_end": solution["times"][-1] if solution["times"] else None,
+    }
+    publish_to_ha({"plan": state}, "powerplan_", {"plan": attributes})
+    _last_published = changes
+    _last_state = state
+    _last_time = now
+    return True
@@ -0,0 +1,212 @@
+"""
+powerplan.py
+------------
+Dávkové spouštění optimalizátoru z příkazové řádky – bez Flasku, HA
+i přihlašovacích údajů.
+
+    python -m powerplan solve case.json day.csv ... [--output-dir out/]
+    python -m powerplan replay results/result_*.json [--set engine=dp]
+    python -m powerplan bench [argumenty engine_benchmark.py]
+
+• solve  – vstupy z JSON (tělo `/api/solve`: series, initials, hours, options,
+           dt; JSON může obsahovat i seznam případů) nebo z hodinového CSV
+           (`time,buy_price,sell_price,fve_pred,load_pred[,...]`, počáteční
+           stavy z `--bat-soc`, `--temp-lower`, `--temp-upper`),
+• replay – znovu vyřeší uložené `result_*.json` s jejich nastavením
+           (upraveným `--settings` / `--set`) a ukáže změnu účelové funkce,
+• bench  – porovnání LP a DP enginu, viz `engine_benchmark.py`.
+
+Případy se řeší souběžně v procesech (`--workers`). Každý dokončený případ
+se hned vypíše jako řádek JSON na stdout (souhrn `results`, s `--full` celé
+řešení); s `--output-dir` se celé řešení uloží do `<případ>.json` a na
+stdout jde jen souhrn.
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Případ: (název, series, initials, times, options, dt)
+Case = Tuple[str, Dict[str, List[float]], Dict[str, float], List[str], Dict[str, Any], List[float]]
+
+
+def _json_cases(path: str, base_options: Dict[str, Any]) -> Iterator[Case]:
+    with open(path, "r") as f:
+        data = json.load(f)
+    entries = data if isinstance(data, list) else [data]
+    stem = os.path.splitext(os.path.basename(path))[0]
+    for i, entry in enumerate(entries):
+        name = stem if len(entries) == 1 else f"{stem}_{i}"
+        # Tělo /api/solve i uložený result_*.json
+        series = entry.get("series") or entry.get("inputs")
+        times = entry.get("hours") or entry.get("times")
+        if series is None or times is None or "initials" not in entry:
+            raise ValueError(f"{path}: případ {i} nemá series/inputs, hours/times nebo initials")
+        dt = entry.get("dt") or [1.0] * len(times)
+        yield name, series, entry["initials"], times, {**(entry.get("options") or {}), **base_options}, dt
+
+
+def _csv_case(path: str, initials: Dict[str, float], base_options: Dict[str, Any]) -> Case:
+    from models import get_tuv_demand
+
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    hours = [datetime.fromisoformat(r["time"]) for r in rows]
+    hours = [h if h.tzinfo is not None else h.astimezone() for h in hours]
+    series = {key: [float(r[key]) for r in rows] for key in ("buy_price", "sell_price", "fve_pred", "load_pred")}
+    series["tuv_demand"] = [float(r["tuv_demand"]) if r.get("tuv_demand") else get_tuv_demand(h)
+                            for h, r in zip(hours, rows)]
+    series["heating_demand"] = [float(r.get("heating_demand") or 0.0) for r in rows]
+    series["outdoor_temps"] = [float(r.get("outdoor_temps") or 20.0) for r in rows]
+    dt = [float(r["dt"]) if r.get("dt") else 1.0 for r in rows]
+    name = os.path.splitext(os.path.basename(path))[0]
+    return name, series, dict(initials), [h.isoformat() for h in hours], dict(base_options), dt
+
+
+def load_cases(paths: List[str], initials: Dict[str, float], base_options: Dict[str, Any]) -> List[Case]:
+    cases = []
+    for path in paths:
+        if path.lower().endswith(".csv"):
+            cases.append(_csv_case(path, initials, base_options))
+        else:
+            cases.extend(_json_cases(path, base_options))
+    return cases
+
+
+def parse_overrides(settings_file: Optional[str], assignments: List[str]) -> Dict[str, Any]:
+    """Nastavení ze souboru a `--set klíč=hodnota`, ověřené proti `VARIABLES_SPEC`."""
+    from powerplan_whatif import candidate_settings
+
+    overrides: Dict[str, Any] = {}
+    if settings_file:
+        with open(settings_file, "r") as f:
+            overrides.update(json.load(f))
+    for assignment in assignments:
+        key, sep, value = assignment.partition("=")
+        if not sep:
+            raise ValueError(f"Očekáváno klíč=hodnota: {assignment}")
+        try:
+            overrides[key.strip()] = json.loads(value)  # čísla, true/false
+        except ValueError:
+            overrides[key.strip()] = value  # volby (engine=dp)
+    return candidate_settings({}, overrides)
+
+
+def run_cases(cases: List[Case], workers: Optional[int], time_limit: Optional[float]) -> Iterator[Tuple[Case, Any]]:
+    """Řeší případy souběžně a vrací je v pořadí dokončení (řešení nebo výjimka)."""
+    from powerplan_workers import solve_case
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = {pool.submit(solve_case, *case[1:], time_limit): case for case in cases}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = e
+            yield futures[future], result
+
+
+def emit(name: str, solution, output_dir: Optional[str], full: bool, extra: Optional[Dict[str, Any]] = None) -> None:
+    record: Dict[str, Any] = {"case": name}
+    if isinstance(solution, Exception):
+        record["error"] = str(solution)
+    else:
+        data = solution.to_dict()
+        if output_dir:
+            path = os.path.join(output_dir, f"{name}.json")
+            with open(path, "w") as f:
+                json.dump(data, f)
+            record["file"] = path
+        record.update(data if full and not output_dir else {"solver": data.get("solver"), "results": data["results"]})
+    record.update(extra or {})
+    print(json.dumps(record), flush=True)
+
+
+def cmd_solve(args) -> int:
+    overrides = parse_overrides(args.settings, args.set)
+    initials = {"bat_soc": args.bat_soc, "temp_lower": args.temp_lower, "temp_upper": args.temp_upper}
+    cases = load_cases(args.inputs, initials, overrides)
+    failed = 0
+    for (name, *_), solution in run_cases(cases, args.workers, args.time_limit):
+        failed += isinstance(solution, Exception)
+        emit(name, solution, args.output_dir, args.full)
+    return 1 if failed else 0
+
+
+def cmd_replay(args) -> int:
+    overrides = parse_overrides(args.settings, args.set)
+    stored = {}
+    cases = []
+    for path in args.results:
+        with open(path, "r") as f:
+            data = json.load(f)
+        if not all(k in data for k in ("inputs", "initials", "times", "dt")):
+            print(f"{path}: chybí vstupy, přeskočeno", file=sys.stderr)
+            continue
+        name = os.path.splitext(os.path.basename(path))[0]
+        stored[name] = data["results"].get("objective_value")
+        cases.append((name, data["inputs"], data["initials"], data["times"],
+                      {**(data.get("options") or {}), **overrides}, data["dt"]))
+
+    failed = 0
+    for (name, *_), solution in run_cases(cases, args.workers, args.time_limit):
+        failed += isinstance(solution, Exception)
+        extra = {}
+        if not isinstance(solution, Exception) and stored[name] is not None:
+            extra["objective_diff"] = solution["results"]["objective_value"] - stored[name]
+        emit(name, solution, args.output_dir, args.full, extra)
+    return 1 if failed else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m powerplan", description="Dávkové spouštění optimalizátoru")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--settings", default=None, help="JSON s nastavením optimalizátoru")
+    common.add_argument("--set", action="append", default=[], metavar="KLÍČ=HODNOTA",
+                        help="Přepsání jednoho parametru (lze opakovat)")
+    common.add_argument("--workers", type=int, default=os.cpu_count(), help="Počet procesů")
+    common.add_argument("--time-limit", type=float, default=None, help="Časový limit řešiče na případ [s]")
+    common.add_argument("--output-dir", default=None, help="Uložit celá řešení jako <případ>.json")
+    common.add_argument("--full", action="store_true", help="Vypsat na stdout celá řešení")
+
+    solve = sub.add_parser("solve", parents=[common], help="Vyřešit případy z JSON/CSV souborů")
+    solve.add_argument("inputs", nargs="+", help="Soubory .json (tělo /api/solve nebo result_*.json) nebo .csv")
+    solve.add_argument("--bat-soc", type=float, default=30.0, help="SOC baterie pro CSV vstupy [%%]")
+    solve.add_argument("--temp-lower", type=float, default=40.0, help="Teplota dolní zóny pro CSV vstupy [°C]")
+    solve.add_argument("--temp-upper", type=float, default=50.0, help="Teplota horní zóny pro CSV vstupy [°C]")
+    solve.set_defaults(func=cmd_solve)
+
+    replay = sub.add_parser("replay", parents=[common], help="Znovu vyřešit uložené result_*.json")
+    replay.add_argument("results", nargs="+", help="Soubory result_*.json")
+    replay.set_defaults(func=cmd_replay)
+
+    sub.add_parser("bench", add_help=False, help="Porovnání LP a DP enginu (engine_benchmark.py)")
+
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["bench"]:
+        import engine_benchmark
+
+        engine_benchmark.main(argv[1:])
+        return 0
+
+    args = parser.parse_args(argv)
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    try:
+        return args.func(args)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Chyba: {e}", file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
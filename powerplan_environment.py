@@ -1,4 +1,5 @@
 import os
+import json
 
 PORT = int(os.environ.get("PORT", "26781"))
 DATA_DIR = os.environ.get("HA_ADDON_DATA", "./data")
@@ -11,5 +12,27 @@ HA_ADDON = os.environ.get("HA_ADDON")
 RESULTS_DIR = os.path.join(DATA_DIR, "results")
 LATEST_LINK = os.path.join(RESULTS_DIR, "latest.json")
 LATEST_CSV = os.path.join(RESULTS_DIR, "latest.csv")
-# Ensure results directory exists on startup
-os.makedirs(RESULTS_DIR, exist_ok=True)
\ No newline at end of file
+# Maximální doba startu (import aplikace) v sekundách, nad ní se loguje varování
+STARTUP_BUDGET = float(os.environ.get("STARTUP_BUDGET", "1.0"))
+# Timeout gunicornu (s); synchronní API (/api/solve, /api/whatif) musí odpovědět dřív
+REQUEST_TIMEOUT = 120
+
+
+def ensure_dirs():
+    """Vytvoří datové adresáře. Volá se explicitně při startu, ne při importu."""
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+
+
+def addon_option(key, default=None):
+    """
+    Vrátí volbu add-onu z options.json, přebitelnou proměnnou prostředí
+    s názvem klíče velkými písmeny (např. REMOTECONTROL_MODE).
+    """
+    env = os.environ.get(key.upper())
+    if env is not None:
+        return env
+    try:
+        with open(OPTIONS_FILE, "r") as f:
+            return json.load(f).get(key, default)
+    except (FileNotFoundError, json.JSONDecodeError, ValueError):
+        return default
@@ -0,0 +1,90 @@
+"""
+powerplan_fallback.py
+---------------------
+Časový rozpočet řešiče a záložní plán.
+
+Plán musí být publikován včas před začátkem dalšího slotu. Rozpočet řešiče
+se proto odvozuje od nejbližší hranice slotu (a intervalu přepočtu). Když
+řešič rozpočet překročí nebo výpočet selže (např. HA je nedostupný),
+použije se předchozí plán posunutý na aktuální slot a označený jako záložní.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+from solution import Solution
+
+REFRESH_INTERVAL = 300.0  # s – interval plánovaného přepočtu (mpc_refresh)
+SOLVE_MARGIN = 10.0       # s – rezerva na publikaci před hranicí slotu
+MIN_SOLVE_BUDGET = 2.0    # s – minimální čas, který řešiči vždy dáme
+
+
+def solve_budget(hours: Sequence[datetime], now: Optional[datetime] = None) -> float:
+    """
+    Vrátí časový limit řešiče [s] – čas do nejbližší hranice slotu nebo do
+    dalšího přepočtu (co nastane dřív) mínus rezerva.
+    """
+    now = now or datetime.now().astimezone()
+    budget = REFRESH_INTERVAL
+    for h in hours:
+        remaining = (h.astimezone(now.tzinfo) - now).total_seconds()
+        if remaining > 0:
+            budget = min(budget, remaining)
+            break
+    return max(MIN_SOLVE_BUDGET, budget - SOLVE_MARGIN)
+
+
+def shift_solution(previous: Dict[str, Any], now: Optional[datetime] = None, reason: str = "") -> Solution:
+    """
+    Posune předchozí řešení na aktuální slot.
+
+    Zahodí sloty, které už skončily, zkrátí `dt[0]` na zbytek aktuálního
+    slotu a řešení označí klíčem "fallback". KPI a účelová funkce
+    (`results`) se přepočítají z posunutých výstupů; plán bez uložených
+    vstupů je nemá a `results` zůstanou prázdné. Akce se musí přepočítat
+    z posunutých výstupů (`powerplan_to_actions`).
+
+    Raises
+    ------
+    ValueError
+        Když předchozí plán nepokrývá aktuální čas.
+    """
+    now = now or datetime.now().astimezone()
+    previous = Solution.from_dict(previous)
+
+    # Index slotu, do kterého spadá aktuální čas (poslední slot má 1 h)
+    starts = previous.epoch
+    ends = np.append(starts[1:], starts[-1] + 3600.0) if len(starts) else starts
+    elapsed = now.timestamp() - starts
+    inside = np.flatnonzero((elapsed >= 0) & (now.timestamp() < ends))
+    if not len(inside):
+        raise ValueError("Předchozí plán nepokrývá aktuální čas")
+    current = int(inside[0])
+
+    # Sloupce jsou pohledy na předchozí řešení, dt je nutné zkopírovat
+    solution = previous.slice(current)
+    dt = previous.dt[current:].copy() if previous.dt is not None else np.ones(len(solution))
+    dt[0] = (ends[current] - now.timestamp()) / 3600.0
+    solution.dt = dt
+    solution.generated_at = now.isoformat()
+    solution["fallback"] = {
+        "reason": reason,
+        "source_generated_at": previous.generated_at,
+        "shifted_slots": current,
+    }
+    for key in ("actions", "actions_timeline"):
+        solution.pop(key, None)
+
+    # Výsledky předchozího plánu popisují celý neposunutý horizont
+    from powerplan_optimizer import run_mpc_optimizer
+
+    try:
+        evaluated = run_mpc_optimizer(
+            solution.inputs, solution.initials, solution.datetimes, solution.options, dt, plan=solution.outputs,
+        )
+        solution.results = evaluated.results
+    except (KeyError, TypeError):
+        solution.results = {}
+    return solution
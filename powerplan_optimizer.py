@@ -43,6 +43,17 @@ self‑explanatory:
 
 * ``dt`` – optional list of time step lengths [h], one per timestep. Default: 1.0.
 
+* ``time_limit`` – optional solver time budget [s]. When the solver does not
+  reach an optimal solution in time a ``RuntimeError`` is raised and the
+  caller falls back to the previous plan (see ``powerplan_fallback``).
+
+* ``plan`` – optional outputs of an existing plan (``PRIMAL_KEYS`` columns).
+  Nothing is solved; the plan is only evaluated – outputs, KPIs and the
+  objective over the given horizon (used for the shifted fallback plan).
+
+The result is a :class:`solution.Solution` (NumPy columns, dict-like access
+in the JSON layout of ``results/*.json``).
+
 This structure eliminates a long positional parameter list and makes it clear
 which values belong in which category – future options can be added without
 breaking the API.
@@ -51,18 +62,24 @@ breaking the API.
 from __future__ import annotations
 
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Sequence, Mapping, Any, List, Dict
-from pulp import LpProblem, LpMinimize, LpVariable, lpSum, LpStatusOptimal
 import logging
+import time
 
-from models.tank_losses import estimate_heating_losses
+import numpy as np
+
+from devices import Battery, Device, ModelContext, TwoZoneTank
+from fast_path import idle_plan, terminal_bands
+from models.tank_losses import compile_tank
 from options import VARIABLES_SPEC, get_option
+from solution import Solution
 
-# Nastavení základního logování
-logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+# Logování konfiguruje až aplikace (powerplan_server), modul jde importovat jako knihovna
+logger = logging.getLogger(__name__)
 
 def debug(msg):
-    logging.info(msg)
+    logger.info(msg)
 
 def clamp(value, min_value, max_value):
     """Omezí hodnotu na zadaný rozsah."""
@@ -86,13 +103,125 @@ def energy_to_temp(energy: float, volume: float, ref_temp: float) -> float:
     # Zahrnutí hustoty vody 1000 kg/m³
     return energy * 3600 / (volume * 1000 * 4.181) + ref_temp  # Převod z kWh na °C
 
+# Pořadí proměnných po slotech v `_primal` (klíče hodnot pro výstupy)
+PRIMAL_KEYS = (
+    "b_power", "b_charge", "b_discharge", "b_soc", "g_buy", "g_sell", "fve_unused", "h_in_lower", "h_in_upper",
+    "h_out_lower", "h_out_upper", "h_soc_lower", "h_soc_upper", "h_to_upper", "b_soc_under",
+)
+
+def _duals(prob, names: Sequence[str]) -> np.ndarray:
+    """Duální ceny omezení podle názvu; omezení, která presolve převedl na meze, mají 0."""
+    constraints = prob.constraints
+    return np.fromiter(
+        ((constraints[name].pi or 0.0) if name in constraints else 0.0 for name in names),
+        dtype=float, count=len(names),
+    )
+
+
+def _primal(var_dicts: Sequence[Mapping[int, Any]], n: int) -> np.ndarray:
+    """Hodnoty proměnných po řešení jako matice (řada × slot) jedním průchodem.
+
+    Proměnné bez hodnoty (např. nepoužité v žádném omezení) se berou jako 0.
+    """
+    values = np.fromiter(
+        (var.varValue or 0.0 for variables in var_dicts for var in variables.values()),
+        dtype=float,
+        count=len(var_dicts) * n,
+    )
+    return values.reshape(len(var_dicts), n)
+
+def _cbc(time_limit: float | None = None, gap: float | None = None, warm_start: bool = False):
+    """CBC řešič bez výpisů na stdout, volitelně s časovým limitem a MIP gapem."""
+    from pulp import PULP_CBC_CMD
+
+    return PULP_CBC_CMD(msg=False, timeLimit=time_limit, gapRel=gap, warmStart=warm_start)
+
+
+@lru_cache(maxsize=1)
+def _cbc_available() -> bool:
+    """Je k dispozici PuLP s binárkou CBC? (engine `auto` jinak přepne na DP)"""
+    try:
+        from pulp import PULP_CBC_CMD
+    except ImportError:
+        return False
+    return bool(PULP_CBC_CMD().available())
+
+
+def _clamp(var, value):
+    """Hodnota omezená na meze proměnné (None zůstává None)."""
+    if value is None:
+        return None
+    if var.lowBound is not None:
+        value = max(value, var.lowBound)
+    if var.upBound is not None:
+        value = min(value, var.upBound)
+    return value
+
+
+def _solve_milp(prob, binaries, time_limit: float, gap: float) -> str:
+    """
+    Vyřeší MILP s heuristikou zaokrouhlení LP relaxace jako výchozím řešením.
+
+    1. Vyřeší LP relaxaci (binární proměnné jako spojité 0–1).
+    2. Binární proměnné zaokrouhlí, zafixuje a dořeší LP – pokud je přípustné,
+       je to výchozí řešení (incumbent) pro CBC.
+    3. Vyřeší MILP s warm startem, časovým limitem a MIP gapem.
+
+    Pokud CBC v limitu nenajde lepší řešení, použije se zaokrouhlené řešení.
+    Vrací, odkud pochází výsledné řešení ("milp", "rounding").
+    """
+    from pulp import LpContinuous, LpInteger, LpStatusOptimal, LpSolutionIntegerFeasible, LpSolutionOptimal
+
+    deadline = time.monotonic() + time_limit
+
+    for var in binaries:
+        var.cat = LpContinuous
+    prob.solve(_cbc(time_limit=time_limit))
+    relaxed_ok = prob.status == LpStatusOptimal
+
+    incumbent = None
+    if relaxed_ok:
+        rounded = {var: (1 if (var.varValue or 0.0) >= 0.5 else 0) for var in binaries}
+        for var, value in rounded.items():
+            var.lowBound = var.upBound = value
+        prob.solve(_cbc(time_limit=max(1.0, deadline - time.monotonic())))
+        if prob.status == LpStatusOptimal:
+            incumbent = {var: var.varValue for var in prob.variables()}
+        for var in binaries:
+            var.lowBound, var.upBound = 0, 1
+
+    # PuLP ukládá binární proměnné jako celočíselné s mezemi 0–1
+    for var in binaries:
+        var.cat = LpInteger
+    if incumbent is not None:
+        for var, value in incumbent.items():
+            # Presolve převádí řádky na meze; hodnoty z CBC je mohou překročit o zaokrouhlení
+            var.setInitialValue(_clamp(var, value))
+
+    remaining = max(1.0, deadline - time.monotonic())
+    prob.solve(_cbc(time_limit=remaining, gap=gap, warm_start=incumbent is not None))
+    if prob.sol_status in (LpSolutionOptimal, LpSolutionIntegerFeasible):
+        return "milp"
+
+    if incumbent is None:
+        return "none"
+    debug("MILP bez řešení v časovém limitu, použito zaokrouhlené LP řešení")
+    for var, value in incumbent.items():
+        var.varValue = value
+    prob.status = LpStatusOptimal
+    return "rounding"
+
+
 def run_mpc_optimizer(
     series: Mapping[str, Sequence[float]],
     initials: Mapping[str, float],
     hours: Sequence[datetime],
     options: Mapping[str, Any] | None = None,
     dt: Sequence[float] | None = None,
-) -> Dict[str, Dict[str, List[float]]]:
+    time_limit: float | None = None,
+    devices: Sequence[Device] = (),
+    plan: Mapping[str, Sequence[float]] | None = None,
+) -> Solution:
     debug(f"run_mpc_optimizer called with options: {options}")
     debug(f"series keys: {list(series.keys())}")
     debug(f"initials: {initials}")
@@ -101,6 +230,9 @@ def run_mpc_optimizer(
     indexes = range(len(hours))
     if dt is None:
         dt = [1.0] * len(hours)
+    if devices:
+        # Rychlá cesta, DP engine a dekompozice znají jen výchozí baterii a nádrž
+        logger.info(f"Další zařízení ({', '.join(d.name for d in devices)}): řeší se jen LP/MILP")
 
     # Kontext pro odvozené hodnoty
     context = {}
@@ -108,6 +240,9 @@ def run_mpc_optimizer(
 
     heating_enabled = get_option(options, "heating_enabled")
     charge_bat_min = get_option(options, "charge_bat_min")
+    milp_enabled = get_option(options, "milp_enabled")
+    milp_time_limit = get_option(options, "milp_time_limit")
+    milp_gap = get_option(options, "milp_gap")
     b_cap = get_option(options, "b_cap")
     b_min = get_option(options, "b_min", context=context)
     b_max = get_option(options, "b_max", context=context)
@@ -168,264 +303,374 @@ def run_mpc_optimizer(
     debug(f"soc_bat_init={soc_bat_init}, soc_lower_init={soc_lower_init}, soc_upper_init={soc_upper_init}")
     debug(f"h_lower_cap={h_lower_cap}, h_upper_cap={h_upper_cap}, h_lower_vol={h_lower_vol}, h_upper_vol={h_upper_vol}")
 
-    prob = LpProblem("EnergyMPC", LpMinimize)
-
-    # Přejmenování všech stavových proměnných a výstupů na lower_snake_case
-    b_power = LpVariable.dicts("b_power", indexes, -b_power_max, b_power_max)
-    b_soc = LpVariable.dicts("b_soc", indexes, b_min, b_max)
-    b_charge = LpVariable.dicts("b_charge", indexes, 0, b_power_max)
-    b_discharge = LpVariable.dicts("b_discharge", indexes, 0, b_power_max)
-    h_in_lower = LpVariable.dicts("h_in_lower", indexes, 0, h_lower_power)
-    h_in_upper = LpVariable.dicts("h_in_upper", indexes, 0, h_upper_power)
-    h_soc_lower = LpVariable.dicts("h_soc_lower", indexes, 0, h_lower_cap)
-    h_soc_upper = LpVariable.dicts("h_soc_upper", indexes, 0, h_upper_cap)
-    h_out_lower = LpVariable.dicts("h_out_lower", indexes, 0)
-    h_out_upper = LpVariable.dicts("h_out_upper", indexes, 0)
-    # Heat flow from lower to upper (can be negative for reverse flow)
-    h_to_upper = LpVariable.dicts("h_to_upper", indexes)
-    # Pomocná proměnná pro kladnou část rozdílu teplot mezi zónami
-    h_delta_temp = LpVariable.dicts("h_delta_temp", indexes, 0)
-
-    # Definice proměnných pro nákup, prodej a nevyužitou PV
-    g_buy = LpVariable.dicts("g_buy", indexes, 0)
-    g_sell = LpVariable.dicts("g_sell", indexes, 0)
-    fve_unused = LpVariable.dicts("fve_unused", indexes, 0)
-
-    # Penalizace za SOC pod prahem v každém kroku
+    # Parametry účelové funkce (sdílené LP a rychlou cestou)
     bat_under_penalty = get_option(options, "bat_under_penalty")
     bat_threshold = bat_threshold_pct * b_cap
-    b_soc_under = LpVariable.dicts("b_soc_under", indexes, 0)
-    for t in indexes:
-        prob += b_soc_under[t] >= bat_threshold - b_soc[t]
-        prob += b_soc_under[t] >= 0
-
     threshold = bat_threshold_pct * b_cap
     t_end = max(indexes)
-    b_short = LpVariable("b_short", 0, threshold)
-    b_surplus = LpVariable("b_surplus", 0, b_cap - threshold)
-    prob += b_short + b_surplus == b_soc[t_end]
-
-    for t in indexes:
-        prob += b_power[t] == b_charge[t] - b_discharge[t]
-
     # Parametry pro ocenění energie v nádrži v konkrétní hodinu
     tank_value_hour = get_option(options, "tank_value_hour")
     tank_value_bonus = get_option(options, "tank_value_bonus")  # Kč/kWh
     tank_value_indexes = [i for i, h in enumerate(hours) if h.hour == tank_value_hour]
+    parasitic_water_heating = get_option(options, "parasitic_water_heating")
+    tank = compile_tank(h_lower_cap, h_upper_cap, h_lower_vol, h_upper_vol, alpha)
+
+    def assemble(values, b_short, b_surplus, objective_value, extra) -> Solution:
+        """Výstupy a KPI z hodnot proměnných (řada → pole) nad poli NumPy."""
+        (v_b_power, v_b_charge, v_b_discharge, v_b_soc, v_g_buy, v_g_sell, v_fve_unused, v_h_in_lower,
+         v_h_in_upper, v_h_out_lower, v_h_out_upper, v_h_soc_lower, v_h_soc_upper, v_h_to_upper,
+         v_b_soc_under) = (values[k] for k in PRIMAL_KEYS)
+        dt_arr = np.asarray(dt, dtype=float)
+        buy_arr = np.asarray(buy_price, dtype=float)
+        sell_arr = np.asarray(sell_price, dtype=float)
+        buy_cost = v_g_buy * buy_arr
+        sell_income = v_g_sell * sell_arr
+        h_in_total = v_h_in_lower + v_h_in_upper
+
+        outputs = {
+            "b_power": v_b_power,
+            "b_charge": v_b_charge,
+            "b_discharge": v_b_discharge,
+            "b_soc": v_b_soc,
+            "b_soc_percent": (100 * v_b_soc / b_cap).astype(int),
+            "g_buy": v_g_buy,
+            "g_sell": v_g_sell,
+            "buy_cost": buy_cost,
+            "sell_income": sell_income,
+            "net_step_cost": buy_cost - sell_income,
+            "fve_unused": v_fve_unused,
+            # nové průběhy dvou-zónové nádrže
+            "h_in_lower": v_h_in_lower,
+            "h_in_upper": v_h_in_upper,
+            "h_out_lower": v_h_out_lower,
+            "h_out_upper": v_h_out_upper,
+            "h_soc_lower": v_h_soc_lower,
+            "h_soc_upper": v_h_soc_upper,
+            "h_soc_upper_percent": 100 * v_h_soc_upper / h_upper_cap,
+            "h_soc_lower_percent": 100 * v_h_soc_lower / h_lower_cap,
+            "h_to_upper": v_h_to_upper,
+            # Teploty dolní a horní zóny [°C]
+            "temp_lower": energy_to_temp(v_h_soc_lower, h_lower_vol, h_lower_min_t),
+            "temp_upper": energy_to_temp(v_h_soc_upper, h_upper_vol, h_upper_min_t),
+        }
+        # Průběhy dalších zařízení (klíče s prefixem zařízení)
+        outputs.update({k: v for k, v in values.items() if k not in PRIMAL_KEYS})
+
+        results = {}
+        results["grid_consumption"] = v_g_buy.sum()  # Celková spotřeba z gridu
+        results["grid_injection"] = v_g_sell.sum()  # Celková
+        results["total_buy_cost"] = buy_cost.sum()
+        results["total_sell_income"] = sell_income.sum()
+        results["net_bilance"] = outputs["net_step_cost"].sum()
+        results["total_charged"] = v_b_charge.sum()  # Total energy charged to the battery
+        results["total_discharged"] = v_b_discharge.sum()  # Total energy discharged from the battery
+        results["total_battery_penalty"] = battery_penalty * (v_b_discharge @ dt_arr)
+        results["total_fve_unused_penalty"] = fve_unused_penalty * (v_fve_unused @ dt_arr)
+        results["total_bat_price_above"] = bat_price_above * b_surplus
+        results["total_bat_price_below"] = bat_price_below * (threshold - b_short)
+        # Celková hodnota energii v obou zónách na konci
+        results["total_final_boiler_value"] = final_boiler_price * (v_h_soc_lower[t_end] + v_h_soc_upper[t_end])
+        # Bonus za energii v horní zóně na konci
+        results["final_upper_zone_bonus"] = upper_zone_priority * v_h_soc_upper[t_end]
+        results["total_fve_unused"] = v_fve_unused @ dt_arr
+        # Bonifikace za ohřev v obou zónách
+        results["total_water_priority_bonus"] = water_priority_bonus * (h_in_total @ dt_arr)
+        # Bonus za prioritní ohřev horní zóny
+        results["total_upper_zone_priority"] = upper_zone_priority * (v_h_in_upper @ dt_arr)
+        results["total_battery_under_penalty"] = bat_under_penalty * (v_b_soc_under @ dt_arr)
+        # Bonus hodnoty tepla v obou zónách ve vybraných hodinách
+        results["tank_value_bonus"] = tank_value_bonus * (v_h_soc_lower[tank_value_indexes] + v_h_soc_upper[tank_value_indexes]).sum()
+        results["objective_value"] = objective_value
+
+        # Výpočet celkové parazitní energie při ohřevu vody a její rozdělení podle SOC baterie (ex-post)
+        parasitic = parasitic_water_heating * h_in_total * dt_arr
+        to_battery = v_b_soc < b_cap
+        results["total_parasitic_energy"] = parasitic.sum()
+        results["total_parasitic_to_battery"] = parasitic[to_battery].sum()
+        results["total_parasitic_to_grid"] = parasitic[~to_battery].sum()
+        if "b_value" in outputs:
+            # Hodnota 1 kWh v baterii teď (duální cena, jen LP)
+            results["battery_kwh_value"] = outputs["b_value"][0]
+        results = {k: float(v) if v is not None else None for k, v in results.items()}
+
+        debug(f"b_cap: {b_cap}, b_min: {b_min}, b_max: {b_max}, h_lower_cap: {h_lower_cap}, h_upper_cap: {h_upper_cap}")
+        debug(f"outputs keys: {list(outputs.keys())}")
+        debug(f"results: {results}")
+
+        return Solution(
+            hours,
+            series,
+            outputs,
+            dt=dt,
+            generated_at=datetime.now().isoformat(),
+            initials=initials,
+            results=results,
+            options=options,
+            extra=extra,
+        )
+
+    def objective(values, b_short, b_surplus) -> float:
+        """Účelová funkce LP vyhodnocená nad hodnotami proměnných (plány skládané mimo LP)."""
+        dt_arr = np.asarray(dt, dtype=float)
+        return float(
+            ((np.asarray(buy_price) * values["g_buy"] - np.asarray(sell_price) * values["g_sell"]
+              + battery_penalty * values["b_discharge"] + fve_unused_penalty * values["fve_unused"]
+              - water_priority_bonus * (values["h_in_lower"] + values["h_in_upper"])
+              - upper_zone_priority * values["h_in_upper"]
+              + bat_under_penalty * values["b_soc_under"]) @ dt_arr)
+            - bat_price_above * b_surplus
+            + bat_price_below * (threshold - b_short)
+            - final_boiler_price * (values["h_soc_lower"][t_end] + values["h_soc_upper"][t_end])
+            - upper_zone_priority * values["h_soc_upper"][t_end]
+            - tank_value_bonus * values["h_soc_upper"][tank_value_indexes].sum()
+        )
+
+    # Vyhodnocené parametry pro řešení bez PuLP (rychlá cesta, DP engine)
+    plan_params = dict(
+        tuv_demand=tuv_demand, heating_demand=heating_demand, fve_pred=fve_pred,
+        buy_price=buy_price, sell_price=sell_price, load_pred=load_pred, dt=dt,
+        heating_enabled=heating_enabled, tank=tank,
+        soc_bat_init=soc_bat_init, soc_lower_init=soc_lower_init, soc_upper_init=soc_upper_init,
+        b_cap=b_cap, b_min=b_min, b_max=b_max, b_eff_in=b_eff_in, b_eff_out=b_eff_out,
+        grid_limit=grid_limit, battery_penalty=battery_penalty, bat_under_penalty=bat_under_penalty,
+        bat_threshold=bat_threshold, bat_price_above=bat_price_above, bat_price_below=bat_price_below,
+        final_boiler_price=final_boiler_price, water_priority_bonus=water_priority_bonus,
+        upper_zone_priority=upper_zone_priority, tank_value_bonus=tank_value_bonus,
+        tank_value_indexes=tank_value_indexes, parasitic_water_heating=parasitic_water_heating,
+    )
+
+    if plan is not None:
+        # Jen vyhodnocení zadaného plánu (stejně jako výsledek dekompozice)
+        values = {k: np.asarray(plan[k], dtype=float) for k in PRIMAL_KEYS if k != "b_soc_under"}
+        values["b_soc_under"] = np.maximum(0.0, bat_threshold - values["b_soc"])
+        if "b_value" in plan:
+            values["b_value"] = np.asarray(plan["b_value"], dtype=float)
+        b_short, b_surplus = terminal_bands(
+            values["b_soc"][t_end], b_cap, bat_threshold, bat_price_above, bat_price_below,
+        )
+        return assemble(values, b_short, b_surplus, objective(values, b_short, b_surplus), {})
+
+    # Rychlá cesta: klidový plán bez sestavení modelu, pokud je prokazatelně optimální
+    fast_path_verify = get_option(options, "fast_path_verify")
+    idle = None
+    if (get_option(options, "fast_path_enabled") or fast_path_verify) and not devices:
+        fast_start = time.monotonic()
+        check = idle_plan(**plan_params)
+        idle = check.plan
+        fast_time = time.monotonic() - fast_start
+        debug(f"Fast path: {'klidový plán' if idle is not None else check.reason} ({fast_time * 1000:.2f} ms)")
+        if idle is not None and not fast_path_verify:
+            return assemble(idle.values, idle.b_short, idle.b_surplus, idle.objective_value, {
+                "status": "Optimal",
+                "solver": "fast_path",
+                "solve_time": fast_time,
+                "model_size": None,
+            })
+
+    # Vícedenní horizont: bloky s překryvem řešené souběžně, svázané stavem zásobníků
+    decomposition_hours = get_option(options, "decomposition_block_hours") + get_option(options, "decomposition_overlap_hours")
+    if get_option(options, "decomposition_enabled") and sum(dt) > decomposition_hours and not devices:
+        from decomposition import solve_decomposed
+
+        def block_initials(state):
+            soc, lower, upper = state
+            return {
+                **initials,
+                "bat_soc": 100 * soc / b_cap,
+                "temp_lower": energy_to_temp(lower, h_lower_vol, h_lower_min_t),
+                "temp_upper": energy_to_temp(upper, h_upper_vol, h_upper_min_t),
+            }
+
+        decomposition_start = time.monotonic()
+        try:
+            result = solve_decomposed(
+                series, hours,
+                # Bloky bez další dekompozice, odvozené ceny z celého horizontu
+                {**options, "decomposition_enabled": False, "devices": [], "final_boiler_price": final_boiler_price,
+                 "bat_price_below": bat_price_below, "bat_price_above": bat_price_above},
+                dt, (soc_bat_init, soc_lower_init, soc_upper_init), block_initials,
+                block_hours=get_option(options, "decomposition_block_hours"),
+                overlap_hours=get_option(options, "decomposition_overlap_hours"),
+                max_iter=get_option(options, "decomposition_max_iter"),
+                tol=get_option(options, "decomposition_tol"),
+                time_limit=time_limit,
+            )
+        except Exception as e:
+            logger.warning(f"Dekompozice selhala ({e}), řeší se celý horizont najednou")
+            result = None
+            if time_limit is not None:
+                # Celý horizont jen ve zbytku časového limitu
+                time_limit = max(1.0, time_limit - (time.monotonic() - decomposition_start))
+        if result is not None:
+            decomposition_time = time.monotonic() - decomposition_start
+            debug(f"Dekompozice: {result.summary()} ({decomposition_time:.3f}s)")
+            values = {k: result.values[k] for k in PRIMAL_KEYS if k != "b_soc_under"}
+            values["b_soc_under"] = np.maximum(0.0, bat_threshold - values["b_soc"])
+            b_short, b_surplus = terminal_bands(
+                values["b_soc"][t_end], b_cap, bat_threshold, bat_price_above, bat_price_below,
+            )
+            return assemble(values, b_short, b_surplus, objective(values, b_short, b_surplus), {
+                "status": "Optimal",
+                "solver": "decomposition",
+                "solve_time": decomposition_time,
+                "model_size": None,
+                "decomposition": result.summary(),
+            })
+
+    # DP engine: řešení bez PuLP/CBC (auto jen tam, kde CBC chybí)
+    engine = get_option(options, "engine")
+    if engine == "auto" or devices:
+        # DP engine modeluje jen výchozí baterii a nádrž
+        engine = "lp" if _cbc_available() or devices else "dp"
+    if engine == "dp":
+        from dp_engine import solve_dp
+
+        dp_start = time.monotonic()
+        plan = solve_dp(
+            **plan_params,
+            inverter_limit=inverter_limit, b_power_max=b_power_max,
+            h_lower_power=h_lower_power, h_upper_power=h_upper_power,
+            charge_bat_min=charge_bat_min, fve_unused_penalty=fve_unused_penalty,
+            battery_step=get_option(options, "dp_battery_step"),
+            tank_step=get_option(options, "dp_tank_step"),
+            # MILP režim: patrony jen vypnuto / plný výkon
+            heater_levels=np.linspace(0.0, 1.0, 2 if milp_enabled else get_option(options, "dp_heater_steps") + 1),
+        )
+        dp_time = time.monotonic() - dp_start
+        debug(f"DP engine: {dp_time:.3f}s")
+        return assemble(plan.values, plan.b_short, plan.b_surplus, plan.objective_value, {
+            "status": "Optimal",
+            "solver": "dp",
+            "solve_time": dp_time,
+            "model_size": None,
+        })
+
+    # PuLP se načítá až při prvním řešení (rychlý start serveru)
+    from pulp import LpProblem, LpMinimize, LpVariable, lpSum, LpStatusOptimal, LpStatus, LpBinary, LpContinuous
+
+    prob = LpProblem("EnergyMPC", LpMinimize)
+    model = ModelContext(prob, indexes, dt, milp=milp_enabled)
+
+    # Zařízení: výchozí baterie a dvouzónová nádrž (názvy proměnných b_*, h_*) + další z `devices`
+    battery = Battery(
+        cap=b_cap, soc_min=b_min, soc_max=b_max, power=b_power_max, eff_in=b_eff_in, eff_out=b_eff_out,
+        soc_init=soc_bat_init,
+        # Při odběru tepla necháme v baterii rezervu 10 %
+        soc_limit=[b_cap * 0.9 if heating_demand[t] > 0 or tuv_demand[t] > 0 else b_cap for t in indexes],
+        discharge_penalty=battery_penalty, under_penalty=bat_under_penalty, threshold=threshold,
+        price_above=bat_price_above, price_below=bat_price_below,
+    )
+    boiler = TwoZoneTank(
+        tank=tank, lower_power=h_lower_power, upper_power=h_upper_power,
+        out_lower=[heating_demand[t] if heating_enabled else 0 for t in indexes], out_upper=tuv_demand,
+        soc_lower_init=soc_lower_init, soc_upper_init=soc_upper_init, parasitic=parasitic_water_heating,
+        heating_bonus=water_priority_bonus, upper_bonus=upper_zone_priority, final_price=final_boiler_price,
+        value_bonus=tank_value_bonus, value_indexes=tank_value_indexes,
+    )
+    all_devices = [battery, boiler, *devices]
+    for device in all_devices:
+        device.build(model)
+    binaries = model.binaries
+
+    # Sběrnice: nákup, prodej a nevyužitá FVE
+    g_buy = LpVariable.dicts("g_buy", indexes, 0)
+    g_sell = LpVariable.dicts("g_sell", indexes, 0)
+    fve_unused = LpVariable.dicts("fve_unused", indexes, 0)
 
     prob += (
         lpSum(
             (g_buy[t] * buy_price[t]
              - g_sell[t] * sell_price[t]
-             + battery_penalty * b_discharge[t]
-             + fve_unused_penalty * fve_unused[t]
-             - water_priority_bonus * (h_in_lower[t] + h_in_upper[t])
-             - upper_zone_priority * h_in_upper[t]
-             + bat_under_penalty * b_soc_under[t]) * dt[t]
+             + fve_unused_penalty * fve_unused[t]) * dt[t]
             for t in indexes
         )
-        - bat_price_above * b_surplus
-        + bat_price_below * (threshold - b_short)
-        - final_boiler_price * (h_soc_lower[t_end] + h_soc_upper[t_end])
-        - upper_zone_priority * h_soc_upper[t_end]
-        - tank_value_bonus * lpSum(h_soc_upper[t] for t in tank_value_indexes)
+        + lpSum(device.objective(model) for device in all_devices)
     )
 
-    # Unified two-zone boiler constraints
     for t in indexes:
-        # Battery SOC dynamics
-        if t == 0:
-            prob += b_soc[t] == soc_bat_init + (b_charge[t] * b_eff_in - b_discharge[t] / b_eff_out) * dt[t]
-        else:
-            prob += b_soc[t] == b_soc[t-1] + (b_charge[t] * b_eff_in - b_discharge[t] / b_eff_out) * dt[t]
-
-        # Outputs from boiler zones
-        prob += h_out_upper[t] == tuv_demand[t]
-        prob += h_out_lower[t] == (heating_demand[t] if heating_enabled else 0)
-
-        # Parazitní ztráty nyní z obou patron
-        parasitic_water_heating = get_option(options, "parasitic_water_heating")
-        parasitic_energy = parasitic_water_heating * (h_in_lower[t] + h_in_upper[t])
-
-        # Energetická bilance s oběma patronami
+        # Energetická bilance sběrnice se všemi zařízeními
         prob += (
-            fve_pred[t] + g_buy[t] + b_discharge[t] * b_eff_out ==
-            load_pred[t] + b_charge[t] / b_eff_in + (h_in_lower[t] + h_in_upper[t] + parasitic_energy) + g_sell[t] + fve_unused[t]
+            fve_pred[t] + g_buy[t] ==
+            load_pred[t] + lpSum(device.bus(t) for device in all_devices) + g_sell[t] + fve_unused[t],
+            f"balance_{t}",
         )
-
-        # Heat transfer lower->upper based on energy difference (linearized approach)
-        # Since temperature is proportional to energy/volume, we can use SOC directly
-        # Convert alpha from temperature-based to energy-based coefficient
-        
-        if t == 0:
-            lower_soc_available = soc_lower_init
-            upper_soc_available = soc_upper_init
-            # Use previous SOC for heat transfer calculation
-            lower_soc_for_transfer = soc_lower_init
-            upper_soc_for_transfer = soc_upper_init
-        else:
-            lower_soc_available = h_soc_lower[t-1]
-            upper_soc_available = h_soc_upper[t-1]
-            # Use previous SOC for heat transfer calculation
-            lower_soc_for_transfer = h_soc_lower[t-1]
-            upper_soc_for_transfer = h_soc_upper[t-1]
-        
-        # Linearized heat transfer based on energy difference
-        # Convert temperature difference to energy difference for linear model
-        # alpha_energy adjusts the original alpha coefficient for energy-based calculation
-        alpha_energy = alpha * 3600 / 4181  # Convert from temperature-based to energy-based
-        
-        # Normalize by volume to account for different zone sizes
-        lower_energy_density = lower_soc_for_transfer / h_lower_vol if h_lower_vol > 0 else 0
-        upper_energy_density = upper_soc_for_transfer / h_upper_vol if h_upper_vol > 0 else 0
-        
-        # Heat transfer proportional to energy density difference
-        prob += h_to_upper[t] == alpha_energy * (lower_energy_density - upper_energy_density)
-        
-        # Physical constraints: heat transfer cannot exceed available energy in source zone
-        # When heat flows from lower to upper (h_to_upper[t] > 0)
-        prob += h_to_upper[t] <= lower_soc_available
-        # When heat flows from upper to lower (h_to_upper[t] < 0)
-        prob += h_to_upper[t] >= -upper_soc_available
-        
-
-        # Lower zone SOC dynamics
-        loss_lower = estimate_heating_losses(
-            (h_soc_lower[t - 1] if t > 0 else soc_lower_init ),
-            h_lower_cap, T_ambient=20, cirk_time=0.3
-        )
-
-        loss_upper = estimate_heating_losses(
-            (h_soc_upper[t - 1] if t > 0 else soc_upper_init),
-             h_upper_cap, T_ambient=20, cirk_time=0.3
-        )
-
-        # Zone SOC dynamics - physically correct model
-        # Lower zone: heated by lower heater, loses heat through transfer to upper zone and direct output
-        # Upper zone: heated by upper heater, gains heat from lower zone, loses heat through output
-        
-        if t == 0:
-            prob += h_soc_lower[t] == soc_lower_init + (h_in_lower[t] - h_to_upper[t] - h_out_lower[t] - loss_lower) * dt[t]
-            prob += h_soc_upper[t] == soc_upper_init + (h_in_upper[t] + h_to_upper[t] - h_out_upper[t] - loss_upper) * dt[t]
-        else:
-            prob += h_soc_lower[t] == h_soc_lower[t - 1] + (h_in_lower[t] - h_to_upper[t] - h_out_lower[t] - loss_lower) * dt[t]
-            prob += h_soc_upper[t] == h_soc_upper[t - 1] + (h_in_upper[t] + h_to_upper[t] - h_out_upper[t] - loss_upper) * dt[t]
-
-        # Heater power limits and grid/inverter constraints
-        prob += h_in_lower[t] <= h_lower_power
-        prob += h_in_upper[t] <= h_upper_power
-        prob += g_buy[t] + b_charge[t] + (h_in_lower[t] + h_in_upper[t]) <= grid_limit
-        prob += b_discharge[t] + (h_in_lower[t] + h_in_upper[t]) + g_sell[t] <= inverter_limit
-
-    # Dynamické omezení SOC baterie podle plánu ohřevu nádrže
-    for t in indexes:
-        if heating_demand[t] > 0 or tuv_demand[t] > 0:
-            prob += b_soc[t] <= b_cap * 0.9
-        else:
-            prob += b_soc[t] <= b_cap
-        prob += b_soc[t] >= b_min
-        # BEGIN CLEANUP: uprava pro dvouzónovy model
-        # Pokud je baterie pod 60 %, neohříváme vodu
-        if charge_bat_min:
-            prob += (h_in_lower[t] + h_in_upper[t]) <= (h_lower_power + h_upper_power) * (b_soc[t] >= b_cap * 0.6)
-        # END CLEANUP
-
-    prob.solve()
+        # Hlavní jistič a měnič
+        prob += g_buy[t] + lpSum(device.grid_load(t) for device in all_devices) <= grid_limit, f"grid_limit_{t}"
+        prob += lpSum(device.inverter_load(t) for device in all_devices) + g_sell[t] <= inverter_limit
+
+    # Pokud je baterie pod 60 %, neohříváme vodu:
+    # bat_ok[t] = 1 povoluje ohřev a zároveň vynucuje b_soc[t] >= 60 %.
+    # V MILP je bat_ok binární, v LP režimu jde o její spojitou relaxaci.
+    if charge_bat_min:
+        bat_ok = LpVariable.dicts("bat_ok", indexes, 0, 1, cat=LpBinary if milp_enabled else LpContinuous)
+        if milp_enabled:
+            binaries += list(bat_ok.values())
+        for t in indexes:
+            prob += boiler.heat(t) <= (h_lower_power + h_upper_power) * bat_ok[t]
+            prob += battery.soc[t] >= b_cap * 0.6 * bat_ok[t]
+
+    # Redukce modelu (fixní proměnné, aliasy, řádky-meze, duplicity) před řešičem
+    postsolve = None
+    model_size = None
+    if get_option(options, "presolve_enabled"):
+        from presolve import reduce_problem
+
+        prob, postsolve, reduction = reduce_problem(prob)
+        model_size = reduction.as_dict()
+        debug(f"Presolve: {reduction}")
+
+    solve_start = time.monotonic()
+    if binaries:
+        if time_limit is not None:
+            milp_time_limit = min(milp_time_limit, time_limit)
+        solution_source = _solve_milp(prob, binaries, milp_time_limit, milp_gap)
+    else:
+        prob.solve(_cbc(time_limit=time_limit))
+        solution_source = "lp"
+    solve_time = time.monotonic() - solve_start
+    debug(f"Solver: {LpStatus[prob.status]} ({solution_source}) in {solve_time:.3f}s")
 
     if prob.status != LpStatusOptimal:
-        raise RuntimeError("Optimal solution not found – model infeasible")
-
-    outputs = {
-        "b_power": [b_power[t].varValue for t in indexes],
-        "b_charge": [b_charge[t].varValue for t in indexes],
-        "b_discharge": [b_discharge[t].varValue for t in indexes],
-        "b_soc": [b_soc[t].varValue for t in indexes],
-        "b_soc_percent": [int(100 * b_soc[t].varValue / b_cap) for t in indexes],
-        "g_buy": [g_buy[t].varValue for t in indexes],
-        "g_sell": [g_sell[t].varValue for t in indexes],
-        "buy_cost": [g_buy[t].varValue * buy_price[t] for t in indexes],
-        "sell_income": [g_sell[t].varValue * sell_price[t] for t in indexes],
-        "net_step_cost": [g_buy[t].varValue * buy_price[t] - g_sell[t].varValue * sell_price[t] for t in indexes],
-        "fve_unused": [fve_unused[t].varValue for t in indexes],
-        # nové průběhy dvou-zónové nádrže
-        "h_in_lower": [h_in_lower[t].varValue for t in indexes],
-        "h_in_upper": [h_in_upper[t].varValue for t in indexes],
-        "h_out_lower": [h_out_lower[t].varValue for t in indexes],
-        "h_out_upper": [h_out_upper[t].varValue for t in indexes],
-        "h_soc_lower": [h_soc_lower[t].varValue for t in indexes],
-        "h_soc_upper": [h_soc_upper[t].varValue for t in indexes],
-        "h_soc_upper_percent": [100*h_soc_upper[t].varValue/h_upper_cap for t in indexes],
-        "h_soc_lower_percent": [100*h_soc_lower[t].varValue/h_lower_cap for t in indexes],
-        "h_to_upper": [h_to_upper[t].varValue for t in indexes],
-        # Teploty dolní a horní zóny [°C]
-        "temp_lower": [energy_to_temp(h_soc_lower[t].varValue, h_lower_vol, h_lower_min_t) for t in indexes],
-        "temp_upper": [energy_to_temp(h_soc_upper[t].varValue, h_upper_vol, h_upper_min_t) for t in indexes],
-    }
-
-    results = {}
-    results["grid_consumption"] = sum(outputs["g_buy"])  # Celková spotřeba z gridu
-    results["grid_injection"] = sum(outputs["g_sell"])  # Celková
-    results["total_buy_cost"] = sum(outputs["buy_cost"])
-    results["total_sell_income"] = sum(outputs["sell_income"])
-    results["net_bilance"] = sum(outputs["net_step_cost"])
-    results["total_charged"] = sum(outputs["b_charge"])  # Total energy charged to the battery
-    results["total_discharged"] = sum(outputs["b_discharge"])  # Total energy discharged from the battery
-    results["total_battery_penalty"] = sum(b_discharge[t].varValue * battery_penalty * dt[t] for t in indexes)
-    results["total_fve_unused_penalty"] = sum(fve_unused[t].varValue * fve_unused_penalty * dt[t] for t in indexes)
-    results["total_bat_price_above"] = bat_price_above * (b_surplus.varValue if hasattr(b_surplus, 'varValue') else 0)
-    results["total_bat_price_below"] = bat_price_below * (threshold - (b_short.varValue if hasattr(b_short, 'varValue') else 0))
-    # Celková hodnota energii v obou zónách na konci
-    results["total_final_boiler_value"] = final_boiler_price * (
-        (h_soc_lower[t_end].varValue + h_soc_upper[t_end].varValue) if hasattr(h_soc_lower[t_end], 'varValue') and hasattr(h_soc_upper[t_end], 'varValue') else 0
-    )
-    # Bonus za energii v horní zóně na konci
-    results["final_upper_zone_bonus"] = upper_zone_priority * (
-        h_soc_upper[t_end].varValue if hasattr(h_soc_upper[t_end], 'varValue') else 0
-    )
-    results["total_fve_unused"] = sum(fve_unused[t].varValue * dt[t] for t in indexes)
-    # Bonifikace za ohřev v obou zónách
-    results["total_water_priority_bonus"] = sum(
-        water_priority_bonus * (h_in_lower[t].varValue + h_in_upper[t].varValue) * dt[t]
-        for t in indexes
-    )
-    # Bonus za prioritní ohřev horní zóny
-    results["total_upper_zone_priority"] = sum(
-        upper_zone_priority * h_in_upper[t].varValue * dt[t]
-        for t in indexes
+        raise RuntimeError(f"Optimal solution not found – solver status {LpStatus[prob.status]}")
+    if postsolve is not None:
+        postsolve()
+
+    # Primární řešení se z PuLP vytáhne jedním průchodem do matice (řada × slot)
+    variables = {"g_buy": g_buy, "g_sell": g_sell, "fve_unused": fve_unused}
+    for device in all_devices:
+        variables.update(device.variables())
+    values = dict(zip(variables, _primal(list(variables.values()), len(indexes))))
+    if solution_source == "lp":
+        # Duální ceny (jen čisté LP): cena energie na sběrnici, hodnota jističe a kWh v zásobnících
+        dt_arr = np.asarray(dt, dtype=float)
+        values["bus_price"] = _duals(prob, [f"balance_{t}" for t in indexes]) / dt_arr
+        values["grid_limit_value"] = -_duals(prob, [f"grid_limit_{t}" for t in indexes]) / dt_arr
+        for device in all_devices:
+            for key, names in device.duals().items():
+                values[key] = -_duals(prob, [names[t] for t in indexes])
+    solution = assemble(
+        values,
+        battery.short.varValue or 0.0,
+        battery.surplus.varValue or 0.0,
+        prob.objective.value() if prob.objective is not None else None,
+        {
+            "status": LpStatus[prob.status],
+            "solver": solution_source,
+            "solve_time": solve_time,
+            "model_size": model_size,
+        },
     )
-    results["total_battery_under_penalty"] = sum(b_soc_under[t].varValue * bat_under_penalty * dt[t] for t in indexes)
-    # Bonus hodnoty tepla v obou zónách ve vybraných hodinách
-    results["tank_value_bonus"] = sum(
-        (h_soc_lower[t].varValue + h_soc_upper[t].varValue) * tank_value_bonus for t in tank_value_indexes
-    )
-    results["objective_value"] = prob.objective.value() if prob.objective is not None else None
-
-    debug(f"b_cap: {b_cap}, b_min: {b_min}, b_max: {b_max}, h_lower_cap: {h_lower_cap}, h_upper_cap: {h_upper_cap}")
-    debug(f"outputs keys: {list(outputs.keys())}")
-    debug(f"results: {results}")
 
-    # Výpočet celkové parazitní energie při ohřevu vody a její rozdělení podle SOC baterie (ex-post)
-    total_parasitic_energy = 0.0
-    total_parasitic_to_battery = 0.0
-    total_parasitic_to_grid = 0.0
-    for t in indexes:
-        parasitic_water_heating = get_option(options, "parasitic_water_heating")
-        pe = parasitic_water_heating * (outputs["h_in_lower"][t] + outputs["h_in_upper"][t]) * dt[t]
-        total_parasitic_energy += pe
-        # Rozdělení podle skutečného SOC baterie
-        if outputs["b_soc"][t] < b_cap:
-            total_parasitic_to_battery += pe
+    if fast_path_verify and idle is not None:
+        # Ověření rychlé cesty: LP nesmí najít lepší plán než klidový
+        gap = float(idle.objective_value - solution["results"]["objective_value"])
+        solution["fast_path_check"] = {
+            "objective_gap": gap,
+            "max_value_diff": max(float(np.max(np.abs(values[k] - idle.values[k]))) for k in PRIMAL_KEYS),
+        }
+        if gap > 1e-6 * max(1.0, abs(idle.objective_value)):
+            logger.warning(f"Rychlá cesta není optimální: LP je lepší o {gap:.6f}")
         else:
-            total_parasitic_to_grid += pe
-    results["total_parasitic_energy"] = total_parasitic_energy
-    results["total_parasitic_to_battery"] = total_parasitic_to_battery
-    results["total_parasitic_to_grid"] = total_parasitic_to_grid
-
-    return {
-        "generated_at": datetime.now().isoformat(),
-        "times": [h.isoformat() for h in hours],
-        "inputs": series,
-        "outputs": outputs,
-        "results": results,
-        "options": options,
-    }
+            debug(f"Rychlá cesta ověřena, rozdíl účelové funkce {gap:.2e}")
+
+    return solution
@@ -1,23 +1,61 @@
 #!/usr/bin/env python3
 
+import time
+
+_STARTUP_T0 = time.perf_counter()
+
 import os
 import json
 import csv
+import logging
+import threading
 from datetime import datetime, timedelta
 
 from flask import Flask, render_template, redirect, url_for, request, send_from_directory
 from flask_apscheduler import APScheduler
 
-from powerplan_environment import PORT, HA_ADDON, RESULTS_DIR, LATEST_LINK, LATEST_CSV
+from powerplan_environment import PORT, HA_ADDON, RESULTS_DIR, LATEST_LINK, LATEST_CSV, STARTUP_BUDGET, ensure_dirs, addon_option
 from powerplan_optimizer import run_mpc_optimizer
-from data_connector import prepare_data, publish_to_ha
-from presentation import presentation
+from devices import build_devices, device_entities
+from data_connector import prepare_data, publish_changed
 from actions import powerplan_to_actions, powerplan_to_actions_timeline, ACTION_ATTRIBUTES
 from powerplan_settings import settings_bp, load_settings
+from plan_history import history_bp, record_solution
+from powerplan_fallback import solve_budget, shift_solution
+from powerplan_whatif import whatif_bp
+from shadow_mode import shadow_bp, ShadowRunner, HAEnergyCounters
+from solver_service import solve_bp
+from plan_timeline import publish_plan
+from ha_statistics import import_statistics
+from mqtt_transport import MQTTTransport
+from remotecontrol import SetpointStreamer, HATransport
+from tracking_controller import TrackingController, HALiveReader, HAHeaterSwitch
 from publish_version import get_current_version
+from solution import Solution
+from solution_memo import SolutionMemo, fingerprint
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
 
 ENABLE_PUBLISH = bool(HA_ADDON)
 
+# RemoteControl streamer výkonových setpointů (disabled / battery / grid)
+REMOTECONTROL_MODE = addon_option("remotecontrol_mode", "disabled")
+streamer = None
+# Import plánovaných řad do dlouhodobých statistik HA (websocket)
+STATISTICS_IMPORT = str(addon_option("statistics_import", False)).lower() in ("1", "true", "yes")
+# Rychlá regulace mezi přepočty (perioda v s, 0 = vypnuto)
+TRACKING_INTERVAL = float(addon_option("tracking_interval", 0))
+tracker = None
+# MQTT transport místo REST publikace (prázdný mqtt_host = vypnuto)
+MQTT_HOST = addon_option("mqtt_host", "")
+mqtt = None
+# Znovupoužití řešení při nezměněných vstupech (max. stáří v s, 0 = vypnuto)
+MEMO_MAX_AGE = float(addon_option("memo_max_age", 1800))
+memo = SolutionMemo(max_age=MEMO_MAX_AGE) if MEMO_MAX_AGE > 0 else None
+# Stínové profily (shadow_profiles.json) řešené po publikaci hlavního plánu,
+# skutečné náklady z počítadel energie střídače
+shadow = ShadowRunner(HAEnergyCounters() if HA_ADDON else None)
+
 if ENABLE_PUBLISH:
     print("Publishing to Home Assistant is enabled.")
 else:
@@ -33,12 +71,25 @@ class Config:                                    # <-- nový blok
 app.config.from_object(Config())
 
 app.register_blueprint(settings_bp)
+app.register_blueprint(history_bp)
+app.register_blueprint(whatif_bp)
+app.register_blueprint(shadow_bp)
+app.register_blueprint(solve_bp)
+
+ensure_dirs()
 
 # --- Výpočet a cache ------------------------------------------------------
 
-def compute_and_cache():
-    data = prepare_data()
+def solve_current(force=False, pushed=None):
+    """
+    Stáhne aktuální data z HA a vyřeší plán v časovém rozpočtu do hranice slotu.
+    `pushed` jsou čerstvé počáteční stavy z MQTT (přebíjí stavy z HA).
+
+    Vrací (řešení, otisk vstupů, True pokud jde o uložené řešení se stejným otiskem).
+    """
     settings = load_settings()
+    entities = device_entities(settings)
+    data = prepare_data(pushed, entities)
 
     series_keys = [
         "tuv_demand",
@@ -50,19 +101,93 @@ def compute_and_cache():
         "outdoor_temps",
     ]
 
-    initials_keys = ["bat_soc", "temp_upper", "temp_lower"]
+    # Stavy dalších zařízení jen pokud je HA dodal, jinak hodnoty z nastavení
+    initials_keys = ["bat_soc", "temp_upper", "temp_lower", *(k for k in entities if k in data)]
 
     dt = [1.0] * len(data["hours"])  # předpokládáme hodinový krok
     remain_slot_part = data["hours"][1].astimezone(None) - datetime.now().astimezone(None)
     dt[0] = remain_slot_part.total_seconds() / 3600.0  # zbytek aktuálního slotu v hodinách
 
-    solution = run_mpc_optimizer(
-        {k: data[k] for k in series_keys},
-        {k: data[k] for k in initials_keys},
-        data["hours"],
-        settings,
-        dt
-    )
+    series = {k: data[k] for k in series_keys}
+    initials = {k: data[k] for k in initials_keys}
+    key = fingerprint(series, initials, data["hours"], settings, dt)
+    if memo is not None and not force:
+        cached = memo.get(key)
+        if cached is not None:
+            return cached, key, True
+
+    budget = solve_budget(data["hours"])
+    print(f"Solver time budget: {budget:.1f}s")
+
+    devices = build_devices(settings, series, initials, data["hours"], dt)
+    solution = run_mpc_optimizer(series, initials, data["hours"], settings, dt, time_limit=budget, devices=devices)
+    return solution, key, False
+
+# Přepočet může přijít z cronu, z /regenerate i push změnou přes MQTT. Všechny
+# zdroje běží v jediném workeru (start_services), proto stačí zámek vláken.
+_compute_lock = threading.Lock()
+
+
+def _extra(solution):
+    return {
+        "generated_at": solution["generated_at"],
+        # parse the first timestamp string back to datetime for further use
+        "current_slot": solution["times"][0],
+        "fallback": "fallback" in solution,
+    }
+
+
+def _publish(solution, extra):
+    """Publikuje akce, plán a ladicí senzor přes MQTT nebo REST API HA."""
+    actions = solution["actions"]
+    if mqtt is not None:
+        mqtt.publish_actions(actions, ACTION_ATTRIBUTES, extra)
+        mqtt.publish_plan(solution)
+        mqtt.publish_debug(extra["current_slot"], solution["results"])
+    elif ENABLE_PUBLISH:
+        # Stavy jen při změně, plánované řady hromadně do statistik
+        publish_changed(actions, "powerplan_", ACTION_ATTRIBUTES, extra)
+        # Celý plán po změnách pro lokální přepínání na hranicích slotů
+        publish_plan(solution)
+
+        publish_changed({
+            "debug": extra["current_slot"]
+        }, "powerplan_", {
+            "debug": solution["results"]
+        }, compare_attributes=False)  # výsledky se mění s každým přepočtem
+
+
+def compute_and_cache(force=False):
+    with _compute_lock:
+        return _compute_and_cache(force)
+
+
+def _compute_and_cache(force=False):
+    key = None
+    pushed = mqtt.latest_inputs() if mqtt is not None else None
+    try:
+        solution, key, cached = solve_current(force, pushed)
+        if mqtt is not None:
+            # Jen úspěšný výpočet – po selhání má push změna spustit přepočet znovu
+            mqtt.mark_used(pushed)
+    except Exception as e:
+        # Včasná akce je důležitější než optimalita – použij předchozí plán
+        # posunutý na aktuální slot
+        print(f"[ERR] Optimalizace selhala ({e}), použije se posunutý předchozí plán")
+        previous = load_cache()
+        if previous is None:
+            raise
+        solution = shift_solution(previous, reason=str(e))
+        cached = False
+
+    if cached:
+        # Stejné vstupy – plán, akce i uložené soubory jsou aktuální, nic se
+        # znovu neukládá. Publikace běží dál: přeskočí nezměněné hodnoty, ale
+        # obnoví entity po restartu HA a plán po REPUBLISH_INTERVAL.
+        print(f"Vstupy beze změny ({key[:8]}), použito řešení z {solution['generated_at']}")
+        _publish(solution, _extra(solution))
+        return solution
+
     # Tag solution with current app version
     solution["version"] = get_current_version()
 
@@ -72,25 +197,26 @@ def compute_and_cache():
     solution["actions"] = actions
     solution["actions_timeline"] = actions_timeline
 
-    extra = {
-        "generated_at": solution["generated_at"],
-        # parse the first timestamp string back to datetime for further use
-        "current_slot": solution["times"][0],
-    }
+    extra = _extra(solution)
 
     print("Solution results", json.dumps(solution["results"], indent=2))
 
-    if ENABLE_PUBLISH:
-        publish_to_ha(actions, "powerplan_", ACTION_ATTRIBUTES, extra)
+    if streamer is not None:
+        streamer.update_plan(solution)
+    if tracker is not None:
+        tracker.update_plan(solution)
 
-        publish_to_ha({
-            "debug": extra["current_slot"]
-        }, "powerplan_", {
-            "debug": solution["results"]
-        })
+    _publish(solution, extra)
+
+    # Statistiky jdou přes websocket API HA nezávisle na transportu stavů
+    if STATISTICS_IMPORT and (mqtt is not None or ENABLE_PUBLISH):
+        try:
+            import_statistics(solution)
+        except Exception as e:
+            print(f"[ERR] Import statistik selhal: {e}")
     
     # Ensure results directory exists
-    os.makedirs(RESULTS_DIR, exist_ok=True)
+    ensure_dirs()
 
     # Save the solution to a timestamped file using current time
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -98,13 +224,16 @@ def compute_and_cache():
     # Use absolute path for symlink target to avoid relative resolution issues
     abs_result_file = os.path.abspath(result_file)
     with open(result_file, "w") as f:
-        json.dump(solution, f, indent=4)
+        json.dump(solution.to_dict(), f, indent=4)
 
     # Create CSV export
     csv_file = os.path.join(RESULTS_DIR, f"result_{timestamp}.csv")
     abs_csv_file = os.path.abspath(csv_file)
     create_csv_export(solution, csv_file)
 
+    # Kompaktní denní index pro porovnání plánů (/api/plan_diff, /api/plan_fan)
+    record_solution(solution, result_file)
+
     print(f"Solution saved to {result_file} and {csv_file}")
 
     # Update the latest symlinks
@@ -121,6 +250,16 @@ def compute_and_cache():
         os.remove(latest_csv_link)
     os.symlink(abs_csv_file, latest_csv_link)
 
+    # Stínové profily nad stejnými vstupy – až po publikaci, nečeká se na ně
+    if "fallback" not in solution:
+        try:
+            shadow.submit(solution, timestamp)
+        except Exception as e:
+            print(f"[ERR] Stínové profily se nepodařilo odeslat: {e}")
+
+    if memo is not None and key is not None:
+        memo.put(key, solution)
+
     return solution
 
 def load_cache(filename=None):
@@ -130,8 +269,8 @@ def load_cache(filename=None):
         else:
             filename = os.path.join(RESULTS_DIR, filename)
         with open(filename, "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError, ValueError):
+            return Solution.from_dict(json.load(f))
+    except (FileNotFoundError, json.JSONDecodeError, ValueError, KeyError):
         # If the file does not exist or is corrupted, return None
         print("Cache file not found or corrupted, recomputing...")
         return None
@@ -266,7 +405,8 @@ def create_csv_export(solution, filename):
 
 @app.route("/regenerate", methods=["POST"])
 def regenerate():
-    compute_and_cache()
+    # Ruční přepočet vždy řeší znovu, i při nezměněných vstupech
+    compute_and_cache(force=True)
     return redirect('./')
 
 @app.route("/")
@@ -322,6 +462,9 @@ def index():
         solution = load_cache(selected_file)
         print(f"Loaded solution from {selected_file} {solution['version']}")
 
+    # Plotly se načítá až při prvním vykreslení stránky (rychlý start workeru)
+    from presentation import presentation
+
     generated_at = datetime.fromisoformat(solution.get("generated_at"))
     graphs = presentation(solution)
     
@@ -333,22 +476,7 @@ def index():
     
     # Přidat časy do timeline
     if timeline and "times" not in timeline:
-        solution_times = solution.get("times", [])
-        formatted_times = []
-        for t in solution_times:
-            # Pokud je časový údaj jako řetězec v ISO formátu, parse a formátuj
-            if isinstance(t, str):
-                try:
-                    dt = datetime.fromisoformat(t)
-                    formatted_times.append(dt.strftime("%H:%M"))
-                except Exception:
-                    formatted_times.append(t)
-            # Pokud je datetime objekt
-            elif hasattr(t, 'strftime'):
-                formatted_times.append(t.strftime("%H:%M"))
-            else:
-                formatted_times.append(str(t))
-        timeline["times"] = formatted_times
+        timeline["times"] = [t.strftime("%H:%M") for t in solution.datetimes]
 
     # Determine whether to expand filter controls only when user provided filter parameters
     expand_filters = bool(request.args.get('day') or request.args.get('time'))
@@ -451,8 +579,27 @@ def download_csv_specific(filename):
     except Exception as e:
         return f"Chyba při stahování souboru: {str(e)}", 500
 
-# Inicializace scheduleru pokud běží v produkci
-if HA_ADDON:
+# --- Služby na pozadí -----------------------------------------------------
+
+scheduler = None
+_services_pid = None
+
+
+def start_services():
+    """
+    Spustí scheduler přepočtu, RemoteControl streamer, MQTT transport
+    a rychlou regulaci v aktuálním procesu (jen v produkci).
+
+    Volá se v procesu, který obsluhuje požadavky (gunicorn hook `post_fork`,
+    dev server), ne při importu: s `preload_app` by vlákna běžela jen
+    v masteru a worker by přepočty z /regenerate posílal jejich kopiím,
+    jejichž vlákna forkem nepřežila.
+    """
+    global scheduler, streamer, mqtt, tracker, _services_pid
+    if not HA_ADDON or _services_pid == os.getpid():
+        return
+    _services_pid = os.getpid()
+
     # pokud běží v Dockeru, použij přepočítávej pravielně model
     scheduler = APScheduler()                        # <-- nový objekt
     scheduler.init_app(app)
@@ -467,10 +614,46 @@ if HA_ADDON:
 
     scheduler.start()
 
+    if REMOTECONTROL_MODE in ("battery", "grid"):
+        streamer = SetpointStreamer(HATransport(), mode=REMOTECONTROL_MODE).start_in_thread()
+        # Do prvního přepočtu streamuj poslední uložený plán
+        latest = load_cache()
+        if latest is not None:
+            streamer.update_plan(latest)
+        print(f"RemoteControl streamer started ({REMOTECONTROL_MODE})")
+
+    if MQTT_HOST:
+        mqtt = MQTTTransport(
+            MQTT_HOST,
+            int(addon_option("mqtt_port", 1883)),
+            addon_option("mqtt_username"),
+            addon_option("mqtt_password"),
+            on_change=compute_and_cache,
+        ).start()
+        print(f"MQTT transport connected to {MQTT_HOST}")
+
+    if TRACKING_INTERVAL > 0:
+        tracker = TrackingController(
+            HALiveReader(), HAHeaterSwitch(), streamer, interval=TRACKING_INTERVAL
+        ).start_in_thread()
+        latest = load_cache()
+        if latest is not None:
+            tracker.update_plan(latest)
+        print(f"Tracking controller started ({TRACKING_INTERVAL:.0f} s)")
+
+_startup_time = time.perf_counter() - _STARTUP_T0
+if _startup_time > STARTUP_BUDGET:
+    logging.warning(f"Startup took {_startup_time:.3f}s, budget is {STARTUP_BUDGET:.3f}s")
+else:
+    logging.info(f"Startup took {_startup_time:.3f}s (budget {STARTUP_BUDGET:.3f}s)")
+
 def create_app():
     """Factory function pro vytvoření Flask aplikace."""
     return app
 
 if __name__ == "__main__":
+    # Dev server s reloaderem obsluhuje požadavky v dětském procesu
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_services()
     app.run(host="0.0.0.0", port=PORT, debug=True)
 
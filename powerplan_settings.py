@@ -1,6 +1,8 @@
 from flask import Blueprint, request, redirect, url_for
+import html
 import json
 from options import VARIABLES_SPEC
+from devices import parse_device_specs
 import os.path
 from powerplan_environment import SETTINGS_FILE
 
@@ -18,7 +20,8 @@ def load_settings():
     for key, meta in spec.items():
         if key not in settings:
             if "default" in meta:
-                settings[key] = meta["default"]
+                default = meta["default"]
+                settings[key] = list(default) if isinstance(default, list) else default
             elif meta["type"] == "bool":
                 settings[key] = False
             elif meta["type"] == "float":
@@ -51,6 +54,19 @@ def settings():
                 val = request.form.get(key)
                 if val:
                     current[key] = float(val)
+            elif spec[key]["type"] == "int":
+                val = request.form.get(key)
+                if val:
+                    current[key] = int(float(val))
+            elif spec[key]["type"] == "choice":
+                val = request.form.get(key)
+                if val in spec[key]["choices"]:
+                    current[key] = val
+            elif spec[key]["type"] == "devices":
+                try:
+                    current[key] = parse_device_specs(request.form.get(key, "").strip())
+                except ValueError as e:
+                    print(f"Neplatné nastavení {key}, ponechána původní hodnota: {e}")
         save_settings(current)
         
         # Automaticky spustit novou optimalizaci po uložení nastavení
@@ -404,6 +420,32 @@ def settings():
                                 <td data-label="Jednotka" class="unit">{unit}</td>
                                 <td data-label="Rozsah" class="range">{range_display}</td>
                             </tr>"""
+        elif meta["type"] == "choice":
+            choices = "".join(
+                f"<option value='{c}'{' selected' if c == val else ''}>{c}</option>" for c in meta["choices"]
+            )
+            form_html += f"""
+                            <tr{row_class}>
+                                <td data-label="Parametr" class="parameter-name">{key}</td>
+                                <td data-label="Hodnota">
+                                    <select name="{key}" class="form-input">{choices}</select>
+                                </td>
+                                <td data-label="Výchozí" class="default-value">{default_disp}</td>
+                                <td data-label="Jednotka" class="unit">{unit}</td>
+                                <td data-label="Rozsah" class="range">{range_display}</td>
+                            </tr>"""
+        elif meta["type"] == "devices":
+            devices_json = html.escape(json.dumps(val, ensure_ascii=False)) if val else ""
+            form_html += f"""
+                            <tr{row_class}>
+                                <td data-label="Parametr" class="parameter-name">{key}</td>
+                                <td data-label="Hodnota">
+                                    <textarea name="{key}" rows="3" class="form-input" placeholder='[{{"type": "tank", "name": "h2", ...}}]'>{devices_json}</textarea>
+                                </td>
+                                <td data-label="Výchozí" class="default-value">[]</td>
+                                <td data-label="Jednotka" class="unit">{unit}</td>
+                                <td data-label="Rozsah" class="range">{range_display}</td>
+                            </tr>"""
         else:
             minval = f"min='{rng[0]}'" if rng and len(rng) >= 2 and rng[0] is not None else ""
             maxval = f"max='{rng[1]}'" if rng and len(rng) >= 2 and rng[1] is not None else ""
@@ -0,0 +1,211 @@
+"""
+powerplan_whatif.py
+-------------------
+What-if vyhodnocení nastavení bez uložení.
+
+Navržená nastavení se vyřeší nad vstupy posledního uloženého plánu (žádné
+stahování z HA) v pracovních procesech a vrátí se rozdíly účelové funkce
+a nákladů oproti aktuálnímu plánu. Živý plán, soubory v `results/` ani
+publikace do HA se nemění.
+
+POST /api/whatif
+    {"settings": {...}}                    – jeden kandidát
+    {"candidates": [{...}, {...}, ...]}    – více kandidátů najednou (řeší se souběžně,
+                                             nejvýše `MAX_CANDIDATES`, společný limit
+                                             `WHATIF_TIMEOUT`)
+"""
+
+import json
+import math
+from concurrent.futures import wait
+from typing import Any, Dict, List
+
+from flask import Blueprint, request, jsonify
+
+from devices import parse_device_specs
+from options import VARIABLES_SPEC
+from powerplan_environment import LATEST_LINK, REQUEST_TIMEOUT
+from powerplan_settings import load_settings
+from powerplan_workers import get_pool, solve_case
+
+whatif_bp = Blueprint("whatif_bp", __name__)
+
+# s – jeden termín pro všechny kandidáty, s rezervou pod timeoutem gunicornu;
+# stejný limit dostane i řešič, aby nedokončené úlohy neblokovaly pool
+WHATIF_TIMEOUT = min(60, REQUEST_TIMEOUT / 2)
+MAX_CANDIDATES = 8  # víc kandidátů by se do termínu stejně nevyřešilo
+
+# Metriky, pro které se počítají rozdíly oproti aktuálnímu plánu
+DELTA_KEYS = [
+    "objective_value",
+    "net_bilance",
+    "total_buy_cost",
+    "total_sell_income",
+    "grid_consumption",
+    "grid_injection",
+    "total_charged",
+    "total_discharged",
+    "total_fve_unused",
+]
+
+
+def load_baseline() -> Dict[str, Any]:
+    """Načte poslední uložený plán, který obsahuje kompletní vstupy."""
+    with open(LATEST_LINK, "r") as f:
+        solution = json.load(f)
+    if "initials" not in solution or "dt" not in solution:
+        raise ValueError("Poslední plán neobsahuje počáteční stavy, spusťte nejprve přepočet")
+    return solution
+
+
+def _parse_value(key: str, meta: Dict[str, Any], value: Any) -> Any:
+    """Hodnota parametru podle typu ve VARIABLES_SPEC; neplatná → ValueError."""
+    kind = meta["type"]
+    if kind == "bool":
+        # bool("false") je True – řetězce jen výslovně
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.strip().lower() in ("true", "false"):
+            return value.strip().lower() == "true"
+        raise ValueError(f"Neplatná hodnota {key}: {value!r} (očekáváno true/false)")
+    if kind == "devices":
+        return parse_device_specs(value)
+    if kind == "choice":
+        if value not in meta["choices"]:
+            raise ValueError(f"Neplatná hodnota {key}: {value}")
+        return value
+    if isinstance(value, bool):
+        raise ValueError(f"Neplatná hodnota {key}: {value!r} (očekáváno číslo)")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Neplatná hodnota {key}: {value!r} (očekáváno číslo)")
+    if not math.isfinite(number):
+        raise ValueError(f"Neplatná hodnota {key}: {value!r} (očekáváno konečné číslo)")
+    if kind == "int":
+        if not number.is_integer():
+            raise ValueError(f"Neplatná hodnota {key}: {value!r} (očekáváno celé číslo)")
+        return int(number)
+    return number
+
+
+def candidate_settings(current: Dict[str, Any], overrides: Dict[str, Any]) -> Dict[str, Any]:
+    """Sloučí navržené hodnoty s aktuálním nastavením (jen známé klíče)."""
+    spec = VARIABLES_SPEC["options"]
+    unknown = [key for key in overrides if key not in spec]
+    if unknown:
+        raise ValueError(f"Neznámé parametry: {', '.join(unknown)}")
+    settings = dict(current)
+    for key, value in overrides.items():
+        settings[key] = _parse_value(key, spec[key], value)
+    return settings
+
+
+def result_deltas(results: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Any]:
+    deltas = {}
+    for key in DELTA_KEYS:
+        new, old = results.get(key), baseline.get(key)
+        deltas[key] = new - old if new is not None and old is not None else None
+    return deltas
+
+
+def evaluate(candidates: List[Dict[str, Any]], timeout: float = WHATIF_TIMEOUT) -> Dict[str, Any]:
+    """Souběžně vyřeší kandidáty nad vstupy posledního plánu a porovná je s ním."""
+    from actions import powerplan_to_actions
+
+    if len(candidates) > MAX_CANDIDATES:
+        raise ValueError(f"Nejvýše {MAX_CANDIDATES} kandidátů najednou")
+    baseline = load_baseline()
+    current = load_settings()
+    all_settings = [candidate_settings(current, c) for c in candidates]
+
+    pool = get_pool()
+    futures = [
+        pool.submit(
+            solve_case,
+            baseline["inputs"],
+            baseline["initials"],
+            baseline["times"],
+            settings,
+            baseline["dt"],
+            timeout,
+        )
+        for settings in all_settings
+    ]
+    # Čeká se na všechny najednou; ještě nespuštěné úlohy po termínu zruší
+    wait(futures, timeout=timeout)
+
+    evaluated = []
+    for overrides, future in zip(candidates, futures):
+        if not future.done():
+            future.cancel()
+            evaluated.append({"settings": overrides, "error": "Časový limit vypršel"})
+            continue
+        try:
+            solution = future.result()
+        except Exception as e:
+            evaluated.append({"settings": overrides, "error": str(e)})
+            continue
+        evaluated.append({
+            "settings": overrides,
+            "results": solution["results"],
+            "delta": result_deltas(solution["results"], baseline.get("results", {})),
+            "actions": powerplan_to_actions(solution),
+        })
+
+    return {
+        "baseline": {
+            "generated_at": baseline.get("generated_at"),
+            "results": baseline.get("results", {}),
+            "actions": baseline.get("actions", {}),
+        },
+        "candidates": evaluated,
+    }
+
+
+# --- Web routes -----------------------------------------------------------
+
+@whatif_bp.route("/api/whatif", methods=["POST"])
+def api_whatif():
+    payload = request.get_json(silent=True) or {}
+    if "candidates" in payload:
+        candidates = payload["candidates"]
+    elif "settings" in payload:
+        candidates = [payload["settings"]]
+    else:
+        return jsonify({"error": "Očekáváno {'settings': {...}} nebo {'candidates': [...]}"}), 400
+    if not isinstance(candidates, list) or not all(isinstance(c, dict) for c in candidates):
+        return jsonify({"error": "Kandidáti musí být seznam slovníků"}), 400
+    try:
+        return jsonify(evaluate(candidates))
+    except FileNotFoundError:
+        return jsonify({"error": "Zatím neexistuje žádný uložený plán"}), 409
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@whatif_bp.route("/api/whatif/estimate", methods=["POST"])
+def api_whatif_estimate():
+    """
+    Odhad změny účelové funkce z duálních cen posledního plánu bez přepočtu.
+    Tělo: {"buy_price": Δ, "sell_price": Δ, "load_pred": Δ, "fve_pred": Δ, "bat_soc": Δ %},
+    Δ řad je skalár pro všechny sloty nebo seznam po slotech.
+    """
+    from sensitivity import estimate_change
+
+    payload = request.get_json(silent=True) or {}
+    known = ("buy_price", "sell_price", "load_pred", "fve_pred", "bat_soc")
+    unknown = [key for key in payload if key not in known]
+    if unknown:
+        return jsonify({"error": f"Neznámé změny: {', '.join(unknown)}"}), 400
+    try:
+        baseline = load_baseline()
+        return jsonify({
+            "generated_at": baseline.get("generated_at"),
+            "objective_value": baseline.get("results", {}).get("objective_value"),
+            **estimate_change(baseline, **payload),
+        })
+    except FileNotFoundError:
+        return jsonify({"error": "Zatím neexistuje žádný uložený plán"}), 409
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
@@ -0,0 +1,82 @@
+"""
+powerplan_workers.py
+--------------------
+Pooly pracovních procesů pro optimalizace mimo hlavní vlákno.
+
+• "shared"        – optimalizace mimo hlavní výpočet (what-if, porovnání
+                    nastavení); `SOLVER_WORKERS` procesů
+• "decomposition" – jen bloky vícedenní dekompozice hlavního výpočtu, aby
+                    na ně nečekaly ve frontě úlohy z what-if a podobných
+                    nástrojů; `DECOMPOSITION_WORKERS` procesů
+• "shadow"        – stínové profily; `SHADOW_WORKERS` procesů se sníženou
+                    prioritou (nice `SHADOW_NICE`), aby nebraly CPU hlavnímu
+                    výpočtu
+
+Pooly se vytváří líně při prvním použití a používají kontext "spawn", aby
+dětské procesy nedědily vlákna scheduleru ani Flasku.
+"""
+
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+SOLVER_WORKERS = int(os.environ.get("SOLVER_WORKERS", "2"))
+DECOMPOSITION_WORKERS = int(os.environ.get("DECOMPOSITION_WORKERS", str(SOLVER_WORKERS)))
+
+SHADOW_WORKERS = int(os.environ.get("SHADOW_WORKERS", "1"))
+SHADOW_NICE = int(os.environ.get("SHADOW_NICE", "10"))
+
+POOL_SIZES = {"shared": SOLVER_WORKERS, "decomposition": DECOMPOSITION_WORKERS, "shadow": SHADOW_WORKERS}
+POOL_NICE = {"shadow": SHADOW_NICE}
+
+_pools: Dict[str, ProcessPoolExecutor] = {}
+_pool_lock = threading.Lock()
+
+
+def _lower_priority(increment: int) -> None:
+    """Inicializace pracovního procesu s nižší prioritou."""
+    try:
+        os.nice(increment)
+    except (AttributeError, OSError):  # Windows / zakázáno
+        pass
+
+
+def get_pool(name: str = "shared") -> ProcessPoolExecutor:
+    """Vrátí pool procesů `name`, při prvním volání ho vytvoří."""
+    with _pool_lock:
+        if name not in _pools:
+            nice = POOL_NICE.get(name, 0)
+            _pools[name] = ProcessPoolExecutor(
+                max_workers=POOL_SIZES[name],
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_lower_priority if nice else None,
+                initargs=(nice,) if nice else (),
+            )
+        return _pools[name]
+
+
+def shutdown_pool(name: str = "shared") -> None:
+    with _pool_lock:
+        pool = _pools.pop(name, None)
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def solve_case(
+    series: Dict[str, List[float]],
+    initials: Dict[str, float],
+    times: List[str],
+    options: Dict[str, Any],
+    dt: List[float],
+    time_limit: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Vyřeší jeden případ v pracovním procesu (časy jako ISO řetězce, další zařízení z `options`)."""
+    from devices import build_devices
+    from powerplan_optimizer import run_mpc_optimizer
+
+    hours = [datetime.fromisoformat(t) for t in times]
+    devices = build_devices(options, series, initials, hours, dt)
+    return run_mpc_optimizer(series, initials, hours, options, dt, time_limit=time_limit, devices=devices)
@@ -6,10 +6,11 @@ Modern visualization module for energy optimization dashboard
 from plotly.subplots import make_subplots
 import plotly.graph_objs as go
 import plotly.io as pio
-from datetime import timedelta, datetime
+import numpy as np
 from dataclasses import dataclass
 from typing import Dict, List, Any, Optional
 from actions import powerplan_to_actions_timeline
+from solution import Solution
 
 
 @dataclass
@@ -80,9 +81,10 @@ class DataProcessor:
     
     @staticmethod
     def prepare_time_series(solution: Dict[str, Any]) -> Dict[str, Any]:
-        """Připraví časové řady pro vizualizaci"""
-        times = [datetime.fromisoformat(t) for t in solution["times"]]
-        ts = {**solution["inputs"], **solution["outputs"]}
+        """Připraví časové řady pro vizualizaci (pole NumPy, místní čas)"""
+        solution = Solution.from_dict(solution)
+        times = solution.local_times
+        ts = {**solution.inputs, **solution.outputs}
         
         # Kategorizace dat
         soc_keys = ["b_soc_percent", "h_soc_lower_percent", "h_soc_upper_percent"]
@@ -93,7 +95,8 @@ class DataProcessor:
         options = solution.get("options", {})
         heating_enabled = options.get("heating_enabled", False)
         
-        actions_timeline = powerplan_to_actions_timeline(solution)
+        # Uložená řešení už timeline obsahují, přepočítává se jen u starých
+        actions_timeline = solution.get("actions_timeline") or powerplan_to_actions_timeline(solution)
         
         return {
             'times': times,
@@ -220,7 +223,7 @@ class ChartFactory:
             if key in data['ts']:
                 fig.add_trace(
                     go.Scatter(
-                        x=[t + timedelta(hours=1) for t in data['times']],
+                        x=data['times'] + np.timedelta64(1, 'h'),
                         y=data['ts'][key],
                         name=self.labels.get(key, key),
                         marker_color=self.color_map.get(key, self.theme.PRIMARY),
@@ -239,7 +242,7 @@ class ChartFactory:
         main_power_keys = data['power_keys'][:4]  # Jen nejdůležitější
         for key in main_power_keys:
             if key in data['ts']:
-                y_values = [-v if key in data['inverted_keys'] else v for v in data['ts'][key]]
+                y_values = -data['ts'][key] if key in data['inverted_keys'] else data['ts'][key]
                 fig.add_trace(
                     go.Scatter(
                         x=data['times'],
@@ -289,7 +292,7 @@ class ChartFactory:
             if key in data['ts']:
                 fig.add_trace(
                     go.Scatter(
-                        x=[t + timedelta(hours=1) for t in data['times']],
+                        x=data['times'] + np.timedelta64(1, 'h'),
                         y=data['ts'][key],
                         name=self.labels.get(key, key),
                         marker_color=self.color_map.get(key, self.theme.PRIMARY),
@@ -309,7 +312,7 @@ class ChartFactory:
             if key in data['ts']:
                 fig.add_trace(
                     go.Scatter(
-                        x=[t + timedelta(hours=1) for t in data['times']],
+                        x=data['times'] + np.timedelta64(1, 'h'),
                         y=data['ts'][key],
                         name=self.labels.get(key, key),
                         line_dash="dot",
@@ -345,7 +348,7 @@ class ChartFactory:
         # Výkonové křivky
         for key in data['power_keys']:
             if key in data['ts']:
-                y_values = [-v if key in data['inverted_keys'] else v for v in data['ts'][key]]
+                y_values = -data['ts'][key] if key in data['inverted_keys'] else data['ts'][key]
                 fig.add_trace(
                     go.Scatter(
                         x=data['times'],
@@ -448,7 +451,7 @@ class ChartFactory:
         temp_keys = ["temp_lower", "temp_upper"]
         dash_styles = ["dash", "dot"]
         for i, key in enumerate(temp_keys):
-            if key in data['ts'] and data['ts'][key]:
+            if key in data['ts'] and len(data['ts'][key]):
                 fig.add_trace(
                     go.Scatter(
                         x=data['times'],
@@ -468,7 +471,7 @@ class ChartFactory:
         key = "h_to_upper"
         if key in data['ts']:
             # invert values so transfer appears upward
-            y_values = [-v for v in data['ts'][key]]
+            y_values = -data['ts'][key]
             fig.add_trace(
                 go.Bar(
                     x=data['times'],
@@ -702,8 +705,8 @@ class ChartFactory:
         
         for i, key in enumerate(bar_keys):
             if key in data['ts']:
-                offset_times = [t + timedelta(minutes=i*10) for t in data['times']]
-                y_values = [-v if key in data['inverted_keys'] else v for v in data['ts'][key]]
+                offset_times = data['times'] + np.timedelta64(i * 10, 'm')
+                y_values = -data['ts'][key] if key in data['inverted_keys'] else data['ts'][key]
                 
                 fig.add_trace(
                     go.Bar(
@@ -803,7 +806,7 @@ def presentation_single(solution: Dict[str, Any]) -> str:
         if key in data['ts']:
             fig.add_trace(
                 go.Scatter(
-                    x=[t + timedelta(hours=1) for t in data['times']],
+                    x=data['times'] + np.timedelta64(1, 'h'),
                     y=data['ts'][key],
                     name=chart_factory.labels.get(key, key),
                     marker_color=chart_factory.color_map.get(key, chart_factory.theme.PRIMARY),
@@ -818,7 +821,7 @@ def presentation_single(solution: Dict[str, Any]) -> str:
         if key in data['ts']:
             fig.add_trace(
                 go.Scatter(
-                    x=[t + timedelta(hours=1) for t in data['times']],
+                    x=data['times'] + np.timedelta64(1, 'h'),
                     y=data['ts'][key],
                     name=chart_factory.labels.get(key, key),
                     line_dash="dot",
@@ -831,7 +834,7 @@ def presentation_single(solution: Dict[str, Any]) -> str:
     # Výkony
     for key in data['power_keys']:
         if key in data['ts']:
-            y_values = [-v if key in data['inverted_keys'] else v for v in data['ts'][key]]
+            y_values = -data['ts'][key] if key in data['inverted_keys'] else data['ts'][key]
             fig.add_trace(
                 go.Scatter(
                     x=data['times'],
@@ -849,8 +852,8 @@ def presentation_single(solution: Dict[str, Any]) -> str:
     bar_offset = 1 / len(data['bar_keys'])
     for i, key in enumerate(data['bar_keys']):
         if key in data['ts']:
-            offset_times = [t + timedelta(minutes=i*10) for t in data['times']]
-            y_values = [-v if key in data['inverted_keys'] else v for v in data['ts'][key]]
+            offset_times = data['times'] + np.timedelta64(i * 10, 'm')
+            y_values = -data['ts'][key] if key in data['inverted_keys'] else data['ts'][key]
             fig.add_trace(
                 go.Bar(
                     x=offset_times,
@@ -897,7 +900,7 @@ def presentation_single(solution: Dict[str, Any]) -> str:
                 )
         
         for key in ["temp_lower", "temp_upper"]:
-            if key in data['ts'] and data['ts'][key]:
+            if key in data['ts'] and len(data['ts'][key]):
                 fig.add_trace(
                     go.Scatter(
                         x=data['times'],
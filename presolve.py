@@ -0,0 +1,233 @@
+"""
+presolve.py
+-----------
+Redukce LP/MILP modelu před předáním řešiči CBC.
+
+Model se v optimalizátoru skládá čitelně po slotech, a obsahuje proto
+nadbytečnou strukturu, kterou CBC musí načíst (přes dočasný .mps/.lp soubor)
+a sám zpracovat:
+
+• fixní proměnné   – rovnost na data (`h_out_upper[t] == tuv_demand[t]`)
+                     nebo shodné meze; dosadí se jako konstanty
+• řádky s jednou proměnnou – (`b_soc_under[t] >= 0`, `b_soc[t] >= b_min`,
+                     `h_in_lower[t] <= h_lower_power`) se převedou na meze
+                     proměnné
+• aliasy           – proměnná definovaná jedinou rovností a jinde
+                     nepoužitá (`b_power[t] == b_charge[t] - b_discharge[t]`),
+                     jejíž meze rovnost sama zaručuje; dopočítá se po řešení
+• duplicitní řádky – stejná levá strana i směr, ponechá se nejtěsnější
+
+`reduce_problem` vrací redukovaný problém nad stejnými objekty proměnných
+a funkci `postsolve`, která po řešení doplní `varValue` odstraněných
+proměnných – extrakce výsledků tak zůstává beze změny. Celočíselné
+proměnné se jen dosazují, meze se jim nemění (MILP heuristika s nimi
+manipuluje sama).
+"""
+
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Tuple
+
+EPS = 1e-9
+
+
+class InfeasibleModel(RuntimeError):
+    """Redukce odhalila, že model nemá přípustné řešení."""
+
+
+@dataclass
+class ReductionStats:
+    variables_before: int = 0
+    variables_after: int = 0
+    constraints_before: int = 0
+    constraints_after: int = 0
+    fixed: int = 0
+    aliases: int = 0
+    bound_rows: int = 0
+    duplicate_rows: int = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
+    def __str__(self) -> str:
+        return (
+            f"proměnné {self.variables_before} → {self.variables_after}, "
+            f"omezení {self.constraints_before} → {self.constraints_after} "
+            f"(fixní {self.fixed}, aliasy {self.aliases}, meze {self.bound_rows}, duplicity {self.duplicate_rows})"
+        )
+
+
+class _Row:
+    """Řádek  sum(coef · var)  <sense>  rhs  (sense: -1 ≤, 0 =, 1 ≥)."""
+
+    __slots__ = ("name", "coefs", "sense", "rhs")
+
+    def __init__(self, name: str, coefs: Dict[Any, float], sense: int, rhs: float):
+        self.name = name
+        self.coefs = coefs
+        self.sense = sense
+        self.rhs = rhs
+
+    def satisfied(self, activity: float = 0.0) -> bool:
+        if self.sense == 0:
+            return abs(activity - self.rhs) <= EPS * max(1.0, abs(self.rhs))
+        return self.sense * (activity - self.rhs) >= -EPS * max(1.0, abs(self.rhs))
+
+
+def _is_integer(var) -> bool:
+    return var.cat != "Continuous"
+
+
+def _activity_range(coefs: Dict[Any, float]) -> Tuple[float, float]:
+    """Rozsah hodnot výrazu podle mezí proměnných (±inf pro neomezené)."""
+    low = high = 0.0
+    for var, coef in coefs.items():
+        lo = var.lowBound if var.lowBound is not None else -float("inf")
+        hi = var.upBound if var.upBound is not None else float("inf")
+        a, b = coef * lo, coef * hi
+        low += min(a, b)
+        high += max(a, b)
+    return low, high
+
+
+def reduce_problem(prob) -> Tuple[Any, Callable[[], None], ReductionStats]:
+    """
+    Zredukuje problém PuLP. Vrací (redukovaný problém, postsolve, statistiky).
+
+    Vyhazuje `InfeasibleModel`, pokud redukce narazí na spor v mezích.
+    """
+    from pulp import LpAffineExpression, LpConstraint, LpProblem
+
+    original = prob.variables()
+    stats = ReductionStats(
+        variables_before=len(original),
+        constraints_before=len(prob.constraints),
+    )
+
+    rows: List[_Row] = [
+        _Row(name, dict(c.items()), c.sense, -c.constant)
+        for name, c in prob.constraints.items()
+    ]
+    objective = dict(prob.objective.items()) if prob.objective is not None else {}
+    objective_constant = prob.objective.constant if prob.objective is not None else 0.0
+
+    fixed: Dict[Any, float] = {}
+    aliases: List[Tuple[Any, float, Dict[Any, float]]] = []
+
+    def fix(var, value: float) -> None:
+        fixed[var] = value
+        stats.fixed += 1
+
+    for row in rows:
+        for var in row.coefs:
+            if var not in fixed and var.lowBound is not None and var.lowBound == var.upBound:
+                fix(var, var.lowBound)
+
+    changed = True
+    while changed:
+        changed = False
+        kept: List[_Row] = []
+        for row in rows:
+            # Dosazení fixních proměnných na pravou stranu
+            for var in [v for v in row.coefs if v in fixed]:
+                row.rhs -= row.coefs.pop(var) * fixed[var]
+            row.coefs = {v: c for v, c in row.coefs.items() if c != 0}
+
+            if not row.coefs:
+                if not row.satisfied():
+                    raise InfeasibleModel(f"Omezení {row.name} nelze splnit")
+                continue
+
+            if len(row.coefs) == 1:
+                (var, coef), = row.coefs.items()
+                if not _is_integer(var):
+                    bound = row.rhs / coef
+                    sense = row.sense if coef > 0 else -row.sense
+                    if sense >= 0 and (var.lowBound is None or bound > var.lowBound):
+                        var.lowBound = bound
+                    if sense <= 0 and (var.upBound is None or bound < var.upBound):
+                        var.upBound = bound
+                    if var.lowBound is not None and var.upBound is not None:
+                        if var.lowBound > var.upBound + EPS * max(1.0, abs(var.upBound)):
+                            raise InfeasibleModel(f"Meze proměnné {var.name} jsou ve sporu ({row.name})")
+                        if var.lowBound >= var.upBound:
+                            var.lowBound = var.upBound
+                            fix(var, var.upBound)
+                            changed = True
+                    stats.bound_rows += 1
+                    continue
+            kept.append(row)
+        rows = kept
+
+    # Fixní proměnné v účelové funkci → konstanta
+    for var in [v for v in objective if v in fixed]:
+        objective_constant += objective.pop(var) * fixed[var]
+
+    # Aliasy: spojitá proměnná jen v jediné rovnosti a mimo účelovou funkci
+    occurrences: Dict[Any, List[_Row]] = {}
+    for row in rows:
+        for var in row.coefs:
+            occurrences.setdefault(var, []).append(row)
+    removed = set()
+    for var, var_rows in occurrences.items():
+        if len(var_rows) != 1 or var in objective or _is_integer(var):
+            continue
+        row = var_rows[0]
+        if row.sense != 0 or id(row) in removed or len(row.coefs) < 2:
+            continue
+        coef = row.coefs[var]
+        others = {v: -c / coef for v, c in row.coefs.items() if v is not var}
+        low, high = _activity_range(others)
+        low += row.rhs / coef
+        high += row.rhs / coef
+        if var.lowBound is not None and low < var.lowBound - EPS:
+            continue
+        if var.upBound is not None and high > var.upBound + EPS:
+            continue
+        aliases.append((var, row.rhs / coef, others))
+        removed.add(id(row))
+        stats.aliases += 1
+    rows = [row for row in rows if id(row) not in removed]
+
+    # Duplicitní řádky (stejná levá strana a směr) – ponechá se nejtěsnější
+    unique: Dict[Tuple, _Row] = {}
+    for row in rows:
+        key = (row.sense, tuple(sorted((v.name, c) for v, c in row.coefs.items())))
+        other = unique.get(key)
+        if other is None:
+            unique[key] = row
+            continue
+        stats.duplicate_rows += 1
+        if row.sense == 0:
+            if abs(row.rhs - other.rhs) > EPS * max(1.0, abs(row.rhs)):
+                raise InfeasibleModel(f"Rovnosti {other.name} a {row.name} jsou ve sporu")
+        elif row.sense * (row.rhs - other.rhs) > 0:
+            other.rhs = row.rhs
+
+    reduced = LpProblem(prob.name, prob.sense)
+    reduced += LpAffineExpression(list(objective.items()), constant=objective_constant)
+    for row in unique.values():
+        reduced.addConstraint(
+            LpConstraint(LpAffineExpression(list(row.coefs.items())), sense=row.sense, rhs=row.rhs),
+            name=row.name,
+        )
+
+    kept_vars = set(reduced.variables())
+    alias_vars = {var for var, _, _ in aliases}
+    # Proměnné, které po převodu řádků na meze zmizely z modelu úplně
+    dropped = [v for v in original if v not in kept_vars and v not in fixed and v not in alias_vars]
+
+    stats.variables_after = len(kept_vars)
+    stats.constraints_after = len(reduced.constraints)
+
+    def postsolve() -> None:
+        """Doplní hodnoty odstraněných proměnných podle vyřešeného problému."""
+        for var, value in fixed.items():
+            var.varValue = value
+        for var in dropped:
+            var.varValue = min(max(0.0, var.lowBound if var.lowBound is not None else -float("inf")),
+                               var.upBound if var.upBound is not None else float("inf"))
+        # Výraz aliasu obsahuje jen proměnné, které zůstaly v modelu
+        for var, constant, others in aliases:
+            var.varValue = constant + sum(c * (v.varValue or 0.0) for v, c in others.items())
+
+    return reduced, postsolve, stats
@@ -0,0 +1,303 @@
+"""
+remotecontrol.py
+----------------
+Streamování výkonových setpointů do Solax Gen4 přes RemoteControl.
+
+RemoteControl příkazy platí jen `remotecontrol_duration` sekund (standardně
+20 s, viz docs/RemoteControl.md) a nezapisují se do EEPROM, takže je lze
+posílat libovolně často. Streamer převádí plánované `b_power` / `g_buy`
+každého slotu na příkazy Battery Control nebo Grid Control a opakuje je
+na přesném časovači (asyncio, bez kumulace zpoždění). Na hranici slotu
+pošle nový příkaz okamžitě, nečeká na další automatizaci v HA.
+
+Transport je vyměnitelný:
+• HATransport   – volá služby solax_modbus integrace přes REST API HA
+• FakeInverter  – lokální simulace střídače s expirací příkazů (testy)
+"""
+
+import asyncio
+import bisect
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from options import get_option
+from solution import Solution
+
+# Režimy RemoteControl (select.solax_remotecontrol_power_control)
+POWER_CONTROL_DISABLED = "Disabled"
+POWER_CONTROL_BATTERY = "Enabled Battery Control"
+POWER_CONTROL_GRID = "Enabled Grid Control"
+
+COMMAND_DURATION = 20   # s – platnost jednoho příkazu ve střídači
+REPEAT_PERIOD = 10.0    # s – perioda opakování (musí být kratší než platnost)
+
+# Entity integrace homeassistant-solax-modbus
+ENTITY_POWER_CONTROL = "select.solax_remotecontrol_power_control"
+ENTITY_ACTIVE_POWER = "number.solax_remotecontrol_active_power"
+ENTITY_DURATION = "number.solax_remotecontrol_duration"
+ENTITY_IMPORT_LIMIT = "number.solax_remotecontrol_import_limit"
+ENTITY_TRIGGER = "button.solax_remotecontrol_trigger"
+
+
+@dataclass(frozen=True)
+class RemoteControlCommand:
+    """Jeden RemoteControl příkaz (kladný výkon = nabíjení / import)."""
+    power_control: str
+    active_power: int          # W
+    duration: int = COMMAND_DURATION
+    import_limit: Optional[int] = None  # W, jen pro Grid Control
+
+
+def slot_command(sol: Dict[str, Any], slot_index: int, mode: str = "battery",
+                 duration: int = COMMAND_DURATION) -> RemoteControlCommand:
+    """
+    Převede výstupy optimalizátoru pro daný slot na RemoteControl příkaz.
+
+    mode="battery" – Battery Control s výkonem baterie `b_power`
+    mode="grid"    – Grid Control s výkonem na síťovém rozhraní `g_buy - g_sell`
+    """
+    out = sol["outputs"]
+    if mode == "grid":
+        power = out["g_buy"][slot_index] - out["g_sell"][slot_index]
+        grid_limit = get_option(sol.get("options") or {}, "grid_limit")
+        return RemoteControlCommand(
+            POWER_CONTROL_GRID,
+            int(round(power * 1000)),
+            duration,
+            int(grid_limit * 1000) if grid_limit else None,
+        )
+    power = out["b_charge"][slot_index] - out["b_discharge"][slot_index]
+    return RemoteControlCommand(POWER_CONTROL_BATTERY, int(round(power * 1000)), duration)
+
+
+def plan_to_commands(sol: Dict[str, Any], mode: str = "battery",
+                     duration: int = COMMAND_DURATION) -> List[Tuple[float, float, RemoteControlCommand]]:
+    """
+    Rozvrh příkazů pro celý plán: seznam (začátek, konec, příkaz), časy jako
+    epoch sekundy. Poslední slot trvá hodinu.
+    """
+    sol = Solution.from_dict(sol)
+    starts = sol.epoch.tolist()
+    schedule = []
+    for i, start in enumerate(starts):
+        end = starts[i + 1] if i + 1 < len(starts) else start + 3600.0
+        schedule.append((start, end, slot_command(sol, i, mode, duration)))
+    return schedule
+
+
+# --- Transporty -----------------------------------------------------------
+
+class RemoteControlTransport:
+    """Rozhraní transportu – doručí příkaz do střídače."""
+
+    async def send(self, command: RemoteControlCommand) -> None:
+        raise NotImplementedError
+
+
+class HATransport(RemoteControlTransport):
+    """
+    Posílá příkazy přes služby Home Assistantu (integrace solax_modbus).
+
+    Parametry se zapisují jen při změně, trigger se mačká při každém
+    opakování. Blokující HTTP volání běží mimo event loop.
+    """
+
+    def __init__(self):
+        self._last: Optional[RemoteControlCommand] = None
+
+    def _call(self, domain: str, service: str, data: Dict[str, Any]) -> None:
+        from data_connector import get_client
+
+        client = get_client()
+        resp = client.session.post(f"{client.url}/api/services/{domain}/{service}", json=data, timeout=5)
+        resp.raise_for_status()
+
+    def _send_sync(self, command: RemoteControlCommand) -> None:
+        last = self._last
+        if last is None or last.power_control != command.power_control:
+            self._call("select", "select_option", {"entity_id": ENTITY_POWER_CONTROL, "option": command.power_control})
+        if last is None or last.active_power != command.active_power:
+            self._call("number", "set_value", {"entity_id": ENTITY_ACTIVE_POWER, "value": command.active_power})
+        if last is None or last.duration != command.duration:
+            self._call("number", "set_value", {"entity_id": ENTITY_DURATION, "value": command.duration})
+        if command.import_limit is not None and (last is None or last.import_limit != command.import_limit):
+            self._call("number", "set_value", {"entity_id": ENTITY_IMPORT_LIMIT, "value": command.import_limit})
+        self._call("button", "press", {"entity_id": ENTITY_TRIGGER})
+        self._last = command
+
+    async def send(self, command: RemoteControlCommand) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._send_sync, command)
+
+
+class FakeInverter(RemoteControlTransport):
+    """
+    Lokální simulace střídače pro testy.
+
+    Ukládá přijaté příkazy s časem doručení a stejně jako Gen4 střídač je
+    po `duration` sekundách bez obnovení považuje za vypršelé.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.received: List[Tuple[float, RemoteControlCommand]] = []
+
+    async def send(self, command: RemoteControlCommand) -> None:
+        self.received.append((self.clock(), command))
+
+    def active(self, now: Optional[float] = None) -> Optional[RemoteControlCommand]:
+        """Příkaz platný v čase `now` (None = příkaz vypršel, střídač řídí sám)."""
+        now = self.clock() if now is None else now
+        for sent_at, command in reversed(self.received):
+            if sent_at <= now:
+                return command if now - sent_at < command.duration else None
+        return None
+
+    def max_gap(self) -> float:
+        """Nejdelší interval mezi dvěma doručenými příkazy [s]."""
+        times = [t for t, _ in self.received]
+        return max((b - a for a, b in zip(times, times[1:])), default=0.0)
+
+
+# --- Streamer -------------------------------------------------------------
+
+class SetpointStreamer:
+    """
+    Opakuje RemoteControl příkaz aktuálního slotu na přesném časovači.
+
+    Časy opakování se počítají od pevného počátku (`start + k * period`),
+    takže se zpoždění jednotlivých odeslání nesčítá. Na hranici slotu se
+    časovač přefázuje a nový příkaz odejde okamžitě.
+
+    `clock` (epoch s) a `sleep` (korutina) jsou vyměnitelné, testy tak
+    rozvrh ověřují na simulovaném čase.
+    """
+
+    def __init__(self, transport: RemoteControlTransport, mode: str = "battery",
+                 period: float = REPEAT_PERIOD, duration: int = COMMAND_DURATION,
+                 clock: Callable[[], float] = time.time,
+                 sleep: Callable[[float], Awaitable[None]] = asyncio.sleep):
+        if period >= duration:
+            raise ValueError("Perioda opakování musí být kratší než platnost příkazu")
+        self.transport = transport
+        self.mode = mode
+        self.period = period
+        self.duration = duration
+        self.clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._starts: List[float] = []
+        self._schedule: List[Tuple[float, float, RemoteControlCommand]] = []
+        self._override: Optional[RemoteControlCommand] = None
+        self._override_until = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._running = False
+        self.errors = 0
+
+    # -- plán ----------------------------------------------------------------
+
+    def update_plan(self, sol: Dict[str, Any]) -> None:
+        """Nahradí rozvrh novým plánem (lze volat z libovolného vlákna)."""
+        schedule = plan_to_commands(sol, self.mode, self.duration)
+        with self._lock:
+            self._schedule = schedule
+            self._starts = [start for start, _, _ in schedule]
+        self._notify()
+
+    def set_override(self, command: Optional[RemoteControlCommand], until: Optional[float] = None) -> None:
+        """
+        Přebije plánovaný příkaz (např. rychlou regulací), None = zpět na plán.
+
+        Přebití platí do `until` (epoch s), standardně po dobu platnosti
+        příkazu; pokud ho volající neobnoví, streamer se vrátí k plánu.
+        """
+        with self._lock:
+            self._override = command
+            self._override_until = until if until is not None else self.clock() + self.duration
+        self._notify()
+
+    def current_command(self, now: Optional[float] = None) -> Optional[RemoteControlCommand]:
+        """Příkaz pro čas `now` (epoch s); mimo plán None."""
+        now = self.clock() if now is None else now
+        with self._lock:
+            if self._override is not None:
+                if now < self._override_until:
+                    return self._override
+                self._override = None
+            i = bisect.bisect_right(self._starts, now) - 1
+            if i < 0:
+                return None
+            start, end, command = self._schedule[i]
+            return command if now < end else None
+
+    def next_boundary(self, now: Optional[float] = None) -> Optional[float]:
+        """Začátek následujícího slotu (epoch s), nebo None."""
+        now = self.clock() if now is None else now
+        with self._lock:
+            i = bisect.bisect_right(self._starts, now)
+            return self._starts[i] if i < len(self._starts) else None
+
+    # -- smyčka --------------------------------------------------------------
+
+    def _notify(self) -> None:
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _send_current(self) -> None:
+        command = self.current_command()
+        if command is None:
+            return
+        try:
+            await self.transport.send(command)
+        except Exception as e:
+            self.errors += 1
+            print(f"[ERR] RemoteControl: {e}")
+
+    async def _wait(self, delay: float) -> None:
+        """Čeká `delay` sekund, nebo do probuzení novým plánem / zastavením."""
+        wakeup = asyncio.ensure_future(self._wakeup.wait())
+        sleep = asyncio.ensure_future(self._sleep(delay))
+        try:
+            await asyncio.wait({wakeup, sleep}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            wakeup.cancel()
+            sleep.cancel()
+
+    async def run(self) -> None:
+        """Hlavní smyčka – posílá příkaz každých `period` sekund a na hranicích slotů."""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._running = True
+        next_tick = self.clock()
+        while self._running:
+            await self._send_current()
+            next_tick += self.period
+            now = self.clock()
+            if next_tick <= now:
+                # Zpoždění delší než perioda – přeskoč zmeškané ticky, nesčítej je
+                next_tick = now + self.period - ((now - next_tick) % self.period)
+            delay = next_tick - now
+            boundary = self.next_boundary(now)
+            if boundary is not None:
+                delay = min(delay, max(0.0, boundary - now))
+            await self._wait(delay)
+            if self._wakeup.is_set() or (boundary is not None and self.clock() >= boundary):
+                # Nový plán nebo hranice slotu – pošli hned a přefázuj časovač
+                self._wakeup.clear()
+                next_tick = self.clock()
+
+    def stop(self) -> None:
+        self._running = False
+        self._notify()
+
+    def start_in_thread(self) -> "SetpointStreamer":
+        """Spustí smyčku ve vlastním vlákně s vlastním event loopem."""
+        self._thread = threading.Thread(
+            target=lambda: asyncio.run(self.run()), name="remotecontrol", daemon=True
+        )
+        self._thread.start()
+        return self
@@ -0,0 +1,125 @@
+"""
+sensitivity.py
+--------------
+Odhad změny účelové funkce při malých změnách vstupů bez přepočtu.
+
+LP řešení obsahuje duální ceny (viz `run_mpc_optimizer`):
+
+• bus_price[t]         – mezní cena 1 kWh spotřeby navíc ve slotu t [Kč/kWh]
+• grid_limit_value[t]  – hodnota 1 kWh kapacity jističe navíc ve slotu t [Kč/kWh]
+• b_value[t]           – hodnota 1 kWh navíc v baterii na začátku slotu t [Kč/kWh]
+• h_value_lower/upper  – totéž pro zóny nádrže
+
+Pro malé změny, které nezmění bázi LP, platí první řád přesně:
+
+    Δ účelové funkce = Σ g_buy·Δbuy·dt − Σ g_sell·Δsell·dt
+                       + Δm·(práh − b_short − b_surplus − h_soc_end)
+                       + Σ bus_price·(Δload − Δfve)·dt − b_value[0]·ΔSOC
+
+(ceny přes obálkovou větu z primárních hodnot, spotřeba a FVE přes duální
+ceny bilance). Člen s Δm = min(buy + Δbuy) − min(buy) platí pro koncová
+ocenění odvozená z nákupních cen – `bat_price_above`, `bat_price_below`
+a `final_boiler_price`, pokud nejsou v nastavení zadané pevně (každé je
+min(buy_price) + konstanta). Bez něj by rovnoměrné zdražení ukázalo jen
+dražší nákup, ne dražší ocenění energie zbylé na konci horizontu.
+
+Větší změny přepnou plán jinam. Optimum LP je po částech lineární: ve
+spotřebě, FVE a SOC konvexní (odhad je dolní mez skutečné změny), v
+cenách konkávní (odhad je horní mez).
+
+Řešení z rychlé cesty, DP enginu, MILP nebo dekompozice duální ceny nemají.
+"""
+
+from typing import Any, Dict, Optional, Sequence, Union
+
+import numpy as np
+
+from fast_path import terminal_bands
+from options import get_option
+
+Delta = Union[float, Sequence[float], None]
+
+DUAL_KEYS = ("bus_price", "b_value")
+# Koncová ocenění odvozená z min(buy_price), pokud nejsou zadaná v nastavení
+DERIVED_PRICES = ("bat_price_above", "bat_price_below", "final_boiler_price")
+
+
+def has_duals(solution: Dict[str, Any]) -> bool:
+    return all(key in solution["outputs"] for key in DUAL_KEYS)
+
+
+def _delta(value: Delta, n: int) -> np.ndarray:
+    """Skalár platí pro všechny sloty, seznam po slotech (kratší se doplní nulami)."""
+    if value is None:
+        return np.zeros(n)
+    if np.isscalar(value):
+        return np.full(n, float(value))
+    array = np.zeros(n)
+    values = np.asarray(value, dtype=float)[:n]
+    array[:len(values)] = values
+    return array
+
+
+def _terminal_change(solution: Dict[str, Any], options: Dict[str, Any], d_buy: np.ndarray) -> float:
+    """Změna koncových ocenění odvozených z min(buy_price) (0, když jsou všechna zadaná)."""
+    derived = [key for key in DERIVED_PRICES if key not in options]
+    if not derived or not d_buy.any():
+        return 0.0
+    outputs = solution["outputs"]
+    buy = np.asarray(solution["inputs"]["buy_price"], dtype=float)
+    d_min = float(np.min(buy + d_buy) - np.min(buy))
+    context = {"buy_price": buy.tolist()}
+    b_cap = get_option(options, "b_cap")
+    threshold = get_option(options, "bat_threshold_pct") * b_cap
+    short, surplus = terminal_bands(
+        float(outputs["b_soc"][-1]), b_cap, threshold,
+        get_option(options, "bat_price_above", context=context),
+        get_option(options, "bat_price_below", context=context),
+    )
+    # Koeficienty koncových cen v účelové funkci (viz run_mpc_optimizer)
+    coefficients = {
+        "bat_price_above": -surplus,
+        "bat_price_below": threshold - short,
+        "final_boiler_price": -(float(outputs["h_soc_lower"][-1]) + float(outputs["h_soc_upper"][-1])),
+    }
+    return d_min * sum(coefficients[key] for key in derived)
+
+
+def estimate_change(
+    solution: Dict[str, Any],
+    *,
+    buy_price: Delta = None,
+    sell_price: Delta = None,
+    load_pred: Delta = None,
+    fve_pred: Delta = None,
+    bat_soc: Optional[float] = None,
+) -> Dict[str, float]:
+    """
+    Odhad změny účelové funkce [Kč] pro změny vstupů (Δ ceny v Kč/kWh, Δ
+    spotřeby a FVE v kW, Δ SOC baterie v procentních bodech). Vrací příspěvky
+    jednotlivých změn a jejich součet; `terminal_prices` je změna koncových
+    ocenění odvozených z nákupních cen.
+    """
+    if not has_duals(solution):
+        raise ValueError("Řešení neobsahuje duální ceny (jen LP bez MILP)")
+    outputs = solution["outputs"]
+    dt = np.asarray(solution["dt"], dtype=float)
+    n = len(dt)
+    g_buy = np.asarray(outputs["g_buy"], dtype=float)
+    g_sell = np.asarray(outputs["g_sell"], dtype=float)
+    bus_price = np.asarray(outputs["bus_price"], dtype=float)
+    options = solution.get("options") or {}
+    d_buy = _delta(buy_price, n)
+
+    parts = {
+        "buy_price": float(g_buy * d_buy @ dt),
+        "terminal_prices": _terminal_change(solution, options, d_buy),
+        "sell_price": -float(g_sell * _delta(sell_price, n) @ dt),
+        "load_pred": float(bus_price * _delta(load_pred, n) @ dt),
+        "fve_pred": -float(bus_price * _delta(fve_pred, n) @ dt),
+        "bat_soc": 0.0,
+    }
+    if bat_soc:
+        b_cap = get_option(options, "b_cap")
+        parts["bat_soc"] = -float(outputs["b_value"][0]) * bat_soc / 100 * b_cap
+    return {**parts, "objective_change": sum(parts.values())}
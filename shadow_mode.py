@@ -0,0 +1,325 @@
+"""
+shadow_mode.py
+--------------
+Stínový režim: alternativní profily nastavení řešené s každým přepočtem.
+
+Po uložení a publikaci hlavního plánu se nad stejnými vstupy (`inputs`,
+`initials`, `times`, `dt` uloženého řešení) vyřeší i profily ze
+`shadow_profiles.json` ve vlastním poolu "shadow" (`powerplan_workers`) se
+sníženou prioritou procesů. Úlohy se jen odešlou a výsledky se zapisují
+z callbacku; hlavní výpočet ani dekompozice se s nimi nedělí o frontu.
+Publikuje se vždy jen hlavní plán.
+
+Stínová řešení se ukládají do `results/shadow/result_<běh>_<profil>.json`
+a každý běh (hlavní i stínový) se zapíše řádkem do denní knihy
+`results/shadow/ledger_<den>.jsonl`:
+
+• planned_slot_cost     – plánovaný náklad prvního slotu: nákup − prodej [Kč]
+• planned_battery_delta – plánovaná změna energie baterie v prvním slotu [kWh]
+• planned_tank_heat     – plánované teplo dodané do nádrže v prvním slotu [kWh]
+• planned_adjusted_cost – planned_slot_cost − min(buy_price) · (baterie + teplo);
+                          hrubá korekce, aby profil, který jen nabíjí, nevypadal
+                          dražší než profil, který vybíjí
+
+Jde o ukazatele z plánu (LP) prvního slotu – provádí se jen hlavní plán,
+takže skutečný náklad stínového profilu neexistuje. Teplo i energie baterie
+se oceňují stejnou cenou, i když jejich hodnota se liší; ukazatel slouží ke
+srovnání profilů mezi sebou.
+
+Skutečný náklad hlavního plánu se měří z počítadel energie střídače
+(`HAEnergyCounters`, celkový import / export v kWh), která se čtou s každým
+během. Rozdíl počítadel mezi dvěma po sobě jdoucími běhy ocení cenami
+prvního slotu dřívějšího běhu; intervaly přes hranici slotu (po výpadku
+nebo vynechaném běhu) se vynechají. Za stejné intervaly se plánované výkony
+prvního slotu přepočtou na plánovaný náklad hlavního i stínových profilů.
+Odhad skutečného nákladu profilu předpokládá stejnou chybu předpovědi jako
+u hlavního plánu: skutečný náklad + (plán profilu − plán hlavní).
+
+Endpointy:
+• GET/POST /api/shadow/profiles – profily {název: {parametr: hodnota}}
+• GET /api/shadow/report?days=7 – souhrn profilů oproti hlavnímu plánu
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Any, Dict, List, Optional
+
+from flask import Blueprint, jsonify, request
+
+from options import get_option
+from powerplan_environment import DATA_DIR, RESULTS_DIR
+from powerplan_whatif import candidate_settings
+from powerplan_workers import get_pool, solve_case
+
+shadow_bp = Blueprint("shadow_bp", __name__)
+
+SHADOW_DIR = os.path.join(RESULTS_DIR, "shadow")
+PROFILES_FILE = os.path.join(DATA_DIR, "shadow_profiles.json")
+PRIMARY = "primary"
+
+# Počítadla energie střídače (solax_modbus, kWh, rostoucí)
+ENTITY_GRID_IMPORT_TOTAL = "sensor.solax_grid_import_total"
+ENTITY_GRID_EXPORT_TOTAL = "sensor.solax_grid_export_total"
+# Delší mezera mezi běhy (výpadek, restart) se do skutečných nákladů nezapočte
+MAX_REALIZED_GAP = 900.0  # s
+# Tolerance konce slotu – počítadla se čtou až po dokončení výpočtu
+SLOT_END_TOLERANCE = 60.0  # s
+
+
+def load_profiles() -> Dict[str, Dict[str, Any]]:
+    try:
+        with open(PROFILES_FILE, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError, ValueError):
+        return {}
+
+
+def save_profiles(profiles: Dict[str, Dict[str, Any]]) -> None:
+    with open(PROFILES_FILE, "w") as f:
+        json.dump(profiles, f, indent=2)
+
+
+def _ledger_file(day: str) -> str:
+    return os.path.join(SHADOW_DIR, f"ledger_{day}.jsonl")
+
+
+def slot_record(solution: Dict[str, Any], profile: str, run: str) -> Dict[str, Any]:
+    """Plánované ukazatele prvního slotu pro knihu stínového režimu."""
+    outputs, inputs = solution["outputs"], solution["inputs"]
+    options = solution.get("options") or {}
+    dt0 = float(solution["dt"][0])
+    slot_cost = (float(outputs["g_buy"][0]) * inputs["buy_price"][0]
+                 - float(outputs["g_sell"][0]) * inputs["sell_price"][0]) * dt0
+
+    b_cap = get_option(options, "b_cap")
+    soc_init = min(max(solution["initials"]["bat_soc"] / 100 * b_cap, get_option(options, "b_min")),
+                   get_option(options, "b_max"))
+    battery_delta = float(outputs["b_soc"][0]) - soc_init
+    # Dodané teplo; odběr a ztráty jsou pro všechny profily téměř stejné
+    tank_delta = (float(outputs["h_in_lower"][0]) + float(outputs["h_in_upper"][0])) * dt0
+    value = min(inputs["buy_price"])
+    times = solution["times"]
+    slot_end = (datetime.fromisoformat(times[1]).timestamp() if len(times) > 1
+                else datetime.fromisoformat(times[0]).timestamp() + 3600.0)
+
+    return {
+        "run": run,
+        "profile": profile,
+        "generated_at": solution.get("generated_at"),
+        "objective": solution["results"].get("objective_value"),
+        "net_bilance": solution["results"].get("net_bilance"),
+        "solver": solution.get("solver"),
+        "buy_price": inputs["buy_price"][0],
+        "sell_price": inputs["sell_price"][0],
+        "planned_rate": slot_cost / dt0 if dt0 > 0 else 0.0,
+        "slot_end": slot_end,
+        "planned_slot_cost": slot_cost,
+        "planned_battery_delta": battery_delta,
+        "planned_tank_heat": tank_delta,
+        "planned_adjusted_cost": slot_cost - value * (battery_delta + tank_delta),
+    }
+
+
+class HAEnergyCounters:
+    """Čte celkový import a export ze sítě [kWh] z počítadel střídače v HA."""
+
+    def _state(self, client, entity_id: str) -> float:
+        resp = client.session.get(f"{client.url}/api/states/{entity_id}", timeout=3)
+        resp.raise_for_status()
+        return float(resp.json()["state"])
+
+    def read(self) -> Dict[str, float]:
+        from data_connector import get_client
+
+        client = get_client()
+        return {
+            "import_total": self._state(client, ENTITY_GRID_IMPORT_TOTAL),
+            "export_total": self._state(client, ENTITY_GRID_EXPORT_TOTAL),
+        }
+
+
+class ShadowRunner:
+    """
+    Odesílá stínové profily do poolu a zapisuje jejich výsledky. S `meter`
+    (`HAEnergyCounters`) se k hlavnímu plánu zapíše i stav počítadel energie.
+    """
+
+    def __init__(self, meter=None):
+        self.meter = meter
+        self._pending: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _append(self, record: Dict[str, Any]) -> None:
+        os.makedirs(SHADOW_DIR, exist_ok=True)
+        day = record["run"][:8]
+        with self._lock, open(_ledger_file(day), "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def submit(self, solution, run: str) -> int:
+        """
+        Zapíše hlavní plán do knihy a odešle profily k řešení; nečeká na ně.
+        Profil, jehož předchozí běh ještě neskončil, se v tomto cyklu vynechá.
+        Vrací počet odeslaných profilů.
+        """
+        profiles = load_profiles()
+        if not profiles:
+            return 0
+        record = slot_record(solution, PRIMARY, run)
+        if self.meter is not None:
+            try:
+                record.update(self.meter.read(), measured_at=time.time())
+            except Exception as e:
+                print(f"[shadow] Počítadla energie nelze přečíst: {e}")
+        self._append(record)
+
+        pool = get_pool("shadow")
+        submitted = 0
+        for name, overrides in profiles.items():
+            with self._lock:
+                previous = self._pending.get(name)
+                if previous is not None and not previous.done():
+                    print(f"[shadow] {name}: předchozí běh ještě neskončil, vynecháno")
+                    continue
+            try:
+                settings = candidate_settings(solution.get("options") or {}, overrides)
+            except ValueError as e:
+                print(f"[shadow] {name}: neplatný profil ({e})")
+                continue
+            future = pool.submit(
+                solve_case, solution["inputs"], solution["initials"], solution["times"], settings, solution["dt"],
+            )
+            future.add_done_callback(partial(self._done, name, run))
+            with self._lock:
+                self._pending[name] = future
+            submitted += 1
+        return submitted
+
+    def _done(self, profile: str, run: str, future) -> None:
+        try:
+            shadow = future.result()
+            shadow_file = os.path.join(SHADOW_DIR, f"result_{run}_{profile}.json")
+            os.makedirs(SHADOW_DIR, exist_ok=True)
+            with open(shadow_file, "w") as f:
+                json.dump(shadow.to_dict(), f)
+            self._append(slot_record(shadow, profile, run))
+        except Exception as e:
+            self._append({"run": run, "profile": profile, "error": str(e)})
+
+
+def load_ledger(days: int = 7, today: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    today = today or datetime.now()
+    records = []
+    for i in range(days - 1, -1, -1):
+        path = _ledger_file((today - timedelta(days=i)).strftime("%Y%m%d"))
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                records += [json.loads(line) for line in f if line.strip()]
+    return records
+
+
+def realized_intervals(primary: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """
+    Skutečný náklad hlavního plánu mezi po sobě jdoucími běhy s počítadly:
+    běh → {"hours", "cost"} za interval od tohoto běhu do dalšího.
+    """
+    measured = sorted((r for r in primary if "measured_at" in r), key=lambda r: r["measured_at"])
+    intervals = {}
+    for a, b in zip(measured, measured[1:]):
+        seconds = b["measured_at"] - a["measured_at"]
+        bought = b["import_total"] - a["import_total"]
+        sold = b["export_total"] - a["export_total"]
+        # Reset počítadel nebo výpadek mezi běhy – interval nelze ocenit
+        if not 0 < seconds <= MAX_REALIZED_GAP or bought < 0 or sold < 0:
+            continue
+        # Ceny prvního slotu platí jen do jeho konce
+        if b["measured_at"] > a.get("slot_end", float("inf")) + SLOT_END_TOLERANCE:
+            continue
+        intervals[a["run"]] = {
+            "hours": seconds / 3600.0,
+            "cost": bought * a["buy_price"] - sold * a["sell_price"],
+        }
+    return intervals
+
+
+def report(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Souhrn profilů oproti hlavnímu plánu přes běhy, kde jsou oba výsledky
+    (součty plánovaných ukazatelů prvního slotu, viz `slot_record`), a
+    srovnání se skutečnými náklady hlavního plánu za změřené intervaly.
+    """
+    primary = {r["run"]: r for r in records if r["profile"] == PRIMARY and "error" not in r}
+    realized = realized_intervals(list(primary.values()))
+    profiles: Dict[str, Dict[str, Any]] = {}
+    for r in records:
+        if r["profile"] == PRIMARY:
+            continue
+        p = profiles.setdefault(r["profile"], {
+            "runs": 0, "errors": 0, "planned_slot_cost": 0.0, "planned_adjusted_cost": 0.0,
+            "primary_planned_slot_cost": 0.0, "primary_planned_adjusted_cost": 0.0, "objective_diff": 0.0,
+            "realized_runs": 0, "primary_realized_cost": 0.0, "primary_interval_cost": 0.0,
+            "interval_cost": 0.0,
+        })
+        if "error" in r:
+            p["errors"] += 1
+            continue
+        base = primary.get(r["run"])
+        if base is None:
+            continue
+        p["runs"] += 1
+        for key in ("planned_slot_cost", "planned_adjusted_cost"):
+            p[key] += r[key]
+            p[f"primary_{key}"] += base[key]
+        if r["objective"] is not None and base["objective"] is not None:
+            p["objective_diff"] += r["objective"] - base["objective"]
+        interval = realized.get(r["run"])
+        if interval is not None and "planned_rate" in r:
+            p["realized_runs"] += 1
+            p["primary_realized_cost"] += interval["cost"]
+            p["primary_interval_cost"] += base["planned_rate"] * interval["hours"]
+            p["interval_cost"] += r["planned_rate"] * interval["hours"]
+
+    for p in profiles.values():
+        p["planned_adjusted_saving"] = p["primary_planned_adjusted_cost"] - p["planned_adjusted_cost"]
+        diff = p.pop("objective_diff")
+        p["mean_objective_diff"] = diff / p["runs"] if p["runs"] else None
+        # Profil by měl stejnou chybu předpovědi jako hlavní plán
+        p["estimated_realized_cost"] = (
+            p["primary_realized_cost"] + p["interval_cost"] - p["primary_interval_cost"]
+            if p["realized_runs"] else None
+        )
+    return {
+        "primary_runs": len(primary),
+        "realized": {
+            "intervals": len(realized),
+            "hours": sum(i["hours"] for i in realized.values()),
+            "cost": sum(i["cost"] for i in realized.values()),
+            "planned_cost": sum(primary[run]["planned_rate"] * i["hours"] for run, i in realized.items()),
+        },
+        "profiles": profiles,
+    }
+
+
+@shadow_bp.route("/api/shadow/profiles", methods=["GET", "POST"])
+def api_shadow_profiles():
+    if request.method == "GET":
+        return jsonify(load_profiles())
+    profiles = request.get_json(silent=True)
+    if not isinstance(profiles, dict) or not all(isinstance(v, dict) for v in profiles.values()):
+        return jsonify({"error": "Očekáván objekt {název: {parametr: hodnota}}"}), 400
+    try:
+        for overrides in profiles.values():
+            candidate_settings({}, overrides)
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+    save_profiles(profiles)
+    return jsonify(profiles)
+
+
+@shadow_bp.route("/api/shadow/report")
+def api_shadow_report():
+    days = request.args.get("days", default=7, type=int)
+    return jsonify(report(load_ledger(max(1, days))))
@@ -0,0 +1,257 @@
+"""
+sizing_study.py
+---------------
+Studie dimenzování baterie nad ročními daty pomocí typických dnů.
+
+Rok hodinových dat je 8 760 slotů na každou konfiguraci (`b_cap`,
+`b_power`). Místo řešení všech dnů se historické dny shluknou (k-means nad
+normalizovanými profily ceny, FVE a spotřeby) do `k` typických dnů, řeší
+se jen reprezentant každého shluku (den nejbližší středu) a výsledky se
+přenásobí počtem dnů ve shluku. Dny se řeší souběžně v procesech.
+
+Přesnost odhadu ověří `--exact-sample N`: N náhodných dnů se vyřeší
+přesně a porovná s hodnotou jejich reprezentanta.
+
+Vstupní CSV (hodinové řádky, čas v ISO formátu):
+    time,buy_price,sell_price,fve_pred,load_pred[,tuv_demand,heating_demand,outdoor_temps]
+Chybějící `tuv_demand` se doplní modelem spotřeby TUV, `heating_demand` nulou.
+Dny přechodu na letní / zimní čas mají 23 / 25 hodinových řádků a řeší se
+se skutečným počtem slotů; neúplné dny (začátek a konec historie, mezery)
+se vynechají a jejich počet se vypíše.
+
+    python sizing_study.py history.csv --b-cap 10 17.4 25 --b-power 6 9 --clusters 12
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Profily, podle kterých se dny shlukují
+FEATURE_KEYS = ("buy_price", "fve_pred", "load_pred")
+# Ukazatele sčítané přes dny (váženě podle velikosti shluku); objective_value
+# zahrnuje i ocenění koncového SOC, které net_bilance neobsahuje
+KPI_KEYS = (
+    "objective_value",
+    "net_bilance",
+    "total_buy_cost",
+    "total_sell_income",
+    "grid_consumption",
+    "grid_injection",
+    "total_charged",
+    "total_discharged",
+    "total_fve_unused",
+)
+SLOTS_PER_DAY = 24
+HOUR = 3600.0  # s
+
+
+@dataclass
+class Day:
+    date: str
+    times: List[str]
+    series: Dict[str, List[float]]
+
+
+@dataclass
+class Cluster:
+    representative: int  # index dne v seznamu dnů
+    members: List[int]
+
+
+def _complete_day(times: Sequence[datetime]) -> bool:
+    """Den od půlnoci do 23:00 po hodinách – 23 až 25 slotů podle přechodu času."""
+    return (
+        SLOTS_PER_DAY - 1 <= len(times) <= SLOTS_PER_DAY + 1
+        and times[0].hour == 0 and times[-1].hour == 23
+        and all((b - a).total_seconds() == HOUR for a, b in zip(times, times[1:]))
+    )
+
+
+def load_history(path: str) -> List[Day]:
+    """Načte hodinové CSV a rozdělí ho na celé dny (neúplné dny se vynechají)."""
+    from models import get_tuv_demand
+
+    rows = defaultdict(list)
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            t = datetime.fromisoformat(row["time"])
+            if t.tzinfo is None:
+                t = t.astimezone()
+            rows[t.date().isoformat()].append((t, row))
+
+    days = []
+    skipped = 0
+    for date in sorted(rows):
+        entries = sorted(rows[date], key=lambda e: e[0])
+        if not _complete_day([t for t, _ in entries]):
+            skipped += 1
+            continue
+        series = {key: [float(r[key]) for _, r in entries] for key in ("buy_price", "sell_price", "fve_pred", "load_pred")}
+        series["tuv_demand"] = [float(r["tuv_demand"]) if r.get("tuv_demand") else get_tuv_demand(t) for t, r in entries]
+        series["heating_demand"] = [float(r.get("heating_demand") or 0.0) for _, r in entries]
+        series["outdoor_temps"] = [float(r.get("outdoor_temps") or 20.0) for _, r in entries]
+        days.append(Day(date, [t.isoformat() for t, _ in entries], series))
+    if skipped:
+        print(f"Vynecháno {skipped} neúplných dnů")
+    return days
+
+
+def day_features(days: Sequence[Day]) -> np.ndarray:
+    """
+    Matice (dny × 24·profily) se z-normalizací každého profilu přes všechny dny.
+    Profily dnů s 23 / 25 sloty se pro porovnání převzorkují na 24 hodnot.
+    """
+    grid = np.linspace(0.0, 1.0, SLOTS_PER_DAY)
+    blocks = []
+    for key in FEATURE_KEYS:
+        values = np.array([
+            np.interp(grid, np.linspace(0.0, 1.0, len(d.series[key])), d.series[key]) for d in days
+        ], dtype=float)
+        std = values.std()
+        blocks.append((values - values.mean()) / (std if std > 0 else 1.0))
+    return np.hstack(blocks)
+
+
+def kmeans(X: np.ndarray, k: int, seed: int = 0, iterations: int = 100) -> Tuple[np.ndarray, np.ndarray]:
+    """k-means s inicializací k-means++ (NumPy). Vrací (štítky, středy)."""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(X))
+    centers = [X[rng.integers(len(X))]]
+    for _ in range(1, k):
+        dist = np.min(((X[:, None, :] - np.array(centers)[None]) ** 2).sum(axis=2), axis=1)
+        if dist.sum() == 0:
+            break
+        centers.append(X[rng.choice(len(X), p=dist / dist.sum())])
+    centers = np.array(centers)
+
+    labels = np.full(len(X), -1)
+    for _ in range(iterations):
+        dist = ((X[:, None, :] - centers[None]) ** 2).sum(axis=2)
+        new_labels = dist.argmin(axis=1)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for c in range(len(centers)):
+            if (labels == c).any():
+                centers[c] = X[labels == c].mean(axis=0)
+    return labels, centers
+
+
+def typical_days(days: Sequence[Day], k: int, seed: int = 0) -> List[Cluster]:
+    """Shluky dnů; reprezentant je skutečný den nejbližší středu shluku."""
+    X = day_features(days)
+    labels, centers = kmeans(X, k, seed)
+    clusters = []
+    for c, center in enumerate(centers):
+        members = np.flatnonzero(labels == c)
+        if len(members) == 0:
+            continue
+        closest = members[np.argmin(((X[members] - center) ** 2).sum(axis=1))]
+        clusters.append(Cluster(int(closest), members.tolist()))
+    return clusters
+
+
+def solve_days(pool, days: Sequence[Day], indexes: Sequence[int], initials: Dict[str, float],
+               options: Dict[str, Any]) -> Dict[int, Dict[str, float]]:
+    """Vyřeší vybrané dny souběžně a vrátí jejich ukazatele."""
+    from powerplan_workers import solve_case
+
+    futures = {
+        i: pool.submit(solve_case, days[i].series, initials, days[i].times, options, [1.0] * len(days[i].times))
+        for i in indexes
+    }
+    return {i: {k: f.result()["results"][k] for k in KPI_KEYS} for i, f in futures.items()}
+
+
+def study(days: Sequence[Day], clusters: Sequence[Cluster], configs: Sequence[Dict[str, Any]],
+          base_options: Dict[str, Any], initials: Dict[str, float], exact_sample: int = 0,
+          workers: Optional[int] = None, seed: int = 0) -> List[Dict[str, Any]]:
+    """Pro každou konfiguraci sečte vážené výsledky typických dnů (a volitelně ověří vzorek)."""
+    cluster_of = {m: c for c, cluster in enumerate(clusters) for m in cluster.members}
+    sample = random.Random(seed).sample(range(len(days)), min(exact_sample, len(days)))
+    out = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        for config in configs:
+            options = {**base_options, **config}
+            start = time.perf_counter()
+            typical = solve_days(pool, days, [c.representative for c in clusters], initials, options)
+            totals = {
+                k: sum(typical[c.representative][k] * len(c.members) for c in clusters) for k in KPI_KEYS
+            }
+            entry = {"config": config, "totals": totals, "solved_days": len(clusters),
+                     "time": time.perf_counter() - start}
+
+            if sample:
+                exact = solve_days(pool, days, sample, initials, options)
+                errors = [
+                    typical[clusters[cluster_of[i]].representative]["net_bilance"] - exact[i]["net_bilance"]
+                    for i in sample
+                ]
+                entry["exact_check"] = {
+                    "days": len(sample),
+                    "net_bilance_bias": float(np.mean(errors)),
+                    "net_bilance_mae": float(np.mean(np.abs(errors))),
+                }
+            out.append(entry)
+            check = entry.get("exact_check")
+            print(
+                f"b_cap {config.get('b_cap', '-'):>6} b_power {config.get('b_power', '-'):>5}: "
+                f"bilance {totals['net_bilance']:10.1f} Kč, účelová funkce {totals['objective_value']:10.1f}, nákup {totals['grid_consumption']:8.0f} kWh, "
+                f"prodej {totals['grid_injection']:8.0f} kWh ({entry['time']:.1f} s)"
+                + (f", chyba/den {check['net_bilance_bias']:+.2f} ± {check['net_bilance_mae']:.2f} Kč" if check else "")
+            )
+    return out
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Studie dimenzování baterie nad typickými dny")
+    parser.add_argument("history", help="Hodinové CSV s historií (time, buy_price, sell_price, fve_pred, load_pred, ...)")
+    parser.add_argument("--b-cap", type=float, nargs="+", default=[17.4], help="Kapacity baterie [kWh]")
+    parser.add_argument("--b-power", type=float, nargs="+", default=[9.0], help="Výkony baterie [kW]")
+    parser.add_argument("--clusters", type=int, default=12, help="Počet typických dnů")
+    parser.add_argument("--exact-sample", type=int, default=0, help="Počet náhodných dnů pro přesné ověření")
+    parser.add_argument("--settings", default=None, help="JSON s nastavením optimalizátoru (jinak výchozí)")
+    parser.add_argument("--bat-soc", type=float, default=30.0, help="SOC baterie na začátku dne [%%]")
+    parser.add_argument("--temp-lower", type=float, default=40.0, help="Teplota dolní zóny na začátku dne [°C]")
+    parser.add_argument("--temp-upper", type=float, default=50.0, help="Teplota horní zóny na začátku dne [°C]")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Počet procesů")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Uložit výsledky jako JSON")
+    args = parser.parse_args(argv)
+
+    days = load_history(args.history)
+    if not days:
+        raise SystemExit("V historii nejsou žádné celé dny")
+    clusters = typical_days(days, args.clusters, args.seed)
+    print(f"{len(days)} dnů → {len(clusters)} typických dnů")
+
+    base_options = {}
+    if args.settings:
+        with open(args.settings, "r") as f:
+            base_options = json.load(f)
+    initials = {"bat_soc": args.bat_soc, "temp_lower": args.temp_lower, "temp_upper": args.temp_upper}
+    configs = [{"b_cap": cap, "b_power": power} for cap in args.b_cap for power in args.b_power]
+
+    results = study(days, clusters, configs, base_options, initials, args.exact_sample, args.workers, args.seed)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "days": len(days),
+                "clusters": [{"day": days[c.representative].date, "weight": len(c.members)} for c in clusters],
+                "results": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+solution.py
+-----------
+Typované řešení optimalizace nad sloupci NumPy.
+
+Řešení se dosud předávalo jako vnořený slovník seznamů s časy jako ISO
+řetězci, které každý konzument (akce, prezentace, index, CSV) znovu
+parsoval. `Solution` drží časové řady jako pole:
+
+• times      – datetime64[us] v UTC + `offsets` (posun časové zóny slotu v s)
+• dt         – float64 délky slotů v hodinách
+• inputs     – název → pole vstupní řady
+• outputs    – název → pole výstupní řady (dtype zachovaný z optimalizátoru)
+
+Časy se parsují jen jednou (`from_dict`), pohledy `datetimes`,
+`local_times` a `iso_times` se počítají líně a cachují. `slice()` vrací
+pohledy bez kopie dat.
+
+Kvůli kompatibilitě se chová jako slovník ve stávajícím JSON formátu
+(`sol["outputs"]["g_buy"][t]`, `sol.get("actions")`, `sol["times"]` jako
+ISO řetězce) a `to_dict()` / `from_dict()` jsou bezeztrátové (chybějící
+hodnoty jsou v polích NaN, v JSON null).
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Klíče uložené ve slotech; ostatní klíče JSON (status, actions, fallback…) jsou v `extra`
+_CORE_KEYS = ("generated_at", "times", "dt", "inputs", "outputs", "initials", "results", "options")
+
+
+def _column(values: Sequence[Any]) -> np.ndarray:
+    """Převede řadu na pole; celá čísla zůstávají int64, aby JSON zůstal stejný.
+
+    Chybějící hodnoty (None) se stanou NaN; `to_dict` je vrací zpět jako None.
+    """
+    array = np.asarray(values)
+    if array.dtype.kind not in "biuf":
+        array = np.asarray(values, dtype=float)
+    return array
+
+
+def _column_list(array: np.ndarray) -> List[Any]:
+    """Pole jako seznam pro JSON; chybějící hodnoty (NaN) se vrací jako None."""
+    if array.dtype.kind == "f" and np.isnan(array).any():
+        return [None if x != x else x for x in array.tolist()]
+    return array.tolist()
+
+
+def to_plain(value: Any) -> Any:
+    """Rekurzivně převede NumPy hodnoty na nativní typy Pythonu (pro JSON, NaN → None)."""
+    if isinstance(value, np.ndarray):
+        return _column_list(value)
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    if isinstance(value, dict):
+        return {k: to_plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_plain(v) for v in value]
+    return value
+
+
+class Solution:
+    """Řešení optimalizace se sloupci NumPy a rozhraním slovníku."""
+
+    __slots__ = (
+        "generated_at", "times", "offsets", "dt", "inputs", "outputs",
+        "initials", "results", "options", "extra", "_cache",
+    )
+
+    def __init__(self, times: Sequence[datetime], inputs: Dict[str, Sequence[float]],
+                 outputs: Dict[str, Sequence[float]], dt: Optional[Sequence[float]] = None,
+                 generated_at: Optional[str] = None, initials: Optional[Dict[str, float]] = None,
+                 results: Optional[Dict[str, Any]] = None, options: Optional[Dict[str, Any]] = None,
+                 extra: Optional[Dict[str, Any]] = None):
+        offsets = [t.utcoffset() for t in times]
+        self.offsets = np.array([o.total_seconds() if o is not None else 0 for o in offsets], dtype=np.int32)
+        self.times = np.array(
+            [(t.replace(tzinfo=None) - o if o is not None else t) for t, o in zip(times, offsets)],
+            dtype="datetime64[us]",
+        )
+        self.dt = np.asarray(dt, dtype=float) if dt is not None else None
+        self.inputs = {k: _column(v) for k, v in inputs.items()}
+        self.outputs = {k: _column(v) for k, v in outputs.items()}
+        self.generated_at = generated_at
+        self.initials = dict(initials) if initials is not None else None
+        self.results = results if results is not None else {}
+        self.options = options if options is not None else {}
+        self.extra = dict(extra or {})
+        self._cache: Dict[str, Any] = {"datetimes": list(times)}
+
+    # -- (de)serializace --------------------------------------------------------
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Solution":
+        """Vytvoří řešení ze slovníku ve formátu JSON souborů v `results/`."""
+        if isinstance(data, Solution):
+            return data
+        times = [datetime.fromisoformat(t) for t in data["times"]]
+        sol = cls(
+            times,
+            data.get("inputs", {}),
+            data.get("outputs", {}),
+            dt=data.get("dt"),
+            generated_at=data.get("generated_at"),
+            initials=data.get("initials"),
+            results=data.get("results"),
+            options=data.get("options"),
+            extra={k: v for k, v in data.items() if k not in _CORE_KEYS},
+        )
+        sol._cache["iso_times"] = list(data["times"])
+        return sol
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Slovník ve formátu JSON souborů (nativní typy Pythonu)."""
+        data: Dict[str, Any] = {}
+        if self.generated_at is not None:
+            data["generated_at"] = self.generated_at
+        data["times"] = self.iso_times
+        data["inputs"] = {k: _column_list(v) for k, v in self.inputs.items()}
+        if self.initials is not None:
+            data["initials"] = to_plain(self.initials)
+        if self.dt is not None:
+            data["dt"] = _column_list(self.dt)
+        data["outputs"] = {k: _column_list(v) for k, v in self.outputs.items()}
+        data["results"] = to_plain(self.results)
+        data["options"] = to_plain(self.options)
+        data.update(to_plain(self.extra))
+        return data
+
+    # -- časové pohledy -----------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    @property
+    def datetimes(self) -> List[datetime]:
+        """Časy slotů jako aware datetime (s původním posunem zóny)."""
+        if "datetimes" not in self._cache:
+            self._cache["datetimes"] = [
+                (_EPOCH + timedelta(microseconds=int(us))).astimezone(timezone(timedelta(seconds=int(off))))
+                for us, off in zip(self.times.astype(np.int64), self.offsets)
+            ]
+        return self._cache["datetimes"]
+
+    @property
+    def iso_times(self) -> List[str]:
+        if "iso_times" not in self._cache:
+            self._cache["iso_times"] = [t.isoformat() for t in self.datetimes]
+        return self._cache["iso_times"]
+
+    @property
+    def local_times(self) -> np.ndarray:
+        """Místní čas slotů (bez zóny) jako datetime64 – pro grafy a hodiny dne."""
+        if "local_times" not in self._cache:
+            self._cache["local_times"] = self.times + self.offsets.astype("timedelta64[s]")
+        return self._cache["local_times"]
+
+    @property
+    def epoch(self) -> np.ndarray:
+        """Začátky slotů v epoch sekundách (float64)."""
+        if "epoch" not in self._cache:
+            self._cache["epoch"] = self.times.astype(np.int64) / 1e6
+        return self._cache["epoch"]
+
+    @property
+    def hours(self) -> np.ndarray:
+        """Místní hodina dne každého slotu (int)."""
+        return (self.local_times.astype("datetime64[h]").astype(np.int64) % 24).astype(int)
+
+    def slice(self, start: int, stop: Optional[int] = None) -> "Solution":
+        """Řešení omezené na sloty [start, stop) – sloupce jsou pohledy bez kopie."""
+        sol = Solution.__new__(Solution)
+        sol.times = self.times[start:stop]
+        sol.offsets = self.offsets[start:stop]
+        sol.dt = self.dt[start:stop] if self.dt is not None else None
+        sol.inputs = {k: v[start:stop] for k, v in self.inputs.items()}
+        sol.outputs = {k: v[start:stop] for k, v in self.outputs.items()}
+        sol.generated_at = self.generated_at
+        sol.initials = self.initials
+        sol.results = self.results
+        sol.options = self.options
+        sol.extra = dict(self.extra)
+        sol._cache = {}
+        if "datetimes" in self._cache:
+            sol._cache["datetimes"] = self._cache["datetimes"][start:stop]
+        return sol
+
+    # -- rozhraní slovníku ----------------------------------------------------
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "times":
+            return self.iso_times
+        if key in _CORE_KEYS:
+            value = getattr(self, key)
+            if value is None:
+                raise KeyError(key)
+            return value
+        return self.extra[key]
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key == "times":
+            raise KeyError("Časy řešení nelze měnit, vytvořte nové řešení")
+        if key in ("inputs", "outputs"):
+            setattr(self, key, {k: _column(v) for k, v in value.items()})
+        elif key == "dt":
+            self.dt = np.asarray(value, dtype=float)
+        elif key in _CORE_KEYS:
+            setattr(self, key, value)
+        else:
+            self.extra[key] = value
+
+    def __contains__(self, key: object) -> bool:
+        if key in _CORE_KEYS:
+            return key == "times" or getattr(self, key) is not None
+        return key in self.extra
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def pop(self, key: str, *default: Any) -> Any:
+        return self.extra.pop(key, *default)
+
+    def keys(self) -> Iterator[str]:
+        yield from (k for k in _CORE_KEYS if k in self)
+        yield from self.extra
+
+    def __iter__(self) -> Iterator[str]:
+        return self.keys()
+
+    def items(self):
+        return ((k, self[k]) for k in self.keys())
+
+    def __repr__(self) -> str:
+        start = self.iso_times[0] if len(self) else "-"
+        return f"<Solution {len(self)} slotů od {start}, generated_at={self.generated_at}>"
@@ -0,0 +1,116 @@
+"""
+solution_memo.py
+----------------
+Memoizace výsledků optimalizace podle otisku vstupů.
+
+Přepočet spouští cron, /regenerate i push změny z MQTT, takže se stejné
+vstupy často řeší vícekrát po sobě. Otisk normalizovaných vstupů – časové
+řady, počáteční stavy zaokrouhlené na rozlišení čidel, nastavení a délky
+slotů – určuje, zda lze znovu použít už spočítané řešení včetně akcí.
+Délka prvního slotu se zkracuje s každou minutou, plán z dřívějšího
+intervalu přepočtu se proto znovu nepoužije.
+
+• `fingerprint()` – stabilní hash normalizovaných vstupů
+• `SolutionMemo`  – LRU cache otisk → řešení s omezeným počtem záznamů
+                    a maximálním stářím
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Mapping, Optional, Sequence
+
+import numpy as np
+
+# Zvýšit při změně normalizace nebo modelu, aby se staré otisky nepoužily
+FINGERPRINT_VERSION = 3
+
+# Rozlišení čidel – menší změny počátečního stavu plán prakticky neovlivní.
+# Platí i pro stavy dalších zařízení se stejnou příponou (`b2_soc`, `h2_temp_upper`).
+INITIAL_RESOLUTION = {
+    "soc": 1.0,           # %
+    "temp_upper": 0.5,    # °C
+    "temp_lower": 0.5,    # °C
+    "delivered": 0.1,     # kWh
+}
+SERIES_DECIMALS = 4
+# Zbytek aktuálního slotu (dt[0]) se mění každý běh. Porovnává se po minutách,
+# takže se znovu použije jen plán ze stejného intervalu přepočtu (push z MQTT,
+# opakovaný spouštěč) a první slot není zastaralý o víc než minutu.
+DT_RESOLUTION = 1.0 / 60.0  # h
+
+MEMO_SIZE = 8
+MEMO_MAX_AGE = 1800.0  # s
+
+
+def _quantize(value: float, step: float) -> float:
+    return round(round(float(value) / step) * step, 6)
+
+
+def _resolution(key: str) -> float:
+    for name, step in INITIAL_RESOLUTION.items():
+        if key == name or key.endswith("_" + name):
+            return step
+    return 0.01
+
+
+def fingerprint(series: Mapping[str, Sequence[float]], initials: Mapping[str, float],
+                hours: Sequence[datetime], options: Mapping[str, Any],
+                dt: Sequence[float]) -> str:
+    """Otisk normalizovaných vstupů `run_mpc_optimizer` (hex řetězec)."""
+    payload = {
+        "version": FINGERPRINT_VERSION,
+        "hours": [h.isoformat() for h in hours],
+        "series": {
+            k: np.round(np.asarray(v, dtype=float), SERIES_DECIMALS).tolist()
+            for k, v in series.items()
+        },
+        "initials": {k: _quantize(v, _resolution(k)) for k, v in initials.items()},
+        "options": options,
+        "dt": [_quantize(x, DT_RESOLUTION) for x in dt],
+    }
+    raw = json.dumps(payload, sort_keys=True, default=str).encode()
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+class SolutionMemo:
+    """LRU cache řešení podle otisku vstupů s maximálním stářím záznamu."""
+
+    def __init__(self, size: int = MEMO_SIZE, max_age: float = MEMO_MAX_AGE):
+        self.size = size
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Vrátí uložené řešení, nebo None (chybí nebo je starší než max_age)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] > self.max_age:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, solution: Any) -> None:
+        with self._lock:
+            self._entries[key] = (solution, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
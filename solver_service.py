@@ -0,0 +1,171 @@
+"""
+solver_service.py
+-----------------
+Optimalizátor jako služba: POST /api/solve vyřeší zadaný případ bez
+stahování dat z HA.
+
+    {
+      "series":   {"buy_price": [...], "sell_price": [...], "fve_pred": [...], "load_pred": [...],
+                   "tuv_demand": [...], "heating_demand": [...]},  – poslední dvě volitelné (nuly)
+      "initials": {"bat_soc": 50, "temp_lower": 40, "temp_upper": 50},
+      "hours":    ["2025-01-01T00:00:00+01:00", ...],
+      "options":  {...},      – volitelné, jen známé parametry (jinak výchozí)
+      "dt":       [1.0, ...], – volitelné, délky slotů v hodinách
+      "timeout":  30          – volitelné, max. `solve_api_timeout` (nejvýše 100 s)
+    }
+
+Případy se řeší ve vlastním poolu procesů (oddělený od what-if a
+dekompozice, aby cizí nástroje nezdržovaly plánovaný přepočet):
+
+• `solve_api_workers` procesů, každý s vlastním dočasným adresářem pro
+  soubory CBC (TMPDIR), takže se požadavky nedělí o žádné soubory,
+• nejvýše `solve_api_queue` čekajících požadavků navíc – plná fronta
+  vrací 503 s hlavičkou Retry-After,
+• časový limit se předá řešiči a po jeho uplynutí (plus rezerva na
+  sestavení modelu) vrací 504. Místo ve frontě se uvolní až dokončením
+  úlohy, ne návratem požadavku, takže pool nelze zahltit opakováním.
+
+Odpověď je celé řešení ve stejném tvaru jako `result_*.json`.
+"""
+
+import atexit
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import Blueprint, jsonify, request
+
+from powerplan_environment import REQUEST_TIMEOUT, addon_option
+from powerplan_whatif import candidate_settings
+
+solve_bp = Blueprint("solve_bp", __name__)
+
+SOLVE_WORKERS = int(addon_option("solve_api_workers", 2))
+SOLVE_QUEUE = int(addon_option("solve_api_queue", 4))
+BUILD_GRACE = 10  # s – rezerva na sestavení modelu a přenos výsledku nad limit řešiče
+# Odpověď (i 504) musí odejít před timeoutem gunicornu
+MAX_SOLVE_TIMEOUT = REQUEST_TIMEOUT - 2 * BUILD_GRACE
+SOLVE_TIMEOUT = min(float(addon_option("solve_api_timeout", 60)), MAX_SOLVE_TIMEOUT)
+
+REQUIRED_SERIES = ("buy_price", "sell_price", "fve_pred", "load_pred")
+# Řady, které optimalizátor čte také; bez nich se počítá s nulovou spotřebou tepla
+OPTIONAL_SERIES = ("tuv_demand", "heating_demand")
+REQUIRED_INITIALS = ("bat_soc", "temp_lower", "temp_upper")
+
+_pool: Optional[ProcessPoolExecutor] = None
+_tmp_base: Optional[str] = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(max(1, SOLVE_WORKERS) + max(0, SOLVE_QUEUE))
+
+
+def _worker_init(base: str) -> None:
+    """Vlastní dočasný adresář pracovního procesu (PuLP do něj zapisuje soubory CBC)."""
+    tmp = tempfile.mkdtemp(dir=base)
+    os.environ["TMPDIR"] = tmp
+    tempfile.tempdir = tmp
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool, _tmp_base
+    with _pool_lock:
+        if _pool is None:
+            _tmp_base = tempfile.mkdtemp(prefix="powerplan-solve-")
+            _pool = ProcessPoolExecutor(
+                max_workers=SOLVE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_worker_init,
+                initargs=(_tmp_base,),
+            )
+        return _pool
+
+
+@atexit.register
+def _reset_pool() -> None:
+    global _pool, _tmp_base
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        if _tmp_base is not None:
+            shutil.rmtree(_tmp_base, ignore_errors=True)
+            _tmp_base = None
+
+
+def parse_request(payload: Dict[str, Any]) -> Tuple[Dict[str, List[float]], Dict[str, float], List[str],
+                                                    Dict[str, Any], List[float], float]:
+    """Ověří tělo požadavku; chyby hlásí jako ValueError."""
+    series, initials, hours = payload.get("series"), payload.get("initials"), payload.get("hours")
+    if not isinstance(series, dict) or not isinstance(initials, dict) or not isinstance(hours, list) or not hours:
+        raise ValueError("Očekáváno {'series': {...}, 'initials': {...}, 'hours': [...]}")
+    n = len(hours)
+    try:
+        times = [datetime.fromisoformat(h).isoformat() for h in hours]
+    except (TypeError, ValueError):
+        raise ValueError("hours musí být časy v ISO formátu")
+
+    missing = [k for k in REQUIRED_SERIES if k not in series] + [k for k in REQUIRED_INITIALS if k not in initials]
+    if missing:
+        raise ValueError(f"Chybí: {', '.join(missing)}")
+    try:
+        series = {k: [float(x) for x in v] for k, v in series.items()}
+        initials = {k: float(v) for k, v in initials.items()}
+        dt = [float(x) for x in payload.get("dt") or [1.0] * n]
+    except (TypeError, ValueError):
+        raise ValueError("Řady, počáteční stavy i dt musí být čísla")
+    values = [x for v in series.values() for x in v] + list(initials.values()) + dt
+    if not all(math.isfinite(x) for x in values):
+        raise ValueError("Řady, počáteční stavy i dt musí být konečná čísla")
+    for key in OPTIONAL_SERIES:
+        series.setdefault(key, [0.0] * n)
+    wrong = [k for k, v in series.items() if len(v) != n] + (["dt"] if len(dt) != n else [])
+    if wrong:
+        raise ValueError(f"Délka neodpovídá počtu slotů ({n}): {', '.join(wrong)}")
+    if any(x <= 0 for x in dt):
+        raise ValueError("dt musí být kladné")
+
+    options = candidate_settings({}, payload.get("options") or {})
+    timeout = min(float(payload.get("timeout", SOLVE_TIMEOUT)), SOLVE_TIMEOUT)
+    if timeout <= 0:
+        raise ValueError("timeout musí být kladný")
+    return series, initials, times, options, dt, timeout
+
+
+@solve_bp.route("/api/solve", methods=["POST"])
+def api_solve():
+    from powerplan_workers import solve_case
+
+    if SOLVE_WORKERS <= 0:
+        return jsonify({"error": "Služba řešiče je vypnutá (solve_api_workers = 0)"}), 503
+    try:
+        series, initials, times, options, dt, timeout = parse_request(request.get_json(silent=True) or {})
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    if not _slots.acquire(blocking=False):
+        response = jsonify({"error": "Fronta řešiče je plná"})
+        response.headers["Retry-After"] = str(int(timeout))
+        return response, 503
+    try:
+        future = _get_pool().submit(solve_case, series, initials, times, options, dt, timeout)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+
+    try:
+        solution = future.result(timeout=timeout + BUILD_GRACE)
+    except FutureTimeoutError:
+        return jsonify({"error": f"Řešení nestihlo časový limit {timeout:.0f} s"}), 504
+    except BrokenProcessPool:
+        _reset_pool()
+        return jsonify({"error": "Pracovní proces řešiče havaroval"}), 500
+    except Exception as e:
+        return jsonify({"error": f"Optimalizace selhala: {e}"}), 422
+    return jsonify(solution.to_dict())
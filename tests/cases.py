@@ -0,0 +1,26 @@
+"""Syntetické vstupy optimalizátoru pro testy."""
+
+import math
+from datetime import datetime, timedelta
+
+from models import get_electricity_load, get_tuv_demand
+
+
+def make_case(n=24, start=None):
+    start = start or datetime(2025, 1, 15, 0, 0).astimezone()
+    hours = [start + timedelta(hours=i) for i in range(n)]
+    fve = [max(0.0, 8 * math.sin(math.pi * (h.hour - 5) / 15)) if 5 <= h.hour <= 20 else 0.0 for h in hours]
+    buy = [3.0 + (1.5 if 17 <= h.hour <= 20 else 0) - (1.0 if h.hour < 6 else 0) for h in hours]
+    series = {
+        "tuv_demand": [get_tuv_demand(h) for h in hours],
+        "heating_demand": [0.0] * n,
+        "fve_pred": fve,
+        "buy_price": buy,
+        "sell_price": [b - 1.5 for b in buy],
+        "load_pred": [get_electricity_load(h) for h in hours],
+        "outdoor_temps": [20.0] * n,
+    }
+    initials = {"bat_soc": 50, "temp_upper": 50.0, "temp_lower": 40.0}
+    dt = [1.0] * n
+    dt[0] = 0.5
+    return series, initials, hours, dt
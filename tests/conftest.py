@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# Moduly add-onu leží v kořeni repozitáře; data (options.json, výsledky) do dočasného adresáře
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("HA_ADDON_DATA", tempfile.mkdtemp(prefix="powerplan-test-"))
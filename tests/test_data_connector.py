@@ -0,0 +1,33 @@
+import pytest
+
+import data_connector
+
+
+@pytest.fixture
+def published(monkeypatch):
+    calls = []
+    monkeypatch.setattr(data_connector, "publish_to_ha", lambda payload, *args: calls.append(dict(payload)))
+    monkeypatch.setattr(data_connector, "_published_states", {})
+    return calls
+
+
+def test_publish_changed_skips_unchanged_state(published):
+    extra = {"generated_at": "a", "fallback": False}
+    assert data_connector.publish_changed({"mode": "charge"}, extra=extra) == {"mode": "charge"}
+    # Jiný čas výpočtu sám o sobě publikaci nevyvolá
+    assert data_connector.publish_changed({"mode": "charge"}, extra={**extra, "generated_at": "b"}) == {}
+    assert published == [{"mode": "charge"}]
+
+
+def test_publish_changed_on_attribute_change(published):
+    data_connector.publish_changed({"mode": "charge"}, extra={"fallback": False})
+    assert data_connector.publish_changed({"mode": "charge"}, extra={"fallback": True}) == {"mode": "charge"}
+    attributes = {"mode": {"unit": "W"}}
+    assert data_connector.publish_changed({"mode": "charge"}, attributes=attributes, extra={"fallback": True})
+    assert len(published) == 3
+
+
+def test_publish_changed_state_only(published):
+    data_connector.publish_changed({"debug": "t0"}, attributes={"debug": {"objective": 1}}, compare_attributes=False)
+    assert data_connector.publish_changed({"debug": "t0"}, attributes={"debug": {"objective": 2}},
+                                          compare_attributes=False) == {}
@@ -0,0 +1,81 @@
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pytest
+
+from cases import make_case
+from decomposition import solve_decomposed
+from powerplan_optimizer import run_mpc_optimizer
+
+
+class StuckPool:
+    """Pool, jehož úlohy se nikdy nedokončí (přetížený nebo zaseknutý proces)."""
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, fn, *args):
+        future = Future()
+        self.futures.append(future)
+        return future
+
+
+def _initials(state):
+    return {"bat_soc": 50.0, "temp_lower": 40.0, "temp_upper": 50.0}
+
+
+def test_block_wait_bounded_by_time_limit():
+    series, _, hours, dt = make_case(72)
+    pool = StuckPool()
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        solve_decomposed(series, hours, {}, dt, (8.0, 5.0, 5.0), _initials, time_limit=0.2, pool=pool)
+    assert time.monotonic() - start < 3.0
+    assert all(f.cancelled() for f in pool.futures)
+
+
+@pytest.fixture
+def thread_pool(monkeypatch):
+    import decomposition
+
+    with ThreadPoolExecutor(2) as pool:
+        original = decomposition.solve_decomposed
+        monkeypatch.setattr(decomposition, "solve_decomposed", lambda *a, **kw: original(*a, **kw, pool=pool))
+        yield pool
+
+
+def _gap(series, initials, hours, dt, **options):
+    """Relativní rozdíl účelové funkce dekompozice oproti monolitickému LP."""
+    options = {"fast_path_enabled": False, **options}
+    full = run_mpc_optimizer(series, initials, hours, options, dt)
+    split = run_mpc_optimizer(series, initials, hours, {**options, "decomposition_enabled": True}, dt)
+    assert split["solver"] == "decomposition"
+    objective = full["results"]["objective_value"]
+    return (split["results"]["objective_value"] - objective) / abs(objective)
+
+
+def _price_step_case():
+    # Třetí den drahý, bez FVE – energii by se vyplatilo nakoupit první den
+    series, initials, hours, dt = make_case(72)
+    series["buy_price"] = [b + (4.0 if i >= 48 else 0.0) for i, b in enumerate(series["buy_price"])]
+    series["sell_price"] = [b - 1.5 for b in series["buy_price"]]
+    series["fve_pred"] = [0.0] * 72
+    return series, initials, hours, dt
+
+
+def test_decomposition_gap_on_repeating_days(thread_pool, record_property):
+    gap = _gap(*make_case(72))
+    record_property("objective_gap", gap)
+    # Spojený plán je přípustný pro celý horizont, lepší být nemůže
+    assert -1e-6 <= gap <= 1e-6, f"gap {gap:.2e}"
+
+
+def test_decomposition_is_a_heuristic(thread_pool, record_property):
+    case = _price_step_case()
+    gap = _gap(*case)
+    no_overlap = _gap(*case, decomposition_overlap_hours=0.0)
+    record_property("objective_gap", gap)
+    record_property("objective_gap_no_overlap", no_overlap)
+    assert 0.0 <= gap <= 1e-3, f"gap {gap:.2e}"
+    # Bez výhledu za hranici bloku chybí přenos energie mezi dny – není to optimum
+    assert no_overlap > 0.05, f"gap {no_overlap:.2e}"
@@ -0,0 +1,216 @@
+import json
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from cases import make_case
+from devices import (Battery, DeferrableLoad, Device, ModelContext, TwoZoneTank, build_devices,
+                     deferrable_windows, device_entities, parse_device_specs)
+from models.tank_losses import compile_tank
+from powerplan_optimizer import run_mpc_optimizer, temp_to_energy
+from powerplan_whatif import candidate_settings
+from powerplan_workers import solve_case
+
+
+def test_extra_devices_add_prefixed_outputs():
+    series, initials, hours, dt = make_case(36)
+    n = len(hours)
+    tank = TwoZoneTank(tank=compile_tank(20.0, 10.0, 0.3, 0.2, 0.1), lower_power=3, upper_power=2,
+                       out_lower=[0] * n, out_upper=[0.3] * n, soc_lower_init=5, soc_upper_init=5,
+                       heating_bonus=0.45, final_price=2.0, name="h2")
+    ev = DeferrableLoad("ev", power=7.4, energy=20, available=[h.hour >= 18 or h.hour < 7 for h in hours])
+    battery = Battery(cap=10, soc_min=1, soc_max=10, power=5, eff_in=0.95, eff_out=0.95, soc_init=5,
+                      threshold=4, price_above=2, price_below=2.5, name="b2")
+
+    solution = run_mpc_optimizer(series, initials, hours, {}, dt, devices=[tank, ev, battery])
+
+    assert solution["solver"] not in ("fast_path", "dp", "decomposition")
+    outputs = solution["outputs"]
+    assert {"h2_soc_upper", "ev_power", "b2_soc"} <= set(outputs)
+    assert float(np.dot(outputs["ev_power"], dt)) == pytest.approx(20.0, abs=1e-6)
+    assert max(outputs["ev_power"]) <= 7.4 + 1e-6
+
+
+def test_battery_bounds_are_variable_bounds():
+    from pulp import LpMinimize, LpProblem
+
+    n = 6
+    model = ModelContext(LpProblem("devices", LpMinimize), range(n), [1.0] * n)
+    limit = [10.0, 9.0, 8.0, 9.0, 10.0, 10.0]
+    battery = Battery(cap=10, soc_min=1, soc_max=10, power=5, eff_in=0.95, eff_out=0.95, soc_init=5,
+                      soc_limit=limit, threshold=4)
+    battery.build(model)
+
+    # Řádky s jedinou proměnnou by presolve při každém řešení převáděl na meze
+    assert all(len(row) > 1 for row in model.prob.constraints.values())
+    assert [battery.soc[t].upBound for t in range(n)] == limit
+    assert all(battery.soc[t].lowBound == 1 for t in range(n))
+    assert all(battery.soc_under[t].lowBound == 0 for t in range(n))
+
+
+def test_deferrable_load_respects_inverter_limit():
+    series, initials, hours, dt = make_case(24)
+    ev = DeferrableLoad("ev", power=11.0, energy=30, available=[True] * len(hours))
+    options = {"inverter_limit": 4.0, "fast_path_enabled": False}
+
+    solution = run_mpc_optimizer(series, initials, hours, options, dt, devices=[ev])
+
+    outputs = solution["outputs"]
+    inverter = (np.asarray(outputs["ev_power"]) + np.asarray(outputs["b_discharge"])
+                + np.asarray(outputs["h_in_lower"]) + np.asarray(outputs["h_in_upper"])
+                + np.asarray(outputs["g_sell"]))
+    assert inverter.max() <= 4.0 + 1e-6
+    assert max(outputs["ev_power"]) == pytest.approx(4.0, abs=1e-6)     # limit váže
+    assert float(np.dot(outputs["ev_power"], dt)) == pytest.approx(30.0, abs=1e-6)
+
+
+TWO_TANKS = [
+    {"type": "tank", "name": "h2", "lower_vol": 0.2, "upper_vol": 0.1, "lower_power": 3, "upper_power": 2,
+     "tuv_share": 0.5, "temp_lower": 40, "temp_upper": 50},
+    {"type": "deferrable", "name": "ev", "power": 7.4, "energy": 20, "start_hour": 18, "end_hour": 7,
+     "energy_entity": "sensor.ev_session_energy"},
+]
+
+
+def test_device_base_is_abstract():
+    with pytest.raises(TypeError):
+        Device()
+
+
+@pytest.mark.parametrize("raw, message", [
+    ("[{", "JSON"),
+    ({"type": "tank"}, "seznam"),
+    ([{"type": "heatpump", "name": "x"}], "neznámý typ"),
+    ([{"type": "battery", "name": "b", "cap": 5, "power": 2}], "název"),
+    ([{"type": "battery", "name": "b2", "cap": 5}], "chybí"),
+    ([{"type": "battery", "name": "b2", "cap": 5, "power": 2, "colour": 1}], "neznámé"),
+    ([{"type": "battery", "name": "b2", "cap": "x", "power": 2}], "čísla"),
+    (TWO_TANKS + [TWO_TANKS[1]], "opakovaný"),
+    ([{"type": "deferrable", "name": "ev", "power": 7.4, "energy": 20}], "chybí"),
+    ([{**TWO_TANKS[0], "temp_upper_entity": 42}], "entita"),
+])
+def test_parse_device_specs_rejects_invalid(raw, message):
+    with pytest.raises(ValueError, match=message):
+        parse_device_specs(raw)
+
+
+def test_build_devices_from_settings():
+    series, initials, hours, dt = make_case(24)
+    devices = build_devices({"devices": json.dumps(TWO_TANKS)}, series, {**initials, "h2_temp_upper": 60}, hours, dt)
+
+    tank, ev = devices
+    assert isinstance(tank, TwoZoneTank) and isinstance(ev, DeferrableLoad)
+    assert tank.out_upper == pytest.approx([0.5 * x for x in series["tuv_demand"]])
+    assert tank.out_lower == [0.0] * len(hours)                 # heating_enabled vypnuto
+    # Počáteční stav z initials přebíjí hodnotu z nastavení
+    assert tank.soc_upper_init == pytest.approx(temp_to_energy(60, 0.1, 45))
+    assert tank.soc_lower_init == pytest.approx(temp_to_energy(40, 0.2, 30))
+    assert ev.available == [h.hour >= 18 or h.hour < 7 for h in hours]
+    assert build_devices({}, series, initials, hours, dt) == []
+
+
+def test_device_entities_map_initial_states():
+    specs = [{**TWO_TANKS[0], "temp_upper_entity": "sensor.h2_top"}, TWO_TANKS[1],
+             {"type": "battery", "name": "b2", "cap": 5, "power": 2, "soc_entity": "sensor.b2_soc"}]
+    assert device_entities({"devices": specs}) == {
+        "h2_temp_upper": "sensor.h2_top", "ev_delivered": "sensor.ev_session_energy", "b2_soc": "sensor.b2_soc",
+    }
+    assert device_entities({"devices": "[{"}) == {}
+
+
+def test_deferrable_windows_per_day_and_delivered():
+    # Začátek ve 20:30 uprostřed okna 18–7, horizont 48 h
+    start = datetime(2025, 1, 15, 20).astimezone()
+    hours = [start + timedelta(hours=i) for i in range(48)]
+    dt = [0.5] + [1.0] * 47
+    windows = deferrable_windows(hours, dt, 18, 7, 20.0, delivered=6.0)
+
+    assert [(w[0], w[-1]) for w, _ in windows] == [(0, 10), (22, 34), (46, 47)]
+    assert windows[0][1] == pytest.approx(14.0)                 # zbytek otevřeného okna
+    assert windows[1][1] == pytest.approx(20.0)                 # celé další okno
+    assert windows[2][1] == pytest.approx(20.0 * 2 / 13)        # uříznuté koncem horizontu
+    # Okno 0–24 začíná každou půlnocí
+    assert [len(w) for w, _ in deferrable_windows(hours, dt, 0, 24, 5.0)] == [4, 24, 20]
+
+
+def test_deferrable_load_meets_each_window():
+    series, initials, hours, dt = make_case(48)
+    windows = deferrable_windows(hours, dt, 18, 7, 10.0, delivered=4.0)
+    ev = DeferrableLoad("ev", power=7.4, energy=10.0, available=[h.hour >= 18 or h.hour < 7 for h in hours],
+                        windows=windows)
+
+    power = np.asarray(run_mpc_optimizer(series, initials, hours, {}, dt, devices=[ev])["outputs"]["ev_power"])
+    assert [target for _, target in windows] == pytest.approx([6.0, 10.0, 10.0 * 6 / 13])
+    for slots, target in windows:
+        assert float(np.dot(power[slots], np.asarray(dt)[slots])) == pytest.approx(target, abs=1e-6)
+
+
+def test_solve_case_builds_devices_from_options():
+    series, initials, hours, dt = make_case(24)
+    solution = solve_case(series, initials, [h.isoformat() for h in hours], {"devices": TWO_TANKS}, dt)
+
+    outputs = solution["outputs"]
+    assert {"h2_soc_upper", "h2_in_lower", "ev_power"} <= set(outputs)
+    assert outputs["h2_out_upper"] == pytest.approx([0.5 * x for x in series["tuv_demand"]])
+    # Noc 0–7 celá v horizontu, večerní okno 18–24 poměrně (6 z 13 h)
+    assert float(np.dot(outputs["ev_power"], dt)) == pytest.approx(20.0 + 20.0 * 6 / 13, abs=1e-6)
+
+
+def test_solve_current_passes_devices_from_settings(monkeypatch):
+    import powerplan_server
+
+    series, initials, hours, dt = make_case(24, datetime(2099, 1, 15).astimezone())
+    calls, requested = [], []
+    specs = [{**TWO_TANKS[0], "temp_upper_entity": "sensor.h2_top"}, TWO_TANKS[1]]
+    delivered = {"ev_delivered": 5.0}
+
+    def fake_prepare(pushed=None, entities=None):
+        requested.append(entities)
+        # Nedostupná entita nádrže ve výsledku chybí
+        return {**series, **initials, **delivered, "hours": hours}
+
+    monkeypatch.setattr(powerplan_server, "prepare_data", fake_prepare)
+    monkeypatch.setattr(powerplan_server, "load_settings", lambda: {"devices": specs})
+    monkeypatch.setattr(powerplan_server, "solve_budget", lambda hours: 1.0)
+    monkeypatch.setattr(powerplan_server, "run_mpc_optimizer", lambda *a, **kw: calls.append((a, kw)) or {})
+    monkeypatch.setattr(powerplan_server, "memo", None)
+
+    _, key, _ = powerplan_server.solve_current()
+    args, kwargs = calls[0]
+    assert requested[0] == {"h2_temp_upper": "sensor.h2_top", "ev_delivered": "sensor.ev_session_energy"}
+    assert args[1] == {**initials, "ev_delivered": 5.0}
+    tank, ev = kwargs["devices"]
+    assert tank.soc_upper_init == pytest.approx(temp_to_energy(50, 0.1, 45))  # z nastavení
+    assert ev.windows[0][1] == pytest.approx(15.0)              # okno 0–7 otevřené, 5 kWh dodáno
+
+    # Dodaná energie je součástí otisku – změna znamená nový výpočet
+    delivered["ev_delivered"] = 9.0
+    assert powerplan_server.solve_current()[1] != key
+
+
+def test_candidate_settings_validates_devices():
+    assert candidate_settings({}, {"devices": TWO_TANKS})["devices"][0]["lower_vol"] == 0.2
+    with pytest.raises(ValueError):
+        candidate_settings({}, {"devices": [{"type": "tank", "name": "h2"}]})
+
+
+def test_blocks_match_scalar_dynamics():
+    from pulp import LpMinimize, LpProblem
+
+    n = 4
+    dt = [0.5, 1.0, 1.0, 2.0]
+    model = ModelContext(LpProblem("devices", LpMinimize), range(n), dt)
+    tank = TwoZoneTank(tank=compile_tank(20.0, 10.0, 0.3, 0.2, 0.1), lower_power=3, upper_power=2,
+                       out_lower=[0.1] * n, out_upper=[0.3] * n, soc_lower_init=5, soc_upper_init=4, name="h2")
+    tank.build(model)
+
+    # Slot 0: počáteční stav na pravé straně, další sloty vazba na minulý slot
+    row0 = model.prob.constraints["h2_dynamics_lower_0"]
+    keep_lower, _ = tank.tank.retention(dt[0])
+    assert row0.constant == pytest.approx(-(keep_lower * 5 - tank.tank.loss_offset * dt[0]))
+    row2 = model.prob.constraints["h2_dynamics_upper_2"]
+    coefs = {v.name: c for v, c in row2.items()}
+    _, keep_upper = tank.tank.retention(dt[2])
+    assert coefs == pytest.approx({"h2_soc_upper_2": 1, "h2_soc_upper_1": -keep_upper, "h2_in_upper_2": -1.0,
+                                   "h2_to_upper_2": -1.0, "h2_out_upper_2": 1.0})
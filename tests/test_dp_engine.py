@@ -0,0 +1,54 @@
+import pytest
+
+import powerplan_optimizer
+from cases import make_case
+from options import VARIABLES_SPEC
+from powerplan_optimizer import run_mpc_optimizer
+
+SPEC = VARIABLES_SPEC["options"]
+# Změřená mezera výchozích mřížek je 0,5–2 %; hranice hlídá regresi diskretizace
+MAX_GAP = 0.03
+
+
+def _solve(n, options):
+    series, initials, hours, dt = make_case(n)
+    options = {"fast_path_enabled": False, **options}
+    dp = run_mpc_optimizer(series, initials, hours, {**options, "engine": "dp"}, dt)
+    lp = run_mpc_optimizer(series, initials, hours, {**options, "engine": "lp"}, dt)
+    return dp, lp
+
+
+@pytest.mark.parametrize("n", [24, 48])
+def test_dp_gap_against_lp(n, record_property):
+    dp, lp = _solve(n, {})
+    assert dp["solver"] == "dp"
+    dp_value = dp["results"]["objective_value"]
+    lp_value = lp["results"]["objective_value"]
+    gap = (dp_value - lp_value) / abs(lp_value)
+    record_property("dp_gap", gap)
+    # LP je optimum spojitého modelu – DP ho nesmí překonat, jen se k němu přiblížit
+    assert dp_value >= lp_value - 1e-6 * abs(lp_value)
+    assert gap <= MAX_GAP
+
+
+@pytest.mark.parametrize("n", [24, 48])
+def test_dp_plan_respects_soc_and_temperature_bounds(n):
+    dp, _ = _solve(n, {})
+    outputs = dp.outputs
+    b_cap = SPEC["b_cap"]["default"]
+    eps = 1e-6
+    assert outputs["b_soc"].min() >= b_cap * 0.15 - eps
+    assert outputs["b_soc"].max() <= b_cap + eps
+    assert outputs["b_charge"].max() <= SPEC["b_power"]["default"] + eps
+    assert outputs["b_discharge"].max() <= SPEC["b_power"]["default"] + eps
+    for zone in ("lower", "upper"):
+        temps = outputs[f"temp_{zone}"]
+        assert temps.min() >= SPEC[f"h_{zone}_min_t"]["default"] - eps
+        assert temps.max() <= SPEC[f"h_{zone}_max_t"]["default"] + eps
+
+
+def test_auto_engine_selects_dp_without_cbc(monkeypatch):
+    monkeypatch.setattr(powerplan_optimizer, "_cbc_available", lambda: False)
+    series, initials, hours, dt = make_case(24)
+    solution = run_mpc_optimizer(series, initials, hours, {"fast_path_enabled": False}, dt)
+    assert solution["solver"] == "dp"
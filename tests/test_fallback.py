@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from cases import make_case
+from powerplan_fallback import MIN_SOLVE_BUDGET, REFRESH_INTERVAL, SOLVE_MARGIN, shift_solution, solve_budget
+from powerplan_optimizer import run_mpc_optimizer
+
+START = datetime(2025, 1, 15, 0, 0).astimezone()
+
+
+@pytest.fixture(scope="module")
+def previous():
+    series, initials, hours, dt = make_case(24, START)
+    return run_mpc_optimizer(series, initials, hours, {}, dt).to_dict()
+
+
+def test_shift_mid_slot(previous):
+    now = START + timedelta(hours=2, minutes=15)
+    shifted = shift_solution(previous, now=now, reason="timeout")
+
+    assert len(shifted) == 22
+    assert shifted["times"][0] == previous["times"][2]
+    assert shifted["dt"][0] == pytest.approx(0.75)
+    assert list(shifted["dt"][1:]) == previous["dt"][3:]
+    assert list(shifted["outputs"]["g_buy"]) == previous["outputs"]["g_buy"][2:]
+    assert shifted["fallback"] == {"reason": "timeout", "source_generated_at": previous["generated_at"],
+                                   "shifted_slots": 2}
+    assert "actions" not in shifted and "actions_timeline" not in shifted
+
+
+def test_shift_recomputes_results_for_shifted_horizon(previous):
+    shifted = shift_solution(previous, now=START + timedelta(hours=2, minutes=15))
+    results, outputs = shifted["results"], shifted["outputs"]
+
+    assert results["grid_consumption"] == pytest.approx(outputs["g_buy"].sum())
+    assert results["net_bilance"] == pytest.approx(outputs["net_step_cost"].sum())
+    assert results["total_fve_unused"] == pytest.approx(outputs["fve_unused"] @ shifted["dt"])
+    assert results["objective_value"] != pytest.approx(previous["results"]["objective_value"])
+    # Nezměněný horizont se vyhodnotí na stejné KPI i účelovou funkci jako při řešení
+    unshifted = run_mpc_optimizer(previous["inputs"], previous["initials"],
+                                  [datetime.fromisoformat(t) for t in previous["times"]], {},
+                                  previous["dt"], plan=previous["outputs"])
+    for key, value in previous["results"].items():
+        if key != "battery_kwh_value":
+            assert unshifted["results"][key] == pytest.approx(value, abs=1e-6), key
+
+
+def test_shift_without_inputs_drops_results(previous):
+    legacy = {k: v for k, v in previous.items() if k != "initials"}
+    shifted = shift_solution(legacy, now=START + timedelta(hours=1))
+    assert shifted["results"] == {}
+
+
+@pytest.mark.parametrize("now", [START - timedelta(minutes=1), START + timedelta(hours=24, minutes=1)])
+def test_shift_outside_plan_raises(previous, now):
+    with pytest.raises(ValueError, match="nepokrývá"):
+        shift_solution(previous, now=now)
+
+
+@pytest.mark.parametrize("to_boundary, expected", [
+    (3600, REFRESH_INTERVAL - SOLVE_MARGIN),   # interval přepočtu je blíž než hranice slotu
+    (200, 200 - SOLVE_MARGIN),                 # hranice slotu je blíž
+    (5, MIN_SOLVE_BUDGET),                     # vždy aspoň minimum
+])
+def test_solve_budget(to_boundary, expected):
+    hours = [START + timedelta(hours=i) for i in range(3)]
+    now = hours[1] - timedelta(seconds=to_boundary)
+    assert solve_budget(hours, now=now) == pytest.approx(expected)
+
+
+def test_solve_budget_after_last_boundary():
+    hours = [START + timedelta(hours=i) for i in range(3)]
+    assert solve_budget(hours, now=hours[-1] + timedelta(minutes=5)) == REFRESH_INTERVAL - SOLVE_MARGIN
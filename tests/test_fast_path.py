@@ -0,0 +1,79 @@
+from datetime import datetime
+
+import pytest
+
+import powerplan_optimizer
+from cases import make_case
+from powerplan_optimizer import run_mpc_optimizer
+
+# Ohřev bez bonusů a s nízkým koncovým oceněním nádrže – klidový plán může být optimální
+IDLE_OPTIONS = {
+    "final_boiler_price": 0.5,
+    "tank_value_bonus": 0.0,
+    "water_priority_bonus": 0.0,
+    "upper_zone_priority": 0.0,
+}
+
+
+def _night_case(buy_price, soc=50.0):
+    series, initials, hours, dt = make_case(12, datetime(2025, 1, 15, 0, 0).astimezone())
+    series["fve_pred"] = [0.0] * 12
+    series["buy_price"] = list(buy_price)
+    series["sell_price"] = [p / 2 for p in buy_price]
+    return series, {**initials, "bat_soc": soc}, hours, dt
+
+
+@pytest.fixture
+def idle_checks(monkeypatch):
+    checks = []
+
+    def recording_idle_plan(**params):
+        check = idle_plan(**params)
+        checks.append(check)
+        return check
+
+    idle_plan = powerplan_optimizer.idle_plan
+    monkeypatch.setattr(powerplan_optimizer, "idle_plan", recording_idle_plan)
+    return checks
+
+
+@pytest.mark.parametrize("soc", [50.0, 80.0])
+@pytest.mark.parametrize("temps", [(50.0, 40.0), (60.0, 50.0)])
+def test_certified_idle_plan_matches_lp(soc, temps):
+    series, initials, hours, dt = _night_case([3.0] * 12, soc)
+    initials.update(temp_upper=temps[0], temp_lower=temps[1])
+
+    fast = run_mpc_optimizer(series, initials, hours, IDLE_OPTIONS, dt)
+    lp = run_mpc_optimizer(series, initials, hours, {**IDLE_OPTIONS, "fast_path_enabled": False}, dt)
+    assert fast["solver"] == "fast_path"
+    assert lp["solver"] == "lp"
+    assert fast["results"]["objective_value"] == pytest.approx(lp["results"]["objective_value"], abs=1e-4)
+    for key in ("b_charge", "b_discharge", "h_in_lower", "h_in_upper", "g_buy", "g_sell"):
+        assert fast.outputs[key] == pytest.approx(lp.outputs[key], abs=1e-4), key
+
+    verified = run_mpc_optimizer(series, initials, hours, {**IDLE_OPTIONS, "fast_path_verify": True}, dt)
+    assert abs(verified["fast_path_check"]["objective_gap"]) < 1e-4
+    assert verified["fast_path_check"]["max_value_diff"] < 1e-4
+
+
+def test_refuses_price_spread_above_round_trip_losses(idle_checks):
+    # Levná noc a drahé ráno: rozdíl 1,0 → 3,0 Kč/kWh převýší ztráty cyklu 1/0,94²
+    buy_price = [1.0] * 4 + [3.0] * 8
+    series, initials, hours, dt = _night_case(buy_price)
+
+    solution = run_mpc_optimizer(series, initials, hours, {**IDLE_OPTIONS, "fast_path_verify": True}, dt)
+    assert idle_checks[-1].plan is None
+    assert idle_checks[-1].reason.startswith("výhodný krok")
+    assert solution["solver"] == "lp"
+    assert "fast_path_check" not in solution
+    assert solution.outputs["b_charge"][:4].max() > 0   # LP opravdu cyklus využije
+
+
+def test_spread_within_round_trip_losses_is_certified(idle_checks):
+    # Rozdíl pod ztrátami cyklu (3,0 → 3,3 < 3,0 / 0,94²) nabíjení nevyplatí
+    buy_price = [3.0] * 4 + [3.3] * 8
+    series, initials, hours, dt = _night_case(buy_price)
+
+    solution = run_mpc_optimizer(series, initials, hours, {**IDLE_OPTIONS, "fast_path_verify": True}, dt)
+    assert idle_checks[-1].plan is not None
+    assert abs(solution["fast_path_check"]["objective_gap"]) < 1e-4
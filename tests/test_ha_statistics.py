@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from ha_statistics import HAWebSocket, HAWebSocketError, MeasuredSamples, StubHAWebSocket, import_statistics
+from solution import Solution
+
+
+def _solution(start, soc):
+    times = [start + timedelta(minutes=30 * i) for i in range(4)]
+    outputs = {
+        "b_soc_percent": [soc, soc + 10, soc + 20, soc + 30],
+        "b_power": [1.0, 2.0, -1.0, 0.0],
+        "g_buy": [0.0, 0.5, 1.0, 0.0],
+        "g_sell": [0.0, 0.0, 0.0, 2.0],
+        "temp_upper": [50.0] * 4,
+        "temp_lower": [40.0] * 4,
+    }
+    initials = {"bat_soc": soc, "temp_upper": 50.0, "temp_lower": 40.0}
+    return Solution(times, {}, outputs, dt=[0.5] * 4, initials=initials).to_dict()
+
+
+def test_import_statistics_round_trip():
+    stub = StubHAWebSocket()
+    measured = MeasuredSamples()
+    start = datetime(2025, 1, 15, 10, 0).astimezone()
+
+    connection = HAWebSocket("http://ha.local:8123", "test", connect=stub)
+    count = import_statistics(_solution(start, 40.0), connection, measured)
+    # Druhý přepočet ve stejné hodině: plán se přepíše, měření se přidá
+    import_statistics(_solution(start + timedelta(minutes=5), 44.0), connection, measured)
+
+    assert count == 6 + 3
+    planned = stub.statistics["powerplan:planned_b_soc_percent"]
+    assert planned[start.isoformat()]["mean"] == pytest.approx(49.0)
+    assert planned[(start + timedelta(hours=1)).isoformat()]["mean"] == pytest.approx(69.0)
+
+    measured_soc = stub.statistics["powerplan:measured_bat_soc"][start.isoformat()]
+    assert measured_soc == {"start": start.isoformat(), "mean": 42.0, "min": 40.0, "max": 44.0}
+    assert stub.metadata["powerplan:measured_bat_soc"]["unit_of_measurement"] == "%"
+    assert not any(k.startswith("powerplan:realized") for k in stub.statistics)
+
+
+def test_invalid_token_rejected():
+    with pytest.raises(HAWebSocketError):
+        HAWebSocket("http://ha.local:8123", "wrong", connect=StubHAWebSocket())
+
+
+def test_measured_samples_keep_recent_hours():
+    samples = MeasuredSamples(hours=2)
+    start = datetime(2025, 1, 15, 10, 0).astimezone()
+    for h in range(4):
+        samples.add(start + timedelta(hours=h), {"bat_soc": h})
+    assert [row["mean"] for row in samples.rows("bat_soc")] == [2.0, 3.0]
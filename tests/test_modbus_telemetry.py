@@ -0,0 +1,127 @@
+import struct
+
+import pytest
+
+from modbus_telemetry import (
+    ModbusError,
+    ModbusSimulator,
+    ModbusTCPClient,
+    Register,
+    parse_registers,
+    plan_reads,
+    read_registers,
+)
+
+TANK = {
+    "bat_soc": Register(0x001C),
+    "boiler_top": Register(0x0100, signed=True, scale=0.1),
+    "boiler_middle": Register(0x0101, signed=True, scale=0.1),
+    "boiler_bottom": Register(0x0102, signed=True, scale=0.1),
+}
+
+
+@pytest.fixture
+def simulator():
+    sim = ModbusSimulator().start()
+    yield sim
+    sim.stop()
+
+
+def _client(sim):
+    host, port = sim.address
+    return ModbusTCPClient(host, port)
+
+
+def test_plan_reads_merges_only_adjacent_registers():
+    assert plan_reads(TANK) == [(0x001C, 1), (0x0100, 3)]
+    gapped = {"bat_soc": Register(10), "boiler_top": Register(12)}
+    assert plan_reads(gapped) == [(10, 1), (12, 1)]
+    assert plan_reads(gapped, max_gap=1) == [(10, 3)]
+
+
+def test_plan_reads_respects_block_limit():
+    registers = {f"r{i}": Register(i) for i in range(130)}
+    assert plan_reads(registers) == [(0, 125), (125, 5)]
+
+
+def test_batched_read_one_request_per_block(simulator):
+    simulator.set_values({"bat_soc": 63, "boiler_top": 55.5, "boiler_middle": 48.2, "boiler_bottom": -1.5}, TANK)
+    client = _client(simulator)
+    try:
+        values = read_registers(client, TANK)
+    finally:
+        client.close()
+
+    assert values["bat_soc"] == 63
+    assert values["boiler_top"] == pytest.approx(55.5)
+    assert values["boiler_middle"] == pytest.approx(48.2)
+    assert values["boiler_bottom"] == pytest.approx(-1.5)
+    reads = [struct.unpack(">HH", pdu[1:5]) for pdu in simulator.requests]
+    assert reads == [(0x001C, 1), (0x0100, 3)]
+
+
+def test_unmapped_gap_is_not_read(simulator):
+    # Registry 10 a 12 existují, 11 ne – čtení přes mezeru by skončilo výjimkou 0x02
+    simulator.registers.update({10: 1, 12: 2})
+    client = _client(simulator)
+    try:
+        registers = {"bat_soc": Register(10), "boiler_top": Register(12)}
+        assert read_registers(client, registers) == {"bat_soc": 1, "boiler_top": 2}
+        with pytest.raises(ModbusError):
+            client.read_holding_registers(10, 3)
+    finally:
+        client.close()
+
+
+def test_parse_registers():
+    registers = parse_registers("bat_soc=0x001C, boiler_top=256:s:0.1")
+    assert registers == {"bat_soc": Register(0x1C), "boiler_top": Register(256, True, 0.1)}
+    with pytest.raises(ValueError):
+        parse_registers("pool_temp=0x10")
+    with pytest.raises(ValueError):
+        parse_registers("bat_soc=abc")
+
+
+def test_prepare_data_fetches_only_missing_states(monkeypatch):
+    import data_connector
+
+    requested = []
+
+    def fake_states(entity_ids=None):
+        requested.append(entity_ids)
+        return [{"entity_id": "sensor.tepelnaakumulace_spodn_senzor", "state": "31.0", "attributes": {}}]
+
+    monkeypatch.setattr(data_connector, "get_ha_states", fake_states)
+    monkeypatch.setattr(data_connector, "get_temperature_forecast", lambda hours: [])
+    monkeypatch.setattr(data_connector, "read_telemetry",
+                        lambda: {"bat_soc": 70.0, "boiler_top": 60.0, "boiler_middle": 50.0})
+
+    data = data_connector.prepare_data()
+
+    assert requested[0] is not None  # žádné celé /api/states
+    assert "sensor.tepelnaakumulace_spodn_senzor" in requested[0]
+    assert "sensor.solax_battery_capacity" not in requested[0]
+    assert data["bat_soc"] == 70.0
+    assert data["temp_lower"] == pytest.approx(50.0 * 0.25 + 31.0 * 0.75)
+
+
+def test_prepare_data_reads_device_entities(monkeypatch, capsys):
+    import data_connector
+
+    requested = []
+
+    def fake_states(entity_ids=None):
+        requested.append(entity_ids)
+        return [{"entity_id": "sensor.ev_session_energy", "state": "4.2", "attributes": {}},
+                {"entity_id": "sensor.b2_soc", "state": "unavailable", "attributes": {}}]
+
+    monkeypatch.setattr(data_connector, "get_ha_states", fake_states)
+    monkeypatch.setattr(data_connector, "get_temperature_forecast", lambda hours: [])
+    monkeypatch.setattr(data_connector, "read_telemetry", lambda: {})
+
+    data = data_connector.prepare_data(None, {"ev_delivered": "sensor.ev_session_energy", "b2_soc": "sensor.b2_soc"})
+
+    assert {"sensor.ev_session_energy", "sensor.b2_soc"} <= set(requested[0])
+    assert data["ev_delivered"] == 4.2
+    assert "b2_soc" not in data                                 # zařízení začne z hodnoty v nastavení
+    assert "sensor.b2_soc nedostupná" in capsys.readouterr().out
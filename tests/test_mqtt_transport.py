@@ -0,0 +1,117 @@
+import json
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("paho.mqtt")
+
+import mqtt_transport
+from mqtt_transport import AVAILABILITY_TOPIC, MQTTBrokerSimulator, MQTTTransport, topic_matches
+
+
+def _wait(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def broker():
+    sim = MQTTBrokerSimulator().start()
+    yield sim
+    sim.stop()
+
+
+@pytest.fixture
+def transport(broker, monkeypatch):
+    monkeypatch.setattr(mqtt_transport, "RESOLVE_DEBOUNCE", 0.05)
+    resolved = threading.Event()
+    host, port = broker.address
+    mqtt = MQTTTransport(host, port, on_change=resolved.set).start()
+    mqtt.resolved = resolved
+    assert _wait(lambda: broker.subscribed("powerplan/input/bat_soc"))
+    yield mqtt
+    mqtt.stop()
+
+
+def _publish_input(broker, key, value):
+    broker.publish(f"powerplan/input/{key}", str(value).encode())
+
+
+def test_topic_matches():
+    assert topic_matches("powerplan/#", "powerplan/plan/state")
+    assert topic_matches("homeassistant/sensor/+/+/config", "homeassistant/sensor/powerplan/plan/config")
+    assert not topic_matches("powerplan/input/+", "powerplan/input/a/b")
+
+
+def test_actions_and_plan_are_retained_with_discovery(broker, transport):
+    attributes = {"charge": {"friendly_name": "Nabíjení", "icon": "mdi:battery", "device_class": "switch"}}
+    transport.publish_actions({"charge": "on"}, attributes, {"fallback": False})
+    times = ["2025-01-15T10:00:00+01:00", "2099-01-15T11:00:00+01:00"]
+    transport.publish_plan({"times": times, "actions_timeline": {"max_heat": ["on", "off"]}})
+    transport.publish_debug(times[0], {"objective_value": 1.5})
+
+    assert _wait(lambda: "powerplan/debug/state" in broker.retained)
+    assert broker.retained[AVAILABILITY_TOPIC] == b"online"
+    assert broker.retained["powerplan/charge/state"] == b"on"
+    assert json.loads(broker.retained["powerplan/attributes"]) == {"fallback": False}
+    config = json.loads(broker.retained["homeassistant/sensor/powerplan/charge/config"])
+    assert config["state_topic"] == "powerplan/charge/state"
+    assert config["unique_id"] == "powerplan_charge"
+    assert "device_class" not in config
+    assert broker.retained["powerplan/plan/state"] == times[1].encode()
+    assert json.loads(broker.retained["powerplan/plan/attributes"])["changes"][0]["max_heat"] == "on"
+    assert "homeassistant/sensor/powerplan/debug/config" in broker.retained
+
+    # Discovery se v rámci spojení posílá jen jednou
+    transport.publish_actions({"charge": "off"}, attributes)
+    assert _wait(lambda: broker.retained["powerplan/charge/state"] == b"off")
+    configs = [t for t, _, _ in broker.published if t == "homeassistant/sensor/powerplan/charge/config"]
+    assert len(configs) == 1
+
+
+def test_pushed_inputs_marked_used_only_after_success(broker, transport):
+    _publish_input(broker, "bat_soc", 50)
+    assert transport.resolved.wait(2)
+    assert transport.latest_inputs() == {"bat_soc": 50.0}
+
+    # Výpočet selhal – hodnoty se neoznačí a malá změna spustí přepočet znovu
+    transport.resolved.clear()
+    _publish_input(broker, "bat_soc", 51)
+    assert transport.resolved.wait(2)
+
+    transport.mark_used(transport.latest_inputs())
+    transport.resolved.clear()
+    _publish_input(broker, "bat_soc", 52)
+    assert _wait(lambda: transport.latest_inputs() == {"bat_soc": 52.0})
+    assert not transport.resolved.wait(0.3)   # pod prahem RESOLVE_THRESHOLDS
+
+
+def test_stale_inputs_ignored(broker, transport):
+    _publish_input(broker, "boiler_top", 60)
+    assert _wait(lambda: "boiler_top" in transport.latest_inputs())
+    assert transport.latest_inputs(max_age=-1) == {}
+
+
+def test_publish_from_other_process_is_refused(broker, transport):
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+
+    def publish_in_child():
+        try:
+            transport.publish_debug("slot", {"objective_value": 1.0})
+            queue.put("published")
+        except RuntimeError:
+            queue.put("refused")
+
+    child = context.Process(target=publish_in_child)
+    child.start()
+    assert queue.get(timeout=10) == "refused"
+    child.join(timeout=5)
+    transport.publish_debug("slot", {"objective_value": 1.0})  # proces, který se připojil
+    assert _wait(lambda: "powerplan/debug/state" in broker.retained)
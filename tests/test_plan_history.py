@@ -0,0 +1,94 @@
+import json
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import plan_history
+from plan_history import INDEX_ACTIONS, align, compact_record, diff_runs, plan_fan, record_solution
+from solution import Solution
+
+START = datetime(2025, 1, 15, 10, 0).astimezone()
+
+
+def _solution(start, b_soc, charger_mode, max_heat, objective):
+    n = len(b_soc)
+    times = [start + timedelta(hours=i) for i in range(n)]
+    outputs = {key: [0.0] * n for key in plan_history.INDEX_SERIES}
+    outputs["b_soc"] = list(b_soc)
+    timeline = {key: [0] * n for key in INDEX_ACTIONS}
+    timeline["charger_mode"] = list(charger_mode)
+    timeline["max_heat"] = list(max_heat)
+    sol = Solution(times, {}, outputs, results={"objective_value": objective, "net_bilance": objective / 2},
+                   extra={"actions_timeline": timeline})
+    sol.generated_at = start.isoformat()
+    return sol.to_dict()
+
+
+@pytest.fixture
+def runs():
+    # Druhý běh je o slot posunutý – osy se překrývají jen ve dvou slotech
+    older = _solution(START, [10.0, 11.0, 12.0], ["Back Up Mode"] * 3, [False, False, True], 5.0)
+    newer = _solution(START + timedelta(hours=1), [11.5, 12.0, 13.0],
+                      ["Back Up Mode", "Manual Charge", "Manual Charge"], [True, True, False], 4.0)
+    return [compact_record(older, "result_20250115_100000.json"),
+            compact_record(newer, "result_20250115_110000.json")]
+
+
+def test_compact_record_indexes_all_timeline_actions(runs):
+    record = runs[0]
+    assert record["run"] == "20250115_100000"
+    assert set(record["actions"]) == set(INDEX_ACTIONS)
+    assert {"charger_mode", "max_heat", "upper_accumulation", "battery_target_soc"} <= set(record["actions"])
+    assert record["times"][1] - record["times"][0] == 3600
+    assert record["objective"] == 5.0
+
+
+def test_align_on_shifted_grids(runs):
+    axis, matrix = align(runs, "b_soc")
+    assert len(axis) == 4
+    np.testing.assert_array_equal(matrix[0], [10.0, 11.0, 12.0, np.nan])
+    np.testing.assert_array_equal(matrix[1], [np.nan, 11.5, 12.0, 13.0])
+    _, actions = align(runs, "charger_mode", source="actions")
+    assert actions[0, 3] is None and actions[1, 0] is None
+
+
+def test_diff_runs_values(runs):
+    diff = diff_runs(runs)["diffs"][0]
+    assert diff["from"] == "20250115_100000" and diff["to"] == "20250115_110000"
+    assert diff["objective_delta"] == pytest.approx(-1.0)
+    assert diff["net_bilance_delta"] == pytest.approx(-0.5)
+    assert diff["series"]["b_soc"][1:3] == [pytest.approx(0.5), pytest.approx(0.0)]
+    assert diff["series"]["b_soc"][0] is None and diff["series"]["b_soc"][3] is None
+    assert diff["max_abs"]["b_soc"] == pytest.approx(0.5)
+
+    changes = diff["action_changes"]
+    assert [(c["from"], c["to"]) for c in changes["charger_mode"]] == [("Back Up Mode", "Manual Charge")]
+    # Změna patron je vidět stejně jako změna režimu střídače
+    assert [(c["from"], c["to"]) for c in changes["max_heat"]] == [(False, True)]
+    assert changes["max_heat"][0]["time"] == diff_runs(runs)["times"][1]
+    assert changes["upper_accumulation"] == []
+
+
+def test_diff_needs_two_runs(runs):
+    with pytest.raises(ValueError):
+        diff_runs(runs[:1])
+
+
+def test_plan_fan_over_day_index(monkeypatch, tmp_path):
+    monkeypatch.setattr(plan_history, "RESULTS_DIR", str(tmp_path))
+    solutions = {
+        "result_20250115_100000.json": _solution(START, [10.0, 11.0, 12.0], ["Back Up Mode"] * 3, [False] * 3, 5.0),
+        "result_20250115_110000.json": _solution(START + timedelta(hours=1), [11.5, 12.0, 13.0],
+                                                 ["Back Up Mode"] * 3, [False] * 3, 4.0),
+    }
+    for name, solution in solutions.items():
+        # Stejné pořadí jako v serveru: plný JSON, pak denní index
+        (tmp_path / name).write_text(json.dumps(solution))
+        record_solution(solution, name)
+    fan = plan_fan("20250115", "b_soc")
+    assert fan["runs"] == ["20250115_100000", "20250115_110000"]
+    assert fan["count"] == [1, 2, 2, 1]
+    assert fan["min"] == [10.0, 11.0, 12.0, 13.0]
+    assert fan["max"] == [10.0, 11.5, 12.0, 13.0]
+    assert fan["values"][0][3] is None
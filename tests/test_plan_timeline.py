@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import data_connector
+import plan_timeline
+from actions import powerplan_to_actions_timeline
+from cases import make_case
+from plan_timeline import TIMELINE_KEYS, decode_changes, encode_changes, publish_plan
+from powerplan_optimizer import run_mpc_optimizer
+
+
+def _times(n, start=None):
+    start = start or datetime(2025, 1, 15, 0, 0).astimezone()
+    return [(start + timedelta(minutes=15 * i)).isoformat() for i in range(n)]
+
+
+def _timeline(n):
+    # Každá akce se mění s jinou periodou, hodnoty různých typů jako v actions_timeline
+    values = [["Auto", "Nabíjení", "Prodej"], [False, True], [20, 55, 100], [0.0, 2.5]]
+    return {
+        key: [values[k % len(values)][(i // (k + 1)) % len(values[k % len(values)])] for i in range(n)]
+        for k, key in enumerate(TIMELINE_KEYS)
+    }
+
+
+def _assert_roundtrip(times, timeline):
+    changes = encode_changes(times, timeline)
+    assert set(changes[0]) == {"start", *TIMELINE_KEYS}
+    for i, at in enumerate(times):
+        assert decode_changes(changes, at) == {k: timeline[k][i] for k in TIMELINE_KEYS}, at
+    return changes
+
+
+def test_encode_decode_roundtrip_all_keys():
+    n = 40
+    times, timeline = _times(n), _timeline(n)
+    changes = _assert_roundtrip(times, timeline)
+    # Každá akce se aspoň jednou změní a záznamy nesou jen změny
+    for key in TIMELINE_KEYS:
+        assert sum(key in entry for entry in changes) > 1, key
+    assert sum(len(entry) - 1 for entry in changes) < n * len(TIMELINE_KEYS)
+
+
+def test_encode_decode_roundtrip_solution_timeline():
+    series, initials, hours, dt = make_case(24)
+    solution = run_mpc_optimizer(series, initials, hours, {}, dt)
+    timeline = powerplan_to_actions_timeline(solution)
+    _assert_roundtrip(solution["times"], timeline)
+
+
+@pytest.fixture
+def published(monkeypatch):
+    calls = []
+    monkeypatch.setattr(data_connector, "publish_to_ha", lambda payload, prefix, attributes: calls.append(payload))
+    monkeypatch.setattr(plan_timeline, "_last_published", None)
+    monkeypatch.setattr(plan_timeline, "_last_state", None)
+    monkeypatch.setattr(plan_timeline, "_last_time", 0.0)
+    return calls
+
+
+def _solution(n=24):
+    start = datetime.now().astimezone().replace(microsecond=0) + timedelta(hours=1)
+    times = _times(n, start)
+    return {"times": times, "actions_timeline": _timeline(n)}
+
+
+def test_publish_skips_unchanged_plan(published):
+    solution = _solution()
+    assert publish_plan(solution)
+    assert not publish_plan(solution)
+    assert not publish_plan({**solution})
+    assert len(published) == 1
+    assert published[0]["plan"] == encode_changes(solution["times"], solution["actions_timeline"])[1]["start"]
+
+    changed = _solution()
+    changed["actions_timeline"]["max_heat"][-1] = not changed["actions_timeline"]["max_heat"][-1]
+    assert publish_plan(changed)
+    assert len(published) == 2
+
+
+def test_publish_repeats_after_republish_interval(published):
+    solution = _solution()
+    assert publish_plan(solution)
+    plan_timeline._last_time -= plan_timeline.REPUBLISH_INTERVAL / 2
+    assert not publish_plan(solution)
+    plan_timeline._last_time -= plan_timeline.REPUBLISH_INTERVAL
+    assert publish_plan(solution)
+    assert not publish_plan(solution)
+    assert len(published) == 2
@@ -0,0 +1,72 @@
+import json
+import os
+
+import pytest
+
+from cases import make_case
+from powerplan import main
+
+
+@pytest.fixture
+def case_file(tmp_path):
+    series, initials, hours, dt = make_case(12)
+    path = tmp_path / "day.json"
+    path.write_text(json.dumps({
+        "series": series, "initials": initials,
+        "hours": [h.isoformat() for h in hours], "options": {}, "dt": dt,
+    }))
+    return str(path)
+
+
+def _lines(capsys):
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith("{")]
+
+
+def _solve(case_file, out_dir, capsys):
+    assert main(["solve", case_file, "--workers", "1", "--output-dir", str(out_dir)]) == 0
+    return _lines(capsys)
+
+
+def test_solve_writes_one_line_per_case_and_output_file(case_file, tmp_path, capsys):
+    lines = _solve(case_file, tmp_path / "out", capsys)
+
+    assert len(lines) == 1
+    record = lines[0]
+    assert record["case"] == "day" and "error" not in record
+    assert record["file"] == os.path.join(str(tmp_path / "out"), "day.json")
+    with open(record["file"]) as f:
+        stored = json.load(f)
+    # Na stdout jen souhrn, celé řešení v souboru
+    assert "outputs" not in record
+    assert stored["results"]["objective_value"] == pytest.approx(record["results"]["objective_value"])
+
+
+def test_replay_reproduces_stored_objective(case_file, tmp_path, capsys):
+    record = _solve(case_file, tmp_path / "out", capsys)[0]
+    result = tmp_path / "result_20250115_000000.json"
+    os.rename(record["file"], result)
+
+    assert main(["replay", str(result), "--workers", "1", "--set", "engine=lp"]) == 0
+    lines = _lines(capsys)
+    assert len(lines) == 1
+    assert lines[0]["case"] == "result_20250115_000000"
+    assert lines[0]["objective_diff"] == pytest.approx(0.0, abs=1e-6)
+
+
+def test_bench_runs_to_completion(case_file, tmp_path, capsys):
+    record = _solve(case_file, tmp_path / "out", capsys)[0]
+
+    assert main(["bench", record["file"]]) == 0
+    out = capsys.readouterr().out
+    assert "day.json" in out and "1 plánů" in out
+
+
+@pytest.mark.parametrize("argv", [
+    ["solve", "missing.json"],
+    ["replay", "missing.json"],
+    ["solve", "{case}", "--set", "no_such_option=1"],
+])
+def test_bad_input_returns_rc2(case_file, argv, capsys):
+    argv = [arg.replace("{case}", case_file) for arg in argv]
+    assert main(argv + ["--workers", "1"]) == 2
+    assert "Chyba" in capsys.readouterr().err
@@ -0,0 +1,22 @@
+import pytest
+
+from cases import make_case
+from powerplan_optimizer import run_mpc_optimizer
+
+MILP = {"milp_enabled": True, "heating_enabled": True, "fast_path_enabled": False}
+
+
+@pytest.mark.parametrize("milp", [False, True])
+def test_presolve_matches_full_model(milp):
+    series, initials, hours, dt = make_case(24)
+    options = {**MILP, "milp_enabled": milp}
+    reduced = run_mpc_optimizer(series, initials, hours, {**options, "presolve_enabled": True}, dt)
+    full = run_mpc_optimizer(series, initials, hours, {**options, "presolve_enabled": False}, dt)
+    assert reduced["results"]["objective_value"] == pytest.approx(full["results"]["objective_value"], abs=1e-4)
+
+
+def test_milp_warm_start_with_presolve():
+    # Hodnoty z relaxace mohou o zaokrouhlení překročit meze vzniklé v presolve
+    series, initials, hours, dt = make_case(24)
+    solution = run_mpc_optimizer(series, initials, hours, {**MILP, "presolve_enabled": True}, dt)
+    assert solution["solver"] == "milp"
@@ -0,0 +1,105 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from remotecontrol import (
+    POWER_CONTROL_BATTERY,
+    POWER_CONTROL_GRID,
+    FakeInverter,
+    SetpointStreamer,
+    slot_command,
+)
+from solution import Solution
+
+
+def _plan(start, powers, slot_seconds, options=None):
+    times = [start + timedelta(seconds=slot_seconds * i) for i in range(len(powers))]
+    outputs = {
+        "b_charge": [max(p, 0.0) for p in powers],
+        "b_discharge": [max(-p, 0.0) for p in powers],
+        "g_buy": [1.5] * len(powers),
+        "g_sell": [0.5] * len(powers),
+    }
+    return Solution(times, {}, outputs, options=options or {}).to_dict()
+
+
+def test_grid_command_uses_default_grid_limit():
+    plan = _plan(datetime.now(timezone.utc), [1.0], 3600)
+    command = slot_command(plan, 0, mode="grid")
+    assert command.power_control == POWER_CONTROL_GRID
+    assert command.active_power == 1000
+    assert command.import_limit == 18000  # výchozí grid_limit z VARIABLES_SPEC
+    plan["options"] = {"grid_limit": 11}
+    assert slot_command(plan, 0, mode="grid").import_limit == 11000
+
+
+class FakeClock:
+    """Simulovaný čas: `sleep` jen posune hodiny, po `stop_at` zastaví streamer."""
+
+    def __init__(self, now, stop_at):
+        self.now = now
+        self.stop_at = stop_at
+        self.streamer = None
+
+    def time(self):
+        return self.now
+
+    async def sleep(self, delay):
+        self.now += delay
+        if self.now >= self.stop_at:
+            self.streamer.stop()
+        await asyncio.sleep(0)
+
+
+def _run_streamer(inverter, clock, plan, period=10.0, duration=20):
+    streamer = SetpointStreamer(inverter, period=period, duration=duration, clock=clock.time, sleep=clock.sleep)
+    clock.streamer = streamer
+    streamer.update_plan(plan)
+    asyncio.run(streamer.run())
+    return streamer
+
+
+def test_autorepeat_keeps_command_alive_and_switches_on_boundary():
+    clock = FakeClock(1000.0, stop_at=1050.0)
+    inverter = FakeInverter(clock=clock.time)
+    plan = _plan(datetime.fromtimestamp(1000.0, timezone.utc), [2.0, -3.0], 25)
+    streamer = _run_streamer(inverter, clock, plan)
+
+    # Opakování po 10 s od pevného počátku, na hranici slotu (1025) hned nový příkaz a přefázování
+    assert [(t, c.active_power) for t, c in inverter.received] == [
+        (1000.0, 2000), (1010.0, 2000), (1020.0, 2000),
+        (1025.0, -3000), (1035.0, -3000), (1045.0, -3000),
+    ]
+    assert inverter.max_gap() == 10.0
+    assert all(c.power_control == POWER_CONTROL_BATTERY for _, c in inverter.received)
+    assert streamer.errors == 0
+
+
+def test_slow_send_skips_missed_ticks_without_drift():
+    clock = FakeClock(1000.0, stop_at=1050.0)
+
+    class SlowInverter(FakeInverter):
+        async def send(self, command):
+            await super().send(command)
+            clock.now += 15.0  # doručení trvá déle než perioda
+
+    inverter = SlowInverter(clock=clock.time)
+    _run_streamer(inverter, clock, _plan(datetime.fromtimestamp(1000.0, timezone.utc), [1.0], 3600))
+
+    # Zmeškaný tick 1010 se přeskočí, další odeslání zůstávají v mřížce 1000 + k * 10
+    assert [t for t, _ in inverter.received] == [1000.0, 1020.0, 1040.0]
+
+
+def test_fake_inverter_expires_commands():
+    inverter = FakeInverter(clock=lambda: 100.0)
+    plan = _plan(datetime.now(timezone.utc), [1.0], 3600)
+    command = slot_command(plan, 0, duration=20)
+    inverter.received.append((100.0, command))
+    assert inverter.active(110.0) == command
+    assert inverter.active(120.0) is None
+
+
+def test_period_must_be_shorter_than_duration():
+    with pytest.raises(ValueError):
+        SetpointStreamer(FakeInverter(), period=20, duration=20)
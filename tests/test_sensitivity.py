@@ -0,0 +1,43 @@
+import random
+
+import pytest
+
+from cases import make_case
+from powerplan_optimizer import run_mpc_optimizer
+from sensitivity import estimate_change
+
+OPTIONS = {"fast_path_enabled": False}
+
+
+def _case(seed):
+    random.seed(seed)
+    series, initials, hours, dt = make_case(24)
+    series["buy_price"] = [p + random.uniform(-1, 1) for p in series["buy_price"]]
+    series["sell_price"] = [p - 1.5 for p in series["buy_price"]]
+    return series, initials, hours, dt
+
+
+def _resolve_change(series, initials, hours, dt, options, solution, shift):
+    shifted = {**series, "buy_price": [p + shift for p in series["buy_price"]]}
+    return run_mpc_optimizer(shifted, initials, hours, options, dt)["results"]["objective_value"] \
+        - solution["results"]["objective_value"]
+
+
+@pytest.mark.parametrize("seed", [1, 2, 5])
+def test_uniform_buy_shift_includes_derived_terminal_prices(seed):
+    series, initials, hours, dt = _case(seed)
+    solution = run_mpc_optimizer(series, initials, hours, OPTIONS, dt)
+    estimate = estimate_change(solution, buy_price=0.01)
+    exact = _resolve_change(series, initials, hours, dt, OPTIONS, solution, 0.01)
+    assert estimate["terminal_prices"] != 0.0
+    assert estimate["objective_change"] == pytest.approx(exact, abs=1e-3)
+
+
+def test_fixed_terminal_prices_have_no_terminal_term():
+    series, initials, hours, dt = _case(1)
+    options = {**OPTIONS, "bat_price_above": 2.0, "bat_price_below": 2.5, "final_boiler_price": 2.0}
+    solution = run_mpc_optimizer(series, initials, hours, options, dt)
+    estimate = estimate_change(solution, buy_price=0.01)
+    assert estimate["terminal_prices"] == 0.0
+    exact = _resolve_change(series, initials, hours, dt, options, solution, 0.01)
+    assert estimate["objective_change"] == pytest.approx(exact, abs=1e-3)
@@ -0,0 +1,173 @@
+import multiprocessing
+import os
+import runpy
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import powerplan_server
+from remotecontrol import FakeInverter
+from solution import Solution
+
+GUNICORN_CONF = os.path.join(os.path.dirname(powerplan_server.__file__), "gunicorn.conf.py")
+
+
+def _plan(power):
+    start = datetime.now(timezone.utc) - timedelta(minutes=1)
+    times = [start + timedelta(hours=i) for i in range(2)]
+    outputs = {"b_charge": [power] * 2, "b_discharge": [0.0] * 2, "g_buy": [0.0] * 2, "g_sell": [0.0] * 2}
+    return Solution(times, {}, outputs, options={}).to_dict()
+
+
+def _tracking_plan():
+    start = datetime.now(timezone.utc) - timedelta(minutes=1)
+    times = [start + timedelta(hours=i) for i in range(2)]
+    n = len(times)
+    outputs = {
+        "b_charge": [1.0] * n, "b_discharge": [0.0] * n, "b_soc": [10.0] * n,
+        "g_buy": [0.0] * n, "g_sell": [0.0] * n, "h_in_lower": [0.0] * n, "h_in_upper": [0.0] * n,
+        "temp_upper": [50.0] * n, "temp_lower": [40.0] * n,
+    }
+    inputs = {"load_pred": [1.0] * n, "fve_pred": [2.0] * n}
+    return Solution(times, inputs, outputs, options={"b_cap": 17.4},
+                    initials={"bat_soc": 50.0, "temp_upper": 50.0, "temp_lower": 40.0}).to_dict()
+
+
+def _wait_for(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def _gunicorn_worker(check, queue):
+    """Tělo workeru po forku: hook z gunicorn.conf.py, pak kontrola v tomto procesu."""
+    try:
+        runpy.run_path(GUNICORN_CONF)["post_fork"](None, None)
+        queue.put(check())
+    except Exception as e:
+        queue.put(repr(e))
+
+
+def run_in_worker(check):
+    """Spustí `check` v procesu forknutém z importované (preload) aplikace."""
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    worker = context.Process(target=_gunicorn_worker, args=(check, queue))
+    worker.start()
+    try:
+        return queue.get(timeout=20)
+    finally:
+        worker.join(timeout=5)
+        if worker.is_alive():
+            worker.kill()
+
+
+@pytest.fixture
+def addon(monkeypatch):
+    monkeypatch.setattr(powerplan_server, "HA_ADDON", "power_stream_plan")
+    monkeypatch.setattr(powerplan_server, "REMOTECONTROL_MODE", "disabled")
+    monkeypatch.setattr(powerplan_server, "MQTT_HOST", "")
+    monkeypatch.setattr(powerplan_server, "TRACKING_INTERVAL", 0)
+    monkeypatch.setattr(powerplan_server, "load_cache", lambda filename=None: None)
+
+
+def test_import_starts_no_services():
+    # Při preload_app se modul importuje v masteru – žádná vlákna ani spojení
+    assert powerplan_server.scheduler is None
+    assert powerplan_server.streamer is None
+    assert powerplan_server.tracker is None
+    assert powerplan_server.mqtt is None
+
+
+def test_plan_update_reaches_streamer_in_worker(addon, monkeypatch):
+    inverter = FakeInverter(clock=time.time)
+    monkeypatch.setattr(powerplan_server, "REMOTECONTROL_MODE", "battery")
+    monkeypatch.setattr(powerplan_server, "HATransport", lambda: inverter)
+
+    def check():
+        # Přepočet ve workeru (/regenerate) předá plán běžící smyčce
+        powerplan_server.streamer.update_plan(_plan(2.5))
+        return _wait_for(lambda: any(c.active_power == 2500 for _, c in inverter.received))
+
+    assert run_in_worker(check) is True
+    assert powerplan_server.streamer is None
+
+
+def test_plan_update_reaches_tracker_in_worker(addon, monkeypatch):
+    class Reader:
+        def read(self):
+            from tracking_controller import LiveSample
+            return LiveSample(pv=2.0, load=1.0, grid=0.0)
+
+    monkeypatch.setattr(powerplan_server, "TRACKING_INTERVAL", 0.05)
+    monkeypatch.setattr(powerplan_server, "HALiveReader", Reader)
+    monkeypatch.setattr(powerplan_server, "HAHeaterSwitch", lambda: None)
+
+    def check():
+        tracker = powerplan_server.tracker
+        tracker.update_plan(_tracking_plan())
+        return _wait_for(lambda: tracker.last is not None)
+
+    assert run_in_worker(check) is True
+    assert powerplan_server.tracker is None
+
+
+def test_single_worker_owns_recomputes():
+    conf = runpy.run_path(GUNICORN_CONF)
+    # _compute_lock serializuje přepočty jen v rámci jednoho procesu
+    assert conf["workers"] == 1
+    assert not conf.get("max_requests")
+    assert conf["preload_app"] and callable(conf["post_fork"])
+
+
+def test_services_start_once_per_process(addon, monkeypatch):
+    started = []
+    monkeypatch.setattr(powerplan_server, "APScheduler", lambda: started.append(1) or _NoScheduler())
+    monkeypatch.setattr(powerplan_server, "_services_pid", None)
+    monkeypatch.setattr(powerplan_server, "scheduler", None)
+    powerplan_server.start_services()
+    powerplan_server.start_services()
+    assert started == [1]
+
+
+class _NoScheduler:
+    def init_app(self, app):
+        pass
+
+    def add_job(self, **kwargs):
+        pass
+
+    def start(self):
+        pass
+
+
+def test_mqtt_connects_and_publishes_once_in_worker(addon, monkeypatch):
+    pytest.importorskip("paho.mqtt")
+    from mqtt_transport import MQTTBrokerSimulator
+
+    broker = MQTTBrokerSimulator().start()
+    host, port = broker.address
+    monkeypatch.setattr(powerplan_server, "MQTT_HOST", host)
+    monkeypatch.setenv("MQTT_PORT", str(port))
+
+    def check():
+        mqtt = powerplan_server.mqtt
+        if not _wait_for(mqtt.client.is_connected):
+            return "not connected"
+        mqtt.publish_actions({"charge": "on"})
+        time.sleep(0.3)
+        mqtt.stop()
+        return True
+
+    try:
+        assert run_in_worker(check) is True
+        assert _wait_for(lambda: broker.retained.get("powerplan/charge/state") == b"on")
+        states = [t for t, _, _ in broker.published if t == "powerplan/charge/state"]
+        assert states == ["powerplan/charge/state"]
+        assert powerplan_server.mqtt is None
+    finally:
+        broker.stop()
@@ -0,0 +1,110 @@
+from concurrent.futures import Future
+from datetime import datetime
+
+import pytest
+
+import shadow_mode
+from cases import make_case
+from powerplan_optimizer import run_mpc_optimizer
+from shadow_mode import PRIMARY, ShadowRunner, realized_intervals, report, slot_record
+
+
+@pytest.fixture(scope="module")
+def solution():
+    series, initials, hours, dt = make_case(24)
+    return run_mpc_optimizer(series, initials, hours, {}, dt)
+
+
+def test_slot_record_is_planned_first_slot(solution):
+    record = slot_record(solution, PRIMARY, "20250115_100000")
+    outputs, inputs = solution["outputs"], solution["inputs"]
+    expected = (outputs["g_buy"][0] * inputs["buy_price"][0] - outputs["g_sell"][0] * inputs["sell_price"][0]) \
+        * solution["dt"][0]
+    assert record["planned_slot_cost"] == pytest.approx(expected)
+    storage = record["planned_battery_delta"] + record["planned_tank_heat"]
+    assert record["planned_adjusted_cost"] == pytest.approx(expected - min(inputs["buy_price"]) * storage)
+    assert not [key for key in record if key.endswith("_cost") and not key.startswith("planned_")]
+
+
+def test_report_compares_profiles():
+    records = [
+        {"run": "a", "profile": PRIMARY, "objective": 10.0, "planned_slot_cost": 2.0, "planned_adjusted_cost": 1.0},
+        {"run": "a", "profile": "cheap", "objective": 9.0, "planned_slot_cost": 1.5, "planned_adjusted_cost": 0.5},
+        {"run": "b", "profile": PRIMARY, "objective": 10.0, "planned_slot_cost": 2.0, "planned_adjusted_cost": 1.0},
+        {"run": "b", "profile": "cheap", "objective": 11.0, "planned_slot_cost": 3.0, "planned_adjusted_cost": 2.0},
+        {"run": "c", "profile": "cheap", "error": "infeasible"},
+    ]
+    summary = report(records)
+    cheap = summary["profiles"]["cheap"]
+    assert summary["primary_runs"] == 2
+    assert cheap["runs"] == 2 and cheap["errors"] == 1
+    assert cheap["planned_slot_cost"] == pytest.approx(4.5)
+    assert cheap["planned_adjusted_saving"] == pytest.approx(2.0 - 2.5)
+    assert cheap["mean_objective_diff"] == pytest.approx(0.0)
+
+
+def _primary(run, measured_at, imported, exported, rate, slot_end=10_000.0):
+    return {"run": run, "profile": PRIMARY, "objective": 10.0, "planned_slot_cost": 0.0,
+            "planned_adjusted_cost": 0.0, "planned_rate": rate, "buy_price": 4.0, "sell_price": 1.0,
+            "slot_end": slot_end, "measured_at": measured_at, "import_total": imported, "export_total": exported}
+
+
+def _shadow(run, rate):
+    return {"run": run, "profile": "cheap", "objective": 9.0, "planned_slot_cost": 0.0,
+            "planned_adjusted_cost": 0.0, "planned_rate": rate}
+
+
+def test_report_compares_profiles_with_realized_cost():
+    records = [
+        _primary("a", 0.0, 100.0, 50.0, rate=3.0), _shadow("a", rate=1.2),
+        # 5 min: nákup 0.5 kWh, prodej 0.2 kWh → 0.5 · 4 − 0.2 · 1
+        _primary("b", 300.0, 100.5, 50.2, rate=6.0), _shadow("b", rate=6.0),
+        # Mezera delší než MAX_REALIZED_GAP se nezapočte
+        _primary("c", 1800.0, 101.0, 50.2, rate=6.0, slot_end=2000.0), _shadow("c", rate=6.0),
+        # Interval přes konec slotu běhu "c" by se ocenil špatnými cenami
+        _primary("d", 2100.0, 101.5, 50.2, rate=6.0),
+    ]
+    summary = report(records)
+    assert summary["realized"]["intervals"] == 1
+    assert summary["realized"]["cost"] == pytest.approx(1.8)
+    assert summary["realized"]["planned_cost"] == pytest.approx(3.0 / 12)
+
+    cheap = summary["profiles"]["cheap"]
+    assert cheap["realized_runs"] == 1
+    assert cheap["primary_realized_cost"] == pytest.approx(1.8)
+    assert cheap["interval_cost"] == pytest.approx(1.2 / 12)
+    assert cheap["estimated_realized_cost"] == pytest.approx(1.8 + (1.2 - 3.0) / 12)
+
+
+@pytest.mark.parametrize("later", [
+    {"import_total": 99.0},              # reset počítadla
+    {"measured_at": 10_100.0},           # interval přes konec slotu
+])
+def test_realized_intervals_skip_resets_and_slot_boundaries(later):
+    records = [_primary("a", 9_900.0, 100.0, 50.0, rate=3.0),
+               {**_primary("b", 10_000.0, 100.5, 50.0, rate=3.0), **later}]
+    assert realized_intervals(records) == {}
+
+
+def test_runner_records_energy_counters(solution, monkeypatch, tmp_path):
+    class Meter:
+        def read(self):
+            return {"import_total": 12.5, "export_total": 3.0}
+
+    monkeypatch.setattr(shadow_mode, "SHADOW_DIR", str(tmp_path))
+    monkeypatch.setattr(shadow_mode, "load_profiles", lambda: {"cheap": {"battery_penalty": 0.5}})
+    submitted = []
+
+    class Pool:
+        def submit(self, *args):
+            submitted.append(args)
+            return Future()  # profil se v testu neřeší
+
+    monkeypatch.setattr(shadow_mode, "get_pool", lambda name: Pool())
+
+    assert ShadowRunner(Meter()).submit(solution, "20250115_100000") == 1
+    assert len(submitted) == 1
+    (record,) = shadow_mode.load_ledger(1, datetime(2025, 1, 15))
+    assert record["profile"] == PRIMARY
+    assert (record["import_total"], record["export_total"]) == (12.5, 3.0)
+    assert record["measured_at"] > 0
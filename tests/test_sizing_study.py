@@ -0,0 +1,98 @@
+import csv
+import math
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from powerplan_optimizer import run_mpc_optimizer
+from sizing_study import KPI_KEYS, kmeans, load_history, study, typical_days
+
+CET, CEST = timezone(timedelta(hours=1)), timezone(timedelta(hours=2))
+INITIALS = {"bat_soc": 30.0, "temp_lower": 40.0, "temp_upper": 50.0}
+
+
+def _write_history(path, times):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["time", "buy_price", "sell_price", "fve_pred", "load_pred"])
+        for t in times:
+            day = t.toordinal() % 4  # čtyři různé typy dnů
+            buy = 3.0 + 0.5 * day + (1.5 if 17 <= t.hour <= 20 else 0.0)
+            fve = max(0.0, (2 + day) * math.sin(math.pi * (t.hour - 5) / 15)) if 5 <= t.hour <= 20 else 0.0
+            writer.writerow([t.isoformat(), buy, buy - 1.5, round(fve, 3), 0.5 + 0.1 * day])
+
+
+def _hours(start, count):
+    # Hodinové kroky v absolutním čase, zápis v místním čase s posunem (přechod času 30. 3.)
+    utc = start.astimezone(timezone.utc)
+    out = []
+    for i in range(count):
+        t = utc + timedelta(hours=i)
+        tz = CEST if t >= datetime(2025, 3, 30, 1, tzinfo=timezone.utc) else CET
+        out.append(t.astimezone(tz))
+    return out
+
+
+@pytest.fixture
+def history(tmp_path):
+    path = tmp_path / "history.csv"
+    # 27. 3. od 12:00 (neúplný) až 31. 3. 23:00, 30. 3. má 23 hodin
+    start = datetime(2025, 3, 27, 12, tzinfo=CET)
+    end = datetime(2025, 4, 1, 0, tzinfo=CEST)
+    _write_history(path, _hours(start, int((end - start).total_seconds() // 3600)))
+    return str(path)
+
+
+def test_dst_day_kept_with_real_slot_count(history, capsys):
+    days = load_history(history)
+    assert [d.date for d in days] == ["2025-03-28", "2025-03-29", "2025-03-30", "2025-03-31"]
+    assert [len(d.times) for d in days] == [24, 24, 23, 24]
+    assert "Vynecháno 1 neúplných dnů" in capsys.readouterr().out
+
+
+def test_kmeans_partitions_points():
+    X = np.vstack([np.random.default_rng(1).normal(c, 0.1, size=(5, 3)) for c in (0.0, 5.0, 10.0)])
+    labels, centers = kmeans(X, 3)
+    assert len(labels) == len(X) and set(labels) == {0, 1, 2}
+    assert len(centers) == 3
+    # Každá skupina bodů skončí v jednom shluku
+    assert all(len(set(labels[i:i + 5])) == 1 for i in (0, 5, 10))
+
+
+@pytest.mark.parametrize("k", [1, 2, 4])
+def test_typical_days_partition_all_days(history, k):
+    days = load_history(history)
+    clusters = typical_days(days, k)
+    members = sorted(m for c in clusters for m in c.members)
+    assert members == list(range(len(days)))
+    assert all(c.representative in c.members for c in clusters)
+    assert sum(len(c.members) for c in clusters) == len(days)
+
+
+def test_study_weighted_totals_and_exact_check(history):
+    days = load_history(history)
+    clusters = typical_days(days, 2)
+    config = {"b_cap": 10.0, "b_power": 5.0}
+    (entry,) = study(days, clusters, [config], {}, INITIALS, workers=1)
+
+    expected = {k: 0.0 for k in KPI_KEYS}
+    for c in clusters:
+        day = days[c.representative]
+        results = run_mpc_optimizer(day.series, INITIALS, [datetime.fromisoformat(t) for t in day.times],
+                                    config, [1.0] * len(day.times))["results"]
+        for k in KPI_KEYS:
+            expected[k] += results[k] * len(c.members)
+    for k in KPI_KEYS:
+        assert entry["totals"][k] == pytest.approx(expected[k], abs=1e-6), k
+    assert entry["solved_days"] == len(clusters)
+
+
+def test_exact_check_without_bias_when_every_day_is_typical(history):
+    days = load_history(history)
+    clusters = typical_days(days, len(days))
+    assert len(clusters) == len(days)
+    (entry,) = study(days, clusters, [{"b_cap": 10.0}], {}, INITIALS, exact_sample=len(days), workers=1)
+    assert entry["exact_check"]["days"] == len(days)
+    assert entry["exact_check"]["net_bilance_bias"] == pytest.approx(0.0, abs=1e-9)
+    assert entry["exact_check"]["net_bilance_mae"] == pytest.approx(0.0, abs=1e-9)
@@ -0,0 +1,52 @@
+import json
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+from solution import Solution
+
+PRAGUE = ZoneInfo("Europe/Prague")
+
+
+def _data():
+    # Přechod na letní čas: sloty s posunem +01:00 i +02:00
+    start = datetime(2025, 3, 30, 0, 0, tzinfo=PRAGUE)
+    times = [(start.astimezone(ZoneInfo("UTC")) + timedelta(hours=h)).astimezone(PRAGUE) for h in range(4)]
+    return {
+        "generated_at": "2025-03-30T00:05:00+01:00",
+        "times": [t.isoformat() for t in times],
+        "inputs": {"buy_price": [3.1, None, 2.9, 3.0], "load_pred": [0.5, 0.6, 0.4, 0.5]},
+        "initials": {"bat_soc": 50.0},
+        "dt": [0.5, 1.0, 1.0, 1.0],
+        "outputs": {"g_buy": [1.0, 0.0, None, 2.0], "b_soc_percent": [50, 52, 54, 55]},
+        "results": {"objective_value": 12.5, "self_sufficiency": None},
+        "options": {"engine": "lp"},
+        "status": "ok",
+    }
+
+
+def test_roundtrip_with_missing_values_and_dst_times():
+    data = _data()
+    sol = Solution.from_dict(data)
+    assert np.isnan(sol.inputs["buy_price"][1])
+    assert sol.outputs["b_soc_percent"].dtype.kind == "i"
+    assert [t.utcoffset() for t in sol.datetimes] == [timedelta(hours=1)] * 2 + [timedelta(hours=2)] * 2
+
+    again = sol.to_dict()
+    assert again == data
+    assert json.loads(json.dumps(again, allow_nan=False)) == data
+
+    fresh = Solution.from_dict(json.loads(json.dumps(again)))
+    fresh._cache.clear()        # časy znovu z polí, ne z uložených ISO řetězců
+    assert fresh.to_dict() == data
+
+
+def test_computed_nan_serialized_as_null():
+    sol = Solution.from_dict(_data())
+    sol.outputs["g_sell"] = np.array([np.nan, 0.5, 0.0, np.nan])
+    sol.results["ratio"] = np.float64("nan")
+    data = sol.to_dict()
+    assert data["outputs"]["g_sell"] == [None, 0.5, 0.0, None]
+    assert data["results"]["ratio"] is None
+    json.dumps(data, allow_nan=False)
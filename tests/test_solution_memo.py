@@ -0,0 +1,106 @@
+import copy
+from datetime import datetime
+
+import pytest
+
+import powerplan_server
+import solution_memo
+from cases import make_case
+from solution_memo import SolutionMemo, fingerprint
+
+
+@pytest.fixture
+def case():
+    series, initials, hours, dt = make_case(24)
+    return series, initials, hours, {"battery_penalty": 0.1}, dt
+
+
+def _key(series, initials, hours, options, dt):
+    return fingerprint(series, initials, hours, options, dt)
+
+
+def test_equal_after_quantization_hits(case):
+    series, initials, hours, options, dt = case
+    key = _key(*case)
+    noisy = copy.deepcopy(series)
+    noisy["buy_price"][3] += 1e-6                          # pod SERIES_DECIMALS
+    jitter = {**initials, "bat_soc": initials["bat_soc"] + 0.3, "temp_upper": initials["temp_upper"] + 0.2}
+    later = [dt[0] - 0.005] + dt[1:]                        # zbytek slotu o 18 s kratší
+    assert _key(noisy, jitter, hours, dict(options), later) == key
+
+
+@pytest.mark.parametrize("change", ["price", "option", "initial", "dt", "hours"])
+def test_changed_input_misses(case, change):
+    series, initials, hours, options, dt = copy.deepcopy(case)
+    key = _key(series, initials, hours, options, dt)
+    if change == "price":
+        series["buy_price"][10] += 0.01
+    elif change == "option":
+        options["battery_penalty"] = 0.2
+    elif change == "initial":
+        initials["bat_soc"] += 2
+    elif change == "dt":
+        dt[0] -= 2 / 60                                      # o 2 min kratší první slot
+    else:
+        hours = hours[1:] + [hours[-1].replace(year=2030)]
+    assert _key(series, initials, hours, options, dt) != key
+
+
+def test_max_age_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(solution_memo.time, "monotonic", lambda: now[0])
+    memo = SolutionMemo(max_age=60)
+    memo.put("a", "plan")
+    now[0] += 59
+    assert memo.get("a") == "plan"
+    now[0] += 2
+    assert memo.get("a") is None
+    assert len(memo) == 0
+    assert (memo.hits, memo.misses) == (1, 1)
+
+
+def test_lru_eviction():
+    memo = SolutionMemo(size=2)
+    memo.put("a", 1)
+    memo.put("b", 2)
+    assert memo.get("a") == 1       # "a" je teď nejnověji použitý
+    memo.put("c", 3)
+    assert memo.get("b") is None
+    assert memo.get("a") == 1 and memo.get("c") == 3
+
+
+def test_solve_current_returns_memoized_solution(monkeypatch):
+    series, initials, hours, dt = make_case(24, datetime(2099, 1, 15).astimezone())
+    data = {**series, **initials, "hours": hours}
+    solves = []
+    monkeypatch.setattr(powerplan_server, "prepare_data", lambda pushed=None, entities=None: data)
+    monkeypatch.setattr(powerplan_server, "load_settings", lambda: {})
+    monkeypatch.setattr(powerplan_server, "solve_budget", lambda hours: 1.0)
+    monkeypatch.setattr(powerplan_server, "run_mpc_optimizer", lambda *a, **kw: solves.append(1) or {"plan": len(solves)})
+    monkeypatch.setattr(powerplan_server, "memo", SolutionMemo())
+
+    solution, key, cached = powerplan_server.solve_current()
+    assert not cached and solves == [1]
+    powerplan_server.memo.put(key, solution)
+
+    again, again_key, cached = powerplan_server.solve_current()
+    assert cached and again is solution and again_key == key and solves == [1]
+    # Ruční přepočet memo obchází
+    _, _, cached = powerplan_server.solve_current(force=True)
+    assert not cached and solves == [1, 1]
+
+
+def test_memo_hit_still_publishes(monkeypatch):
+    solution = {"generated_at": "2099-01-15T00:00:00", "times": ["2099-01-15T00:00:00"],
+                "actions": {"charger_mode": "auto"}, "actions_timeline": {}, "results": {}}
+    published = []
+    monkeypatch.setattr(powerplan_server, "solve_current", lambda force, pushed: (solution, "k" * 32, True))
+    monkeypatch.setattr(powerplan_server, "mqtt", None)
+    monkeypatch.setattr(powerplan_server, "ENABLE_PUBLISH", True)
+    monkeypatch.setattr(powerplan_server, "publish_changed",
+                        lambda values, *a, **kw: published.append(sorted(values)))
+    monkeypatch.setattr(powerplan_server, "publish_plan", lambda sol: published.append("plan"))
+
+    # Bez ukládání, ale entity a plán se obnoví (publikace sama přeskočí nezměněné)
+    assert powerplan_server.compute_and_cache() is solution
+    assert published == [["charger_mode"], "plan", ["debug"]]
@@ -0,0 +1,88 @@
+import importlib
+import os
+import runpy
+
+import pytest
+from flask import Flask
+
+import solver_service
+from cases import make_case
+from powerplan_environment import REQUEST_TIMEOUT
+from solver_service import parse_request, solve_bp
+
+
+def _payload(**changes):
+    series, initials, hours, dt = make_case(24)
+    payload = {
+        "series": {k: series[k] for k in ("buy_price", "sell_price", "fve_pred", "load_pred")},
+        "initials": initials,
+        "hours": [h.isoformat() for h in hours],
+        "dt": dt,
+    }
+    payload.update(changes)
+    return payload
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.register_blueprint(solve_bp)
+    yield app.test_client()
+    solver_service._reset_pool()
+
+
+def test_optional_series_default_to_zeros():
+    series, *_ = parse_request(_payload())
+    assert series["tuv_demand"] == [0.0] * 24
+    assert series["heating_demand"] == [0.0] * 24
+
+
+@pytest.mark.parametrize("payload, message", [
+    (_payload(series={"buy_price": [1.0] * 24}), "Chybí"),
+    (_payload(initials={"bat_soc": 50}), "temp_lower"),
+    (_payload(dt=[1.0] * 23), "dt"),
+    (_payload(dt=[float("nan")] * 24), "konečná"),
+])
+def test_invalid_request_rejected(client, payload, message):
+    response = client.post("/api/solve", json=payload)
+    assert response.status_code == 400
+    assert message in response.get_json()["error"]
+
+
+def test_solve_without_heat_demand(client):
+    response = client.post("/api/solve", json=_payload(timeout=30))
+    assert response.status_code == 200
+    assert len(response.get_json()["outputs"]["b_soc"]) == 24
+
+
+def test_api_timeout_fits_gunicorn_timeout():
+    conf = runpy.run_path(os.path.join(os.path.dirname(solver_service.__file__), "gunicorn.conf.py"))
+    assert conf["worker_class"] == "gthread"
+    assert conf["threads"] > solver_service.SOLVE_WORKERS + solver_service.SOLVE_QUEUE
+    assert solver_service.SOLVE_TIMEOUT + solver_service.BUILD_GRACE < conf["timeout"]
+
+
+def test_api_timeout_option_is_clamped(monkeypatch):
+    monkeypatch.setenv("SOLVE_API_TIMEOUT", "600")
+    try:
+        importlib.reload(solver_service)
+        assert solver_service.SOLVE_TIMEOUT == solver_service.MAX_SOLVE_TIMEOUT
+        assert solver_service.SOLVE_TIMEOUT + solver_service.BUILD_GRACE < REQUEST_TIMEOUT
+        _, _, _, _, _, timeout = parse_request(_payload(timeout=600))
+        assert timeout == solver_service.MAX_SOLVE_TIMEOUT
+    finally:
+        monkeypatch.delenv("SOLVE_API_TIMEOUT")
+        importlib.reload(solver_service)
+
+
+def test_full_queue_returns_503(client):
+    taken = 0
+    while solver_service._slots.acquire(blocking=False):
+        taken += 1
+    try:
+        response = client.post("/api/solve", json=_payload(timeout=30))
+    finally:
+        for _ in range(taken):
+            solver_service._slots.release()
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "30"
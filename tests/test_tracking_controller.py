@@ -0,0 +1,82 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from remotecontrol import POWER_CONTROL_BATTERY, FakeInverter, RemoteControlCommand, SetpointStreamer
+from solution import Solution
+from tracking_controller import LiveSample, TrackingController, compute_bounds
+
+B_CAP = 17.4
+
+
+def _plan(start, soc_percent=50.0, b_soc=(10.0, 10.0)):
+    n = len(b_soc)
+    times = [start + timedelta(hours=i) for i in range(n)]
+    outputs = {
+        "b_charge": [1.0] * n, "b_discharge": [0.0] * n, "b_soc": list(b_soc),
+        "g_buy": [0.0] * n, "g_sell": [0.0] * n,
+        "h_in_lower": [0.0] * n, "h_in_upper": [0.0] * n,
+        "temp_upper": [50.0] * n, "temp_lower": [40.0] * n,
+    }
+    inputs = {"load_pred": [1.0] * n, "fve_pred": [2.0] * n}
+    return Solution(times, inputs, outputs, options={"b_cap": B_CAP},
+                    initials={"bat_soc": soc_percent, "temp_upper": 50.0, "temp_lower": 40.0}).to_dict()
+
+
+class Reader:
+    def __init__(self, sample=None, error=None):
+        self.sample = sample
+        self.error = error
+
+    def read(self):
+        if self.error:
+            raise self.error
+        return self.sample
+
+
+def test_first_slot_bounds_use_initial_soc():
+    # Baterie začíná na minimu (15 %), plán ji v prvním slotu nabije
+    bounds = compute_bounds(_plan(datetime.now(timezone.utc), soc_percent=15.0, b_soc=(10.0, 10.0)))
+    assert bounds.battery_min[0] == 0.0    # vybíjení pod minimum není povolené
+    assert bounds.battery_min[1] < 0.0
+
+
+def test_override_expires_without_refresh():
+    streamer = SetpointStreamer(FakeInverter(), period=1, duration=20)
+    command = RemoteControlCommand(POWER_CONTROL_BATTERY, 500)
+    now = time.time()
+    streamer.set_override(command, until=now + 5)
+    assert streamer.current_command(now + 4) == command
+    assert streamer.current_command(now + 6) is None
+
+
+def test_step_sets_bounded_override():
+    start = datetime.now(timezone.utc) - timedelta(minutes=30)
+    streamer = SetpointStreamer(FakeInverter(), period=1, duration=20)
+    tracker = TrackingController(Reader(LiveSample(pv=2.0, load=1.0, grid=0.0)), streamer=streamer, interval=5)
+    tracker.update_plan(_plan(start))
+    now = time.time()
+    tracker.step(now)
+    assert streamer.current_command(now + 9) is not None
+    assert streamer.current_command(now + 11) is None   # nejdéle dva kroky regulace
+
+
+def test_failed_step_releases_override():
+    start = datetime.now(timezone.utc) - timedelta(minutes=30)
+    streamer = SetpointStreamer(FakeInverter(), period=1, duration=20)
+    reader = Reader(LiveSample(pv=2.0, load=1.0, grid=0.0))
+    tracker = TrackingController(reader, streamer=streamer)
+    tracker.update_plan(_plan(start))
+    tracker.step()
+    assert streamer._override is not None
+
+    reader.error = OSError("HA nedostupný")
+    with pytest.raises(OSError):
+        tracker.step()
+    assert streamer._override is None
+
+    reader.error = None
+    tracker.step()
+    assert tracker.step(start.timestamp() - 60) is None  # mimo plán
+    assert streamer._override is None
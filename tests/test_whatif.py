@@ -0,0 +1,86 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from flask import Flask
+
+import powerplan_whatif
+from powerplan_environment import REQUEST_TIMEOUT
+from powerplan_whatif import MAX_CANDIDATES, WHATIF_TIMEOUT, candidate_settings, evaluate, whatif_bp
+
+
+def _slow_solve(series, initials, times, options, dt, time_limit=None):
+    time.sleep(options["battery_penalty"])
+    return {"results": {"objective_value": options["battery_penalty"]}, "outputs": {}}
+
+
+@pytest.fixture
+def one_worker(monkeypatch):
+    pool = ThreadPoolExecutor(max_workers=1)
+    baseline = {"inputs": {}, "initials": {}, "times": [], "dt": [], "results": {"objective_value": 0.0}}
+    monkeypatch.setattr(powerplan_whatif, "get_pool", lambda: pool)
+    monkeypatch.setattr(powerplan_whatif, "solve_case", _slow_solve)
+    monkeypatch.setattr(powerplan_whatif, "load_baseline", lambda: baseline)
+    monkeypatch.setattr(powerplan_whatif, "load_settings", lambda: {})
+    monkeypatch.setattr("actions.powerplan_to_actions", lambda solution: {})
+    yield pool
+    pool.shutdown(wait=True, cancel_futures=True)
+
+
+def test_timeout_is_shared_by_all_candidates(one_worker):
+    started = time.monotonic()
+    report = evaluate([{"battery_penalty": 0.3}] * 4, timeout=0.5)
+    elapsed = time.monotonic() - started
+
+    assert elapsed < 0.7  # jeden termín, ne 4 × 0,5 s
+    errors = [c.get("error") for c in report["candidates"]]
+    assert errors[0] is None
+    assert errors[1:] == ["Časový limit vypršel"] * 3
+    assert report["candidates"][0]["delta"]["objective_value"] == pytest.approx(0.3)
+
+
+def test_candidate_count_is_capped(one_worker):
+    with pytest.raises(ValueError, match="Nejvýše"):
+        evaluate([{}] * (MAX_CANDIDATES + 1))
+
+
+def test_whatif_timeout_fits_gunicorn_timeout():
+    assert WHATIF_TIMEOUT < REQUEST_TIMEOUT
+
+
+@pytest.mark.parametrize("value, expected", [(True, True), (False, False), ("true", True), ("False", False)])
+def test_candidate_bool_accepts_bools_and_true_false(value, expected):
+    assert candidate_settings({"milp_enabled": not expected}, {"milp_enabled": value})["milp_enabled"] is expected
+
+
+@pytest.mark.parametrize("overrides", [
+    {"milp_enabled": "0"},
+    {"milp_enabled": "no"},
+    {"milp_enabled": 1},
+    {"milp_enabled": None},
+    {"battery_penalty": None},
+    {"battery_penalty": "abc"},
+    {"battery_penalty": "nan"},
+    {"battery_penalty": True},
+    {"tank_value_hour": None},
+    {"tank_value_hour": 18.5},
+])
+def test_candidate_rejects_invalid_values(overrides):
+    with pytest.raises(ValueError):
+        candidate_settings({}, overrides)
+
+
+def test_candidate_parses_numbers():
+    settings = candidate_settings({}, {"battery_penalty": "0.5", "tank_value_hour": 18.0})
+    assert settings == {"battery_penalty": 0.5, "tank_value_hour": 18}
+    assert isinstance(settings["tank_value_hour"], int)
+
+
+@pytest.mark.parametrize("settings", [{"battery_penalty": None}, {"milp_enabled": "0"}])
+def test_api_whatif_invalid_value_is_400(one_worker, settings):
+    app = Flask(__name__)
+    app.register_blueprint(whatif_bp)
+
+    response = app.test_client().post("/api/whatif", json={"settings": settings})
+    assert response.status_code == 400
+    assert "Neplatná hodnota" in response.get_json()["error"]
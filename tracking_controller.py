@@ -0,0 +1,299 @@
+"""
+tracking_controller.py
+----------------------
+Rychlá regulace mezi přepočty MPC.
+
+Plán se přepočítává každých 5 minut a mezi tím je statický – přechodný
+mrak nebo nečekaná spotřeba způsobí odběr či přetok, se kterým LP nepočítalo.
+Regulátor každých 5–10 s přečte živý výkon FVE, spotřeby a sítě a v mezích
+aktuálního slotu upraví výkon baterie a povolení patron kolem setpointů MPC.
+
+Odchylka se počítá z čisté spotřeby (spotřeba − FVE) oproti predikci, ne
+z výkonu sítě – ten už obsahuje korekci baterie z předchozího kroku a
+regulace by kmitala. Výkon sítě se jen zaznamenává pro kontrolu.
+
+Meze pro každý slot se předpočítají z řešení při jeho příchodu
+(`SlotBounds`), takže jeden krok regulace je O(1): index slotu se spočítá
+aritmeticky z času a korekce je pár porovnání.
+
+Výkon baterie se posílá jako přebití RemoteControl streameru
+(`remotecontrol.SetpointStreamer.set_override`), patrony přes přepínače
+akumulace v HA. Regulátor běží ve vlastním vlákně nezávisle na gunicornu.
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from options import get_option
+from remotecontrol import RemoteControlCommand, POWER_CONTROL_BATTERY
+from solution import Solution
+
+TRACKING_INTERVAL = 10.0  # s
+DEADBAND = 0.3            # kW – odchylka od plánu, na kterou se nereaguje
+SOC_MARGIN = 0.02         # podíl kapacity – rezerva u mezí SOC
+TEMP_MARGIN = 2.0         # °C – rezerva u maximální teploty zóny
+
+# Živé hodnoty (solax_modbus, W)
+ENTITY_PV_POWER = "sensor.solax_pv_power_total"
+ENTITY_LOAD_POWER = "sensor.solax_house_load"       # včetně patron
+ENTITY_GRID_POWER = "sensor.solax_measured_power"   # kladně = přetok
+# Povolení akumulace (viz actions.py)
+ENTITY_UPPER_HEATER = "switch.tepelnaakumulace_povolen_horn_akumulace"
+ENTITY_LOWER_HEATER = "switch.tepelnaakumulace_povolen_spodn_akumulace"
+
+
+@dataclass
+class SlotBounds:
+    """Předpočítané setpointy a meze všech slotů plánu (sloupcově)."""
+    starts: List[float]             # epoch s
+    slot_length: Optional[float]    # s, pokud jsou sloty rovnoměrné
+    net_load: List[float]           # plánovaná čistá spotřeba vč. patron − FVE [kW]
+    battery: List[float]            # plánovaný výkon baterie b_charge - b_discharge [kW]
+    battery_min: List[float]        # nejnižší povolený výkon baterie [kW]
+    battery_max: List[float]        # nejvyšší povolený výkon baterie [kW]
+    upper_heater: List[bool]        # plán počítá s ohřevem horní zóny
+    lower_heater: List[bool]        # plán počítá s ohřevem dolní zóny
+    upper_room: List[bool]          # horní zóna má rezervu pro ohřev navíc
+    lower_room: List[bool]          # dolní zóna má rezervu pro ohřev navíc
+    upper_power: float
+    lower_power: float
+
+    def slot_index(self, now: float) -> Optional[int]:
+        """Index slotu pro čas `now` v O(1) (rovnoměrné sloty)."""
+        if not self.starts or now < self.starts[0]:
+            return None
+        if self.slot_length:
+            i = int((now - self.starts[0]) // self.slot_length)
+        else:
+            i = len(self.starts) - 1
+            while i > 0 and self.starts[i] > now:
+                i -= 1
+        return i if i < len(self.starts) else None
+
+    def slot_end(self, i: int) -> float:
+        """Konec slotu `i` (epoch s); poslední slot nerovnoměrného plánu trvá hodinu."""
+        if self.slot_length:
+            return self.starts[0] + (i + 1) * self.slot_length
+        return self.starts[i + 1] if i + 1 < len(self.starts) else self.starts[i] + 3600.0
+
+
+def compute_bounds(sol: Dict[str, Any]) -> SlotBounds:
+    """Předpočítá setpointy a meze pro všechny sloty řešení."""
+    sol = Solution.from_dict(sol)
+    out = sol.outputs
+    options = sol.options
+    b_cap = get_option(options, "b_cap")
+    b_min = get_option(options, "b_min")
+    b_max = get_option(options, "b_max")
+    b_power = get_option(options, "b_power")
+    upper_max_t = get_option(options, "h_upper_max_t")
+    lower_max_t = get_option(options, "h_lower_max_t")
+
+    starts = sol.epoch.tolist()
+    steps = {round(b - a) for a, b in zip(starts, starts[1:])}
+    slot_length = float(steps.pop()) if len(steps) == 1 else (3600.0 if len(starts) == 1 else None)
+
+    n = len(starts)
+    inputs = sol.inputs
+    battery = [out["b_charge"][t] - out["b_discharge"][t] for t in range(n)]
+    # b_soc[t] je stav na konci slotu, začátek prvního slotu je naměřený počáteční stav
+    initial_soc = (sol.initials or {}).get("bat_soc")
+    soc_first = initial_soc / 100 * b_cap if initial_soc is not None else out["b_soc"][0]
+    soc_start = [out["b_soc"][t - 1] if t > 0 else soc_first for t in range(n)]
+    margin = SOC_MARGIN * b_cap
+
+    return SlotBounds(
+        starts=starts,
+        slot_length=slot_length,
+        net_load=[
+            inputs["load_pred"][t] + out["h_in_lower"][t] + out["h_in_upper"][t] - inputs["fve_pred"][t]
+            for t in range(n)
+        ],
+        battery=battery,
+        battery_min=[-b_power if soc_start[t] > b_min + margin else min(battery[t], 0.0) for t in range(n)],
+        battery_max=[b_power if soc_start[t] < b_max - margin else max(battery[t], 0.0) for t in range(n)],
+        upper_heater=[out["h_in_upper"][t] > 0.1 for t in range(n)],
+        lower_heater=[out["h_in_lower"][t] > 0.1 for t in range(n)],
+        upper_room=[out["temp_upper"][t] < upper_max_t - TEMP_MARGIN for t in range(n)],
+        lower_room=[out["temp_lower"][t] < lower_max_t - TEMP_MARGIN for t in range(n)],
+        upper_power=get_option(options, "h_upper_power"),
+        lower_power=get_option(options, "h_lower_power"),
+    )
+
+
+@dataclass
+class LiveSample:
+    pv: float     # kW
+    load: float   # kW, včetně patron
+    grid: float   # kW, kladně = odběr
+
+
+@dataclass
+class TrackingDecision:
+    battery_power: float   # kW, kladně = nabíjení
+    upper_heater: bool
+    lower_heater: bool
+    deviation: float       # kW, živá čistá spotřeba − plán (kladně = víc spotřeby)
+
+
+def track(bounds: SlotBounds, i: int, sample: LiveSample,
+          upper_on: bool = False, lower_on: bool = False, deadband: float = DEADBAND) -> TrackingDecision:
+    """
+    Jeden krok regulace pro slot `i`.
+
+    `upper_on` / `lower_on` jsou patrony zapnuté předchozím krokem nad rámec
+    plánu – jejich příkon se od živé spotřeby odečte, aby regulátor
+    nereagoval sám na sebe.
+
+    Odchylka čisté spotřeby od plánu se nejprve vyrovná baterií v mezích
+    slotu. Přebytek, který baterie nepojme, zapne patrony (nejprve horní),
+    pokud v zóně zbývá rezerva. Přebytek menší než příkon patrony, kterou
+    jsme zapnuli dřív, ji zase vypne.
+    """
+    extra = (bounds.upper_power if upper_on and not bounds.upper_heater[i] else 0.0) \
+        + (bounds.lower_power if lower_on and not bounds.lower_heater[i] else 0.0)
+    deviation = (sample.load - extra - sample.pv) - bounds.net_load[i]
+    battery = bounds.battery[i]
+    upper = bounds.upper_heater[i]
+    lower = bounds.lower_heater[i]
+
+    if abs(deviation) > deadband:
+        target = battery - deviation
+        clamped = min(max(target, bounds.battery_min[i]), bounds.battery_max[i])
+        surplus = target - clamped      # > 0 – přetok, který baterie nepojme
+        battery = clamped
+        if surplus > deadband:
+            if not upper and bounds.upper_room[i] and surplus >= bounds.upper_power:
+                upper = True
+                surplus -= bounds.upper_power
+            if not lower and bounds.lower_room[i] and surplus >= bounds.lower_power:
+                lower = True
+
+    return TrackingDecision(battery, upper, lower, deviation)
+
+
+# --- Živá data a akční členy -----------------------------------------------
+
+class HALiveReader:
+    """Čte živé výkony z HA po jednotlivých entitách (ne celý /api/states)."""
+
+    def _state(self, client, entity_id: str) -> float:
+        resp = client.session.get(f"{client.url}/api/states/{entity_id}", timeout=3)
+        resp.raise_for_status()
+        return float(resp.json()["state"]) / 1000.0
+
+    def read(self) -> LiveSample:
+        from data_connector import get_client
+
+        client = get_client()
+        return LiveSample(
+            pv=self._state(client, ENTITY_PV_POWER),
+            load=self._state(client, ENTITY_LOAD_POWER),
+            grid=-self._state(client, ENTITY_GRID_POWER),
+        )
+
+
+class HAHeaterSwitch:
+    """Přepíná povolení akumulace v HA, jen při změně stavu."""
+
+    def __init__(self):
+        self._state: Dict[str, bool] = {}
+
+    def set(self, entity_id: str, on: bool) -> None:
+        if self._state.get(entity_id) == on:
+            return
+        from data_connector import get_client
+
+        client = get_client()
+        service = "turn_on" if on else "turn_off"
+        resp = client.session.post(
+            f"{client.url}/api/services/switch/{service}", json={"entity_id": entity_id}, timeout=3
+        )
+        resp.raise_for_status()
+        self._state[entity_id] = on
+
+
+class TrackingController:
+    """Regulační smyčka ve vlastním vlákně (perioda bez kumulace zpoždění)."""
+
+    def __init__(self, reader, heaters=None, streamer=None, interval: float = TRACKING_INTERVAL):
+        self.reader = reader
+        self.heaters = heaters
+        self.streamer = streamer
+        self.interval = interval
+        self._bounds: Optional[SlotBounds] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last: Optional[Tuple[float, LiveSample, TrackingDecision]] = None
+
+    def update_plan(self, sol: Dict[str, Any]) -> None:
+        # Atomická výměna reference – smyčka čte vždy konzistentní meze
+        self._bounds = compute_bounds(sol)
+
+    def _release(self) -> None:
+        """Vrátí streamer na plán (korekce bez živých dat neplatí)."""
+        if self.streamer is not None and self.streamer.mode == "battery":
+            self.streamer.set_override(None)
+
+    def step(self, now: Optional[float] = None) -> Optional[TrackingDecision]:
+        try:
+            return self._step(now)
+        except Exception:
+            self._release()
+            raise
+
+    def _step(self, now: Optional[float]) -> Optional[TrackingDecision]:
+        bounds = self._bounds
+        if bounds is None:
+            self._release()
+            return None
+        now = time.time() if now is None else now
+        i = bounds.slot_index(now)
+        if i is None:
+            self._release()
+            return None
+        sample = self.reader.read()
+        previous = self.last[2] if self.last is not None else None
+        decision = track(
+            bounds, i, sample,
+            upper_on=previous is not None and previous.upper_heater,
+            lower_on=previous is not None and previous.lower_heater,
+        )
+        if self.streamer is not None and self.streamer.mode == "battery":
+            # V režimu Grid Control drží síť na plánu sám střídač baterií.
+            # Korekce platí do konce slotu, nejdéle dva kroky – když smyčka
+            # uvázne, streamer se sám vrátí k plánu.
+            self.streamer.set_override(RemoteControlCommand(
+                POWER_CONTROL_BATTERY, int(round(decision.battery_power * 1000)), self.streamer.duration
+            ), until=min(bounds.slot_end(i), now + 2 * self.interval))
+        if self.heaters is not None:
+            self.heaters.set(ENTITY_UPPER_HEATER, decision.upper_heater)
+            self.heaters.set(ENTITY_LOWER_HEATER, decision.lower_heater)
+        self.last = (now, sample, decision)
+        return decision
+
+    def _run(self) -> None:
+        next_tick = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self.step()
+            except Exception as e:
+                print(f"[ERR] Tracking: {e}")
+            next_tick += self.interval
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                # Krok trval déle než perioda – přeskoč zmeškané ticky
+                next_tick = time.monotonic()
+                delay = 0
+            self._stop.wait(delay)
+
+    def start_in_thread(self) -> "TrackingController":
+        self._thread = threading.Thread(target=self._run, name="tracking", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._release()